@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Worker AMI Builder for NDT
+Bakes Docker, containerlab, kernel settings and optional node images into a versioned worker AMI
+"""
+
+import asyncio
+import hashlib
+import logging
+import shlex
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from async_executor import DEPLOY_LANE, run_blocking
+from job_queue import Job
+
+logger = logging.getLogger(__name__)
+
+# Tags identifying baked images
+IMAGE_TAG = 'NDT-Image'
+IMAGE_ROLE = 'worker'
+VERSION_TAG = 'NDT-Image-Version'
+
+BAKE_DONE_MARKER = '/var/local/ndt_bake_complete'
+BAKE_FAILED_MARKER = '/var/local/ndt_bake_failed'
+
+# Everything slow about a worker bootstrap, run once on the builder instance
+BAKE_SCRIPT = r"""#!/bin/bash
+set -euxo pipefail
+exec > >(tee -a /var/log/ndt-bake.log) 2>&1
+trap 'touch {failed_marker}' ERR
+
+export DEBIAN_FRONTEND=noninteractive
+
+# Packages used by both the manager and the provisioner bootstrap
+apt-get update -y
+apt-get upgrade -y
+apt-get install -y \
+    curl wget git vim htop iotop jq unzip ca-certificates gnupg lsb-release \
+    software-properties-common apt-transport-https unattended-upgrades \
+    net-tools tcpdump bridge-utils iptables iproute2 iputils-ping traceroute nmap iperf3 mtr-tiny \
+    python3 python3-pip python3-venv
+
+# Docker (official installer)
+curl -fsSL https://get.docker.com | sh
+systemctl enable --now docker
+usermod -aG docker ubuntu || true
+timeout 180 bash -c 'until docker info >/dev/null 2>&1; do sleep 3; done'
+
+# Containerlab
+bash -c "$(curl -sL https://get.containerlab.dev)"
+ln -sf "$(command -v containerlab || command -v clab)" /usr/local/bin/clab
+
+# Python packages for the worker scripts
+pip3 install --break-system-packages paramiko pyyaml requests psutil docker
+
+# Kernel modules and sysctls, persisted so every boot has them
+cat > /etc/modules-load.d/ndt.conf << 'EOF'
+br_netfilter
+ip_gre
+ip6_gre
+vxlan
+EOF
+cat > /etc/sysctl.d/90-ndt.conf << 'EOF'
+net.ipv4.ip_forward=1
+net.ipv6.conf.all.forwarding=1
+net.bridge.bridge-nf-call-iptables=1
+net.bridge.bridge-nf-call-ip6tables=1
+kernel.pid_max=65536
+vm.max_map_count=262144
+EOF
+
+# Node images, so the first deploy on a new worker pulls nothing
+for image in {images}; do
+  docker pull "$image"
+done
+
+# Workspace
+mkdir -p /opt/ndt/topos /opt/ndt/topologies /opt/ndt/logs /opt/ndt/configs
+chown -R ubuntu:ubuntu /opt/ndt
+
+# Leave no per-instance state behind: readiness markers belong to the instances launched from the image
+rm -f /var/local/ndt_bootstrap_success /tmp/ndt-initialization-complete
+apt-get clean
+echo '{version}' > /etc/ndt-image-version
+
+touch {done_marker}
+"""
+
+class AMIBuilder:
+    """Builds, finds and prunes baked NDT worker AMIs"""
+
+    def __init__(self, ec2_client):
+        self.ec2_client = ec2_client
+
+    @staticmethod
+    def recipe_hash(images: List[str]) -> str:
+        """Identifies what a bake contains, independent of when it ran"""
+        recipe = BAKE_SCRIPT + '\n' + '\n'.join(sorted(images))
+        return hashlib.sha256(recipe.encode()).hexdigest()[:8]
+
+    def bake_script(self, version: str, images: List[str]) -> str:
+        return BAKE_SCRIPT.format(
+            images=' '.join(shlex.quote(image) for image in images),
+            version=version,
+            done_marker=BAKE_DONE_MARKER,
+            failed_marker=BAKE_FAILED_MARKER,
+        )
+
+    def list_images(self) -> List[Dict]:
+        """Available baked worker AMIs, newest first"""
+        response = self.ec2_client.describe_images(
+            Owners=['self'],
+            Filters=[
+                {'Name': f'tag:{IMAGE_TAG}', 'Values': [IMAGE_ROLE]},
+                {'Name': 'state', 'Values': ['available']},
+            ],
+        )
+        images = []
+        for image in response.get('Images', []):
+            tags = {tag['Key']: tag['Value'] for tag in image.get('Tags', [])}
+            images.append({
+                'image_id': image['ImageId'],
+                'name': image.get('Name'),
+                'version': tags.get(VERSION_TAG),
+                'created_at': image.get('CreationDate'),
+                'base_ami': tags.get('NDT-Base-AMI'),
+                'prefetched_images': [i for i in tags.get('NDT-Prefetched-Images', '').split(',') if i],
+                'snapshot_ids': [
+                    mapping['Ebs']['SnapshotId']
+                    for mapping in image.get('BlockDeviceMappings', [])
+                    if 'Ebs' in mapping and 'SnapshotId' in mapping['Ebs']
+                ],
+            })
+        return sorted(images, key=lambda image: image['created_at'] or '', reverse=True)
+
+    async def find_latest(self) -> Optional[str]:
+        """ID of the newest baked worker AMI, or None if nothing has been baked"""
+        images = await run_blocking(self.list_images)
+        return images[0]['image_id'] if images else None
+
+    async def build(self,
+                    base_ami: str,
+                    security_group_id: str,
+                    key_name: str,
+                    ssh_pool,
+                    images: Optional[List[str]] = None,
+                    instance_type: str = 't3.large',
+                    volume_gb: int = 20,
+                    timeout: float = 1800,
+                    job: Optional[Job] = None) -> Dict:
+        """Launch a builder from base_ami, run the bake script, snapshot it and terminate it
+
+        volume_gb must not exceed the smallest worker volume, since an instance's
+        root volume cannot be smaller than its AMI's snapshot.
+        """
+        images = images or []
+        recipe = self.recipe_hash(images)
+        version = f"{datetime.now().strftime('%Y%m%d-%H%M')}-{recipe}"
+
+        def phase(name: str):
+            return job.phase(name) if job is not None else nullcontext()
+
+        instance_id = None
+        try:
+            with phase('launch'):
+                response = await run_blocking(
+                    self.ec2_client.run_instances,
+                    ImageId=base_ami,
+                    MinCount=1,
+                    MaxCount=1,
+                    InstanceType=instance_type,
+                    KeyName=key_name,
+                    SecurityGroupIds=[security_group_id],
+                    BlockDeviceMappings=[{
+                        'DeviceName': '/dev/sda1',
+                        'Ebs': {'VolumeSize': volume_gb, 'VolumeType': 'gp3', 'DeleteOnTermination': True},
+                    }],
+                    TagSpecifications=[{
+                        'ResourceType': 'instance',
+                        'Tags': [
+                            {'Key': 'Name', 'Value': f'ndt-ami-builder-{version}'},
+                            {'Key': 'NDT-Role', 'Value': 'ami-builder'},
+                            {'Key': 'CreatedBy', 'Value': 'ndt-manager'},
+                        ],
+                    }],
+                    UserData=self.bake_script(version, images),
+                )
+                instance_id = response['Instances'][0]['InstanceId']
+                waiter = self.ec2_client.get_waiter('instance_running')
+                await run_blocking(waiter.wait, InstanceIds=[instance_id], lane=DEPLOY_LANE)
+                described = await run_blocking(self.ec2_client.describe_instances, InstanceIds=[instance_id])
+                public_ip = described['Reservations'][0]['Instances'][0].get('PublicIpAddress')
+                if not public_ip:
+                    raise RuntimeError(f"Builder instance {instance_id} has no public IP")
+
+            with phase('bake') as bake_phase:
+                await self._wait_for_bake(ssh_pool, public_ip, timeout)
+                if bake_phase is not None:
+                    bake_phase.detail = f"{len(images)} node images pulled"
+
+            with phase('snapshot'):
+                # Stop first so the filesystem is consistent without relying on a reboot
+                await run_blocking(self.ec2_client.stop_instances, InstanceIds=[instance_id])
+                waiter = self.ec2_client.get_waiter('instance_stopped')
+                await run_blocking(waiter.wait, InstanceIds=[instance_id], lane=DEPLOY_LANE)
+
+                image = await run_blocking(
+                    self.ec2_client.create_image,
+                    InstanceId=instance_id,
+                    Name=f'ndt-worker-{version}',
+                    Description=f'NDT worker image: Docker, containerlab and {len(images)} node images',
+                    TagSpecifications=[{
+                        'ResourceType': 'image',
+                        'Tags': [
+                            {'Key': IMAGE_TAG, 'Value': IMAGE_ROLE},
+                            {'Key': VERSION_TAG, 'Value': version},
+                            {'Key': 'NDT-Recipe', 'Value': recipe},
+                            {'Key': 'NDT-Base-AMI', 'Value': base_ami},
+                            # Tag values are limited to 256 characters
+                            {'Key': 'NDT-Prefetched-Images', 'Value': ','.join(images)[:256]},
+                        ],
+                    }],
+                )
+                image_id = image['ImageId']
+                waiter = self.ec2_client.get_waiter('image_available')
+                await run_blocking(
+                    waiter.wait, ImageIds=[image_id], WaiterConfig={'Delay': 15, 'MaxAttempts': 120}, lane=DEPLOY_LANE
+                )
+
+            logger.info(f"Baked worker AMI {image_id} (version {version})")
+            return {'image_id': image_id, 'version': version, 'base_ami': base_ami, 'prefetched_images': images}
+
+        finally:
+            if instance_id is not None:
+                try:
+                    await run_blocking(self.ec2_client.terminate_instances, InstanceIds=[instance_id])
+                except Exception as e:
+                    logger.error(f"Could not terminate AMI builder {instance_id}: {e}")
+
+    async def _wait_for_bake(self, ssh_pool, public_ip: str, timeout: float):
+        command = (f'if [ -f {BAKE_FAILED_MARKER} ]; then echo failed; '
+                   f'elif [ -f {BAKE_DONE_MARKER} ]; then echo done; fi')
+        deadline = asyncio.get_running_loop().time() + timeout
+        while asyncio.get_running_loop().time() < deadline:
+            try:
+                result = await run_blocking(ssh_pool.exec_command, public_ip, command, timeout=10)
+                state = result.stdout.strip()
+                if state == 'done':
+                    return
+                if state == 'failed':
+                    raise RuntimeError("Bake script failed; see /var/log/ndt-bake.log on the builder")
+            except RuntimeError:
+                raise
+            except Exception as e:
+                logger.debug(f"Builder at {public_ip} not reachable yet: {e}")
+            await asyncio.sleep(15)
+        raise TimeoutError(f"Bake did not finish within {timeout:.0f}s")
+
+    async def prune(self, keep: int = 3) -> List[str]:
+        """Deregister all but the newest `keep` baked AMIs and delete their snapshots"""
+        images = await run_blocking(self.list_images)
+        removed = []
+        for image in images[keep:]:
+            await run_blocking(self.ec2_client.deregister_image, ImageId=image['image_id'])
+            for snapshot_id in image['snapshot_ids']:
+                await run_blocking(self.ec2_client.delete_snapshot, SnapshotId=snapshot_id)
+            removed.append(image['image_id'])
+        if removed:
+            logger.info(f"Pruned {len(removed)} old worker AMIs: {', '.join(removed)}")
+        return removed
@@ -8,7 +8,7 @@ import json
 import requests
 import argparse
 import sys
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 import yaml
 
 class NDTClient:
@@ -27,9 +27,9 @@ class NDTClient:
         response.raise_for_status()
         return response.json()
     
-    def get_resources(self) -> Dict:
-        """Get EC2 resource information"""
-        response = self.session.get(f"{self.base_url}/resources")
+    def get_resources(self, fresh: bool = False) -> Dict:
+        """Get EC2 resource information (fresh=True polls every worker first)"""
+        response = self.session.get(f"{self.base_url}/resources", params={'fresh': 'true'} if fresh else None)
         response.raise_for_status()
         return response.json()
     
@@ -48,6 +48,47 @@ class NDTClient:
         response.raise_for_status()
         return response.json()
     
+    def get_job(self, job_id: str, wait: float = 0, since: int = -1) -> Dict:
+        """Get a deployment job; wait > 0 long-polls until it changes past `since`"""
+        params = {'wait': wait, 'since': since} if wait else None
+        response = self.session.get(f"{self.base_url}/jobs/{job_id}", params=params, timeout=wait + 30)
+        response.raise_for_status()
+        return response.json()
+    
+    def list_jobs(self, status: Optional[str] = None) -> Dict:
+        """List deployment jobs"""
+        response = self.session.get(f"{self.base_url}/jobs", params={'status': status} if status else None)
+        response.raise_for_status()
+        return response.json()
+    
+    def wait_for_job(self, job_id: str, on_update: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Follow a job until it finishes, calling on_update with each new version"""
+        version = -1
+        while True:
+            job = self.get_job(job_id, wait=30, since=version)
+            if job['version'] != version:
+                version = job['version']
+                if on_update:
+                    on_update(job)
+            if job['status'] in ('succeeded', 'partial', 'failed'):
+                return job
+    
+    def benchmark_topology(self, topology_name: str, duration: int = 5, ping_count: int = 20,
+                           streams: int = 1) -> Dict:
+        """Queue a throughput/latency benchmark between the hosts of a deployed topology"""
+        response = self.session.post(
+            f"{self.base_url}/topology/{topology_name}/benchmark",
+            json={'duration': duration, 'ping_count': ping_count, 'streams': streams}
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def get_trace(self, topology_name: str) -> Dict:
+        """Span tree of the latest deploy of a topology"""
+        response = self.session.get(f"{self.base_url}/deployments/{topology_name}/trace")
+        response.raise_for_status()
+        return response.json()
+    
     def destroy_topology(self, topology_name: str) -> Dict:
         """Destroy a deployed topology"""
         response = self.session.delete(f"{self.base_url}/topology/{topology_name}")
@@ -97,6 +138,84 @@ def print_resources_table(resources: Dict):
         
         print(f"{instance_id:<20} {instance_type:<12} {state:<10} {cpu_percent:<6} {memory_percent:<8} {ssh_ok:<5} {docker_ok:<6}")
 
+def print_jobs_table(jobs: Dict):
+    """Print jobs in table format"""
+    job_list = jobs.get('jobs', [])
+    
+    if not job_list:
+        print("No jobs found")
+        return
+    
+    # Header
+    print(f"{'Job ID':<14} {'Kind':<8} {'Target':<25} {'Status':<10} {'Phase':<14} {'Created At':<20}")
+    print("-" * 95)
+    
+    for job in job_list:
+        created_at = job.get('created_at', 'N/A')
+        if isinstance(created_at, str) and 'T' in created_at:
+            created_at = created_at.split('T')[0] + ' ' + created_at.split('T')[1][:8]
+        phase = job.get('current_phase') or '-'
+        
+        print(f"{job['job_id']:<14} {job['kind']:<8} {job['target']:<25} {job['status']:<10} {phase:<14} {created_at:<20}")
+
+def print_job_progress(job: Dict):
+    """Print a one-line summary of a job's latest state"""
+    phases = ', '.join(f"{p['name']}={p['status']} ({p['duration_seconds']}s)" for p in job.get('phases', []))
+    print(f"[{job['status']}] {phases or 'waiting for a worker'}")
+
+def print_benchmark_table(result: Dict):
+    """Print per-host-pair benchmark results and the pairs worth a look"""
+    pairs = result.get('pairs', [])
+    
+    if not pairs:
+        print("No links cross hosts; nothing to benchmark")
+        return
+    
+    # Header
+    print(f"{'Host A':<20} {'Host B':<20} {'Links':<6} {'Mbit/s':<9} {'RTT ms':<8} {'Loss%':<6} {'MTU':<4}")
+    print("-" * 78)
+    
+    for pair in pairs:
+        a, b = pair['hosts']
+        throughput = f"{pair['throughput_mbps']:.0f}" if pair.get('throughput_mbps') is not None else 'N/A'
+        rtt = f"{pair['rtt_avg_ms']:.2f}" if pair.get('rtt_avg_ms') is not None else 'N/A'
+        loss = f"{pair['loss_percent']:.1f}" if pair.get('loss_percent') is not None else 'N/A'
+        mtu_ok = '✓' if pair.get('mtu_ok') else '✗'
+        
+        print(f"{a:<20} {b:<20} {pair['links']:<6} {throughput:<9} {rtt:<8} {loss:<6} {mtu_ok:<4}")
+    
+    for outlier in result.get('outliers', []):
+        print(f"⚠ {' <-> '.join(outlier['hosts'])}: {'; '.join(outlier['reasons'])}")
+
+def print_trace_waterfall(trace: Dict, width: int = 50, min_ms: float = 0):
+    """Print a deploy's spans as an indented tree with a bar per span on a shared time axis"""
+    root = trace['root']
+    total = root['duration_ms'] or 1
+    
+    print(f"Deploy of {trace.get('topology_name')} (job {trace.get('job_id')}) at {trace.get('started_at')}: "
+          f"{trace.get('status')}, {total / 1000:.1f}s")
+    print(f"{'Span':<44} {'Start':>8} {'Duration':>9}  Timeline")
+    print("-" * (65 + width))
+    
+    def walk(span: Dict, depth: int):
+        if span['duration_ms'] < min_ms and depth > 0:
+            return
+        attributes = span.get('attributes') or {}
+        subject = attributes.get('instance_id') or attributes.get('instance_type')
+        label = '  ' * depth + span['name'] + (f" [{subject}]" if subject else '')
+        
+        offset = min(int(span['start_ms'] / total * width), width - 1)
+        length = max(1, int(span['duration_ms'] / total * width))
+        bar = ' ' * offset + ('█' if span['status'] != 'failed' else '▒') * min(length, width - offset)
+        marker = ' ✗ ' + span['error'] if span.get('error') else ''
+        
+        print(f"{label[:44]:<44} {span['start_ms'] / 1000:>7.1f}s {span['duration_ms'] / 1000:>8.1f}s  "
+              f"{bar:<{width}}{marker}")
+        for child in span.get('children', []):
+            walk(child, depth + 1)
+    
+    walk(root, 0)
+
 def print_deployments_table(deployments: Dict):
     """Print deployments in table format"""
     if not deployments:
@@ -131,6 +250,7 @@ def main():
     # Resources command
     resources_parser = subparsers.add_parser('resources', help='Get resource information')
     resources_parser.add_argument('--json', action='store_true', help='Output as JSON')
+    resources_parser.add_argument('--fresh', action='store_true', help='Poll workers now instead of using the telemetry snapshot')
     
     # Deployments command
     deployments_parser = subparsers.add_parser('deployments', help='List deployments')
@@ -141,6 +261,30 @@ def main():
     deploy_parser.add_argument('file', help='Topology file (JSON or YAML)')
     deploy_parser.add_argument('--wait', action='store_true', help='Wait for deployment to complete')
     
+    # Jobs commands
+    jobs_parser = subparsers.add_parser('jobs', help='List deployment jobs')
+    jobs_parser.add_argument('--status', help='Only show jobs in this state')
+    jobs_parser.add_argument('--json', action='store_true', help='Output as JSON')
+    
+    job_parser = subparsers.add_parser('job', help='Show a deployment job')
+    job_parser.add_argument('job_id', help='Job ID returned by deploy')
+    job_parser.add_argument('--wait', action='store_true', help='Follow the job until it finishes')
+    
+    # Benchmark command
+    bench_parser = subparsers.add_parser('bench', help='Measure throughput, latency and loss between topology hosts')
+    bench_parser.add_argument('name', help='Topology name')
+    bench_parser.add_argument('--duration', type=int, default=5, help='Seconds of iperf3 per host pair')
+    bench_parser.add_argument('--pings', type=int, default=20, help='Pings per host pair')
+    bench_parser.add_argument('--streams', type=int, default=1, help='Parallel iperf3 streams')
+    bench_parser.add_argument('--json', action='store_true', help='Output as JSON')
+    
+    # Trace command
+    trace_parser = subparsers.add_parser('trace', help='Show where the time of the latest deploy went')
+    trace_parser.add_argument('name', help='Topology name')
+    trace_parser.add_argument('--min-ms', type=float, default=0, help='Hide spans shorter than this')
+    trace_parser.add_argument('--width', type=int, default=50, help='Timeline width in characters')
+    trace_parser.add_argument('--json', action='store_true', help='Output as JSON')
+    
     # Destroy command
     destroy_parser = subparsers.add_parser('destroy', help='Destroy topology')
     destroy_parser.add_argument('name', help='Topology name')
@@ -164,11 +308,14 @@ def main():
             print_json(result)
         
         elif args.command == 'resources':
-            result = client.get_resources()
+            result = client.get_resources(fresh=args.fresh)
             if args.json:
                 print_json(result)
             else:
                 print_resources_table(result)
+                age = result.get('telemetry', {}).get('snapshot_age_seconds')
+                if age is not None:
+                    print(f"\nData age: {age}s")
         
         elif args.command == 'deployments':
             result = client.get_deployments()
@@ -180,30 +327,60 @@ def main():
         elif args.command == 'deploy':
             print(f"Deploying topology from {args.file}...")
             result = client.deploy_from_file(args.file)
+            job_id = result['job_id']
+            print(f"✓ Deployment queued as job {job_id}")
             
-            if result.get('status') == 'success':
-                print("✓ Topology deployed successfully")
+            if args.wait:
+                print(f"\nFollowing job {job_id}...")
+                job = client.wait_for_job(job_id, on_update=print_job_progress)
+                
+                if job['status'] == 'succeeded':
+                    print("✓ Topology deployed successfully")
+                elif job['status'] == 'partial':
+                    print("⚠ Topology deployment completed with issues")
+                else:
+                    print(f"✗ Deployment failed: {job.get('error')}")
+                
+                print_json(job.get('result') or job)
+                if job['status'] == 'failed':
+                    sys.exit(1)
             else:
-                print("⚠ Topology deployment completed with issues")
-            
+                print(f"Follow progress with: job {job_id} --wait")
+        
+        elif args.command == 'jobs':
+            result = client.list_jobs(status=args.status)
+            if args.json:
+                print_json(result)
+            else:
+                print_jobs_table(result)
+        
+        elif args.command == 'job':
+            if args.wait:
+                result = client.wait_for_job(args.job_id, on_update=print_job_progress)
+            else:
+                result = client.get_job(args.job_id)
             print_json(result)
+        
+        elif args.command == 'bench':
+            result = client.benchmark_topology(args.name, args.duration, args.pings, args.streams)
+            print(f"Benchmark queued as job {result['job_id']}")
+            job = client.wait_for_job(result['job_id'], on_update=None if args.json else print_job_progress)
             
-            if args.wait:
-                import time
-                topology_name = result.get('deployment_info', {}).get('topology_name')
-                if topology_name:
-                    print(f"\nMonitoring deployment of {topology_name}...")
-                    while True:
-                        deployments = client.get_deployments()
-                        if topology_name in deployments:
-                            deployment = deployments[topology_name]
-                            status = deployment.get('status', 'unknown')
-                            print(f"Status: {status}")
-                            
-                            if status in ['success', 'failed']:
-                                break
-                        
-                        time.sleep(10)
+            if job['status'] == 'failed':
+                print(f"✗ Benchmark failed: {job.get('error')}")
+                sys.exit(1)
+            if args.json:
+                print_json(job['result'])
+            else:
+                print()
+                print_benchmark_table(job['result'])
+        
+        elif args.command == 'trace':
+            result = client.get_trace(args.name)
+            if args.json:
+                print_json(result)
+            else:
+                print_trace_waterfall(result, width=args.width, min_ms=args.min_ms)
         
         elif args.command == 'destroy':
             print(f"Destroying topology {args.name}...")
@@ -230,6 +407,7 @@ def main():
                         print_resources_table(resources)
                         
                         print(f"\nLast updated: {resources.get('timestamp', 'Unknown')}")
+                        print(f"Data age: {resources.get('telemetry', {}).get('snapshot_age_seconds', 'Unknown')}s")
                         print(f"Next refresh in {args.interval} seconds...")
                         
                     except Exception as e:
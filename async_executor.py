@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Blocking Call Executor for NDT
+Runs paramiko and boto3 calls off the event loop with per-lane concurrency limits
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config_loader import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Lane names used across the manager
+DEPLOY_LANE = 'deploy'          # EC2 launches and containerlab deploys, bounded by deployment.max_concurrent_deployments
+OPERATIONS_LANE = 'operations'  # polling, describe calls and short SSH commands, bounded by manager.max_concurrent_operations
+
+class BlockingExecutor:
+    """Thread pool for blocking I/O with an asyncio semaphore per lane"""
+
+    def __init__(self, lane_limits: Dict[str, int]):
+        self.lane_limits = dict(lane_limits)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, sum(self.lane_limits.values())),
+            thread_name_prefix='ndt-blocking'
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, lane: str) -> asyncio.Semaphore:
+        if lane not in self.lane_limits:
+            raise ValueError(f"Unknown executor lane: {lane}")
+        if lane not in self._semaphores:
+            self._semaphores[lane] = asyncio.Semaphore(self.lane_limits[lane])
+        return self._semaphores[lane]
+
+    async def run(self, lane: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run func(*args, **kwargs) in the pool once a slot in the lane is free"""
+        loop = asyncio.get_running_loop()
+        # Carry contextvars (e.g. the current trace span) into the worker thread
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+
+        async with self._semaphore(lane):
+            return await loop.run_in_executor(self._pool, call)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Slots in use per lane"""
+        stats = {}
+        for lane, limit in self.lane_limits.items():
+            semaphore = self._semaphores.get(lane)
+            free = semaphore._value if semaphore else limit
+            stats[lane] = {'limit': limit, 'in_use': limit - free}
+        return stats
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+_executor: Optional[BlockingExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> BlockingExecutor:
+    """Return the process-wide executor, sized from config.yaml"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = BlockingExecutor({
+                DEPLOY_LANE: int(get_setting('deployment.max_concurrent_deployments', 5)),
+                OPERATIONS_LANE: int(get_setting('manager.max_concurrent_operations', 10)),
+            })
+        return _executor
+
+async def run_blocking(func: Callable[..., Any], *args, lane: str = OPERATIONS_LANE, **kwargs) -> Any:
+    """Shorthand for get_executor().run(lane, func, ...)"""
+    return await get_executor().run(lane, func, *args, **kwargs)
@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+Autoscaler for NDT
+Consolidates underused workers, retires empty ones after a cooldown and keeps spare capacity for bursts
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Set
+
+from botocore.exceptions import ClientError
+
+from async_executor import DEPLOY_LANE, run_blocking
+from bin_packer import Resources
+from config_loader import get_setting
+from metrics_store import MetricsStore
+from state_store import AUTOSCALER_LOG, AUTOSCALER_WORKERS, DEPLOYMENTS, StateStore
+
+if TYPE_CHECKING:
+    from ndt_manager import NDTManager
+
+logger = logging.getLogger(__name__)
+
+# Worker states kept by the autoscaler (workers without a record are active)
+ACTIVE = 'active'
+DRAINING = 'draining'  # placement skips it; its topologies leave by destroy or migration
+STOPPED = 'stopped'    # retired with retire_action 'stop'; restarted before launching new workers
+
+# Decision actions
+SCALE_UP = 'scale_up'
+RESTART = 'restart'
+UNDRAIN = 'undrain'
+DRAIN = 'drain'
+MIGRATE = 'migrate'
+RETIRE = 'retire'
+
+RETIRE_ACTIONS = ('terminate', 'stop')
+
+_LOG_KEY = 'decisions'
+
+def utilization(history: MetricsStore, instance_ids: List[str], window: float) -> Dict[str, Dict]:
+    """p95 CPU, p95 memory and peak running containers per host over the last window seconds (blocking)"""
+    if not instance_ids:
+        return {}
+    start = time.time() - window
+    cpu = history.query('cpu_percent', start, instance_ids=instance_ids, stats=('p95', 'count'))
+    memory = history.query('memory_percent', start, instance_ids=instance_ids, stats=('p95',))
+    containers = history.query('docker_running', start, instance_ids=instance_ids, stats=('max',))
+    return {
+        instance_id: {
+            'samples': cpu['hosts'][instance_id]['count'],
+            'cpu_p95': cpu['hosts'][instance_id]['p95'],
+            'memory_p95': memory['hosts'][instance_id]['p95'],
+            'containers_max': containers['hosts'][instance_id]['max'],
+        }
+        for instance_id in instance_ids
+    }
+
+@dataclass
+class WorkerView:
+    """One running worker as a round of the autoscaler sees it"""
+    instance_id: str
+    instance_type: str
+    state: str
+    topologies: List[str]
+    reserved: Resources
+    reserved_share: float
+    free: Resources
+    usage: Dict
+    running_containers: int
+    record: Dict = field(default_factory=dict)
+
+    @property
+    def empty(self) -> bool:
+        # Reservations cover partitions still deploying; running containers cover anything outside the ledger
+        return not self.topologies and self.reserved_share == 0 and self.running_containers == 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'instance_type': self.instance_type,
+            'state': self.state,
+            'topologies': self.topologies,
+            'reserved_share': round(self.reserved_share, 3),
+            'free': self.free.as_dict(),
+            'usage': self.usage,
+            'running_containers': self.running_containers,
+            'empty_since': self.record.get('empty_since'),
+            'draining_since': self.record.get('draining_since'),
+        }
+
+class Autoscaler:
+    """Utilization-driven control loop over the worker fleet
+
+    Each round, in the one process holding the autoscaler lock:
+    - headroom: when free capacity on active workers falls below the headroom, a
+      drained worker is reactivated, a stopped one restarted, or a new one launched;
+    - consolidation: a worker whose reserved share and p95 CPU stay under the
+      underfill thresholds is drained when its reservations fit elsewhere, and
+      with migrate its topologies are redeployed onto the rest of the fleet;
+    - retirement: a worker empty for longer than the cooldown is stopped or
+      terminated, as long as min_workers and the headroom remain.
+    Every decision is logged and kept in the state store; with dry_run nothing
+    but the log changes.
+    """
+
+    def __init__(self,
+                 manager: 'NDTManager',
+                 store: StateStore,
+                 interval: float = 300,
+                 cooldown: float = 1800,
+                 idle_window: float = 3600,
+                 idle_cpu_percent: float = 10.0,
+                 underfill_share: float = 0.25,
+                 min_samples: int = 10,
+                 min_workers: int = 1,
+                 max_workers: int = 20,
+                 headroom: Optional[Dict] = None,
+                 retire_action: str = 'terminate',
+                 migrate: bool = False,
+                 dry_run: bool = False,
+                 max_log: int = 500,
+                 enabled: bool = False):
+        if retire_action not in RETIRE_ACTIONS:
+            raise ValueError(f"Unknown retire action {retire_action!r}, expected one of {', '.join(RETIRE_ACTIONS)}")
+        self.manager = manager
+        self.store = store
+        self.interval = interval
+        self.cooldown = cooldown
+        self.idle_window = idle_window
+        self.idle_cpu_percent = idle_cpu_percent
+        self.underfill_share = underfill_share
+        self.min_samples = min_samples
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        headroom = headroom or {}
+        self.headroom = Resources(float(headroom.get('cpu', 0)), float(headroom.get('memory', 0)))
+        self.headroom_size = headroom.get('size', get_setting('deployment.worker_instance_default', 'medium'))
+        self.retire_action = retire_action
+        self.migrate = migrate
+        self.dry_run = dry_run
+        self.max_log = max_log
+        self.enabled = enabled
+
+        # Redeploys one topology away from draining workers; set by the API module (returns the job ID)
+        self.migrate_topology: Optional[Callable[[str], Awaitable[Optional[str]]]] = None
+        self.last_round: Optional[Dict] = None
+        # Topology -> job ID of the migration this process queued
+        self._migrations: Dict[str, str] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        self._scaling: Set[asyncio.Task] = set()
+        # Worker -> its retirement running in the background
+        self._retiring: Dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_config(cls, manager: 'NDTManager', store: StateStore) -> 'Autoscaler':
+        return cls(
+            manager,
+            store,
+            interval=float(get_setting('autoscaler.interval', 300)),
+            cooldown=float(get_setting('autoscaler.cooldown', 1800)),
+            idle_window=float(get_setting('autoscaler.idle_window', 3600)),
+            idle_cpu_percent=float(get_setting('autoscaler.idle_cpu_percent', 10)),
+            underfill_share=float(get_setting('autoscaler.underfill_share', 0.25)),
+            min_samples=int(get_setting('autoscaler.min_samples', 10)),
+            min_workers=int(get_setting('autoscaler.min_workers', 1)),
+            max_workers=int(get_setting('autoscaler.max_workers', 20)),
+            headroom=get_setting('autoscaler.headroom'),
+            retire_action=get_setting('autoscaler.retire_action', 'terminate'),
+            migrate=bool(get_setting('autoscaler.migrate', False)),
+            dry_run=bool(get_setting('autoscaler.dry_run', False)),
+            max_log=int(get_setting('autoscaler.max_log', 500)),
+            enabled=bool(get_setting('autoscaler.enabled', False)),
+        )
+
+    async def start(self):
+        """Start the control loop"""
+        if self.enabled and (self._loop_task is None or self._loop_task.done()):
+            self._loop_task = asyncio.create_task(self._run())
+            logger.info(f"Autoscaler started (every {self.interval}s{', dry run' if self.dry_run else ''})")
+
+    async def stop(self):
+        tasks = [t for t in [self._loop_task, *self._scaling, *self._retiring.values()] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+
+    async def _run(self):
+        while True:
+            try:
+                # Rounds run where the metrics history is written
+                if self.manager.telemetry.leading:
+                    await self.evaluate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Autoscaler round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def draining(self) -> Set[str]:
+        """Workers placement must not put new partitions on"""
+        records = await self.store.all(AUTOSCALER_WORKERS)
+        return {instance_id for instance_id, record in records.items() if record.get('state') == DRAINING}
+
+    # Observation
+
+    async def fleet_view(self) -> Dict[str, WorkerView]:
+        """Running workers with their partitions, reservations, free capacity and recent utilization"""
+        samples = await self.manager.telemetry.get_snapshot()
+        reserved = await self.manager.reservations.reserved()
+        deployments = await self.store.all(DEPLOYMENTS)
+        records = await self.store.all(AUTOSCALER_WORKERS)
+
+        running = {
+            instance_id: sample for instance_id, sample in samples.items()
+            if sample.resources.status == 'running' and sample.ssh_accessible
+        }
+        usage = await run_blocking(utilization, self.manager.metrics_history, list(running), self.idle_window)
+        bins, _ = self.manager._existing_bins(running, reserved)
+        free = {b.bin_id: b.capacity for b in bins}
+
+        topologies: Dict[str, List[str]] = {}
+        for name, info in deployments.items():
+            for instance_id in info.get('distribution', {}):
+                topologies.setdefault(instance_id, []).append(name)
+
+        workers = {}
+        for instance_id, sample in running.items():
+            resource = sample.resources
+            held = reserved.get(instance_id, Resources())
+            capacity = Resources(resource.cpu_cores, resource.memory_gb, resource.storage_gb,
+                                 self.manager.bin_packer.max_nodes_for_type(resource.instance_type))
+            record = records.get(instance_id, {})
+            workers[instance_id] = WorkerView(
+                instance_id=instance_id,
+                instance_type=resource.instance_type,
+                state=record.get('state', ACTIVE),
+                topologies=sorted(topologies.get(instance_id, [])),
+                reserved=held,
+                reserved_share=held.dominant_share(capacity),
+                free=free.get(instance_id, Resources()),
+                usage=usage.get(instance_id, {}),
+                running_containers=sample.metrics.docker_running if sample.metrics else 0,
+                record=record,
+            )
+        return workers
+
+    def _idle(self, worker: WorkerView) -> bool:
+        """Enough history, all of it under the CPU threshold"""
+        usage = worker.usage
+        return (usage.get('samples', 0) >= self.min_samples
+                and usage.get('cpu_p95') is not None
+                and usage['cpu_p95'] < self.idle_cpu_percent)
+
+    def _free_capacity(self, workers: Dict[str, WorkerView], exclude: Set[str] = frozenset()) -> Resources:
+        total = Resources()
+        for worker in workers.values():
+            if worker.state == ACTIVE and worker.instance_id not in exclude:
+                total = total + Resources(max(worker.free.cpu, 0), max(worker.free.memory, 0))
+        return total
+
+    def _has_headroom(self, free: Resources) -> bool:
+        return free.cpu >= self.headroom.cpu and free.memory >= self.headroom.memory
+
+    def _fits_elsewhere(self, worker: WorkerView, workers: Dict[str, WorkerView], leaving: Set[str]) -> bool:
+        """Whether the worker's reservations fit on the active workers staying, beyond the headroom"""
+        others = [
+            other.free for other in workers.values()
+            if other.state == ACTIVE and other.instance_id not in leaving | {worker.instance_id}
+        ]
+        spare = sum((Resources(max(f.cpu, 0), max(f.memory, 0), max(f.storage, 0), max(f.containers, 0))
+                     for f in others), Resources())
+        needed = worker.reserved + self.headroom
+        # Bin-level fit of each partition is left to placement when the topology is redeployed
+        return needed.fits_in(spare) and any(worker.reserved.fits_in(f) for f in others)
+
+    # Decisions
+
+    async def evaluate(self, dry_run: Optional[bool] = None) -> List[Dict]:
+        """Run one round now; a no-op unless this process wins the autoscaler lock"""
+        dry_run = self.dry_run if dry_run is None else dry_run
+        lock = self.store.lock('autoscaler', ttl=max(self.interval * 2, 600))
+        if not await lock.acquire(blocking=False):
+            return []
+        try:
+            return await self._round(dry_run)
+        finally:
+            await lock.release()
+
+    async def _round(self, dry_run: bool) -> List[Dict]:
+        workers = await self.fleet_view()
+        now = time.time()
+        decisions: List[Dict] = []
+
+        def decide(action: str, reason: str, instance_id: Optional[str] = None, **detail) -> Dict:
+            decision = {
+                'at': datetime.now().isoformat(),
+                'action': action,
+                'instance_id': instance_id,
+                'reason': reason,
+                'dry_run': dry_run,
+                **detail,
+            }
+            decisions.append(decision)
+            logger.info(f"Autoscaler{' (dry run)' if dry_run else ''}: {action} {instance_id or ''} - {reason}")
+            return decision
+
+        # Forget workers that no longer exist, keeping stopped ones for restarts
+        for instance_id, record in (await self.store.all(AUTOSCALER_WORKERS)).items():
+            if instance_id not in workers and record.get('state') != STOPPED:
+                await self.store.delete(AUTOSCALER_WORKERS, instance_id)
+
+        # 1. Headroom for bursts
+        free = self._free_capacity(workers)
+        if not self._has_headroom(free) and not self._scaling:
+            reason = (f"free capacity {free.cpu:.1f} vCPU / {free.memory:.1f} GB is under the headroom "
+                      f"{self.headroom.cpu:.1f} vCPU / {self.headroom.memory:.1f} GB")
+            draining = sorted((w for w in workers.values() if w.state == DRAINING), key=lambda w: w.free.cpu)
+            stopped = [iid for iid, r in (await self.store.all(AUTOSCALER_WORKERS)).items() if r.get('state') == STOPPED]
+            if draining:
+                worker = draining[-1]
+                decide(UNDRAIN, reason, worker.instance_id)
+                if not dry_run:
+                    await self._set_state(worker.instance_id, None)
+                worker.state = ACTIVE
+            elif stopped:
+                decide(RESTART, reason, stopped[0])
+                if not dry_run:
+                    self._in_background(self._restart(stopped[0]))
+            elif len(workers) < self.max_workers:
+                decide(SCALE_UP, reason, size=self.headroom_size)
+                if not dry_run:
+                    self._in_background(self._launch(self.headroom_size))
+            else:
+                decide(SCALE_UP, f"{reason}; not launching, max_workers {self.max_workers} reached",
+                       size=self.headroom_size, skipped=True)
+
+        # 2. Empty workers: start (or keep) their cooldown; retire the ones past it
+        retiring: Set[str] = set(self._retiring) & set(workers)
+        for worker in sorted(workers.values(), key=lambda w: w.record.get('empty_since') or now):
+            if worker.instance_id in retiring:
+                continue
+            if not worker.empty:
+                if worker.record.get('empty_since') and not dry_run:
+                    await self._update(worker.instance_id, {'empty_since': None})
+                continue
+            empty_since = worker.record.get('empty_since')
+            if empty_since is None:
+                if not dry_run:
+                    await self._update(worker.instance_id, {'empty_since': now})
+                continue
+            if now - empty_since < self.cooldown:
+                continue
+
+            remaining = len(workers) - len(retiring) - 1
+            if remaining < self.min_workers:
+                continue
+            if worker.state == ACTIVE and not self._has_headroom(self._free_capacity(workers, retiring | {worker.instance_id})):
+                continue
+            retiring.add(worker.instance_id)
+            decide(RETIRE, f"empty for {int(now - empty_since)}s (cooldown {int(self.cooldown)}s)",
+                   worker.instance_id, retire_action=self.retire_action)
+            if not dry_run:
+                # Placement skips it from now on; _retire re-checks the ledger for plans already under way
+                if worker.state != DRAINING:
+                    await self._set_state(worker.instance_id, DRAINING, draining_since=now)
+                worker.state = DRAINING
+                task = asyncio.ensure_future(self._retire(worker.instance_id))
+                self._retiring[worker.instance_id] = task
+                task.add_done_callback(lambda _, instance_id=worker.instance_id: self._retiring.pop(instance_id, None))
+
+        # 3. Underfilled, idle workers: drain them onto the rest of the fleet
+        draining_now = {w.instance_id for w in workers.values() if w.state == DRAINING}
+        candidates = sorted(
+            (w for w in workers.values()
+             if w.state == ACTIVE and w.topologies and w.instance_id not in retiring
+             and w.reserved_share < self.underfill_share and self._idle(w)),
+            key=lambda w: w.reserved_share,
+        )
+        for worker in candidates:
+            if len(workers) - len(retiring) - len(draining_now) - 1 < self.min_workers:
+                break
+            if not self._fits_elsewhere(worker, workers, retiring | draining_now):
+                continue
+            draining_now.add(worker.instance_id)
+            decide(DRAIN, f"{worker.reserved_share:.0%} reserved and p95 CPU {worker.usage['cpu_p95']:.1f}% "
+                          f"over {int(self.idle_window)}s", worker.instance_id, topologies=worker.topologies)
+            if not dry_run:
+                await self._set_state(worker.instance_id, DRAINING, draining_since=now)
+            worker.state = DRAINING
+
+        # 4. Migrations off draining workers, one topology per round
+        if self.migrate and self.migrate_topology is not None:
+            pending = sorted({
+                name for w in workers.values() if w.state == DRAINING for name in w.topologies
+                if not self._migrating(name)
+            })
+            if pending:
+                name = pending[0]
+                reason = "topology has partitions on draining workers"
+                if dry_run:
+                    decide(MIGRATE, reason, topology=name)
+                else:
+                    # None: the topology is busy (deploy, destroy or benchmark) or the queue is full; next round
+                    job_id = await self.migrate_topology(name)
+                    if job_id is not None:
+                        self._migrations[name] = job_id
+                        decide(MIGRATE, reason, topology=name, job_id=job_id)
+
+        self.last_round = {
+            'at': datetime.now().isoformat(),
+            'dry_run': dry_run,
+            'free': free.as_dict(),
+            'workers': len(workers),
+            'decisions': len(decisions),
+        }
+        if decisions:
+            await self._log(decisions)
+        return decisions
+
+    def _migrating(self, topology_name: str) -> bool:
+        job_id = self._migrations.get(topology_name)
+        job = self.manager.job_queue.jobs.get(job_id) if job_id else None
+        if job is None or job.done:
+            self._migrations.pop(topology_name, None)
+            return False
+        return True
+
+    # Actions
+
+    def _in_background(self, coroutine: Awaitable):
+        task = asyncio.ensure_future(coroutine)
+        self._scaling.add(task)
+        task.add_done_callback(self._scaling.discard)
+
+    async def _launch(self, size: str):
+        try:
+            instance_ids = await self.manager.launch_instances([size])
+            logger.info(f"Autoscaler launched {size} worker {instance_ids[0]}")
+        except Exception as e:
+            logger.error(f"Autoscaler could not launch a {size} worker: {e}")
+
+    async def _restart(self, instance_id: str):
+        try:
+            await run_blocking(self.manager.ec2_client.start_instances, InstanceIds=[instance_id])
+            await self.store.delete(AUTOSCALER_WORKERS, instance_id)
+            await self.manager._wait_for_instances_ready([instance_id], status_checks=False)
+        except ClientError as e:
+            logger.error(f"Autoscaler could not restart {instance_id}: {e}")
+            await self.store.delete(AUTOSCALER_WORKERS, instance_id)
+
+    async def _retire(self, instance_id: str):
+        """Stop or terminate a drained worker unless placement reserved capacity on it meanwhile
+
+        The worker is already draining, so plans started from now on skip it.
+        Re-reading the ledger under the placement lock catches a plan that was
+        under way when it was drained; the worker then goes back to active.
+        """
+        try:
+            lock = await self.manager.acquire_placement_lock()
+        except RuntimeError as e:
+            logger.warning(f"Autoscaler is not retiring {instance_id} this round: {e}")
+            return
+
+        terminated = False
+        try:
+            held = (await self.manager.reservations.reserved()).get(instance_id, Resources())
+            deployed = sorted(name for name, info in (await self.store.all(DEPLOYMENTS)).items()
+                              if instance_id in info.get('distribution', {}))
+            if held != Resources() or deployed:
+                reason = f"capacity was reserved on it while retiring ({', '.join(deployed) or 'deploy in progress'})"
+                logger.info(f"Autoscaler: {UNDRAIN} {instance_id} - {reason}")
+                await self._set_state(instance_id, None)
+                await self._update(instance_id, {'empty_since': None})
+                await self._log([{'at': datetime.now().isoformat(), 'action': UNDRAIN, 'instance_id': instance_id,
+                                  'reason': reason, 'dry_run': False}])
+                return
+
+            await self.manager.instance_retired([instance_id], stopped=self.retire_action == 'stop')
+            if self.retire_action == 'stop':
+                await run_blocking(self.manager.ec2_client.stop_instances, InstanceIds=[instance_id])
+                await self._set_state(instance_id, STOPPED, stopped_at=time.time())
+            else:
+                await run_blocking(self.manager.ec2_client.terminate_instances, InstanceIds=[instance_id])
+                await self.store.delete(AUTOSCALER_WORKERS, instance_id)
+                terminated = True
+        except ClientError as e:
+            logger.error(f"Autoscaler could not retire {instance_id}: {e}")
+        finally:
+            await lock.release()
+
+        if terminated:
+            try:
+                waiter = self.manager.ec2_client.get_waiter('instance_terminated')
+                await run_blocking(waiter.wait, InstanceIds=[instance_id], lane=DEPLOY_LANE)
+            except Exception as e:
+                logger.warning(f"Autoscaler did not see {instance_id} terminate: {e}")
+
+    async def _set_state(self, instance_id: str, state: Optional[str], **fields):
+        def apply(record: Optional[Dict]) -> Optional[Dict]:
+            record = {**(record or {}), **fields, 'state': state}
+            if state is None:
+                record.pop('state')
+                record.pop('draining_since', None)
+            return record or None
+
+        await self.store.update(AUTOSCALER_WORKERS, instance_id, apply)
+
+    async def _update(self, instance_id: str, fields: Dict):
+        def apply(record: Optional[Dict]) -> Optional[Dict]:
+            record = {key: value for key, value in {**(record or {}), **fields}.items() if value is not None}
+            return record or None
+
+        await self.store.update(AUTOSCALER_WORKERS, instance_id, apply)
+
+    async def _log(self, decisions: List[Dict]):
+        def append(record: Optional[Dict]) -> Dict:
+            entries = (record or {}).get('entries', []) + decisions
+            return {'entries': entries[-self.max_log:]}
+
+        await self.store.update(AUTOSCALER_LOG, _LOG_KEY, append)
+
+    # Reporting
+
+    async def decisions(self, limit: int = 50) -> List[Dict]:
+        """Most recent decisions first"""
+        record = await self.store.get(AUTOSCALER_LOG, _LOG_KEY) or {}
+        return list(reversed(record.get('entries', [])))[:limit]
+
+    async def status(self) -> Dict:
+        workers = await self.fleet_view()
+        stopped = [iid for iid, r in (await self.store.all(AUTOSCALER_WORKERS)).items() if r.get('state') == STOPPED]
+        return {
+            'enabled': self.enabled,
+            'dry_run': self.dry_run,
+            'interval': self.interval,
+            'cooldown': self.cooldown,
+            'min_workers': self.min_workers,
+            'max_workers': self.max_workers,
+            'migrate': self.migrate,
+            'retire_action': self.retire_action,
+            'headroom': {**self.headroom.as_dict(), 'size': self.headroom_size},
+            'free': self._free_capacity(workers).as_dict(),
+            'last_round': self.last_round,
+            'workers': {instance_id: worker.to_dict() for instance_id, worker in workers.items()},
+            'stopped': stopped,
+        }
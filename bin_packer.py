@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Bin Packer for NDT
+Multi-dimensional placement of containerlab nodes onto existing and new workers
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config_loader import get_setting
+from node_profiles import NodeProfiles, get_node_profiles
+from topology_partitioner import Graph, TopologyPartitioner, build_graph
+
+logger = logging.getLogger(__name__)
+
+_EPSILON = 1e-9
+
+# Used when config.yaml has no node_resources section
+DEFAULT_NODE_RESOURCES = {
+    'default': {'cpu': 0.2, 'memory': 0.5, 'storage': 1.0},
+}
+DEFAULT_HOST_OVERHEAD = {'cpu': 0.5, 'memory': 1.0, 'storage': 10}
+DEFAULT_THRESHOLDS = {'cpu_threshold': 0.8, 'memory_threshold': 0.8, 'storage_threshold': 0.9}
+
+@dataclass
+class Resources:
+    """A demand or capacity vector: vCPUs, GB memory, GB storage and container slots"""
+    cpu: float = 0.0
+    memory: float = 0.0
+    storage: float = 0.0
+    containers: float = 0.0
+
+    def __add__(self, other: 'Resources') -> 'Resources':
+        return Resources(self.cpu + other.cpu, self.memory + other.memory,
+                         self.storage + other.storage, self.containers + other.containers)
+
+    def __sub__(self, other: 'Resources') -> 'Resources':
+        return Resources(self.cpu - other.cpu, self.memory - other.memory,
+                         self.storage - other.storage, self.containers - other.containers)
+
+    def maximum(self, other: 'Resources') -> 'Resources':
+        """Per-dimension maximum of two vectors"""
+        return Resources(max(self.cpu, other.cpu), max(self.memory, other.memory),
+                         max(self.storage, other.storage), max(self.containers, other.containers))
+
+    def fits_in(self, capacity: 'Resources') -> bool:
+        return (self.cpu <= capacity.cpu + _EPSILON
+                and self.memory <= capacity.memory + _EPSILON
+                and self.storage <= capacity.storage + _EPSILON
+                and self.containers <= capacity.containers + _EPSILON)
+
+    def dominant_share(self, capacity: 'Resources') -> float:
+        """Largest fraction of any one dimension of capacity this demand takes"""
+        shares = []
+        for demand, available in ((self.cpu, capacity.cpu), (self.memory, capacity.memory),
+                                  (self.storage, capacity.storage), (self.containers, capacity.containers)):
+            if demand <= 0:
+                continue
+            shares.append(demand / available if available > 0 else float('inf'))
+        return max(shares, default=0.0)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {'cpu': round(self.cpu, 2), 'memory': round(self.memory, 2),
+                'storage': round(self.storage, 2), 'containers': round(self.containers, 2)}
+
+@dataclass
+class Bin:
+    """Free capacity on one worker, existing or yet to be launched"""
+    bin_id: str
+    capacity: Resources
+    size: Optional[str] = None
+    existing: bool = False
+    used: Resources = field(default_factory=Resources)
+    nodes: List[str] = field(default_factory=list)
+
+    def can_fit(self, demand: Resources) -> bool:
+        return (self.used + demand).fits_in(self.capacity)
+
+    def add(self, node: str, demand: Resources):
+        self.nodes.append(node)
+        self.used = self.used + demand
+
+    def slack_after(self, demand: Resources) -> float:
+        """How much of the bin would remain free (as a dominant share) after adding demand"""
+        return 1.0 - (self.used + demand).dominant_share(self.capacity)
+
+@dataclass
+class PackingPlan:
+    """Nodes placed on existing workers plus the new workers to launch"""
+    existing: Dict[str, List[str]]
+    new_instances: List[Tuple[str, List[str]]]
+    estimated_cost_per_hour: float = 0.0
+    bin_usage: Dict[str, Dict] = field(default_factory=dict)
+
+    def summary(self) -> Dict:
+        return {
+            'existing_instances': {instance_id: len(nodes) for instance_id, nodes in self.existing.items()},
+            'new_instances': [{'size': size, 'nodes': len(nodes)} for size, nodes in self.new_instances],
+            'estimated_cost_per_hour': round(self.estimated_cost_per_hour, 4),
+            'bin_usage': self.bin_usage,
+        }
+
+class BinPacker:
+    """Packs nodes by CPU, memory, storage and container count, keeping linked nodes together"""
+
+    def __init__(self,
+                 instance_types: Dict[str, Dict],
+                 node_resources: Optional[Dict[str, Dict]] = None,
+                 host_overhead: Optional[Dict[str, float]] = None,
+                 thresholds: Optional[Dict[str, float]] = None,
+                 default_max_nodes: int = 10,
+                 objective: str = 'cost',
+                 profiles: Optional[NodeProfiles] = None,
+                 learned_percentile: str = 'p95',
+                 learned_min_samples: int = 30,
+                 learned_headroom: float = 1.0):
+        self.instance_types = instance_types
+        self.node_resources = node_resources or DEFAULT_NODE_RESOURCES
+        overhead = host_overhead or DEFAULT_HOST_OVERHEAD
+        self.host_overhead = Resources(overhead.get('cpu', 0), overhead.get('memory', 0), overhead.get('storage', 0))
+        # Share of each worker's CPU, memory and storage placement may fill; no limit when not given
+        thresholds = thresholds or {}
+        self.thresholds = Resources(float(thresholds.get('cpu_threshold', 1.0)),
+                                    float(thresholds.get('memory_threshold', 1.0)),
+                                    float(thresholds.get('storage_threshold', 1.0)), 1.0)
+        self.default_max_nodes = default_max_nodes
+        # 'cost': cheapest set of new workers; 'count': fewest new workers (fewer cross-host links)
+        self.objective = objective
+        # Observed CPU and memory per kind/image replace the configured ones when given
+        self.profiles = profiles
+        self.learned_percentile = learned_percentile
+        self.learned_min_samples = learned_min_samples
+        self.learned_headroom = learned_headroom
+
+    @classmethod
+    def from_config(cls, instance_types: Dict[str, Dict]) -> 'BinPacker':
+        return cls(
+            instance_types=instance_types,
+            node_resources=get_setting('node_resources'),
+            host_overhead=get_setting('placement.host_overhead'),
+            thresholds={**DEFAULT_THRESHOLDS, **(get_setting('resource_thresholds') or {})},
+            default_max_nodes=int(get_setting('deployment.max_nodes_per_instance', 10)),
+            objective=get_setting('placement.objective', 'cost'),
+            profiles=get_node_profiles() if get_setting('placement.learned_profiles', False) else None,
+            learned_percentile=get_setting('placement.learned_percentile', 'p95'),
+            learned_min_samples=int(get_setting('placement.learned_min_samples', 30)),
+            learned_headroom=float(get_setting('placement.learned_headroom', 1.0)),
+        )
+
+    def configured_profile(self, kind: str) -> Dict[str, float]:
+        """Configured per-kind estimate, falling back to the default profile"""
+        return self.node_resources.get(kind) or self.node_resources.get('default') or DEFAULT_NODE_RESOURCES['default']
+
+    def node_profile(self, node_config: Dict) -> Dict[str, float]:
+        """Estimate for a node: observed CPU and memory once the kind is sampled enough, else configured
+
+        Storage always comes from the configuration; cgroups do not account for it.
+        """
+        node_config = node_config or {}
+        kind = node_config.get('kind', 'linux')
+        configured = self.configured_profile(kind)
+        if self.profiles is None:
+            return configured
+
+        observed = self.profiles.profile(kind, node_config.get('image'), self.learned_min_samples)
+        if observed is None:
+            return configured
+        return {
+            **configured,
+            'cpu': observed['cpu'][self.learned_percentile] * self.learned_headroom,
+            'memory': observed['memory'][self.learned_percentile] * self.learned_headroom,
+        }
+
+    def node_demand(self, node_config: Dict) -> Resources:
+        profile = self.node_profile(node_config)
+        return Resources(float(profile.get('cpu', 0)), float(profile.get('memory', 0)),
+                         float(profile.get('storage', 0)), 1.0)
+
+    def max_nodes_for_type(self, instance_type: str) -> int:
+        for specs in self.instance_types.values():
+            if specs.get('instance_type') == instance_type and 'max_nodes' in specs:
+                return int(specs['max_nodes'])
+        return self.default_max_nodes
+
+    def limit(self, total: Resources) -> Resources:
+        """Part of a worker's total capacity that stays under the utilization thresholds"""
+        return Resources(total.cpu * self.thresholds.cpu, total.memory * self.thresholds.memory,
+                         total.storage * self.thresholds.storage, total.containers * self.thresholds.containers)
+
+    def type_capacity(self, size: str) -> Resources:
+        """Usable capacity of a fresh worker of this size: under the thresholds, after the host overhead"""
+        specs = self.instance_types[size]
+        total = Resources(float(specs['cpu']), float(specs['memory']), float(specs['storage']),
+                          float(specs.get('max_nodes', self.default_max_nodes)))
+        return self.limit(total) - self.host_overhead
+
+    def _cost(self, size: str) -> float:
+        return float(self.instance_types[size].get('cost_per_hour', 0))
+
+    def pack(self, nodes: Dict[str, Dict], links: List[Dict], existing_bins: List[Bin]) -> PackingPlan:
+        """Fill existing workers first, then pick the cheapest set of new workers for the rest"""
+        if not nodes:
+            return PackingPlan(existing={}, new_instances=[])
+
+        demands = {name: self.node_demand(config) for name, config in nodes.items()}
+        graph = build_graph(nodes, links)
+        order = self._link_order(nodes, links, demands)
+
+        # Phase 1: free capacity on running workers
+        bins = list(existing_bins)
+        remaining = self._fill(order, demands, graph, bins, open_bin=None)
+
+        # Phase 2: new workers for whatever did not fit
+        new_bins = self._pack_new(remaining, demands, graph) if remaining else []
+
+        existing = {b.bin_id: b.nodes for b in bins if b.nodes}
+        new_instances = [(b.size, b.nodes) for b in new_bins]
+        usage = {
+            b.bin_id: {'size': b.size, 'used': b.used.as_dict(), 'capacity': b.capacity.as_dict()}
+            for b in bins + new_bins if b.nodes
+        }
+        plan = PackingPlan(
+            existing=existing,
+            new_instances=new_instances,
+            estimated_cost_per_hour=sum(self._cost(b.size) for b in new_bins),
+            bin_usage=usage,
+        )
+        logger.info(f"Packing plan: {len(existing)} existing workers, "
+                    f"new {[size for size, _ in new_instances]}")
+        return plan
+
+    def _link_order(self, nodes: Dict[str, Dict], links: List[Dict], demands: Dict[str, Resources]) -> List[str]:
+        """Node order in which densely linked nodes are adjacent (partition by partition)"""
+        if not self.instance_types:
+            return list(nodes)
+        reference = max((self.type_capacity(size) for size in self.instance_types),
+                        key=lambda capacity: (capacity.cpu, capacity.memory))
+        partitioner = TopologyPartitioner(
+            capacity=1.0,
+            weight_fn=lambda name, config: min(1.0, demands[name].dominant_share(reference)),
+        )
+        plan = partitioner.partition(nodes, links)
+        return [name for part in plan.parts for name in part]
+
+    def _fill(self, order: List[str], demands: Dict[str, Resources], graph: Graph,
+              bins: List[Bin], open_bin: Optional[Callable[[], Bin]]) -> List[str]:
+        """Place nodes in order; returns the nodes that fit nowhere (when open_bin is None)"""
+        location: Dict[str, Bin] = {}
+        current: Optional[Bin] = None
+        leftover: List[str] = []
+
+        for name in order:
+            demand = demands[name]
+            fitting = [b for b in bins if b.can_fit(demand)]
+
+            if fitting:
+                def score(b: Bin):
+                    links_in_bin = sum(w for neighbor, w in graph[name].items() if location.get(neighbor) is b)
+                    # Neighbours first, then stay on the bin being filled, then tightest fit
+                    return (links_in_bin, b is current, -b.slack_after(demand))
+                target = max(fitting, key=score)
+            elif open_bin is not None:
+                target = open_bin()
+                if not target.can_fit(demand):
+                    logger.warning(f"Node {name} needs {demand.as_dict()}, more than a "
+                                   f"{target.size} worker offers; placing it alone")
+                bins.append(target)
+            else:
+                leftover.append(name)
+                continue
+
+            target.add(name, demand)
+            location[name] = target
+            current = target
+
+        return leftover
+
+    def _pack_new(self, remaining: List[str], demands: Dict[str, Resources], graph: Graph) -> List[Bin]:
+        """Try each instance size for the remainder, keep the best by objective, then right-size each worker"""
+        if not self.instance_types:
+            raise ValueError("No instance types configured for new workers")
+
+        candidates = []
+        for size in self.instance_types:
+            capacity = self.type_capacity(size)
+            if not all(demands[name].fits_in(capacity) for name in remaining):
+                continue
+            bins: List[Bin] = []
+            counter = iter(range(len(remaining)))
+            self._fill(remaining, demands, graph, bins,
+                       open_bin=lambda: Bin(bin_id=f'new-{next(counter)}', capacity=capacity, size=size))
+            candidates.append((len(bins) * self._cost(size), len(bins), size, bins))
+
+        if not candidates:
+            # Some node is bigger than every type: use the largest type and accept the overcommit
+            size = max(self.instance_types, key=lambda s: (self.type_capacity(s).cpu, self.type_capacity(s).memory))
+            capacity = self.type_capacity(size)
+            bins = []
+            counter = iter(range(len(remaining)))
+            self._fill(remaining, demands, graph, bins,
+                       open_bin=lambda: Bin(bin_id=f'new-{next(counter)}', capacity=capacity, size=size))
+            return bins
+
+        if self.objective == 'count':
+            _, _, _, bins = min(candidates, key=lambda c: (c[1], c[0]))
+        else:
+            _, _, _, bins = min(candidates, key=lambda c: (c[0], c[1]))
+
+        # A partly filled worker may fit a cheaper size
+        for b in bins:
+            fitting_sizes = [s for s in self.instance_types if b.used.fits_in(self.type_capacity(s))]
+            if fitting_sizes:
+                cheapest = min(fitting_sizes, key=lambda s: (self._cost(s), self.type_capacity(s).cpu))
+                if self._cost(cheapest) < self._cost(b.size):
+                    b.size = cheapest
+                    b.capacity = self.type_capacity(cheapest)
+
+        return bins
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Configuration Loader for NDT Manager
+Reads config.yaml once per process and exposes dotted-path lookups
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Caches, metrics history and learned profiles; relative data paths in the config resolve here
+DATA_DIR = os.getenv('NDT_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+
+# Searched in order; NDT_CONFIG overrides all of them
+CONFIG_CANDIDATES = [
+    os.path.join(BASE_DIR, 'configs', 'config.yaml'),
+    os.path.join(BASE_DIR, 'config.yaml'),
+]
+
+_config: Optional[Dict] = None
+_config_lock = threading.Lock()
+
+def load_config(path: Optional[str] = None, reload: bool = False) -> Dict:
+    """Load and cache the NDT configuration file"""
+    global _config
+    with _config_lock:
+        if _config is not None and not reload and path is None:
+            return _config
+
+        candidates = [path] if path else [os.getenv('NDT_CONFIG')] + CONFIG_CANDIDATES
+        for candidate in candidates:
+            if candidate and os.path.exists(candidate):
+                try:
+                    with open(candidate, 'r') as f:
+                        _config = yaml.safe_load(f) or {}
+                    logger.info(f"Loaded configuration from {candidate}")
+                    return _config
+                except Exception as e:
+                    logger.error(f"Error reading configuration {candidate}: {e}")
+
+        logger.warning("No configuration file found, using built-in defaults")
+        _config = {}
+        return _config
+
+def get_setting(dotted_key: str, default: Any = None) -> Any:
+    """Look up a setting such as 'deployment.max_concurrent_deployments'"""
+    value: Any = load_config()
+    for part in dotted_key.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return default
+        value = value[part]
+    return value
+
+def data_path(path: str) -> str:
+    """A data file or directory setting as an absolute path; relative ones are taken from DATA_DIR"""
+    return path if os.path.isabs(path) else os.path.join(DATA_DIR, path)
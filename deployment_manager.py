@@ -7,12 +7,18 @@ Handles the deployment and management of containerlab topologies across EC2 inst
 import asyncio
 import json
 import logging
+import shlex
 import yaml
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
-import paramiko
 import time
 from datetime import datetime
+from ssh_pool import get_ssh_pool
+from async_executor import DEPLOY_LANE, run_blocking
+from state_store import get_state_store
+from link_realizer import LinkPlan, LinkRealizer, lab_name
+from tracing import span
+from topology_partitioner import PartitionPlan, TopologyPartitioner, link_nodes
 
 logger = logging.getLogger(__name__)
 
@@ -32,36 +38,36 @@ class TopologyDistributor:
     
     def __init__(self, max_nodes_per_instance: int = 10):
         self.max_nodes_per_instance = max_nodes_per_instance
+        self.last_plan: Optional[PartitionPlan] = None
     
     def distribute_nodes(self, topology: Dict, available_instances: List[str]) -> Dict[str, List[str]]:
         """
         Distribute topology nodes across available instances
-        Uses a simple round-robin distribution for now
+        Partitions along the links so as few of them as possible cross instances
         """
-        nodes = list(topology.get('topology', {}).get('nodes', {}).keys())
+        topo = topology.get('topology', {})
+        nodes = topo.get('nodes', {})
         
-        if not nodes:
+        if not nodes or not available_instances:
             return {}
         
-        # Simple round-robin distribution
-        distribution = {}
-        instance_index = 0
+        # As few instances as capacity allows; overflow is spread evenly if there are too few
+        needed = -(-len(nodes) // self.max_nodes_per_instance)
+        partitioner = TopologyPartitioner(capacity=self.max_nodes_per_instance)
+        plan = partitioner.partition(nodes, topo.get('links', []), num_parts=min(needed, len(available_instances)))
+        self.last_plan = plan
         
-        for i, node in enumerate(nodes):
-            if i % self.max_nodes_per_instance == 0 and instance_index < len(available_instances):
-                current_instance = available_instances[instance_index]
-                if current_instance not in distribution:
-                    distribution[current_instance] = []
-                instance_index += 1
-            else:
-                current_instance = available_instances[(instance_index - 1) % len(available_instances)]
-            
-            distribution[current_instance].append(node)
+        logger.info(f"Partition plan for {topology.get('name', 'topology')}: {plan.summary()}")
         
-        return distribution
+        return dict(zip(available_instances, plan.parts))
     
-    def create_partial_topology(self, original_topology: Dict, assigned_nodes: List[str], instance_id: str) -> Dict:
-        """Create a partial topology configuration for a specific instance"""
+    def create_partial_topology(self, original_topology: Dict, assigned_nodes: List[str], instance_id: str,
+                                link_plan: Optional[LinkPlan] = None) -> Dict:
+        """Create a partial topology configuration for a specific instance
+        
+        With a link plan, links to nodes on other instances become this
+        instance's end of their VXLAN tunnel instead of being dropped.
+        """
         
         # Get original topology structure
         original_topo = original_topology.get('topology', {})
@@ -75,21 +81,22 @@ class TopologyDistributor:
             if node in original_nodes
         }
         
-        # Filter links - only include links where both endpoints are in assigned nodes
-        partial_links = []
-        for link in original_links:
-            endpoints = link.get('endpoints', [])
-            if len(endpoints) >= 2:
-                # Extract node names from endpoints (format: "node:interface")
-                endpoint_nodes = [ep.split(':')[0] for ep in endpoints[:2]]
-                if all(node in assigned_nodes for node in endpoint_nodes):
+        if link_plan is not None:
+            partial_links = link_plan.links_for(instance_id)
+        else:
+            # Without a plan only links where both endpoints are in assigned nodes can be deployed
+            partial_links = []
+            for link in original_links:
+                endpoint_nodes = link_nodes(link)
+                if endpoint_nodes and all(node in assigned_nodes for node in endpoint_nodes):
                     partial_links.append(link)
         
-        # Create partial topology
+        # Create partial topology; node images and settings may come from kinds/defaults
         partial_topology = {
-            'name': f"{original_topology.get('name', 'topology')}-{instance_id[-8:]}",
+            'name': lab_name(original_topology.get('name', 'topology'), instance_id),
             'mgmt': original_topology.get('mgmt', {}),
             'topology': {
+                **{section: original_topo[section] for section in ('kinds', 'defaults') if section in original_topo},
                 'nodes': partial_nodes,
                 'links': partial_links
             }
@@ -103,47 +110,29 @@ class ContainerlabDeployer:
     def __init__(self, ssh_key_path: str, ssh_username: str = "ubuntu"):
         self.ssh_key_path = ssh_key_path
         self.ssh_username = ssh_username
+        self.ssh_pool = get_ssh_pool(ssh_key_path)
     
     async def deploy_topology(self, instance_ip: str, topology_config: Dict, topology_name: str) -> bool:
         """Deploy a topology configuration to a specific instance"""
         try:
-            # Connect via SSH
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            ssh.connect(
-                hostname=instance_ip,
-                username=self.ssh_username,
-                key_filename=self.ssh_key_path,
-                timeout=30
-            )
-            
             # Create topology file
             topology_yaml = yaml.dump(topology_config, default_flow_style=False)
             topology_file = f"/opt/ndt/{topology_name}.clab.yml"
             
             # Upload topology file
-            sftp = ssh.open_sftp()
-            try:
-                with sftp.open(topology_file, 'w') as f:
-                    f.write(topology_yaml)
-            finally:
-                sftp.close()
+            await run_blocking(
+                self.ssh_pool.write_file, instance_ip, topology_file, topology_yaml, username=self.ssh_username
+            )
             
             # Deploy with containerlab
             deploy_command = f"cd /opt/ndt && sudo containerlab deploy -t {topology_file} --reconfigure"
             
-            stdin, stdout, stderr = ssh.exec_command(deploy_command)
-            
-            # Wait for command completion
-            exit_status = stdout.channel.recv_exit_status()
-            deploy_output = stdout.read().decode()
-            deploy_errors = stderr.read().decode()
-            
-            ssh.close()
+            result = await run_blocking(
+                self.ssh_pool.exec_command, instance_ip, deploy_command, username=self.ssh_username, lane=DEPLOY_LANE
+            )
             
-            if exit_status != 0:
-                logger.error(f"Deployment failed on {instance_ip}: {deploy_errors}")
+            if result.exit_status != 0:
+                logger.error(f"Deployment failed on {instance_ip}: {result.stderr}")
                 return False
             
             logger.info(f"Successfully deployed {topology_name} to {instance_ip}")
@@ -156,24 +145,13 @@ class ContainerlabDeployer:
     async def destroy_topology(self, instance_ip: str, topology_name: str) -> bool:
         """Destroy a topology on a specific instance"""
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            ssh.connect(
-                hostname=instance_ip,
-                username=self.ssh_username,
-                key_filename=self.ssh_key_path,
-                timeout=30
-            )
-            
             destroy_command = f"cd /opt/ndt && sudo containerlab destroy -t {topology_name}.clab.yml --cleanup"
             
-            stdin, stdout, stderr = ssh.exec_command(destroy_command)
-            exit_status = stdout.channel.recv_exit_status()
-            
-            ssh.close()
+            result = await run_blocking(
+                self.ssh_pool.exec_command, instance_ip, destroy_command, username=self.ssh_username, lane=DEPLOY_LANE
+            )
             
-            if exit_status != 0:
+            if result.exit_status != 0:
                 logger.warning(f"Destroy command had non-zero exit status on {instance_ip}")
             
             return True
@@ -185,29 +163,27 @@ class ContainerlabDeployer:
     async def get_topology_status(self, instance_ip: str, topology_name: str) -> Dict:
         """Get the status of a deployed topology"""
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            ssh.connect(
-                hostname=instance_ip,
-                username=self.ssh_username,
-                key_filename=self.ssh_key_path,
-                timeout=30
-            )
-            
             # Check if topology file exists
-            stdin, stdout, stderr = ssh.exec_command(f"test -f /opt/ndt/{topology_name}.clab.yml && echo 'exists'")
-            file_exists = stdout.read().decode().strip() == 'exists'
+            result = await run_blocking(
+                self.ssh_pool.exec_command,
+                instance_ip,
+                f"test -f /opt/ndt/{topology_name}.clab.yml && echo 'exists'",
+                timeout=30,
+                username=self.ssh_username
+            )
+            file_exists = result.stdout.strip() == 'exists'
             
             if not file_exists:
-                ssh.close()
                 return {'status': 'not_deployed', 'containers': []}
             
             # Get containerlab status
-            stdin, stdout, stderr = ssh.exec_command(f"cd /opt/ndt && sudo containerlab inspect -t {topology_name}.clab.yml --format json")
-            inspect_output = stdout.read().decode()
-            
-            ssh.close()
+            result = await run_blocking(
+                self.ssh_pool.exec_command,
+                instance_ip,
+                f"cd /opt/ndt && sudo containerlab inspect -t {topology_name}.clab.yml --format json",
+                username=self.ssh_username
+            )
+            inspect_output = result.stdout
             
             if inspect_output:
                 try:
@@ -226,97 +202,123 @@ class ContainerlabDeployer:
             logger.error(f"Error getting topology status from {instance_ip}: {e}")
             return {'status': 'error', 'error': str(e)}
 
+# Runs as root on one host and handles every tunnel end there; an end that already exists is left alone
+TUNNEL_SCRIPT = r"""
+ensure() {
+  ns=$1; ifc=$2; vni=$3; remote=$4; port=$5; mtu=$6; repair=$7; id=$8
+  if { ip netns exec "$ns" ip -d -o link show "$ifc" 2>/dev/null; ip -d -o link show type vxlan; } \
+      | grep -q "vxlan id $vni "; then
+    echo "present $id"; return
+  fi
+  # Only plain vxlan ends can be recreated here, and only while the node is running
+  if [ "$repair" != 1 ] || ! ip netns list | grep -qw "$ns"; then
+    echo "failed $id"; return
+  fi
+  dev=$(ip route get "$remote" | awk '{for (i = 1; i < NF; i++) if ($i == "dev") {print $(i + 1); exit}}')
+  tmp="vx$vni"
+  ip link del "$tmp" 2>/dev/null
+  if ip link add "$tmp" type vxlan id "$vni" remote "$remote" dstport "$port" dev "$dev" \
+      && { [ -z "$mtu" ] || ip link set "$tmp" mtu "$mtu"; } \
+      && ip link set "$tmp" netns "$ns" \
+      && ip netns exec "$ns" ip link set "$tmp" name "$ifc" \
+      && ip netns exec "$ns" ip link set "$ifc" up; then
+    echo "created $id"
+  else
+    ip link del "$tmp" 2>/dev/null
+    echo "failed $id"
+  fi
+}
+"""
+
 class NetworkConnector:
-    """Handles network connectivity between distributed topology components"""
+    """Ensures the VXLAN tunnels carrying a topology's cross-host links exist on every host"""
     
-    def __init__(self):
-        self.bridge_networks = {}
-    
-    async def setup_inter_instance_connectivity(self, deployment_info: Dict[str, List[str]], 
-                                              ec2_client, ssh_key_path: str) -> bool:
-        """Setup network connectivity between topology parts on different instances"""
-        try:
-            # Get instance IPs
-            instance_ips = {}
-            instance_ids = list(deployment_info.keys())
-            
-            if len(instance_ids) <= 1:
-                # Single instance deployment, no inter-instance connectivity needed
-                return True
-            
-            response = ec2_client.describe_instances(InstanceIds=instance_ids)
-            
-            for reservation in response['Reservations']:
-                for instance in reservation['Instances']:
-                    instance_id = instance['InstanceId']
-                    instance_ips[instance_id] = {
-                        'public_ip': instance.get('PublicIpAddress'),
-                        'private_ip': instance.get('PrivateIpAddress')
-                    }
-            
-            # Create GRE tunnels between instances for inter-connectivity
-            tunnel_commands = []
-            
-            # Create mesh connectivity between all instances
-            for i, instance_id_1 in enumerate(instance_ids):
-                for j, instance_id_2 in enumerate(instance_ids[i+1:], i+1):
-                    
-                    ip1 = instance_ips[instance_id_1]['private_ip']
-                    ip2 = instance_ips[instance_id_2]['private_ip']
-                    
-                    if not ip1 or not ip2:
-                        continue
-                    
-                    # Create tunnel from instance 1 to instance 2
-                    tunnel_name_1_2 = f"gre-{instance_id_2[-8:]}"
-                    tunnel_name_2_1 = f"gre-{instance_id_1[-8:]}"
-                    
-                    # Commands for instance 1
-                    cmd1 = f"""
-sudo ip tunnel add {tunnel_name_1_2} mode gre remote {ip2} local {ip1}
-sudo ip link set {tunnel_name_1_2} up
-sudo ip addr add 192.168.{i+1}.1/24 dev {tunnel_name_1_2}
-"""
-                    
-                    # Commands for instance 2
-                    cmd2 = f"""
-sudo ip tunnel add {tunnel_name_2_1} mode gre remote {ip1} local {ip2}
-sudo ip link set {tunnel_name_2_1} up
-sudo ip addr add 192.168.{i+1}.2/24 dev {tunnel_name_2_1}
-"""
-                    
-                    tunnel_commands.append((instance_ips[instance_id_1]['public_ip'], cmd1))
-                    tunnel_commands.append((instance_ips[instance_id_2]['public_ip'], cmd2))
-            
-            # Execute tunnel setup commands
-            deployer = ContainerlabDeployer(ssh_key_path)
-            
-            for public_ip, command in tunnel_commands:
-                if public_ip:
-                    try:
-                        ssh = paramiko.SSHClient()
-                        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                        
-                        ssh.connect(
-                            hostname=public_ip,
-                            username='ubuntu',
-                            key_filename=ssh_key_path,
-                            timeout=30
-                        )
-                        
-                        stdin, stdout, stderr = ssh.exec_command(command)
-                        stdout.channel.recv_exit_status()
-                        
-                        ssh.close()
-                        
-                    except Exception as e:
-                        logger.error(f"Error setting up tunnel on {public_ip}: {e}")
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error setting up inter-instance connectivity: {e}")
-            return False
+    async def ensure_tunnels(self, link_plan: LinkPlan, instance_ips: Dict[str, str],
+                             ssh_key_path: str) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """Check, and recreate where missing, every tunnel end; one script per host, all hosts at once
+        
+        Containerlab creates the tunnel ends when it deploys, so normally every end
+        is present and a run costs one SSH command per host. Returns per-host
+        results and per-link state.
+        """
+        ends: Dict[str, List[Tuple[str, str, str, int, str]]] = {}
+        for link in link_plan.cross_host:
+            ends.setdefault(link.a_host, []).append(
+                (link.link_id, link.a_node, link.a_interface, link.vni, link_plan.host_ips[link.b_host])
+            )
+            ends.setdefault(link.b_host, []).append(
+                (link.link_id, link.b_node, link.b_interface, link.vni, link_plan.host_ips[link.a_host])
+            )
+        
+        ssh_pool = get_ssh_pool(ssh_key_path)
+        repair = 1 if link_plan.link_type == 'vxlan' else 0
+        
+        def host_script(instance_id: str) -> str:
+            lab = lab_name(link_plan.topology_name, instance_id)
+            calls = [
+                ' '.join(shlex.quote(str(arg)) for arg in (
+                    'ensure', f"clab-{lab}-{node}", interface, vni, remote,
+                    link_plan.udp_port, link_plan.mtu or '', repair, link_id,
+                ))
+                for link_id, node, interface, vni, remote in ends[instance_id]
+            ]
+            return TUNNEL_SCRIPT + '\n'.join(calls) + '\n'
+        
+        async def provision_host(instance_id: str) -> Dict:
+            with span('tunnels', instance_id=instance_id, ends=len(ends[instance_id])) as host_span:
+                result = await ensure_host(instance_id)
+                host_span.set(created=len(result['created']), failed=len(result['failed']))
+                if not result['ok']:
+                    host_span.fail(result.get('error') or f"{len(result['failed'])} tunnel ends failed")
+                return result
+        
+        async def ensure_host(instance_id: str) -> Dict:
+            started = time.monotonic()
+            result = {'ok': False, 'present': [], 'created': [], 'failed': []}
+            public_ip = instance_ips.get(instance_id)
+            if not public_ip:
+                result['error'] = 'no address'
+                return result
+            try:
+                output = await run_blocking(
+                    ssh_pool.exec_command,
+                    public_ip,
+                    f"sudo bash -c {shlex.quote(host_script(instance_id))}",
+                    timeout=60,
+                    lane=DEPLOY_LANE,
+                )
+            except Exception as e:
+                logger.error(f"Error provisioning tunnels on {instance_id}: {e}")
+                result['error'] = str(e)
+                return result
+            
+            for line in output.stdout.splitlines():
+                state, _, link_id = line.strip().partition(' ')
+                if state in result:
+                    result[state].append(link_id)
+            reported = set(result['present'] + result['created'] + result['failed'])
+            # Ends the script never reported on (it died part-way) count as failed
+            result['failed'] += [end[0] for end in ends[instance_id] if end[0] not in reported]
+            result['ok'] = not result['failed']
+            result['seconds'] = round(time.monotonic() - started, 2)
+            return result
+        
+        hosts = list(ends)
+        host_results = dict(zip(hosts, await asyncio.gather(*[provision_host(host) for host in hosts])))
+        
+        links = {}
+        for link in link_plan.cross_host:
+            a_up = link.link_id not in host_results[link.a_host]['failed'] and 'error' not in host_results[link.a_host]
+            b_up = link.link_id not in host_results[link.b_host]['failed'] and 'error' not in host_results[link.b_host]
+            links[link.link_id] = {'vni': link.vni, 'up': a_up and b_up, 'a_up': a_up, 'b_up': b_up}
+        
+        created = sum(len(result['created']) for result in host_results.values())
+        down = [link_id for link_id, state in links.items() if not state['up']]
+        if created:
+            logger.info(f"Recreated {created} missing tunnel ends of {link_plan.topology_name}")
+        if down:
+            logger.warning(f"{len(down)}/{len(links)} tunnels of {link_plan.topology_name} are down: {', '.join(down)}")
+        return host_results, links
 
 class DeploymentOrchestrator:
     """Main orchestrator for topology deployments"""
@@ -327,6 +329,7 @@ class DeploymentOrchestrator:
         self.distributor = TopologyDistributor()
         self.deployer = ContainerlabDeployer(ssh_key_path)
         self.connector = NetworkConnector()
+        self.realizer = LinkRealizer.from_config(get_state_store())
         self.active_deployments = {}
     
     async def deploy_distributed_topology(self, topology: Dict, available_instances: List[str]) -> Dict:
@@ -344,6 +347,14 @@ class DeploymentOrchestrator:
             # Get instance IPs
             instance_ips = await self._get_instance_ips(list(distribution.keys()))
             
+            # Cut links become VXLAN tunnels between the private addresses of their hosts
+            link_plan = await self.realizer.plan(
+                topology_name,
+                topology.get('topology', {}).get('links', []),
+                distribution,
+                await self._get_instance_ips(list(distribution.keys()), private=True),
+            )
+            
             # Create deployment tasks
             deployment_tasks = []
             
@@ -354,7 +365,7 @@ class DeploymentOrchestrator:
                 
                 # Create partial topology for this instance
                 partial_topology = self.distributor.create_partial_topology(
-                    topology, nodes, instance_id
+                    topology, nodes, instance_id, link_plan
                 )
                 
                 task = DeploymentTask(
@@ -393,12 +404,11 @@ class DeploymentOrchestrator:
                     task.status = "failed"
                     failed_deployments += 1
             
-            # Setup inter-instance connectivity if multiple instances
-            connectivity_setup = True
-            if len(distribution) > 1:
-                connectivity_setup = await self.connector.setup_inter_instance_connectivity(
-                    distribution, self.ec2_client, self.ssh_key_path
-                )
+            # Make sure both ends of every cross-instance tunnel exist
+            tunnel_hosts, tunnels = {}, {}
+            if link_plan.cross_host:
+                tunnel_hosts, tunnels = await self.connector.ensure_tunnels(link_plan, instance_ips, self.ssh_key_path)
+            connectivity_setup = all(state['up'] for state in tunnels.values())
             
             # Store deployment info
             deployment_info = {
@@ -408,8 +418,12 @@ class DeploymentOrchestrator:
                 'successful_deployments': successful_deployments,
                 'failed_deployments': failed_deployments,
                 'distribution': distribution,
+                'partition': self.distributor.last_plan.summary() if self.distributor.last_plan else None,
                 'tasks': deployment_tasks,
                 'connectivity_setup': connectivity_setup,
+                'links': link_plan.mapping(),
+                'tunnels': tunnels,
+                'tunnel_hosts': tunnel_hosts,
                 'deployed_at': datetime.now()
             }
             
@@ -427,10 +441,10 @@ class DeploymentOrchestrator:
             instance_ip, task.topology_config, task.topology_name
         )
     
-    async def _get_instance_ips(self, instance_ids: List[str]) -> Dict[str, str]:
-        """Get IP addresses for instances"""
+    async def _get_instance_ips(self, instance_ids: List[str], private: bool = False) -> Dict[str, str]:
+        """Get IP addresses for instances (private ones for traffic between instances)"""
         try:
-            response = self.ec2_client.describe_instances(InstanceIds=instance_ids)
+            response = await run_blocking(self.ec2_client.describe_instances, InstanceIds=instance_ids)
             
             instance_ips = {}
             for reservation in response['Reservations']:
@@ -439,8 +453,11 @@ class DeploymentOrchestrator:
                     public_ip = instance.get('PublicIpAddress')
                     private_ip = instance.get('PrivateIpAddress')
                     
-                    # Prefer public IP for SSH access
-                    instance_ips[instance_id] = public_ip or private_ip
+                    if private:
+                        instance_ips[instance_id] = private_ip
+                    else:
+                        # Prefer public IP for SSH access
+                        instance_ips[instance_id] = public_ip or private_ip
             
             return instance_ips
             
@@ -475,8 +492,9 @@ class DeploymentOrchestrator:
             # Execute destruction concurrently
             await asyncio.gather(*destroy_tasks, return_exceptions=True)
             
-            # Remove from active deployments
+            # Remove from active deployments and free the tunnel VNIs
             del self.active_deployments[topology_name]
+            await self.realizer.release(topology_name)
             
             return True
             
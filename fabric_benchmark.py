@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Fabric Benchmark for NDT
+Throughput, latency, loss and MTU between the hosts of a topology, measured through VXLAN like its links
+"""
+
+import asyncio
+import json
+import logging
+import re
+import shlex
+import statistics
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+from async_executor import DEPLOY_LANE, run_blocking
+from job_queue import Job
+from link_realizer import VXLAN_PORT, LinkRealizer
+
+logger = logging.getLogger(__name__)
+
+# Addresses inside the throwaway probe namespaces, so they never meet the topology's own
+_PROBE_ADDRESSES = ('10.254.0.1', '10.254.0.2')
+_IPERF_PORT = 5201
+
+# Root script creating one end of a probe tunnel: a namespace holding a VXLAN device to the peer host
+PROBE_SETUP = """
+set -e
+ip netns pids {ns} 2>/dev/null | xargs -r kill || true
+ip netns del {ns} 2>/dev/null || true
+dev=$(ip route get {peer} | awk '{{for (i = 1; i < NF; i++) if ($i == "dev") {{print $(i + 1); exit}}}}')
+ip netns add {ns}
+ip link add {ns} type vxlan id {vni} remote {peer} dstport {port} dev "$dev"
+ip link set {ns} mtu {mtu} netns {ns}
+ip -n {ns} addr add {address}/30 dev {ns}
+ip -n {ns} link set lo up
+ip -n {ns} link set {ns} up
+"""
+
+PING_SUMMARY = re.compile(r'(\d+) packets transmitted, (\d+) received')
+PING_RTT = re.compile(r'= ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms')
+
+def host_pairs(links: Dict[str, Dict]) -> Dict[Tuple[str, str], List[str]]:
+    """Host pairs sharing cut links, from a deployment's link mapping, with the links each carries"""
+    pairs: Dict[Tuple[str, str], List[str]] = {}
+    for link_id, link in links.items():
+        if link['a_host'] != link['b_host']:
+            pairs.setdefault(tuple(sorted((link['a_host'], link['b_host']))), []).append(link_id)
+    return pairs
+
+def schedule(pairs: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+    """Rounds of host-disjoint pairs: each round runs concurrently without two tests sharing a host"""
+    rounds: List[List[Tuple[str, str]]] = []
+    busy: List[set] = []
+    for pair in pairs:
+        for index, hosts in enumerate(busy):
+            if not hosts & set(pair):
+                rounds[index].append(pair)
+                hosts.update(pair)
+                break
+        else:
+            rounds.append([pair])
+            busy.append(set(pair))
+    return rounds
+
+class FabricBenchmark:
+    """Runs iperf3 and ping between the host pairs of a deployed topology
+
+    Each pair gets a temporary VXLAN tunnel between namespaces on both hosts,
+    with the MTU and UDP port the topology's links use, so the figures cover
+    the same encapsulated path without touching the topology's nodes.
+    """
+
+    def __init__(self,
+                 ssh_pool,
+                 realizer: LinkRealizer,
+                 duration: int = 5,
+                 ping_count: int = 20,
+                 streams: int = 1):
+        self.ssh_pool = ssh_pool
+        self.realizer = realizer
+        self.duration = duration
+        self.ping_count = ping_count
+        self.streams = streams
+
+    @property
+    def mtu(self) -> int:
+        return int(self.realizer.mtu or 1450)
+
+    @property
+    def port(self) -> int:
+        return int(self.realizer.udp_port or VXLAN_PORT)
+
+    async def run(self,
+                  topology_name: str,
+                  links: Dict[str, Dict],
+                  public_ips: Dict[str, str],
+                  private_ips: Dict[str, str],
+                  job: Optional[Job] = None) -> Dict:
+        """Benchmark every host pair that shares cut links; returns the pair results and a matrix"""
+        pairs = host_pairs(links)
+        if not pairs:
+            return {'topology': topology_name, 'pairs': [], 'matrix': {}, 'outliers': []}
+
+        # Probe tunnels need VNIs no deployed link uses on these hosts
+        owner = f'benchmark:{topology_name}'
+        vnis = await self.realizer.allocate(owner, [f'{a}--{b}' for a, b in pairs])
+        results: Dict[Tuple[str, str], Dict] = {}
+        try:
+            rounds = schedule(sorted(pairs))
+            for number, round_pairs in enumerate(rounds, 1):
+                with (job.phase(f'round-{number}') if job is not None else nullcontext()) as phase:
+                    measured = await asyncio.gather(*[
+                        self._measure_pair(pair, vnis[f'{pair[0]}--{pair[1]}'], public_ips, private_ips)
+                        for pair in round_pairs
+                    ])
+                    results.update(zip(round_pairs, measured))
+                    if phase is not None:
+                        phase.detail = f"{len(round_pairs)} host pairs"
+        finally:
+            await self.realizer.release(owner)
+
+        report = []
+        for (a, b), result in sorted(results.items()):
+            report.append({'hosts': [a, b], 'links': len(pairs[(a, b)]), **result})
+        outliers = self._outliers(report)
+
+        matrix: Dict[str, Dict[str, Dict]] = {}
+        for entry in report:
+            a, b = entry['hosts']
+            cell = {key: entry.get(key) for key in ('throughput_mbps', 'rtt_avg_ms', 'loss_percent', 'mtu_ok')}
+            matrix.setdefault(a, {})[b] = cell
+            matrix.setdefault(b, {})[a] = cell
+
+        return {
+            'topology': topology_name,
+            'mtu': self.mtu,
+            'duration_seconds': self.duration,
+            'rounds': len(rounds),
+            'pairs': report,
+            'matrix': matrix,
+            'outliers': outliers,
+        }
+
+    @staticmethod
+    def _outliers(report: List[Dict]) -> List[Dict]:
+        """Pairs well below the median throughput, losing packets, or failing the MTU check"""
+        throughputs = [entry['throughput_mbps'] for entry in report if entry.get('throughput_mbps')]
+        median = statistics.median(throughputs) if throughputs else None
+        outliers = []
+        for entry in report:
+            reasons = []
+            if entry.get('error'):
+                reasons.append(entry['error'])
+            if median and entry.get('throughput_mbps') is not None and entry['throughput_mbps'] < median / 2:
+                reasons.append(f"throughput {entry['throughput_mbps']} Mbit/s is under half the median {median:.0f}")
+            if entry.get('loss_percent'):
+                reasons.append(f"{entry['loss_percent']}% packet loss")
+            if entry.get('mtu_ok') is False:
+                reasons.append('full-size packets with DF set do not pass')
+            if reasons:
+                outliers.append({'hosts': entry['hosts'], 'reasons': reasons})
+        return outliers
+
+    async def _measure_pair(self,
+                            pair: Tuple[str, str],
+                            vni: int,
+                            public_ips: Dict[str, str],
+                            private_ips: Dict[str, str]) -> Dict:
+        client, server = pair
+        if not all(public_ips.get(host) and private_ips.get(host) for host in pair):
+            return {'error': 'host address unknown'}
+
+        # Namespace and device share the name (at most 15 characters)
+        ns = f'ndtb{vni}'
+        try:
+            await asyncio.gather(
+                self._root(public_ips[client], self._setup(ns, vni, private_ips[server], _PROBE_ADDRESSES[0])),
+                self._root(public_ips[server], self._setup(ns, vni, private_ips[client], _PROBE_ADDRESSES[1])
+                           + f'ip netns exec {ns} iperf3 -s -1 -D -p {_IPERF_PORT}\n'),
+            )
+            output = await self._root(public_ips[client], self._client_script(ns), timeout=self.duration + 120)
+            return self._parse(output)
+        except Exception as e:
+            logger.warning(f"Benchmark between {client} and {server} failed: {e}")
+            return {'error': str(e)}
+        finally:
+            # Only this probe's server: other benchmarks may run their own on the same host in other namespaces
+            cleanup = f'ip netns pids {ns} 2>/dev/null | xargs -r kill 2>/dev/null; ip netns del {ns} 2>/dev/null; true'
+            for host in pair:
+                if public_ips.get(host):
+                    try:
+                        await self._root(public_ips[host], cleanup)
+                    except Exception as e:
+                        logger.warning(f"Could not remove benchmark namespace {ns} on {host}: {e}")
+
+    def _setup(self, ns: str, vni: int, peer: str, address: str) -> str:
+        return PROBE_SETUP.format(ns=ns, vni=vni, peer=peer, port=self.port, mtu=self.mtu, address=address)
+
+    def _client_script(self, ns: str) -> str:
+        peer = _PROBE_ADDRESSES[1]
+        # The largest packet the links carry, with fragmentation forbidden
+        df_size = self.mtu - 28
+        return (
+            f"echo '--- ping ---'; ip netns exec {ns} ping -q -c {self.ping_count} -i 0.2 -W 2 {peer}; "
+            f"echo '--- mtu ---'; ip netns exec {ns} ping -q -c 3 -M do -s {df_size} -W 2 {peer} >/dev/null 2>&1 "
+            "&& echo ok || echo fail; "
+            f"echo '--- iperf ---'; sleep 1; ip netns exec {ns} iperf3 -J -c {peer} -p {_IPERF_PORT} "
+            f"-t {self.duration} -P {self.streams}; true"
+        )
+
+    async def _root(self, host: str, script: str, timeout: int = 60) -> str:
+        """Run a script as root on a host; its last error line becomes the exception"""
+        result = await run_blocking(
+            self.ssh_pool.exec_command, host, f'sudo bash -c {shlex.quote(script)}', timeout=timeout, lane=DEPLOY_LANE
+        )
+        if result.exit_status != 0:
+            stderr = result.stderr.strip()
+            raise RuntimeError(stderr.splitlines()[-1] if stderr else f"exit status {result.exit_status}")
+        return result.stdout
+
+    @staticmethod
+    def _parse(output: str) -> Dict:
+        sections = dict(re.findall(r'--- (\w+) ---\n(.*?)(?=\n--- \w+ ---|\Z)', output, re.S))
+        result: Dict = {}
+
+        ping = sections.get('ping', '')
+        summary = PING_SUMMARY.search(ping)
+        if summary:
+            sent, received = int(summary.group(1)), int(summary.group(2))
+            result['loss_percent'] = round(100 * (sent - received) / sent, 1) if sent else None
+        rtt = PING_RTT.search(ping)
+        if rtt:
+            result.update({
+                'rtt_min_ms': float(rtt.group(1)),
+                'rtt_avg_ms': float(rtt.group(2)),
+                'rtt_max_ms': float(rtt.group(3)),
+                'jitter_ms': float(rtt.group(4)),
+            })
+
+        result['mtu_ok'] = sections.get('mtu', '').strip() == 'ok'
+
+        try:
+            iperf = json.loads(sections.get('iperf', ''))
+            if 'error' in iperf:
+                result['error'] = f"iperf3: {iperf['error']}"
+            end = iperf.get('end', {})
+            received = end.get('sum_received', {})
+            if received:
+                result['throughput_mbps'] = round(received['bits_per_second'] / 1e6, 1)
+            result['retransmits'] = end.get('sum_sent', {}).get('retransmits')
+        except ValueError:
+            result['error'] = 'iperf3 produced no result'
+        return result
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Fleet Telemetry for NDT Manager
+Background refresher that keeps an in-memory snapshot of every worker's resources
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Optional
+
+from async_executor import run_blocking
+from metrics_store import MetricsStore
+from node_profiles import NodeProfiles
+from resource_monitor import ContainerUsage, SystemMetrics
+from state_store import TELEMETRY, Leadership, StateStore
+
+if TYPE_CHECKING:
+    from ndt_manager import EC2Resources, NDTManager
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class HostSample:
+    """Latest poll result for one worker"""
+    instance_id: str
+    instance_type: str
+    resources: 'EC2Resources'
+    metrics: Optional[SystemMetrics]
+    service_status: Dict[str, bool]
+    polled_at: datetime = field(default_factory=datetime.now)
+
+    # Attribute names expected by ResourceAlertManager.check_alerts
+    @property
+    def current_metrics(self) -> Optional[SystemMetrics]:
+        return self.metrics
+
+    @property
+    def state(self) -> str:
+        return self.resources.status
+
+    @property
+    def ssh_accessible(self) -> bool:
+        return self.service_status.get('ssh_accessible', False)
+
+    @property
+    def docker_running(self) -> bool:
+        return self.service_status.get('docker_running', False)
+
+    def age_seconds(self) -> float:
+        return (datetime.now() - self.polled_at).total_seconds()
+
+    def to_dict(self) -> Dict:
+        """JSON form published to the state store for the other API processes"""
+        metrics = asdict(self.metrics) if self.metrics else None
+        if metrics:
+            metrics['timestamp'] = self.metrics.timestamp.isoformat()
+        return {
+            'instance_id': self.instance_id,
+            'instance_type': self.instance_type,
+            'resources': asdict(self.resources),
+            'metrics': metrics,
+            'service_status': self.service_status,
+            'polled_at': self.polled_at.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'HostSample':
+        # Imported here because ndt_manager imports this module
+        from ndt_manager import EC2Resources
+
+        metrics = data.get('metrics')
+        if metrics:
+            metrics = SystemMetrics(**{
+                **metrics,
+                'timestamp': datetime.fromisoformat(metrics['timestamp']),
+                'load_average': tuple(metrics['load_average']),
+                'containers': [ContainerUsage(**container) for container in metrics.get('containers', [])],
+            })
+        return cls(
+            instance_id=data['instance_id'],
+            instance_type=data['instance_type'],
+            resources=EC2Resources(**data['resources']),
+            metrics=metrics,
+            service_status=data['service_status'],
+            polled_at=datetime.fromisoformat(data['polled_at']),
+        )
+
+class FleetTelemetry:
+    """Polls workers on a per-host schedule and serves the snapshot stale-while-revalidate
+
+    Every sample is also appended to the metrics history when one is given, and
+    its per-container usage to the node profiles.
+
+    With a shared store only one API process, the elected leader, polls and
+    writes history and profiles; it publishes each sample to the store and the
+    other processes serve the snapshot from there. If the leader dies another
+    process takes over within leader_ttl seconds.
+    """
+
+    def __init__(self,
+                 manager: 'NDTManager',
+                 interval: float = 60,
+                 tick: float = 5,
+                 history: Optional[MetricsStore] = None,
+                 profiles: Optional[NodeProfiles] = None,
+                 store: Optional[StateStore] = None,
+                 leader_ttl: float = 30):
+        self.manager = manager
+        self.interval = interval
+        self.tick = min(tick, interval)
+        self.history = history
+        self.profiles = profiles
+        self.store = store
+        self.leadership = Leadership(store, 'telemetry', ttl=max(leader_ttl, self.tick * 3)) if store else None
+        self.snapshot: Dict[str, HostSample] = {}
+        self.last_discovery: Optional[datetime] = None
+
+        self._instances: Dict[str, Dict] = {}
+        self._next_poll: Dict[str, float] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._next_discovery = 0.0
+        self._loop_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the background refresher"""
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+            logger.info(f"Fleet telemetry started (interval {self.interval}s)")
+
+    async def stop(self):
+        """Stop the refresher and any polls still running, then hand over leadership"""
+        tasks = [t for t in [self._loop_task, self._refresh_task, *self._in_flight.values()] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+        if self.leading and self.profiles is not None:
+            await run_blocking(self.profiles.save)
+        if self.leadership is not None:
+            await self.leadership.resign()
+
+    @property
+    def running(self) -> bool:
+        return self._loop_task is not None and not self._loop_task.done()
+
+    @property
+    def leading(self) -> bool:
+        """Whether this process polls the fleet and writes history and profiles"""
+        return self.leadership is None or self.leadership.is_leader
+
+    async def _run(self):
+        while True:
+            try:
+                if self.leadership is not None and not await self.leadership.check():
+                    # Standby: the leader polls; pick up the profiles it saves for placement here
+                    if self.profiles is not None:
+                        await run_blocking(self.profiles.reload)
+                    await asyncio.sleep(self.tick)
+                    continue
+
+                now = time.monotonic()
+                if now >= self._next_discovery:
+                    await self._discover()
+                    self._next_discovery = time.monotonic() + self.interval
+
+                for instance_id, due in list(self._next_poll.items()):
+                    if due <= now and instance_id not in self._in_flight:
+                        self._schedule_poll(instance_id)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Fleet telemetry cycle failed: {e}")
+
+            await asyncio.sleep(self.tick)
+
+    async def _discover(self):
+        """Refresh the set of managed instances; new hosts get a staggered first poll"""
+        instances = await self.manager.describe_managed_instances()
+        now = time.monotonic()
+        current = {instance['InstanceId']: instance for instance in instances}
+
+        for instance_id in current:
+            if instance_id not in self._next_poll:
+                # Spread first polls over one tick so a large fleet is not probed in a single burst
+                self._next_poll[instance_id] = now + random.uniform(0, self.tick)
+
+        for instance_id in set(self._instances) - set(current):
+            self._next_poll.pop(instance_id, None)
+            self.snapshot.pop(instance_id, None)
+            if self.store is not None and self.leading:
+                await self.store.delete(TELEMETRY, instance_id)
+
+        self._instances = current
+        self.last_discovery = datetime.now()
+
+    def _schedule_poll(self, instance_id: str) -> asyncio.Task:
+        task = asyncio.create_task(self._poll(instance_id))
+        self._in_flight[instance_id] = task
+        return task
+
+    async def _poll(self, instance_id: str):
+        try:
+            instance = self._instances.get(instance_id)
+            if instance is None:
+                return
+            sample = await self.manager.poll_instance(instance)
+            if sample is not None and instance_id in self._instances:
+                self.snapshot[instance_id] = sample
+                # Polls on demand (?fresh=true) in a standby process only update its own snapshot
+                if not self.leading:
+                    return
+                if self.store is not None:
+                    await self.store.put(TELEMETRY, instance_id, sample.to_dict())
+                if self.history is not None and sample.metrics is not None:
+                    await run_blocking(self.history.record, instance_id, sample.metrics)
+                if self.profiles is not None and sample.metrics is not None and sample.metrics.containers:
+                    await run_blocking(self.profiles.record, sample.metrics.containers)
+        except Exception as e:
+            logger.debug(f"Telemetry poll failed for {instance_id}: {e}")
+        finally:
+            self._in_flight.pop(instance_id, None)
+            if instance_id in self._next_poll:
+                # Small jitter keeps hosts from synchronising onto the same tick
+                self._next_poll[instance_id] = time.monotonic() + self.interval * random.uniform(0.9, 1.1)
+
+    async def refresh(self) -> Dict[str, HostSample]:
+        """Rediscover the fleet and poll every host now, waiting for the results"""
+        await self._discover()
+        self._next_discovery = time.monotonic() + self.interval
+
+        tasks = []
+        for instance_id in self._instances:
+            task = self._in_flight.get(instance_id) or self._schedule_poll(instance_id)
+            tasks.append(task)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        return dict(self.snapshot)
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+
+    def snapshot_age(self) -> Optional[float]:
+        """Age in seconds of the oldest sample in the snapshot"""
+        if not self.snapshot:
+            return None
+        return max(sample.age_seconds() for sample in self.snapshot.values())
+
+    def is_stale(self) -> bool:
+        """True once data is more than two refresh intervals old"""
+        age = self.snapshot_age()
+        if age is None:
+            # Empty fleet: staleness is about the last discovery instead
+            if self.last_discovery is None:
+                return True
+            age = (datetime.now() - self.last_discovery).total_seconds()
+        return age > self.interval * 2
+
+    async def _load_published(self):
+        """Replace the snapshot with the samples the leader published"""
+        published = await self.store.all(TELEMETRY)
+        snapshot = {}
+        for instance_id, data in published.items():
+            try:
+                snapshot[instance_id] = HostSample.from_dict(data)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.debug(f"Ignoring unreadable telemetry sample for {instance_id}: {e}")
+        self.snapshot = snapshot
+        self.last_discovery = datetime.now()
+
+    async def get_snapshot(self, fresh: bool = False) -> Dict[str, HostSample]:
+        """Return the snapshot, refreshing synchronously only when asked to or on a cold start"""
+        if not fresh and not self.leading:
+            await self._load_published()
+            return dict(self.snapshot)
+
+        if fresh or self.last_discovery is None:
+            return await self.refresh()
+
+        if self.is_stale() and not self.running:
+            # No background loop to catch up: serve what we have and revalidate
+            self._refresh_in_background()
+
+        return dict(self.snapshot)
+
+    async def get_resources(self, fresh: bool = False) -> Dict[str, 'EC2Resources']:
+        samples = await self.get_snapshot(fresh=fresh)
+        return {instance_id: sample.resources for instance_id, sample in samples.items()}
+
+    def metadata(self) -> Dict:
+        """Data-age information returned alongside the snapshot"""
+        age = self.snapshot_age()
+        return {
+            'refresh_interval_seconds': self.interval,
+            'snapshot_age_seconds': round(age, 1) if age is not None else None,
+            'stale': self.is_stale(),
+            'last_discovery': self.last_discovery.isoformat() if self.last_discovery else None,
+            'background_refresh': self.running,
+            'leader': self.leading,
+            'polls_in_flight': len(self._in_flight),
+        }
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Image Prefetch for NDT
+Pulls the node images a worker's partition needs while the rest of the deployment is prepared
+"""
+
+import asyncio
+import logging
+import shlex
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from async_executor import DEPLOY_LANE, run_blocking
+from registry_mirror import RegistryMirror
+from state_store import WORKER_IMAGES, StateStore
+
+logger = logging.getLogger(__name__)
+
+_INVENTORY_MARKER = '--- inventory ---'
+
+def normalize_image(image: str) -> str:
+    """Canonical form used for comparisons: explicit tag, no implicit Docker Hub prefix"""
+    image = image.strip()
+    for prefix in ('docker.io/library/', 'docker.io/'):
+        if image.startswith(prefix):
+            image = image[len(prefix):]
+            break
+    if '@' not in image and ':' not in image.rsplit('/', 1)[-1]:
+        image += ':latest'
+    return image
+
+def node_images(topology: Dict, nodes: Iterable[str]) -> Set[str]:
+    """Images the given nodes run, resolved like containerlab: node, then kind, then defaults"""
+    all_nodes = topology.get('nodes', {}) or {}
+    kinds = topology.get('kinds', {}) or {}
+    defaults = topology.get('defaults', {}) or {}
+
+    images = set()
+    for name in nodes:
+        config = all_nodes.get(name) or {}
+        kind = config.get('kind') or defaults.get('kind')
+        image = config.get('image') or (kinds.get(kind) or {}).get('image') or defaults.get('image')
+        if image:
+            images.add(normalize_image(image))
+    return images
+
+class ImagePrefetcher:
+    """Starts per-worker image pulls early and remembers which images each worker holds
+
+    The inventory lives in the state store; images it lists (and that are younger
+    than inventory_ttl) are not pulled or even checked again.
+    """
+
+    def __init__(self,
+                 ssh_pool,
+                 store: StateStore,
+                 resolve_host: Callable[[str], Awaitable[Optional[str]]],
+                 inventory_ttl: float = 86400,
+                 pull_timeout: int = 1800,
+                 mirror: Optional[RegistryMirror] = None):
+        self.ssh_pool = ssh_pool
+        self.mirror = mirror
+        self.store = store
+        self.resolve_host = resolve_host
+        self.inventory_ttl = inventory_ttl
+        self.pull_timeout = pull_timeout
+        self._tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    async def known_images(self, instance_id: str) -> Set[str]:
+        record = await self.store.get(WORKER_IMAGES, instance_id)
+        if record is None or record.get('updated_at', 0) < time.time() - self.inventory_ttl:
+            return set()
+        return set(record.get('images', []))
+
+    def start(self, key: str, instance_id: str, images: Set[str]) -> asyncio.Task:
+        """Begin prefetching images on a worker for one deployment (key), without waiting"""
+        task = self._tasks.get((key, instance_id))
+        if task is None or task.done():
+            task = asyncio.create_task(self.prefetch(instance_id, images))
+            self._tasks[(key, instance_id)] = task
+        return task
+
+    async def wait(self, key: str, instance_id: str) -> Optional[Dict]:
+        """Result of a started prefetch (None if none was started); failures never raise"""
+        task = self._tasks.pop((key, instance_id), None)
+        if task is None:
+            return None
+        try:
+            return await task
+        except Exception as e:
+            logger.warning(f"Image prefetch on {instance_id} failed: {e}")
+            return {'error': str(e)}
+
+    def cancel(self, key: str):
+        """Drop the prefetches of a deployment that will not go ahead"""
+        for task_key in [k for k in self._tasks if k[0] == key]:
+            self._tasks.pop(task_key).cancel()
+
+    async def prefetch(self, instance_id: str, images: Set[str]) -> Dict:
+        """Pull whichever images the worker is not known to have; returns what happened to each"""
+        started = time.monotonic()
+        cached = await self.known_images(instance_id)
+        missing = sorted(image for image in images if image not in cached)
+        result: Dict[str, List[str]] = {'cached': sorted(images & cached), 'present': [], 'pulled': [], 'failed': []}
+
+        if missing:
+            host = await self.resolve_host(instance_id)
+            if not host:
+                raise RuntimeError(f"No address for {instance_id}")
+            output = await run_blocking(self._pull, host, missing, lane=DEPLOY_LANE)
+            status_lines, _, inventory_lines = output.partition(_INVENTORY_MARKER)
+
+            for line in status_lines.splitlines():
+                status, _, image = line.strip().partition(' ')
+                if status in result:
+                    result[status].append(image)
+
+            inventory = {normalize_image(line) for line in inventory_lines.splitlines()
+                         if line.strip() and '<none>' not in line}
+            await self.store.put(WORKER_IMAGES, instance_id, {'images': sorted(inventory), 'updated_at': time.time()})
+
+        result['seconds'] = round(time.monotonic() - started, 1)
+        if result['pulled'] or result['failed']:
+            logger.info(f"Prefetch on {instance_id}: pulled {len(result['pulled'])}, "
+                        f"failed {len(result['failed'])} in {result['seconds']}s")
+        return result
+
+    def _pull_command(self, image: str) -> str:
+        """Shell for one image: keep it if present, else pull it (through the mirror when there is one)"""
+        quoted = shlex.quote(image)
+        command = f'( if sudo docker image inspect {quoted} >/dev/null 2>&1; then echo "present {image}"; '
+        mirror_ref = self.mirror.mirror_ref(image) if self.mirror is not None else None
+        if mirror_ref is not None:
+            mirrored = shlex.quote(mirror_ref)
+            command += (f'elif sudo docker pull -q {mirrored} >/dev/null 2>&1 '
+                        f'&& sudo docker tag {mirrored} {quoted}; then echo "pulled {image}"; ')
+        # Direct pull; Docker Hub goes through the daemon's registry-mirrors when configured
+        command += (f'elif sudo docker pull -q {quoted} >/dev/null 2>&1; then echo "pulled {image}"; '
+                    f'else echo "failed {image}"; fi ) &')
+        return command
+
+    def _pull(self, host: str, images: List[str]) -> str:
+        """Check then pull every image in parallel on the worker and list its images (blocking)"""
+        checks = ' '.join(self._pull_command(image) for image in images)
+        command = (f"{checks} wait; echo '{_INVENTORY_MARKER}'; "
+                   "sudo docker image ls --format '{{.Repository}}:{{.Tag}}'")
+        return self.ssh_pool.exec_command(host, command, timeout=self.pull_timeout).stdout
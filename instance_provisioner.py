@@ -10,12 +10,20 @@ import json
 import logging
 import os
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 import boto3
-import paramiko
 from botocore.exceptions import ClientError, WaiterError
+from ssh_pool import get_ssh_pool
+from async_executor import DEPLOY_LANE, run_blocking
+from instance_specs import get_spec_cache
+from lookup_cache import BAKED_AMI_KEY, DEFAULT_VPC_KEY, UBUNTU_AMI_KEY, get_lookup_cache, security_group_key
+from ami_builder import AMIBuilder
+from registry_mirror import RegistryMirror
+from config_loader import get_setting
+from autoscaler import utilization
+from metrics_store import get_metrics_store
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +65,11 @@ class EC2InstanceProvisioner:
         self.key_pair_name = key_pair_name
         self.iam_instance_profile = iam_instance_profile
         self.ssh_key_path = os.path.expanduser(ssh_key_path)
+        self.ssh_pool = get_ssh_pool(self.ssh_key_path)
+        self.spec_cache = get_spec_cache(self.ec2_client)
+        self.lookups = get_lookup_cache(region)
+        self.ami_builder = AMIBuilder(self.ec2_client)
+        self.registry_mirror = RegistryMirror.from_config()
         
         # Instance type mapping based on requirements
         self.instance_type_map = {
@@ -113,6 +126,19 @@ class EC2InstanceProvisioner:
                 'cost_per_hour': 0.252
             }
         }
+        self._apply_type_specs()
+    
+    def _apply_type_specs(self):
+        """Take cpu/memory for each mapped type from the shared spec cache"""
+        for specs in self.instance_type_map.values():
+            type_specs = self.spec_cache.get_type_specs(specs['type'])
+            specs['cpu'] = type_specs['cpu']
+            specs['memory'] = type_specs['memory']
+    
+    def refresh_instance_type_specs(self):
+        """Fetch any uncached mapped types in one batch and update the map (blocking)"""
+        self.spec_cache.ensure_types(specs['type'] for specs in self.instance_type_map.values())
+        self._apply_type_specs()
     
     def select_instance_type(self, request: InstanceRequest) -> str:
         """Select the most appropriate instance type based on requirements"""
@@ -159,6 +185,7 @@ class EC2InstanceProvisioner:
         
         try:
             # Select appropriate instance type
+            await run_blocking(self.refresh_instance_type_specs)
             instance_type = self.select_instance_type(request)
             
             # Get latest Ubuntu AMI
@@ -167,8 +194,9 @@ class EC2InstanceProvisioner:
             # Get or create security group
             security_group_id = await self._ensure_security_group()
             
-            # Prepare user data script
-            user_data = self._generate_user_data_script(request)
+            # Prepare user data script (minimal on a baked NDT image)
+            baked = ami_id == await self._get_baked_ami()
+            user_data = self._generate_user_data_script(request, baked=baked)
             
             # Prepare tags
             tags = {
@@ -188,7 +216,8 @@ class EC2InstanceProvisioner:
                 tags.update(request.tags)
             
             # Create instance
-            response = self.ec2_client.run_instances(
+            response = await run_blocking(
+                self.ec2_client.run_instances,
                 ImageId=ami_id,
                 MinCount=1,
                 MaxCount=1,
@@ -235,13 +264,15 @@ class EC2InstanceProvisioner:
             # Wait for instance to be running
             logger.info(f"Waiting for instance {instance_id} to be running...")
             waiter = self.ec2_client.get_waiter('instance_running')
-            waiter.wait(
+            await run_blocking(
+                waiter.wait,
                 InstanceIds=[instance_id],
-                WaiterConfig={'Delay': 15, 'MaxAttempts': 40}
+                WaiterConfig={'Delay': 15, 'MaxAttempts': 40},
+                lane=DEPLOY_LANE
             )
             
             # Get updated instance information
-            response = self.ec2_client.describe_instances(InstanceIds=[instance_id])
+            response = await run_blocking(self.ec2_client.describe_instances, InstanceIds=[instance_id])
             instance = response['Reservations'][0]['Instances'][0]
             
             provisioned = ProvisionedInstance(
@@ -266,60 +297,87 @@ class EC2InstanceProvisioner:
             return provisioned
             
         except Exception as e:
+            if isinstance(e, ClientError) and e.response['Error']['Code'] in (
+                    'InvalidAMIID.NotFound', 'InvalidGroup.NotFound', 'InvalidVpcID.NotFound'):
+                # A memoized ID went away underneath us; look it up again next time
+                self.lookups.invalidate()
             logger.error(f"Error provisioning instance: {e}")
             raise
     
     async def _get_latest_ubuntu_ami(self) -> str:
-        """Get the latest Ubuntu 24.04 LTS AMI"""
+        """Worker AMI: the newest baked NDT image if there is one, else the latest Ubuntu 24.04 LTS"""
+        baked = await self._get_baked_ami()
+        if baked:
+            return baked
         try:
-            response = self.ec2_client.describe_images(
-                Filters=[
-                    {'Name': 'name', 'Values': ['ubuntu/images/hvm-ssd/ubuntu-noble-24.04-amd64-server-*']},
-                    {'Name': 'owner-alias', 'Values': ['amazon']},
-                    {'Name': 'state', 'Values': ['available']},
-                    {'Name': 'architecture', 'Values': ['x86_64']}
-                ],
-                Owners=['099720109477']  # Canonical
-            )
-            
-            if not response['Images']:
-                raise Exception("No Ubuntu 24.04 LTS AMI found")
-            
-            # Sort by creation date and get the latest
-            images = sorted(response['Images'], key=lambda x: x['CreationDate'], reverse=True)
-            ami_id = images[0]['ImageId']
-            
-            logger.info(f"Selected Ubuntu AMI: {ami_id}")
-            return ami_id
-            
+            return await self.lookups.get(UBUNTU_AMI_KEY, self._lookup_latest_ubuntu_ami)
         except Exception as e:
             logger.error(f"Error getting Ubuntu AMI: {e}")
             # Fallback to a known good AMI (update this periodically)
             return 'ami-0c7217cdde317cfec'
     
+    async def _get_baked_ami(self) -> Optional[str]:
+        """Newest baked NDT worker AMI, or None (memoized)"""
+        if not get_setting('ami.prefer_baked', True):
+            return None
+        try:
+            return await self.lookups.get(
+                BAKED_AMI_KEY, self.ami_builder.find_latest, ttl=float(get_setting('ami.lookup_ttl', 600))
+            )
+        except Exception as e:
+            logger.error(f"Error looking up baked worker AMI: {e}")
+            return None
+    
+    async def _lookup_latest_ubuntu_ami(self) -> str:
+        response = await run_blocking(
+            self.ec2_client.describe_images,
+            Filters=[
+                {'Name': 'name', 'Values': ['ubuntu/images/hvm-ssd/ubuntu-noble-24.04-amd64-server-*']},
+                {'Name': 'owner-alias', 'Values': ['amazon']},
+                {'Name': 'state', 'Values': ['available']},
+                {'Name': 'architecture', 'Values': ['x86_64']}
+            ],
+            Owners=['099720109477']  # Canonical
+        )
+        
+        if not response['Images']:
+            raise Exception("No Ubuntu 24.04 LTS AMI found")
+        
+        # Latest by creation date
+        image = max(response['Images'], key=lambda x: x['CreationDate'])
+        
+        logger.info(f"Selected Ubuntu AMI: {image['ImageId']}")
+        return image['ImageId']
+    
     async def _ensure_security_group(self) -> str:
-        """Ensure security group exists and return its ID"""
+        """Ensure security group exists and return its ID (memoized)"""
         sg_name = 'ndt-worker-security-group'
+        vpc_id = await self.lookups.get(DEFAULT_VPC_KEY, lambda: run_blocking(self._get_default_vpc_id))
+        return await self.lookups.get(
+            security_group_key(sg_name, vpc_id),
+            lambda: run_blocking(self._find_or_create_security_group, sg_name, vpc_id)
+        )
+    
+    def _get_default_vpc_id(self) -> str:
+        vpc_response = self.ec2_client.describe_vpcs(
+            Filters=[{'Name': 'isDefault', 'Values': ['true']}]
+        )
+        
+        if not vpc_response['Vpcs']:
+            raise Exception("No default VPC found")
         
+        return vpc_response['Vpcs'][0]['VpcId']
+    
+    def _find_or_create_security_group(self, sg_name: str, vpc_id: str) -> str:
         try:
             # Check if security group exists
             response = self.ec2_client.describe_security_groups(
-                Filters=[{'Name': 'group-name', 'Values': [sg_name]}]
+                Filters=[{'Name': 'group-name', 'Values': [sg_name]}, {'Name': 'vpc-id', 'Values': [vpc_id]}]
             )
             
             if response['SecurityGroups']:
                 return response['SecurityGroups'][0]['GroupId']
             
-            # Get default VPC
-            vpc_response = self.ec2_client.describe_vpcs(
-                Filters=[{'Name': 'isDefault', 'Values': ['true']}]
-            )
-            
-            if not vpc_response['Vpcs']:
-                raise Exception("No default VPC found")
-            
-            vpc_id = vpc_response['Vpcs'][0]['VpcId']
-            
             # Create security group
             sg_response = self.ec2_client.create_security_group(
                 GroupName=sg_name,
@@ -382,8 +440,10 @@ class EC2InstanceProvisioner:
                         'IpRanges': [{'CidrIp': '0.0.0.0/0', 'Description': 'ICMP ping'}]
                     },
                     {
-                        'IpProtocol': 'gre',
-                        'IpRanges': [{'CidrIp': '0.0.0.0/0', 'Description': 'GRE tunnels for inter-instance connectivity'}]
+                        'IpProtocol': 'udp',
+                        'FromPort': 4789,
+                        'ToPort': 4789,
+                        'UserIdGroupPairs': [{'GroupId': sg_id, 'Description': 'VXLAN tunnels for cross-instance links'}]
                     }
                 ]
             )
@@ -395,16 +455,22 @@ class EC2InstanceProvisioner:
             logger.error(f"Error with security group: {e}")
             raise
     
-    def _generate_user_data_script(self, request: InstanceRequest) -> str:
-        """Generate user data script for instance initialization"""
+    def _generate_user_data_script(self, request: InstanceRequest, baked: bool = False) -> str:
+        """Generate user data script for instance initialization
+
+        Baked NDT images already contain the packages, Docker, containerlab and
+        Python packages, so only the per-instance configuration runs on them.
+        """
         
-        script = f"""#!/bin/bash
+        header = """#!/bin/bash
 set -e
 
 # Log all output
 exec > >(tee /var/log/user-data.log) 2>&1
 echo "Starting NDT worker initialization at $(date)"
+"""
 
+        install = """
 # Update system
 export DEBIAN_FRONTEND=noninteractive
 apt-get update -y
@@ -462,6 +528,24 @@ apt-get install -y \\
     iperf3 \\
     mtr-tiny
 
+# Install Python packages for NDT worker
+pip3 install \\
+    paramiko \\
+    pyyaml \\
+    requests \\
+    psutil \\
+    docker
+
+# Automatic security updates
+apt-get install -y unattended-upgrades
+"""
+
+        baked_start = """
+# Baked NDT image: packages, Docker and containerlab are preinstalled
+systemctl start docker
+"""
+
+        configure = f"""
 # Create working directories
 mkdir -p /opt/ndt
 mkdir -p /opt/ndt/topologies
@@ -471,14 +555,6 @@ mkdir -p /opt/ndt/configs
 # Set proper ownership
 chown -R ubuntu:ubuntu /opt/ndt
 
-# Install Python packages for NDT worker
-pip3 install \\
-    paramiko \\
-    pyyaml \\
-    requests \\
-    psutil \\
-    docker
-
 # Create NDT worker service script
 cat > /opt/ndt/worker.py << 'EOF'
 #!/usr/bin/env python3
@@ -593,9 +669,6 @@ cat > /etc/logrotate.d/ndt << 'EOF'
 }}
 EOF
 
-# Install monitoring tools
-pip3 install psutil requests
-
 # Create resource monitoring script
 cat > /opt/ndt/monitor.py << 'EOF'
 #!/usr/bin/env python3
@@ -623,7 +696,6 @@ EOF
 chmod +x /opt/ndt/monitor.py
 
 # Set up automatic security updates
-apt-get install -y unattended-upgrades
 dpkg-reconfigure -plow unattended-upgrades
 
 # Configure automatic cleanup
@@ -655,7 +727,9 @@ python3 --version | tee -a /var/log/user-data.log
 
 echo "NDT worker initialization script completed successfully" | tee -a /var/log/user-data.log
 """
-        
+
+        mirror = self.registry_mirror.bootstrap_script() if self.registry_mirror is not None else ""
+        script = header + (baked_start if baked else install) + mirror + configure
         return base64.b64encode(script.encode('utf-8')).decode('utf-8')
     
     async def _wait_for_initialization(self, instance: ProvisionedInstance, timeout: int = 600):
@@ -698,23 +772,9 @@ echo "NDT worker initialization script completed successfully" | tee -a /var/log
     async def _test_ssh_connectivity(self, ip_address: str) -> bool:
         """Test SSH connectivity to instance"""
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            ssh.connect(
-                hostname=ip_address,
-                username='ubuntu',
-                key_filename=self.ssh_key_path,
-                timeout=10,
-                banner_timeout=10
-            )
-            
             # Test basic command
-            stdin, stdout, stderr = ssh.exec_command('echo "ssh_test"')
-            result = stdout.read().decode().strip()
-            
-            ssh.close()
-            return result == "ssh_test"
+            result = await run_blocking(self.ssh_pool.exec_command, ip_address, 'echo "ssh_test"', timeout=10)
+            return result.stdout.strip() == "ssh_test"
             
         except Exception:
             return False
@@ -722,45 +782,40 @@ echo "NDT worker initialization script completed successfully" | tee -a /var/log
     async def _test_services_ready(self, ip_address: str) -> bool:
         """Test if required services are ready"""
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            ssh.connect(
-                hostname=ip_address,
-                username='ubuntu',
-                key_filename=self.ssh_key_path,
-                timeout=10
-            )
-            
-            # Check initialization marker
-            stdin, stdout, stderr = ssh.exec_command('test -f /tmp/ndt-initialization-complete && echo "ready"')
-            result = stdout.read().decode().strip()
-            
-            if result != "ready":
-                ssh.close()
-                return False
-            
-            # Check Docker
-            stdin, stdout, stderr = ssh.exec_command('sudo docker info >/dev/null 2>&1 && echo "docker_ok"')
-            docker_result = stdout.read().decode().strip()
-            
-            # Check containerlab
-            stdin, stdout, stderr = ssh.exec_command('which containerlab >/dev/null 2>&1 && echo "clab_ok"')
-            clab_result = stdout.read().decode().strip()
-            
-            # Check NDT worker service
-            stdin, stdout, stderr = ssh.exec_command('systemctl is-active ndt-worker 2>/dev/null')
-            worker_result = stdout.read().decode().strip()
-            
-            ssh.close()
-            
-            return (docker_result == "docker_ok" and 
-                   clab_result == "clab_ok" and 
-                   worker_result == "active")
+            return await run_blocking(self._check_services_ready, ip_address)
             
         except Exception:
             return False
     
+    def _check_services_ready(self, ip_address: str) -> bool:
+        """Blocking part of _test_services_ready, run on the executor"""
+        # Check initialization marker
+        result = self.ssh_pool.exec_command(
+            ip_address, 'test -f /tmp/ndt-initialization-complete && echo "ready"', timeout=10
+        ).stdout.strip()
+        
+        if result != "ready":
+            return False
+        
+        # Check Docker
+        docker_result = self.ssh_pool.exec_command(
+            ip_address, 'sudo docker info >/dev/null 2>&1 && echo "docker_ok"', timeout=10
+        ).stdout.strip()
+        
+        # Check containerlab
+        clab_result = self.ssh_pool.exec_command(
+            ip_address, 'which containerlab >/dev/null 2>&1 && echo "clab_ok"', timeout=10
+        ).stdout.strip()
+        
+        # Check NDT worker service
+        worker_result = self.ssh_pool.exec_command(
+            ip_address, 'systemctl is-active ndt-worker 2>/dev/null', timeout=10
+        ).stdout.strip()
+        
+        return (docker_result == "docker_ok" and 
+               clab_result == "clab_ok" and 
+               worker_result == "active")
+    
     async def terminate_instance(self, instance_id: str) -> bool:
         """Terminate an EC2 instance"""
         try:
@@ -776,12 +831,13 @@ echo "NDT worker initialization script completed successfully" | tee -a /var/log
             )
             
             # Terminate instance
-            response = self.ec2_client.terminate_instances(InstanceIds=[instance_id])
+            response = await run_blocking(self.ec2_client.terminate_instances, InstanceIds=[instance_id])
             
             # Wait for termination
             waiter = self.ec2_client.get_waiter('instance_terminated')
-            waiter.wait(InstanceIds=[instance_id])
+            await run_blocking(waiter.wait, InstanceIds=[instance_id], lane=DEPLOY_LANE)
             
+            self.spec_cache.forget_instance(instance_id)
             logger.info(f"Successfully terminated instance {instance_id}")
             return True
             
@@ -789,11 +845,23 @@ echo "NDT worker initialization script completed successfully" | tee -a /var/log
             logger.error(f"Error terminating instance {instance_id}: {e}")
             return False
     
-    async def scale_down_unused_instances(self, min_instances: int = 1) -> List[str]:
-        """Scale down unused instances, keeping minimum number"""
+    async def scale_down_unused_instances(self,
+                                          min_instances: int = 1,
+                                          in_use: Optional[Iterable[str]] = None,
+                                          idle_cpu_percent: float = 10.0,
+                                          idle_window: float = 3600,
+                                          min_samples: int = 10) -> List[str]:
+        """Terminate idle instances, keeping at least min_instances
+        
+        An instance is idle when it hosts no topology partition (in_use, e.g. the
+        instances of the deployments map), ran no containers over idle_window and
+        its p95 CPU stayed under idle_cpu_percent in the metrics history. Instances
+        with fewer than min_samples samples are kept; the least used go first.
+        """
         try:
             # Get all managed instances
-            response = self.ec2_client.describe_instances(
+            response = await run_blocking(
+                self.ec2_client.describe_instances,
                 Filters=[
                     {'Name': 'tag:NDT-Managed', 'Values': ['true']},
                     {'Name': 'instance-state-name', 'Values': ['running']}
@@ -813,16 +881,25 @@ echo "NDT worker initialization script completed successfully" | tee -a /var/log
                 logger.info(f"Already at minimum instance count ({min_instances})")
                 return []
             
-            # Sort by launch time (oldest first) and check utilization
-            instances.sort(key=lambda x: x['launch_time'])
-            
-            candidates_for_termination = []
+            busy = set(in_use or ())
+            usage = await run_blocking(
+                utilization, get_metrics_store(), [instance['id'] for instance in instances], idle_window
+            )
             
+            idle = []
             for instance in instances:
-                # Check if instance has low utilization
-                # This is a placeholder - you'd want to implement actual utilization checking
-                if len(candidates_for_termination) < len(instances) - min_instances:
-                    candidates_for_termination.append(instance['id'])
+                stats = usage.get(instance['id'], {})
+                if instance['id'] in busy or stats.get('samples', 0) < min_samples:
+                    continue
+                if stats['cpu_p95'] is None or stats['cpu_p95'] >= idle_cpu_percent or (stats['containers_max'] or 0) > 0:
+                    continue
+                idle.append((stats['cpu_p95'], instance['launch_time'], instance['id']))
+            
+            # Least used (then oldest) first, never below the minimum
+            idle.sort()
+            candidates_for_termination = [instance_id for _, _, instance_id in idle[:len(instances) - min_instances]]
+            if candidates_for_termination:
+                logger.info(f"Idle instances to terminate: {', '.join(candidates_for_termination)}")
             
             # Terminate candidate instances
             terminated = []
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Instance Specification Cache for NDT
+Batched, disk-persisted cache of EC2 instance-type specs and worker root volume sizes
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from async_executor import run_blocking
+from config_loader import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Root volume size we provision when nothing better is known
+DEFAULT_ROOT_VOLUME_GB = 20
+
+# Used only when describe_instance_types is unreachable and the type was never cached
+FALLBACK_TYPE_SPECS = {
+    't3.micro': {'cpu': 2, 'memory': 1},
+    't3.small': {'cpu': 2, 'memory': 2},
+    't3.medium': {'cpu': 2, 'memory': 4},
+    't3.large': {'cpu': 2, 'memory': 8},
+    't3.xlarge': {'cpu': 4, 'memory': 16},
+    't3.2xlarge': {'cpu': 8, 'memory': 32},
+    'c5.large': {'cpu': 2, 'memory': 4},
+    'c5.xlarge': {'cpu': 4, 'memory': 8},
+    'm5.large': {'cpu': 2, 'memory': 8},
+    'm5.xlarge': {'cpu': 4, 'memory': 16},
+    'r5.large': {'cpu': 2, 'memory': 16},
+    'r5.xlarge': {'cpu': 4, 'memory': 32},
+}
+DEFAULT_TYPE_SPECS = {'cpu': 2, 'memory': 4}
+
+# describe_instance_types and describe_volumes accept at most 100 ids per call
+_BATCH_SIZE = 100
+
+class InstanceSpecCache:
+    """Instance-type specs never change and root volumes rarely do, so fetch each once"""
+
+    def __init__(self, ec2_client, path: Optional[str] = None):
+        self.ec2_client = ec2_client
+        region = ec2_client.meta.region_name or 'default'
+        self.path = path or os.path.join(DATA_DIR, f'instance_specs-{region}.json')
+        self.type_specs: Dict[str, Dict] = {}
+        self.root_volumes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.type_specs = data.get('instance_types', {})
+            self.root_volumes = data.get('root_volumes', {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable instance spec cache {self.path}: {e}")
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'instance_types': self.type_specs, 'root_volumes': self.root_volumes}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Could not persist instance spec cache to {self.path}: {e}")
+
+    def ensure_types(self, instance_types: Iterable[str]):
+        """Fetch specs for every uncached type with batched describe_instance_types calls (blocking)"""
+        with self._lock:
+            missing = sorted({t for t in instance_types if t and t not in self.type_specs})
+            if not missing:
+                return
+
+            fetched = 0
+            for i in range(0, len(missing), _BATCH_SIZE):
+                try:
+                    response = self.ec2_client.describe_instance_types(InstanceTypes=missing[i:i + _BATCH_SIZE])
+                except Exception as e:
+                    logger.error(f"Error describing instance types {missing[i:i + _BATCH_SIZE]}: {e}")
+                    continue
+
+                for info in response.get('InstanceTypes', []):
+                    self.type_specs[info['InstanceType']] = {
+                        'cpu': info['VCpuInfo']['DefaultVCpus'],
+                        'memory': info['MemoryInfo']['SizeInMiB'] / 1024,  # GB
+                    }
+                    fetched += 1
+
+            if fetched:
+                self._save()
+
+    def ensure_root_volumes(self, instances: List[Dict]):
+        """Record the root EBS volume size of each described instance (blocking)"""
+        with self._lock:
+            wanted: Dict[str, str] = {}
+            for instance in instances:
+                instance_id = instance['InstanceId']
+                if instance_id in self.root_volumes:
+                    continue
+                root_device = instance.get('RootDeviceName')
+                for mapping in instance.get('BlockDeviceMappings', []):
+                    if mapping.get('DeviceName') == root_device and 'Ebs' in mapping:
+                        wanted[mapping['Ebs']['VolumeId']] = instance_id
+                        break
+
+            if not wanted:
+                return
+
+            volume_ids = list(wanted)
+            for i in range(0, len(volume_ids), _BATCH_SIZE):
+                try:
+                    response = self.ec2_client.describe_volumes(VolumeIds=volume_ids[i:i + _BATCH_SIZE])
+                except Exception as e:
+                    logger.error(f"Error describing root volumes: {e}")
+                    continue
+
+                for volume in response.get('Volumes', []):
+                    self.root_volumes[wanted[volume['VolumeId']]] = volume['Size']
+
+            self._save()
+
+    def prime_blocking(self, instances: List[Dict], extra_types: Iterable[str] = ()):
+        self.ensure_types([instance['InstanceType'] for instance in instances] + list(extra_types))
+        self.ensure_root_volumes(instances)
+
+    async def prime(self, instances: List[Dict], extra_types: Iterable[str] = ()):
+        """Make sure specs for these instances are cached, off the event loop"""
+        await run_blocking(self.prime_blocking, instances, list(extra_types))
+
+    def get_type_specs(self, instance_type: str) -> Dict:
+        """vCPUs and memory (GB) for an instance type, from cache or the fallback table"""
+        specs = self.type_specs.get(instance_type)
+        if specs is None:
+            specs = FALLBACK_TYPE_SPECS.get(instance_type, DEFAULT_TYPE_SPECS)
+        return dict(specs)
+
+    def specs_for_instance(self, instance: Dict) -> Dict:
+        """cpu / memory / storage for a described instance"""
+        specs = self.get_type_specs(instance['InstanceType'])
+        specs['storage'] = self.root_volumes.get(instance['InstanceId'], DEFAULT_ROOT_VOLUME_GB)
+        return specs
+
+    def forget_instance(self, instance_id: str):
+        """Drop the root volume record of a terminated instance"""
+        with self._lock:
+            if self.root_volumes.pop(instance_id, None) is not None:
+                self._save()
+
+_caches: Dict[str, InstanceSpecCache] = {}
+_caches_lock = threading.Lock()
+
+def get_spec_cache(ec2_client) -> InstanceSpecCache:
+    """Return the process-wide spec cache for the client's region"""
+    region = ec2_client.meta.region_name or 'default'
+    with _caches_lock:
+        if region not in _caches:
+            _caches[region] = InstanceSpecCache(ec2_client)
+        return _caches[region]
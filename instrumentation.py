@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Instrumentation for NDT
+Prometheus metrics for the manager's hot paths and the worker fleet, served at /metrics
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Tuple
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest, multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # prometheus_client is optional; metrics become no-ops
+    Histogram = None
+
+if TYPE_CHECKING:
+    from fleet_telemetry import HostSample
+
+logger = logging.getLogger(__name__)
+
+# Seconds; SSH and AWS calls are short, deploys and pulls can take many minutes
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SLOW_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# uvicorn --workers N runs N processes, each with its own registry. With this set (start.sh
+# does, before any process imports prometheus_client) every process writes its samples to
+# files there and a scrape of any process merges them all.
+MULTIPROCESS_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+class _NullMetric:
+    """Stand-in accepting every metric call when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs) -> '_NullMetric':
+        return self
+
+    def observe(self, value: float):
+        pass
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        yield
+
+def _histogram(name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=FAST_BUCKETS):
+    if Histogram is None:
+        return _NullMetric()
+    return Histogram(name, documentation, labels, buckets=buckets)
+
+# Manager hot paths
+SSH_CONNECT_SECONDS = _histogram('ndt_ssh_connect_seconds', 'Time to open a pooled SSH connection to a worker')
+SSH_COMMAND_SECONDS = _histogram(
+    'ndt_ssh_command_seconds', 'Remote command latency over pooled SSH, including output transfer',
+    buckets=FAST_BUCKETS + SLOW_BUCKETS[4:],
+)
+AWS_CALL_SECONDS = _histogram('ndt_aws_call_seconds', 'boto3 API call latency', ('service', 'operation'))
+PLACEMENT_SECONDS = _histogram('ndt_placement_seconds', 'Time to compute a placement plan (bin packing)')
+TOPOLOGY_YAML_SECONDS = _histogram('ndt_topology_yaml_seconds', 'Time to build and serialize a partial topology')
+CLAB_DEPLOY_SECONDS = _histogram(
+    'ndt_containerlab_deploy_seconds', 'Upload plus containerlab deploy on one worker', ('outcome',),
+    buckets=SLOW_BUCKETS,
+)
+
+# Fleet and job-queue gauges are not kept per process: each scrape builds them from the
+# state all processes share (the published telemetry snapshot and the job records)
+_WORKER_LABELS = ['instance_id', 'instance_type']
+
+def instrument_boto3(client):
+    """Observe the latency of every API call made through a boto3 client"""
+    def before_call(model, context, **kwargs):
+        context['ndt_call'] = (model.service_model.service_name, model.name, time.perf_counter())
+
+    # after-call-error passes no model, so the operation travels in the request context
+    def after_call(context, **kwargs):
+        call = context.pop('ndt_call', None)
+        if call is not None:
+            service, operation, started = call
+            AWS_CALL_SECONDS.labels(service, operation).observe(time.perf_counter() - started)
+
+    client.meta.events.register('before-call', before_call)
+    client.meta.events.register('after-call', after_call)
+    client.meta.events.register('after-call-error', after_call)
+    return client
+
+def snapshot_gauges(samples: Dict[str, 'HostSample'], jobs_by_status: Dict[str, int]) -> List['GaugeMetricFamily']:
+    """Fleet and job-queue gauges for one scrape; terminated workers are simply absent"""
+    cpu = GaugeMetricFamily('ndt_worker_cpu_percent', 'Worker CPU utilization', labels=_WORKER_LABELS)
+    memory = GaugeMetricFamily('ndt_worker_memory_percent', 'Worker memory utilization', labels=_WORKER_LABELS)
+    disk = GaugeMetricFamily('ndt_worker_disk_percent', 'Worker root disk utilization', labels=_WORKER_LABELS)
+    containers = GaugeMetricFamily('ndt_worker_containers', 'Docker containers on a worker',
+                                   labels=_WORKER_LABELS + ['state'])
+    age = GaugeMetricFamily('ndt_worker_sample_age_seconds', 'Age of the latest telemetry sample',
+                            labels=_WORKER_LABELS)
+
+    for instance_id, sample in samples.items():
+        labels = [instance_id, sample.instance_type]
+        age.add_metric(labels, sample.age_seconds())
+        metrics = sample.metrics
+        if metrics is None:
+            continue
+        cpu.add_metric(labels, metrics.cpu_percent)
+        memory.add_metric(labels, metrics.memory_percent)
+        disk.add_metric(labels, metrics.disk_percent)
+        containers.add_metric(labels + ['total'], metrics.docker_containers)
+        containers.add_metric(labels + ['running'], metrics.docker_running)
+
+    return [
+        cpu, memory, disk, containers, age,
+        GaugeMetricFamily('ndt_job_queue_depth', 'Jobs waiting for a job worker', value=jobs_by_status.get('queued', 0)),
+        GaugeMetricFamily('ndt_jobs_running', 'Jobs being run by any API process', value=jobs_by_status.get('running', 0)),
+    ]
+
+class _Collector:
+    """Adapts a function returning metric families to the registry collector interface"""
+
+    def __init__(self, collect: Callable[[], Iterable]):
+        self.collect = collect
+
+def render(samples: Dict[str, 'HostSample'], jobs_by_status: Dict[str, int]) -> Tuple[bytes, str]:
+    """Exposition-format body and content type for /metrics"""
+    if Histogram is None:
+        return b'# prometheus_client is not installed\n', 'text/plain; version=0.0.4; charset=utf-8'
+    registry = CollectorRegistry(auto_describe=False)
+    if MULTIPROCESS_DIR:
+        # Histograms of every API process, including ones that have exited since
+        multiprocess.MultiProcessCollector(registry, path=MULTIPROCESS_DIR)
+    else:
+        registry.register(_Collector(REGISTRY.collect))
+    registry.register(_Collector(lambda: snapshot_gauges(samples, jobs_by_status)))
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead():
+    """Tell the multiprocess collector this process is exiting (call on shutdown)"""
+    if MULTIPROCESS_DIR and Histogram is not None:
+        multiprocess.mark_process_dead(os.getpid(), path=MULTIPROCESS_DIR)
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Deployment Job Queue for NDT Manager
+Bounded worker pool that runs long deployments in the background and records per-phase progress
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set
+
+from state_store import JOBS, Leadership, StateLock, StateStore
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Job and phase states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+PARTIAL = 'partial'
+FAILED = 'failed'
+TERMINAL_STATES = (SUCCEEDED, PARTIAL, FAILED)
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job"""
+
+@dataclass
+class JobPhase:
+    name: str
+    status: str = RUNNING
+    started_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    detail: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        duration = ((self.finished_at or datetime.now()) - self.started_at).total_seconds()
+        return {
+            'name': self.name,
+            'status': self.status,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_seconds': round(duration, 1),
+            'detail': self.detail,
+        }
+
+@dataclass
+class Job:
+    job_id: str
+    kind: str
+    target: str
+    status: str = QUEUED
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    phases: List[JobPhase] = field(default_factory=list)
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    version: int = 0
+    # Process running the job, its last sign of life, and the state lock the job releases when done
+    owner: Optional[str] = None
+    heartbeat_at: Optional[float] = None
+    lock: Optional[Dict[str, str]] = None
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _listener: Optional[Callable[['Job'], None]] = field(default=None, repr=False)
+
+    def touch(self):
+        """Bump the version, wake anyone long-polling this job and publish the change"""
+        self.version += 1
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        if self._listener is not None:
+            self._listener(self)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[JobPhase]:
+        """Record a named phase, also as a span of the current trace; an exception marks it failed and propagates"""
+        phase = JobPhase(name=name)
+        self.phases.append(phase)
+        self.touch()
+        with span(name) as phase_span:
+            try:
+                yield phase
+            except BaseException as e:
+                phase.status = FAILED
+                phase.detail = phase.detail or str(e)
+                raise
+            else:
+                if phase.status == RUNNING:
+                    phase.status = SUCCEEDED
+            finally:
+                phase.finished_at = datetime.now()
+                phase_span.set(phase_status=phase.status, detail=phase.detail)
+                self.touch()
+
+    @property
+    def current_phase(self) -> Optional[str]:
+        running = [phase.name for phase in self.phases if phase.status == RUNNING]
+        return running[-1] if running else None
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'target': self.target,
+            'status': self.status,
+            'current_phase': self.current_phase,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'phases': [phase.to_dict() for phase in self.phases],
+            'result': self.result,
+            'error': self.error,
+            'version': self.version,
+            'owner': self.owner,
+            'heartbeat_at': self.heartbeat_at,
+            'lock': self.lock,
+        }
+
+JobHandler = Callable[[Job], Awaitable[Dict]]
+
+class JobQueue:
+    """FIFO of jobs drained by a fixed number of asyncio workers
+
+    Jobs run in the process that accepted them; their records are mirrored to
+    the state store so every API process can report on them. Each process
+    heartbeats the records of its unfinished jobs; one elected process fails
+    the jobs of processes that stopped heartbeating (a restart or a crash) and
+    breaks the locks they held, so waiters see them end.
+    """
+
+    def __init__(self,
+                 store: StateStore,
+                 max_workers: int = 5,
+                 max_queued: int = 100,
+                 max_history: int = 200,
+                 remote_poll_interval: float = 1.0,
+                 heartbeat_interval: float = 15):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_history = max_history
+        self.remote_poll_interval = remote_poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        # A job whose record has not been heartbeated for this long has no live owner
+        self.orphan_after = heartbeat_interval * 4
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.leadership = Leadership(store, 'job-recovery', ttl=heartbeat_interval * 3)
+        self.jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._handlers: Dict[str, JobHandler] = {}
+        self._workers: List[asyncio.Task] = []
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self._pending_writes: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """Start the worker pool and the heartbeat"""
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_workers)]
+            self._keepalive_task = asyncio.create_task(self._keepalive())
+            logger.info(f"Job queue started with {self.max_workers} workers")
+
+    async def stop(self):
+        """Stop the workers, fail the jobs still queued and flush job records to the store"""
+        tasks = [*self._workers, *([self._keepalive_task] if self._keepalive_task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._keepalive_task = None
+
+        # Running jobs were failed by the cancellation; queued ones never start
+        for job in self.jobs.values():
+            if not job.done:
+                self._handlers.pop(job.job_id, None)
+                job.status = FAILED
+                job.error = 'interrupted: the manager shut down before the job ran'
+                job.finished_at = datetime.now()
+                job.touch()
+                if job.lock is not None:
+                    await self.store.break_lock(job.lock['name'], job.lock['token'])
+        await asyncio.gather(*self._pending_writes, return_exceptions=True)
+        await self.leadership.resign()
+
+    def submit(self, kind: str, target: str, handler: JobHandler, lock: Optional[StateLock] = None) -> Job:
+        """Queue handler(job) and return the job immediately
+
+        lock is a held state lock the handler releases; it is recorded so the
+        lock can be broken if this process dies before the job finishes.
+        """
+        job = Job(job_id=uuid.uuid4().hex[:12], kind=kind, target=target,
+                  owner=self.owner, heartbeat_at=time.time(),
+                  lock={'name': lock.name, 'token': lock.token} if lock is not None and lock.token else None)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self._queue.maxsize} jobs waiting)")
+
+        self._handlers[job.job_id] = handler
+        self.jobs[job.job_id] = job
+        job._listener = self._publish
+        self._publish(job)
+        self._trim_history()
+        logger.info(f"Queued {kind} job {job.job_id} for {target}")
+        return job
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_history)]:
+            del self.jobs[job_id]
+        self._spawn_write(self._trim_store())
+
+    async def _trim_store(self):
+        records = await self.store.all(JOBS)
+        finished = sorted(
+            (record for record in records.values() if record['status'] in TERMINAL_STATES),
+            key=lambda record: record['created_at']
+        )
+        for record in finished[:max(0, len(records) - self.max_history)]:
+            await self.store.delete(JOBS, record['job_id'])
+
+    def _publish(self, job: Job):
+        self._spawn_write(self._write_record(job.to_dict()))
+
+    async def _write_record(self, record: Dict):
+        # Writes can complete out of order; never let an older version overwrite a newer one
+        def newer(current: Optional[Dict]) -> Dict:
+            if current is not None and current.get('version', -1) >= record['version']:
+                return current
+            return record
+        await self.store.update(JOBS, record['job_id'], newer)
+
+    async def _keepalive(self):
+        while True:
+            try:
+                await self._heartbeat()
+                if await self.leadership.check():
+                    await self.recover_orphans()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def _heartbeat(self):
+        """Refresh heartbeat_at on the records of this process's unfinished jobs"""
+        now = time.time()
+
+        # Not a change of the job: the version stays, so long-pollers are not woken
+        def beat(current: Optional[Dict]) -> Optional[Dict]:
+            if current is None or current.get('owner') != self.owner or current['status'] in TERMINAL_STATES:
+                return current
+            return {**current, 'heartbeat_at': now}
+
+        for job in list(self.jobs.values()):
+            if not job.done:
+                job.heartbeat_at = now
+                await self.store.update(JOBS, job.job_id, beat)
+
+    async def recover_orphans(self) -> List[str]:
+        """Fail unfinished jobs whose owner stopped heartbeating and break the locks they held"""
+        cutoff = time.time() - self.orphan_after
+        recovered = []
+        for job_id, record in (await self.store.all(JOBS)).items():
+            if record['status'] in TERMINAL_STATES or record.get('owner') == self.owner:
+                continue
+            interrupted = False
+
+            def interrupt(current: Optional[Dict]) -> Optional[Dict]:
+                nonlocal interrupted
+                # Re-checked atomically: the owner may have heartbeated or finished since the read
+                if (current is None
+                        or current['status'] in TERMINAL_STATES
+                        or (current.get('heartbeat_at') or 0) > cutoff):
+                    return current
+                interrupted = True
+                finished_at = datetime.now().isoformat()
+                return {
+                    **current,
+                    'status': FAILED,
+                    'current_phase': None,
+                    'phases': [
+                        {**phase, 'status': FAILED, 'finished_at': finished_at} if phase['status'] == RUNNING else phase
+                        for phase in current.get('phases', [])
+                    ],
+                    'finished_at': finished_at,
+                    'error': f"interrupted: owning process {current.get('owner') or 'unknown'} stopped",
+                    'version': current.get('version', 0) + 1,
+                }
+
+            await self.store.update(JOBS, job_id, interrupt)
+            if not interrupted:
+                continue
+            if record.get('lock'):
+                await self.store.break_lock(record['lock']['name'], record['lock']['token'])
+            recovered.append(job_id)
+            logger.warning(f"{record['kind']} job {job_id} for {record['target']} was interrupted; marked failed")
+        return recovered
+
+    def _spawn_write(self, coro):
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            coro.close()
+            return
+        self._pending_writes.add(task)
+        task.add_done_callback(self._write_done)
+
+    def _write_done(self, task: asyncio.Task):
+        self._pending_writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to write job record to the state store: {task.exception()}")
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            handler = self._handlers.pop(job.job_id, None)
+            try:
+                if handler is not None:
+                    await self._run(job, handler)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job, handler: JobHandler):
+        job.status = RUNNING
+        job.started_at = datetime.now()
+        job.touch()
+        started = time.monotonic()
+
+        try:
+            job.result = await handler(job)
+            job.status = job.result.get('status', SUCCEEDED) if isinstance(job.result, dict) else SUCCEEDED
+            if job.status not in TERMINAL_STATES:
+                job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            job.status = FAILED
+            job.error = 'cancelled'
+            raise
+        except Exception as e:
+            logger.error(f"{job.kind} job {job.job_id} for {job.target} failed: {e}")
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now()
+            job.touch()
+            logger.info(f"{job.kind} job {job.job_id} finished {job.status} in {time.monotonic() - started:.1f}s")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job owned by this process"""
+        return self.jobs.get(job_id)
+
+    async def get_record(self, job_id: str) -> Optional[Dict]:
+        """A job's record, from this process or any other sharing the store"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return await self.store.get(JOBS, job_id)
+
+    async def list_records(self, status: Optional[str] = None) -> List[Dict]:
+        """Job records from every process, newest first, optionally filtered by status"""
+        records = await self.store.all(JOBS)
+        records.update({job_id: job.to_dict() for job_id, job in self.jobs.items()})
+        ordered = sorted(records.values(), key=lambda record: record['created_at'], reverse=True)
+        return [record for record in ordered if status is None or record['status'] == status]
+
+    async def wait_for_update(self, job_id: str, since_version: int, timeout: float) -> Optional[Dict]:
+        """Long-poll: return once the job moves past since_version, finishes, or timeout expires"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            if job.version <= since_version and not job.done:
+                try:
+                    await asyncio.wait_for(job._changed.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return job.to_dict()
+
+        # Owned by another process: poll the store
+        deadline = time.monotonic() + timeout
+        while True:
+            record = await self.store.get(JOBS, job_id)
+            if (record is None
+                    or record['version'] > since_version
+                    or record['status'] in TERMINAL_STATES
+                    or time.monotonic() >= deadline):
+                return record
+            await asyncio.sleep(min(self.remote_poll_interval, max(0.0, deadline - time.monotonic())))
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            'workers': len(self._workers),
+            'max_workers': self.max_workers,
+            'queue_depth': self._queue.qsize(),
+            'jobs_by_status': counts,
+        }
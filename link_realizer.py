@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Link Realizer for NDT
+Turns links cut by placement into point-to-point VXLAN tunnels between the hosts holding their ends
+"""
+
+import logging
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from config_loader import get_setting
+from state_store import VXLAN_VNIS, StateStore
+from topology_partitioner import link_nodes
+
+logger = logging.getLogger(__name__)
+
+VXLAN_PORT = 4789
+MAX_VNI = 2 ** 24 - 1
+
+# Containerlab endpoints that are not topology nodes; they live wherever the other end does
+PSEUDO_NODES = ('host', 'mgmt-net', 'macvlan')
+
+# One document for the whole fleet: VNIs must be unique on every host, across topologies
+_ALLOCATIONS_KEY = 'allocations'
+
+def link_endpoints(link: Dict) -> Optional[Tuple[Tuple[str, str], Tuple[str, str]]]:
+    """(node, interface) at the two ends of a containerlab link, or None"""
+    if link_nodes(link) is None:
+        return None
+
+    ends = []
+    for endpoint in link['endpoints'][:2]:
+        if isinstance(endpoint, dict):
+            ends.append((endpoint.get('node'), endpoint.get('interface', '')))
+        else:
+            node, _, interface = str(endpoint).partition(':')
+            ends.append((node, interface))
+    return ends[0], ends[1]
+
+def lab_name(topology_name: str, instance_id: str) -> str:
+    """Containerlab lab name of a topology's partition on one host"""
+    return f"{topology_name}-{instance_id[-8:]}"
+
+@dataclass
+class RealizedLink:
+    """Where one topology link ended up, and the tunnel carrying it if it crosses hosts"""
+    link_id: str
+    a_node: str
+    a_interface: str
+    a_host: str
+    b_node: str
+    b_interface: str
+    b_host: str
+    vni: Optional[int] = None
+
+    @property
+    def cross_host(self) -> bool:
+        return self.a_host != self.b_host
+
+@dataclass
+class LinkPlan:
+    """Every link of a distributed topology, mapped to a host or to a VXLAN between two hosts"""
+    topology_name: str
+    links: List[RealizedLink]
+    host_ips: Dict[str, str]
+    udp_port: int = VXLAN_PORT
+    mtu: Optional[int] = None
+    link_type: str = 'vxlan'
+    # Original link definitions by link_id (containerlab options such as mtu or vars are kept)
+    definitions: Dict[str, Dict] = field(default_factory=dict)
+    unplaced: List[Dict] = field(default_factory=list)
+
+    @property
+    def cross_host(self) -> List[RealizedLink]:
+        return [link for link in self.links if link.cross_host]
+
+    def host_pairs(self) -> Dict[Tuple[str, str], int]:
+        """Tunnelled links per host pair; only pairs that share cut links appear"""
+        pairs: Dict[Tuple[str, str], int] = {}
+        for link in self.cross_host:
+            pair = tuple(sorted((link.a_host, link.b_host)))
+            pairs[pair] = pairs.get(pair, 0) + 1
+        return pairs
+
+    def _vxlan_end(self, node: str, interface: str, peer_host: str, vni: int) -> Dict:
+        link = {
+            'type': self.link_type,
+            'endpoint': {'node': node, 'interface': interface},
+            'remote': self.host_ips[peer_host],
+            'vni': vni,
+            'udp-port': self.udp_port,
+        }
+        if self.mtu:
+            link['mtu'] = self.mtu
+        return link
+
+    def links_for(self, instance_id: str) -> List[Dict]:
+        """Containerlab links for one host: its local links plus its end of every tunnel"""
+        links = []
+        for link in self.links:
+            if not link.cross_host:
+                if link.a_host == instance_id:
+                    links.append(self.definitions[link.link_id])
+            elif link.a_host == instance_id:
+                links.append(self._vxlan_end(link.a_node, link.a_interface, link.b_host, link.vni))
+            elif link.b_host == instance_id:
+                links.append(self._vxlan_end(link.b_node, link.b_interface, link.a_host, link.vni))
+        return links
+
+    def mapping(self) -> Dict[str, Dict]:
+        """Per-link realization, for the deployment record and the API"""
+        mapping = {}
+        for link in self.links:
+            entry = asdict(link)
+            entry['realized_as'] = self.link_type if link.cross_host else 'veth'
+            if link.cross_host:
+                entry['a_remote'] = self.host_ips.get(link.b_host)
+                entry['b_remote'] = self.host_ips.get(link.a_host)
+                entry['udp_port'] = self.udp_port
+            mapping[link.link_id] = entry
+        return mapping
+
+    def summary(self) -> Dict:
+        return {
+            'total_links': len(self.links),
+            'tunnelled_links': len(self.cross_host),
+            'host_pairs': [
+                {'hosts': list(pair), 'links': count} for pair, count in sorted(self.host_pairs().items())
+            ],
+            'unplaced_links': len(self.unplaced),
+        }
+
+class LinkRealizer:
+    """Maps a topology's links onto its hosts, giving each cut link its own VXLAN
+
+    VNIs are allocated in the state store, stable per link across redeploys of a
+    topology and unique across topologies (two VXLAN devices on one host cannot
+    share a VNI and UDP port).
+    """
+
+    def __init__(self,
+                 store: StateStore,
+                 vni_base: int = 10000,
+                 udp_port: int = VXLAN_PORT,
+                 mtu: Optional[int] = None,
+                 link_type: str = 'vxlan'):
+        self.store = store
+        self.vni_base = vni_base
+        self.udp_port = udp_port
+        self.mtu = mtu
+        self.link_type = link_type
+
+    @classmethod
+    def from_config(cls, store: StateStore) -> 'LinkRealizer':
+        return cls(
+            store,
+            vni_base=int(get_setting('links.vni_base', 10000)),
+            udp_port=int(get_setting('links.vxlan_udp_port', VXLAN_PORT)),
+            mtu=get_setting('links.vxlan_mtu'),
+            link_type=get_setting('links.vxlan_link_type', 'vxlan'),
+        )
+
+    async def plan(self,
+                   topology_name: str,
+                   links: List[Dict],
+                   distribution: Dict[str, List[str]],
+                   host_ips: Dict[str, str]) -> LinkPlan:
+        """Place every link on a host or a host pair; host_ips are the addresses tunnels use
+
+        Raises ValueError if a cut link touches a host without an address.
+        """
+        host_of = {node: instance_id for instance_id, nodes in distribution.items() for node in nodes}
+        realized: List[RealizedLink] = []
+        definitions: Dict[str, Dict] = {}
+        unplaced: List[Dict] = []
+
+        for link in links:
+            ends = link_endpoints(link)
+            if ends is None:
+                unplaced.append(link)
+                continue
+            (a_node, a_interface), (b_node, b_interface) = ends
+            a_host = host_of.get(a_node) or (host_of.get(b_node) if a_node in PSEUDO_NODES else None)
+            b_host = host_of.get(b_node) or (host_of.get(a_node) if b_node in PSEUDO_NODES else None)
+            if a_host is None or b_host is None:
+                unplaced.append(link)
+                continue
+
+            link_id = f"{a_node}:{a_interface}--{b_node}:{b_interface}"
+            definitions[link_id] = link
+            realized.append(RealizedLink(link_id, a_node, a_interface, a_host, b_node, b_interface, b_host))
+
+        cut = [link for link in realized if link.cross_host]
+        missing = {host for link in cut for host in (link.a_host, link.b_host) if not host_ips.get(host)}
+        if missing:
+            raise ValueError(f"No tunnel address for {', '.join(sorted(missing))}")
+
+        vnis = await self.allocate(topology_name, [link.link_id for link in cut])
+        for link in cut:
+            link.vni = vnis[link.link_id]
+
+        if unplaced:
+            logger.warning(f"{len(unplaced)} links of {topology_name} reference unknown nodes and are not deployed")
+
+        plan = LinkPlan(
+            topology_name=topology_name,
+            links=realized,
+            host_ips=host_ips,
+            udp_port=self.udp_port,
+            mtu=self.mtu,
+            link_type=self.link_type,
+            definitions=definitions,
+            unplaced=unplaced,
+        )
+        logger.info(f"Links of {topology_name}: {len(cut)}/{len(realized)} tunnelled "
+                    f"between {len(plan.host_pairs())} host pairs")
+        return plan
+
+    async def allocate(self, topology_name: str, link_ids: List[str]) -> Dict[str, int]:
+        """VNI per link, keeping the ones this topology already holds"""
+        allocated: Dict[str, int] = {}
+
+        def apply(allocations: Optional[Dict]) -> Optional[Dict]:
+            allocations = dict(allocations or {})
+            held = allocations.get(topology_name, {})
+            used = {vni for name, vnis in allocations.items() if name != topology_name for vni in vnis.values()}
+
+            mine = {link_id: held[link_id] for link_id in link_ids if link_id in held}
+            taken = used | set(mine.values())
+            candidate = self.vni_base
+            for link_id in link_ids:
+                if link_id in mine:
+                    continue
+                while candidate in taken:
+                    candidate += 1
+                if candidate > MAX_VNI:
+                    raise RuntimeError('VXLAN VNI space exhausted')
+                mine[link_id] = candidate
+                taken.add(candidate)
+
+            allocated.clear()
+            allocated.update(mine)
+            if mine:
+                allocations[topology_name] = mine
+            else:
+                allocations.pop(topology_name, None)
+            return allocations or None
+
+        await self.store.update(VXLAN_VNIS, _ALLOCATIONS_KEY, apply)
+        return dict(allocated)
+
+    async def release(self, topology_name: str):
+        """Return a topology's VNIs (the topology was destroyed or never deployed)"""
+        def apply(allocations: Optional[Dict]) -> Optional[Dict]:
+            allocations = dict(allocations or {})
+            allocations.pop(topology_name, None)
+            return allocations or None
+
+        await self.store.update(VXLAN_VNIS, _ALLOCATIONS_KEY, apply)
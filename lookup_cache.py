@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+AWS Lookup Cache for NDT
+TTL memoization with single-flight deduplication for slow-changing AWS lookups
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config_loader import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Keys shared by the manager and the provisioner
+UBUNTU_AMI_KEY = 'ubuntu-noble-ami'
+BAKED_AMI_KEY = 'ndt-baked-worker-ami'
+DEFAULT_VPC_KEY = 'default-vpc-id'
+
+def security_group_key(group_name: str, vpc_id: str) -> str:
+    return f'security-group:{group_name}:{vpc_id}'
+
+class LookupCache:
+    """Memoizes awaitable lookups; concurrent callers for a key share one in-flight call"""
+
+    def __init__(self, default_ttl: float = 3600):
+        self.default_ttl = default_ttl
+        self._values: Dict[str, Tuple[Any, float]] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """Return the cached value for key, calling loader() at most once per expiry"""
+        cached = self._values.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, self.default_ttl if ttl is None else ttl))
+            self._in_flight[key] = task
+
+        # Shield so one cancelled caller does not abort the lookup the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        try:
+            value = await loader()
+            # Failures are not cached: the next caller retries
+            self._values[key] = (value, time.monotonic() + ttl)
+            logger.debug(f"Cached lookup {key} for {ttl}s")
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    def invalidate(self, key: Optional[str] = None):
+        """Forget one key, or every key (e.g. after AWS rejects a cached ID)"""
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
+
+    def stats(self) -> Dict[str, Dict]:
+        now = time.monotonic()
+        return {
+            key: {'value': value, 'expires_in_seconds': round(expires - now, 1)}
+            for key, (value, expires) in self._values.items()
+            if expires > now
+        }
+
+_caches: Dict[str, LookupCache] = {}
+_caches_lock = threading.Lock()
+
+def get_lookup_cache(region: Optional[str]) -> LookupCache:
+    """Return the process-wide lookup cache for a region"""
+    region = region or 'default'
+    with _caches_lock:
+        if region not in _caches:
+            _caches[region] = LookupCache(default_ttl=float(get_setting('aws.lookup_cache_ttl', 3600)))
+        return _caches[region]
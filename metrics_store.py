@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Metrics Store for NDT
+Per-host ring buffers of SystemMetrics in memory-mapped files, downsampled to 1-minute and 1-hour tiers
+"""
+
+import fcntl
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; queries fall back to typed memoryviews
+    np = None
+
+from config_loader import data_path, get_setting
+
+if TYPE_CHECKING:
+    from resource_monitor import SystemMetrics
+
+logger = logging.getLogger(__name__)
+
+# Column order of every record
+METRIC_FIELDS = (
+    'cpu_percent', 'memory_percent', 'memory_used_gb', 'memory_total_gb',
+    'disk_percent', 'disk_used_gb', 'disk_total_gb',
+    'load_1m', 'load_5m', 'load_15m',
+    'process_count', 'network_connections', 'docker_containers', 'docker_running',
+)
+
+# Tier name -> bucket width in seconds (0: every sample kept as is)
+TIERS = {'raw': 0, '1m': 60, '1h': 3600}
+DEFAULT_CAPACITY = {'raw': 4320, '1m': 10080, '1h': 8760}  # ~3 days at 60 s, 7 days, 1 year
+
+STATS = ('avg', 'min', 'max', 'p50', 'p95', 'p99', 'count')
+
+_MAGIC = b'NDTM'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIIIIq')  # magic, version, capacity, fields, head, count
+_HEADER_SIZE = 64
+
+def metrics_values(metrics: 'SystemMetrics') -> List[float]:
+    """A SystemMetrics sample as one value per METRIC_FIELDS column"""
+    load = tuple(metrics.load_average or (0.0, 0.0, 0.0)) + (0.0, 0.0, 0.0)
+    return [
+        metrics.cpu_percent, metrics.memory_percent, metrics.memory_used_gb, metrics.memory_total_gb,
+        metrics.disk_percent, metrics.disk_used_gb, metrics.disk_total_gb,
+        load[0], load[1], load[2],
+        metrics.process_count, metrics.network_connections, metrics.docker_containers, metrics.docker_running,
+    ]
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile of sorted values (numpy's default method)"""
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+class RingFile:
+    """One tier of one host: fixed-width columns in a memory-mapped ring
+
+    Layout after the header: timestamps (float64), sample counts (float32),
+    then a mean and a max column (float32) per metric. A downsampling tier keeps
+    its open bucket in the newest slot and updates it in place, so a restart
+    loses nothing.
+    """
+
+    def __init__(self, path: str, capacity: int, bucket: int, fields: int = len(METRIC_FIELDS)):
+        self.path = path
+        self.bucket = bucket
+        self.fields = fields
+
+        size = _HEADER_SIZE + capacity * (8 + 4 + 2 * fields * 4)
+        exists = os.path.exists(path) and os.path.getsize(path) >= _HEADER_SIZE
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            magic, version, stored_capacity, stored_fields, _, _ = _HEADER.unpack_from(self._file.read(_HEADER.size))
+            if magic != _MAGIC or version != _VERSION or stored_fields != fields:
+                raise ValueError(f"{path} is not a compatible metrics ring")
+            capacity = stored_capacity
+            size = _HEADER_SIZE + capacity * (8 + 4 + 2 * fields * 4)
+        else:
+            self._file.truncate(size)
+            self._file.write(_HEADER.pack(_MAGIC, _VERSION, capacity, fields, 0, 0))
+            self._file.flush()
+
+        self.capacity = capacity
+        # flock does not exclude threads sharing this file object
+        self._append_lock = threading.Lock()
+        self._map = mmap.mmap(self._file.fileno(), size)
+        view = memoryview(self._map)
+        offset = _HEADER_SIZE
+        self._ts = view[offset:offset + capacity * 8].cast('d')
+        offset += capacity * 8
+        self._counts = view[offset:offset + capacity * 4].cast('f')
+        offset += capacity * 4
+        self._means, self._maxes = [], []
+        for column in (self._means, self._maxes):
+            for _ in range(fields):
+                column.append(view[offset:offset + capacity * 4].cast('f'))
+                offset += capacity * 4
+
+    def _header(self) -> Tuple[int, int]:
+        _, _, _, _, head, count = _HEADER.unpack_from(self._map, 0)
+        return head, count
+
+    def _set_header(self, head: int, count: int):
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, self.capacity, self.fields, head, count)
+
+    def append(self, timestamp: float, values: Sequence[float], weight: float = 1):
+        """Add a sample, or fold it into the open bucket of a downsampling tier"""
+        bucket_start = timestamp - timestamp % self.bucket if self.bucket else timestamp
+
+        # Executor threads of this process and other manager processes may write the same host's rings
+        with self._append_lock:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                self._append(bucket_start, values, weight)
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _append(self, bucket_start: float, values: Sequence[float], weight: float):
+        # Header read-modify-write; the caller holds both locks
+        head, count = self._header()
+        last = (head - 1) % self.capacity
+        if self.bucket and count and self._ts[last] == bucket_start:
+            n = self._counts[last]
+            for index, value in enumerate(values):
+                self._means[index][last] = (self._means[index][last] * n + value * weight) / (n + weight)
+                self._maxes[index][last] = max(self._maxes[index][last], value)
+            self._counts[last] = n + weight
+            return
+
+        self._ts[head] = bucket_start
+        self._counts[head] = weight
+        for index, value in enumerate(values):
+            self._means[index][head] = value
+            self._maxes[index][head] = value
+        self._set_header((head + 1) % self.capacity, min(count + 1, self.capacity))
+
+    def covers(self, start: float) -> bool:
+        """Whether the ring still holds everything since start (it has not wrapped past it)"""
+        head, count = self._header()
+        return count < self.capacity or self._ts[head % self.capacity] <= start
+
+    def rows(self, start: float, end: float) -> List[Tuple[float, List[float]]]:
+        """(timestamp, mean of every field) of the slots in [start, end], oldest first"""
+        head, count = self._header()
+        rows = []
+        for offset in range(count):
+            slot = (head - count + offset) % self.capacity
+            if start <= self._ts[slot] <= end:
+                rows.append((self._ts[slot], [column[slot] for column in self._means]))
+        return rows
+
+    def window(self, start: float, end: float, field: int, column: str = 'mean'):
+        """(timestamps, values) of the slots in [start, end], in ring order
+
+        numpy arrays viewing the file when numpy is available, else lists.
+        """
+        _, count = self._header()
+        values = (self._maxes if column == 'max' else self._means)[field]
+        if np is not None:
+            ts = np.frombuffer(self._ts, dtype=np.float64, count=count)
+            selected = (ts >= start) & (ts <= end)
+            return ts[selected], np.frombuffer(values, dtype=np.float32, count=count)[selected]
+
+        timestamps, selected = [], []
+        for slot in range(count):
+            ts = self._ts[slot]
+            if start <= ts <= end:
+                timestamps.append(ts)
+                selected.append(values[slot])
+        return timestamps, selected
+
+    def close(self):
+        self._ts.release()
+        self._counts.release()
+        for view in self._means + self._maxes:
+            view.release()
+        self._map.close()
+        self._file.close()
+
+class MetricsStore:
+    """Fleet metrics history: a raw, 1-minute and 1-hour ring per host"""
+
+    def __init__(self, directory: str, capacities: Optional[Dict[str, int]] = None):
+        self.directory = directory
+        self.capacities = {**DEFAULT_CAPACITY, **(capacities or {})}
+        self._rings: Dict[Tuple[str, str], RingFile] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls) -> 'MetricsStore':
+        return cls(
+            data_path(get_setting('metrics_history.directory', 'metrics')),
+            capacities=get_setting('metrics_history.capacity') or None,
+        )
+
+    def _path(self, instance_id: str, tier: str) -> str:
+        safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', instance_id)
+        return os.path.join(self.directory, f'{safe_id}.{tier}.ring')
+
+    def _ring(self, instance_id: str, tier: str, create: bool = False) -> Optional[RingFile]:
+        """The open ring of a host and tier; None for a host without history unless create"""
+        key = (instance_id, tier)
+        with self._lock:
+            if key not in self._rings:
+                path = self._path(instance_id, tier)
+                # Only recording allocates files: queries name arbitrary hosts
+                if not create and not os.path.exists(path):
+                    return None
+                self._rings[key] = RingFile(path, int(self.capacities[tier]), TIERS[tier])
+            return self._rings[key]
+
+    def hosts(self) -> List[str]:
+        suffix = '.raw.ring'
+        return sorted(name[:-len(suffix)] for name in os.listdir(self.directory) if name.endswith(suffix))
+
+    def has_host(self, instance_id: str) -> bool:
+        return os.path.exists(self._path(instance_id, 'raw'))
+
+    def record(self, instance_id: str, metrics: 'SystemMetrics'):
+        """Store a sample in every tier (blocking)"""
+        timestamp = metrics.timestamp.timestamp() if metrics.timestamp else time.time()
+        values = metrics_values(metrics)
+        for tier in TIERS:
+            self._ring(instance_id, tier, create=True).append(timestamp, values)
+
+    def choose_tier(self, start: float, instance_ids: Iterable[str]) -> str:
+        """Finest tier whose history reaches back to start on every host that has history"""
+        instance_ids = list(instance_ids)
+        for tier in TIERS:
+            rings = [self._ring(instance_id, tier) for instance_id in instance_ids]
+            if all(ring.covers(start) for ring in rings if ring is not None):
+                return tier
+        return '1h'
+
+    def samples(self, instance_id: str, start: float, end: Optional[float] = None,
+                tier: Optional[str] = None) -> List['SystemMetrics']:
+        """One host's history as SystemMetrics (bucket means on downsampled tiers), oldest first"""
+        from resource_monitor import SystemMetrics
+
+        end = end if end is not None else time.time()
+        tier = tier or self.choose_tier(start, [instance_id])
+        ring = self._ring(instance_id, tier)
+        history = []
+        for timestamp, values in (ring.rows(start, end) if ring is not None else []):
+            row = dict(zip(METRIC_FIELDS, values))
+            history.append(SystemMetrics(
+                timestamp=datetime.fromtimestamp(timestamp),
+                cpu_percent=row['cpu_percent'],
+                memory_percent=row['memory_percent'],
+                memory_used_gb=row['memory_used_gb'],
+                memory_total_gb=row['memory_total_gb'],
+                disk_percent=row['disk_percent'],
+                disk_used_gb=row['disk_used_gb'],
+                disk_total_gb=row['disk_total_gb'],
+                load_average=(row['load_1m'], row['load_5m'], row['load_15m']),
+                process_count=round(row['process_count']),
+                network_connections=round(row['network_connections']),
+                docker_containers=round(row['docker_containers']),
+                docker_running=round(row['docker_running']),
+            ))
+        return history
+
+    def query(self,
+              metric: str,
+              start: float,
+              end: Optional[float] = None,
+              instance_ids: Optional[List[str]] = None,
+              stats: Sequence[str] = ('avg', 'p95', 'max'),
+              tier: Optional[str] = None,
+              series: bool = False) -> Dict:
+        """Aggregates of one metric over [start, end], per host and across them
+
+        Downsampled tiers aggregate bucket means, except 'max' which uses the
+        bucket maxima. series=True also returns the (timestamp, value) points.
+        Hosts without history get empty aggregates.
+        """
+        if metric not in METRIC_FIELDS:
+            raise ValueError(f"Unknown metric {metric}; expected one of {', '.join(METRIC_FIELDS)}")
+        unknown = [stat for stat in stats if stat not in STATS]
+        if unknown:
+            raise ValueError(f"Unknown statistics {', '.join(unknown)}; expected {', '.join(STATS)}")
+
+        end = end if end is not None else time.time()
+        instance_ids = instance_ids if instance_ids is not None else self.hosts()
+        tier = tier or self.choose_tier(start, instance_ids)
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier {tier}; expected one of {', '.join(TIERS)}")
+        field = METRIC_FIELDS.index(metric)
+
+        result = {'metric': metric, 'tier': tier, 'start': start, 'end': end, 'hosts': {}}
+        fleet_means, fleet_maxes = [], []
+        for instance_id in instance_ids:
+            ring = self._ring(instance_id, tier)
+            if ring is None:
+                result['hosts'][instance_id] = self._aggregate([], [], stats)
+                if series:
+                    result['hosts'][instance_id]['series'] = []
+                continue
+            timestamps, means = ring.window(start, end, field)
+            _, maxes = ring.window(start, end, field, column='max')
+            entry = self._aggregate(means, maxes, stats)
+            if series:
+                points = sorted(zip(self._as_list(timestamps), self._as_list(means)))
+                entry['series'] = [[round(ts, 3), round(value, 3)] for ts, value in points]
+            result['hosts'][instance_id] = entry
+            fleet_means.append(means)
+            fleet_maxes.append(maxes)
+
+        result['fleet'] = self._aggregate(self._concat(fleet_means), self._concat(fleet_maxes), stats)
+        return result
+
+    @staticmethod
+    def _concat(parts: List):
+        if np is not None and parts:
+            return np.concatenate(parts)
+        return [value for part in parts for value in part]
+
+    @staticmethod
+    def _as_list(values) -> List[float]:
+        return values.tolist() if np is not None else list(values)
+
+    @staticmethod
+    def _aggregate(means, maxes, stats: Sequence[str]) -> Dict[str, Optional[float]]:
+        count = len(means)
+        aggregate: Dict[str, Optional[float]] = {}
+        if not count:
+            return {stat: (0 if stat == 'count' else None) for stat in stats}
+
+        if np is not None:
+            for stat in stats:
+                if stat == 'count':
+                    aggregate[stat] = count
+                elif stat == 'avg':
+                    aggregate[stat] = float(means.mean())
+                elif stat == 'min':
+                    aggregate[stat] = float(means.min())
+                elif stat == 'max':
+                    aggregate[stat] = float(maxes.max())
+                else:
+                    aggregate[stat] = float(np.percentile(means, int(stat[1:])))
+        else:
+            ordered = sorted(means) if any(stat.startswith('p') for stat in stats) else None
+            for stat in stats:
+                if stat == 'count':
+                    aggregate[stat] = count
+                elif stat == 'avg':
+                    aggregate[stat] = sum(means) / count
+                elif stat == 'min':
+                    aggregate[stat] = min(means)
+                elif stat == 'max':
+                    aggregate[stat] = max(maxes)
+                else:
+                    aggregate[stat] = _percentile(ordered, int(stat[1:]))
+
+        return {stat: round(value, 3) if isinstance(value, float) else value for stat, value in aggregate.items()}
+
+    def close(self):
+        with self._lock:
+            for ring in self._rings.values():
+                ring.close()
+            self._rings.clear()
+
+_store: Optional[MetricsStore] = None
+_store_lock = threading.Lock()
+
+def get_metrics_store() -> MetricsStore:
+    """Process-wide metrics store under metrics_history.directory"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetricsStore.from_config()
+        return _store
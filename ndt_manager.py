@@ -9,18 +9,48 @@ import base64
 import json
 import logging
 import os
+import time
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
 
 import boto3
-import paramiko
 import yaml
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
 import uvicorn
 from botocore.exceptions import ClientError
 from deployment_manager import NetworkConnector
+from ssh_pool import close_all_pools, get_ssh_pool
+from async_executor import DEPLOY_LANE, run_blocking
+from resource_monitor import ResourceAlertManager, SSHResourceCollector, SystemMetrics
+from config_loader import get_setting
+from fleet_telemetry import FleetTelemetry, HostSample
+from instance_specs import get_spec_cache
+from lookup_cache import BAKED_AMI_KEY, DEFAULT_VPC_KEY, UBUNTU_AMI_KEY, get_lookup_cache, security_group_key
+from job_queue import PARTIAL, SUCCEEDED, Job, JobQueue, QueueFullError
+from state_store import DEPLOYMENTS, INSTANCES, TRACES, StateLock, get_state_store
+from topology_partitioner import evaluate, link_nodes
+from bin_packer import Bin, BinPacker, PackingPlan, Resources
+from reservations import ReservationLedger
+from warm_pool import STANDBY_TAG, WARMING, WarmPool
+from ami_builder import AMIBuilder
+from image_prefetch import ImagePrefetcher, node_images
+from registry_mirror import RegistryMirror
+from metrics_store import STATS, TIERS, get_metrics_store
+from node_profiles import get_node_profiles
+from instrumentation import (
+    CLAB_DEPLOY_SECONDS,
+    PLACEMENT_SECONDS,
+    TOPOLOGY_YAML_SECONDS,
+    instrument_boto3,
+    mark_process_dead,
+    render,
+)
+from link_realizer import LinkPlan, LinkRealizer, lab_name
+from fabric_benchmark import FabricBenchmark
+from tracing import span, start_span, trace
+from autoscaler import Autoscaler
 
 # Configure logging
 logging.basicConfig(
@@ -77,167 +107,210 @@ class NDTManager:
     """Main NDT Manager class"""
 
     def __init__(self):
-        self.ec2_client = boto3.client("ec2")
+        self.ec2_client = instrument_boto3(boto3.client("ec2"))
         self.ec2_resource = boto3.resource("ec2")
         self.ssh_key_path = os.path.expanduser(os.getenv("SSH_KEY_PATH", "~/.ssh/id_rsa"))
-        self.managed_instances: Dict[str, Dict] = {}
-        self.topology_deployments: Dict[str, Dict] = {}
+        self.ssh_pool = get_ssh_pool(self.ssh_key_path)
+        self.resource_collector = SSHResourceCollector(self.ssh_key_path)
+        self.spec_cache = get_spec_cache(self.ec2_client)
+        self.lookups = get_lookup_cache(self.ec2_client.meta.region_name)
+        self.ami_builder = AMIBuilder(self.ec2_client)
+        # Deployments, launched instances and job records live here so every API process sees them
+        self.state = get_state_store()
+        # None unless registry_mirror is enabled in config.yaml
+        self.registry_mirror = RegistryMirror.from_config()
+        self.prefetcher = ImagePrefetcher(
+            self.ssh_pool,
+            self.state,
+            resolve_host=self._public_ip,
+            inventory_ttl=float(get_setting("prefetch.inventory_ttl", 86400)),
+            mirror=self.registry_mirror,
+        )
+        self.metrics_history = get_metrics_store()
+        # Per-container usage from every poll; placement uses it when placement.learned_profiles is set
+        self.node_profiles = get_node_profiles()
+        self.telemetry = FleetTelemetry(
+            self,
+            interval=float(get_setting("deployment.health_check_interval", 60)),
+            history=self.metrics_history,
+            profiles=self.node_profiles,
+            store=self.state,
+            leader_ttl=float(get_setting("deployment.telemetry_leader_ttl", 30)),
+        )
+        self.job_queue = JobQueue(
+            self.state,
+            max_workers=int(get_setting("deployment.max_concurrent_deployments", 5)),
+            max_queued=int(get_setting("deployment.max_queued_jobs", 100)),
+            heartbeat_interval=float(get_setting("deployment.job_heartbeat_interval", 15)),
+        )
+        # Cut links become per-link VXLAN tunnels; VNIs are allocated fleet-wide in the state store
+        self.link_realizer = LinkRealizer.from_config(self.state)
+        # Capacity promised to topologies that the workers' measured usage may not show yet
+        self.reservations = ReservationLedger(
+            self.state, pending_ttl=float(get_setting("deployment.topology_lock_ttl", 3600))
+        )
 
-        # EC2 instance specifications for different containerlab sizes
-        self.instance_specs = {
+        # EC2 instance specifications for different containerlab sizes (config.yaml instance_types)
+        self.instance_specs = get_setting("instance_types") or {
             "small": {"instance_type": "t3.medium", "cpu": 2, "memory": 4, "storage": 20},
             "medium": {"instance_type": "t3.large", "cpu": 2, "memory": 8, "storage": 50},
             "large": {"instance_type": "t3.xlarge", "cpu": 4, "memory": 16, "storage": 100},
             "xlarge": {"instance_type": "t3.2xlarge", "cpu": 8, "memory": 32, "storage": 200},
         }
+        self.bin_packer = BinPacker.from_config(self.instance_specs)
+        self.warm_pool = WarmPool(
+            self,
+            self.state,
+            sizes=get_setting("warm_pool.sizes"),
+            mode=get_setting("warm_pool.mode", "stopped"),
+            interval=float(get_setting("warm_pool.refill_interval", 60)),
+            demand_window=float(get_setting("warm_pool.demand_window", 1800)),
+            enabled=bool(get_setting("warm_pool.enabled", False)),
+        )
+        # Drains, consolidates and retires workers on measured utilization; keeps headroom for bursts
+        self.autoscaler = Autoscaler.from_config(self, self.state)
 
-    async def poll_ec2_resources(self, instance_ids: Optional[List[str]] = None) -> Dict[str, EC2Resources]:
-        """Poll EC2 instances for their current resource utilization"""
+    async def describe_managed_instances(self, instance_ids: Optional[List[str]] = None) -> List[Dict]:
+        """Describe NDT-managed instances (or the given ones) that are running or starting"""
         try:
             if instance_ids:
-                response = self.ec2_client.describe_instances(InstanceIds=instance_ids)
+                response = await run_blocking(self.ec2_client.describe_instances, InstanceIds=instance_ids)
             else:
-                response = self.ec2_client.describe_instances(
+                response = await run_blocking(
+                    self.ec2_client.describe_instances,
                     Filters=[
                         {"Name": "tag:NDT-Managed", "Values": ["true"]},
                         {"Name": "instance-state-name", "Values": ["running", "pending"]},
-                    ]
+                    ],
                 )
 
-            resources: Dict[str, EC2Resources] = {}
-
-            for reservation in response.get("Reservations", []):
-                for instance in reservation.get("Instances", []):
-                    instance_id = instance["InstanceId"]
-
-                    try:
-                        instance_type = instance["InstanceType"]
-                        public_ip = instance.get("PublicIpAddress")
-                        private_ip = instance.get("PrivateIpAddress")
-
-                        specs = await self._get_instance_type_specs(instance_type)
-                        usage = await self._poll_instance_usage(public_ip or private_ip)
-
-                        resources[instance_id] = EC2Resources(
-                            instance_id=instance_id,
-                            instance_type=instance_type,
-                            cpu_cores=specs["cpu"],
-                            memory_gb=specs["memory"],
-                            storage_gb=specs["storage"],
-                            available_cpu=specs["cpu"] - usage["cpu_used"],
-                            available_memory_gb=specs["memory"] - usage["memory_used_gb"],
-                            available_storage_gb=specs["storage"] - usage["storage_used_gb"],
-                            running_processes=usage["processes"],
-                            region=instance["Placement"]["AvailabilityZone"][:-1],
-                            availability_zone=instance["Placement"]["AvailabilityZone"],
-                            public_ip=public_ip,
-                            private_ip=private_ip,
-                            status=instance["State"]["Name"],
-                        )
-
-                    except Exception as e:
-                        logger.error(f"Error polling instance {instance_id}: {e}")
-                        continue
-
-            return resources
+            instances = [
+                instance
+                for reservation in response.get("Reservations", [])
+                for instance in reservation.get("Instances", [])
+            ]
+            # One batched lookup for any instance types or root volumes not cached yet
+            await self.spec_cache.prime(instances)
+            return instances
 
         except ClientError as e:
             logger.error(f"Error describing instances: {e}")
-            return {}
-
-    async def _get_instance_type_specs(self, instance_type: str) -> Dict:
-        """Get EC2 instance type specifications"""
-        try:
-            response = self.ec2_client.describe_instance_types(InstanceTypes=[instance_type])
-            instance_info = response["InstanceTypes"][0]
-
-            return {
-                "cpu": instance_info["VCpuInfo"]["DefaultVCpus"],
-                "memory": instance_info["MemoryInfo"]["SizeInMiB"] / 1024,  # GB
-                "storage": 20,  # default gp3 volume we provision
-            }
-        except Exception as e:
-            logger.error(f"Error getting instance specs for {instance_type}: {e}")
-            fallback_specs = {
-                "t3.micro": {"cpu": 2, "memory": 1, "storage": 8},
-                "t3.small": {"cpu": 2, "memory": 2, "storage": 20},
-                "t3.medium": {"cpu": 2, "memory": 4, "storage": 20},
-                "t3.large": {"cpu": 2, "memory": 8, "storage": 20},
-                "t3.xlarge": {"cpu": 4, "memory": 16, "storage": 20},
-                "t3.2xlarge": {"cpu": 8, "memory": 32, "storage": 20},
-            }
-            return fallback_specs.get(instance_type, {"cpu": 2, "memory": 4, "storage": 20})
+            return []
 
-    async def _poll_instance_usage(self, ip_address: str) -> Dict:
-        """Poll actual resource usage from an EC2 instance via SSH"""
-        try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            key_path = os.path.expanduser(self.ssh_key_path)
+    async def instance_retired(self, instance_ids: List[str], stopped: bool = False):
+        """Drop what this process keeps per worker for workers about to be terminated (or stopped)
 
-            ssh.connect(hostname=ip_address, username="ubuntu", key_filename=key_path, timeout=30)
+        Every path that removes workers (autoscaler, warm pool, failed launches)
+        calls this right before the EC2 call, while their public addresses are
+        still known: a stopped worker comes back with a new one.
+        """
+        addresses: Dict[str, List[str]] = {}
+        missing = []
+        for instance_id in instance_ids:
+            sample = self.telemetry.snapshot.get(instance_id)
+            if sample is not None:
+                addresses[instance_id] = [sample.resources.public_ip, sample.resources.private_ip]
+            else:
+                missing.append(instance_id)
+        if missing:
+            for instance in await self.describe_managed_instances(missing):
+                addresses[instance["InstanceId"]] = [instance.get("PublicIpAddress"), instance.get("PrivateIpAddress")]
+
+        for instance_id in instance_ids:
+            for address in filter(None, addresses.get(instance_id, [])):
+                await run_blocking(self.ssh_pool.close_host, address)
+                # Counters of a host that comes back (or a new host on its address) start over
+                self.resource_collector.cpu_sampler.forget(address)
+                self.resource_collector.container_sampler.forget(address)
+            if not stopped:
+                # A stopped worker keeps its root volume
+                await run_blocking(self.spec_cache.forget_instance, instance_id)
 
-            # CPU (very rough)
-            stdin, stdout, stderr = ssh.exec_command("top -bn1 | grep 'Cpu(s)' | awk '{print $2}' | sed 's/%us,//'")
-            cpu_used = float(stdout.read().decode().strip() or 0) / 100
+    async def poll_ec2_resources(self, instance_ids: Optional[List[str]] = None) -> Dict[str, EC2Resources]:
+        """Poll EC2 instances for their current resource utilization"""
+        instances = await self.describe_managed_instances(instance_ids)
 
-            # Memory used (GB)
-            stdin, stdout, stderr = ssh.exec_command("free -g | awk 'NR==2{printf \"%.2f\", $3}'")
-            memory_used = float(stdout.read().decode().strip() or 0)
+        # Poll every instance concurrently; the executor bounds the SSH fan-out
+        polled = await asyncio.gather(*[self.poll_instance(instance) for instance in instances])
 
-            # Root FS used (GB)
-            stdin, stdout, stderr = ssh.exec_command("df -BG / | awk 'NR==2{print $3}' | sed 's/G//'")
-            storage_used = float(stdout.read().decode().strip() or 0)
+        return {sample.instance_id: sample.resources for sample in polled if sample is not None}
 
-            # Process count
-            stdin, stdout, stderr = ssh.exec_command("ps aux | wc -l")
-            processes = int(stdout.read().decode().strip() or 0)
+    async def poll_instance(self, instance: Dict) -> Optional[HostSample]:
+        """Probe a single described instance and build its resource view"""
+        instance_id = instance["InstanceId"]
 
-            ssh.close()
+        try:
+            instance_type = instance["InstanceType"]
+            public_ip = instance.get("PublicIpAddress")
+            private_ip = instance.get("PrivateIpAddress")
+
+            specs = self.spec_cache.specs_for_instance(instance)
+            metrics, service_status = await self.resource_collector.collect(public_ip or private_ip)
+            usage = self._usage_from_metrics(metrics)
+
+            resources = EC2Resources(
+                instance_id=instance_id,
+                instance_type=instance_type,
+                cpu_cores=specs["cpu"],
+                memory_gb=specs["memory"],
+                storage_gb=specs["storage"],
+                available_cpu=specs["cpu"] * (1 - usage["cpu_used"]),
+                available_memory_gb=specs["memory"] - usage["memory_used_gb"],
+                available_storage_gb=specs["storage"] - usage["storage_used_gb"],
+                running_processes=usage["processes"],
+                region=instance["Placement"]["AvailabilityZone"][:-1],
+                availability_zone=instance["Placement"]["AvailabilityZone"],
+                public_ip=public_ip,
+                private_ip=private_ip,
+                status=instance["State"]["Name"],
+            )
 
-            return {
-                "cpu_used": cpu_used,
-                "memory_used_gb": memory_used,
-                "storage_used_gb": storage_used,
-                "processes": processes,
-            }
+            return HostSample(
+                instance_id=instance_id,
+                instance_type=instance_type,
+                resources=resources,
+                metrics=metrics,
+                service_status=service_status,
+            )
 
         except Exception as e:
-            logger.error(f"Error polling instance usage for {ip_address}: {e}")
+            logger.error(f"Error polling instance {instance_id}: {e}")
+            return None
+
+    async def _poll_instance_usage(self, ip_address: str) -> Dict:
+        """Poll actual resource usage from an EC2 instance via SSH (one probe round trip)"""
+        metrics = await self.resource_collector.collect_metrics(ip_address)
+        if metrics is None:
+            logger.error(f"Error polling instance usage for {ip_address}")
+        return self._usage_from_metrics(metrics)
+
+    @staticmethod
+    def _usage_from_metrics(metrics: Optional[SystemMetrics]) -> Dict:
+        """Reduce probe metrics to the usage figures placement works with"""
+        if metrics is None:
             return {"cpu_used": 0, "memory_used_gb": 0, "storage_used_gb": 0, "processes": 0}
 
+        return {
+            # Fraction of all vCPUs busy since the previous poll of this host
+            "cpu_used": metrics.cpu_percent / 100,
+            "memory_used_gb": metrics.memory_used_gb,
+            "storage_used_gb": metrics.disk_used_gb,
+            "processes": metrics.process_count,
+        }
+
     def analyze_containerlab_requirements(self, topology: NetworkTopology) -> ContainerlabRequirements:
-        """Analyze containerlab topology to estimate resource requirements"""
+        """Analyze containerlab topology to estimate resource requirements (configured or learned node profiles)"""
         nodes = topology.nodes
         node_count = len(nodes)
 
-        # Base estimates per node (very rough; adjust per kind)
-        cpu_per_node = 0.5
-        memory_per_node = 0.5
-        storage_per_node = 2.0
-
-        total_cpu = 0.0
-        total_memory = 0.0
-        total_storage = 10.0  # base
-
-        for _, node_config in nodes.items():
-            node_kind = node_config.get("kind", "linux")
+        total = Resources()
+        for node_config in nodes.values():
+            total = total + self.bin_packer.node_demand(node_config)
 
-            if node_kind in ["srl", "srlinux"]:
-                cpu_per_node, memory_per_node, storage_per_node = 1.0, 2.0, 5.0
-            elif node_kind in ["ceos", "arista_ceos"]:
-                cpu_per_node, memory_per_node, storage_per_node = 0.5, 1.0, 3.0
-            elif node_kind == "linux":
-                cpu_per_node, memory_per_node, storage_per_node = 0.2, 0.5, 1.0
-
-            total_cpu += cpu_per_node
-            total_memory += memory_per_node
-            total_storage += storage_per_node
-
-        # Overhead
-        total_cpu += 1.0
-        total_memory += 1.0
-        total_storage += 5.0
+        # Base plus overhead
+        total_cpu = total.cpu + 1.0
+        total_memory = total.memory + 1.0
+        total_storage = total.storage + 15.0
 
         estimated_processes = node_count * 5 + 10
 
@@ -250,13 +323,17 @@ class NDTManager:
 
     async def find_suitable_ec2(self, requirements: ContainerlabRequirements) -> Optional[str]:
         """Find an existing EC2 instance that can handle the requirements"""
-        resources = await self.poll_ec2_resources()
+        samples = await self.telemetry.get_snapshot()
+        reserved = await self.reservations.reserved()
 
-        for instance_id, resource in resources.items():
+        for instance_id, sample in samples.items():
+            resource = sample.resources
+            held = reserved.get(instance_id, Resources())
             if (
-                resource.available_cpu >= requirements.cpu_cores
-                and resource.available_memory_gb >= requirements.memory_gb
-                and resource.available_storage_gb >= requirements.storage_gb
+                sample.ssh_accessible
+                and resource.available_cpu - held.cpu >= requirements.cpu_cores
+                and resource.available_memory_gb - held.memory >= requirements.memory_gb
+                and resource.available_storage_gb - held.storage >= requirements.storage_gb
                 and resource.status == "running"
             ):
                 return instance_id
@@ -278,21 +355,137 @@ class NDTManager:
     async def create_ec2_instance(self, requirements: ContainerlabRequirements) -> str:
         """Create a new EC2 instance with the required specifications"""
         size = self.determine_instance_size(requirements)
-        specs = self.instance_specs[size]
+        with span("create_ec2_instance", size=size) as create_span:
+            instance_ids = await self.launch_instances([size])
+            create_span.set(instance_id=instance_ids[0])
+        return instance_ids[0]
+
+    async def launch_instances(
+        self, sizes: List[str], reservation_id: Optional[str] = None, demands: Optional[List[Resources]] = None
+    ) -> List[str]:
+        """Provide one ready worker per requested size and wait for all of them
+
+        Standby workers are claimed from the warm pool first; the rest are launched,
+        batched per instance type. Returns instance IDs in the same order as sizes.
+        With reservation_id, demands[i] is reserved on the i-th instance as soon as it
+        exists, before it can show up as free capacity to another planner.
+        """
+        with span("warm-pool-claim", requested=len(sizes)) as claim_span:
+            claimed = await self.warm_pool.claim_many(sizes)
+            claim_span.set(claimed=len(claimed))
+
+        groups: Dict[str, List[int]] = {}
+        for index, size in enumerate(sizes):
+            if index not in claimed:
+                groups.setdefault(size, []).append(index)
 
         try:
-            # Get the latest Ubuntu 24.04 LTS AMI
-            ami_id = await self._get_ubuntu_ami()
+            results = []
+            if groups:
+                # Memoized, so concurrent launches share one lookup each
+                with span("ami-and-security-group") as lookup_span:
+                    ami_id = await self._get_ubuntu_ami()
+                    security_group_id = await self._get_worker_security_group()
+                    lookup_span.set(ami_id=ami_id)
+
+                results = await asyncio.gather(
+                    *[
+                        self._run_instances(size, len(indexes), ami_id, security_group_id)
+                        for size, indexes in groups.items()
+                    ],
+                    return_exceptions=True,
+                )
+
+            failures = [result for result in results if isinstance(result, Exception)]
+            if failures:
+                # Do not leave half a fleet running for a placement that cannot complete
+                orphans = [iid for result in results if not isinstance(result, Exception) for iid in result]
+                orphans.extend(claimed.values())
+                if orphans:
+                    logger.warning(f"Terminating {len(orphans)} instances from a partially failed launch")
+                    await self.instance_retired(orphans)
+                    await run_blocking(self.ec2_client.terminate_instances, InstanceIds=orphans)
+                raise failures[0]
+
+            instance_ids: List[str] = [""] * len(sizes)
+            for index, instance_id in claimed.items():
+                instance_ids[index] = instance_id
+            for (size, indexes), launched in zip(groups.items(), results):
+                for index, instance_id in zip(indexes, launched):
+                    instance_ids[index] = instance_id
+
+            for size, instance_id in zip(sizes, instance_ids):
+                await self.state.put(
+                    INSTANCES,
+                    instance_id,
+                    {
+                        "instance_id": instance_id,
+                        "size": size,
+                        "instance_type": self.instance_specs[size]["instance_type"],
+                        "launched_at": datetime.now().isoformat(),
+                        "from_warm_pool": instance_id in claimed.values(),
+                    },
+                )
+
+            if reservation_id is not None and demands:
+                for instance_id, demand in zip(instance_ids, demands):
+                    await self.reservations.reserve(reservation_id, instance_id, demand)
 
-            # Create the instance
-            user_data_b64 = base64.b64encode(self._get_user_data_script().encode()).decode()
-            response = self.ec2_client.run_instances(
+            # Claimed workers are already bootstrapped: skip the EC2 status checks
+            with span("wait-ready", instances=len(instance_ids)):
+                await asyncio.gather(
+                    self._wait_for_instances_ready([iid for iid in instance_ids if iid not in claimed.values()]),
+                    self._wait_for_instances_ready(list(claimed.values()), status_checks=False),
+                )
+            return instance_ids
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("InvalidAMIID.NotFound", "InvalidGroup.NotFound", "InvalidVpcID.NotFound"):
+                # A memoized ID went away underneath us; look it up again next time
+                self.lookups.invalidate()
+            logger.error(f"Error creating EC2 instance: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to create EC2 instance: {e}")
+
+    async def _run_instances(
+        self, size: str, count: int, ami_id: str, security_group_id: str, standby_mode: Optional[str] = None
+    ) -> List[str]:
+        """One run_instances call for `count` workers of the same size (all or nothing)
+
+        With standby_mode the workers are tagged as warm-pool standbys instead of
+        managed workers, and are launched hibernation-capable for mode 'hibernated'.
+        """
+        specs = self.instance_specs[size]
+        baked = ami_id == await self._get_baked_ami()
+        user_data_b64 = base64.b64encode(self._get_user_data_script(baked=baked).encode()).decode()
+
+        if standby_mode is None:
+            tags = [
+                {"Key": "Name", "Value": f"ndt-worker-{datetime.now().strftime('%Y%m%d-%H%M%S')}"},
+                {"Key": "NDT-Managed", "Value": "true"},
+                {"Key": "NDT-Role", "Value": "worker"},
+                {"Key": "CreatedBy", "Value": "ndt-manager"},
+            ]
+        else:
+            tags = [
+                {"Key": "Name", "Value": f"ndt-standby-{datetime.now().strftime('%Y%m%d-%H%M%S')}"},
+                {"Key": "NDT-Managed", "Value": STANDBY_TAG},
+                {"Key": "NDT-Role", "Value": "worker"},
+                {"Key": "NDT-Pool-Size", "Value": size},
+                {"Key": "NDT-Pool-State", "Value": WARMING},
+                {"Key": "CreatedBy", "Value": "ndt-manager"},
+            ]
+        hibernate = standby_mode == "hibernated"
+        extra = {"HibernationOptions": {"Configured": True}} if hibernate else {}
+
+        with span("run_instances", instance_type=specs["instance_type"], count=count) as run_span:
+            response = await run_blocking(
+                self.ec2_client.run_instances,
                 ImageId=ami_id,
-                MinCount=1,
-                MaxCount=1,
+                MinCount=count,
+                MaxCount=count,
                 InstanceType=specs["instance_type"],
                 KeyName=os.getenv("AWS_KEY_PAIR_NAME", "default-key"),
-                SecurityGroupIds=[self._get_or_create_security_group()],
+                SecurityGroupIds=[security_group_id],
                 IamInstanceProfile={"Name": "ec2-admin-root"},
                 BlockDeviceMappings=[
                     {
@@ -301,75 +494,44 @@ class NDTManager:
                             "VolumeSize": specs["storage"],
                             "VolumeType": "gp3",
                             "DeleteOnTermination": True,
+                            # Hibernation writes RAM to the root volume, which must then be encrypted
+                            **({"Encrypted": True} if hibernate else {}),
                         },
                     }
                 ],
-                TagSpecifications=[
-                    {
-                        "ResourceType": "instance",
-                        "Tags": [
-                            {"Key": "Name", "Value": f"ndt-worker-{datetime.now().strftime('%Y%m%d-%H%M%S')}"},
-                            {"Key": "NDT-Managed", "Value": "true"},
-                            {"Key": "NDT-Role", "Value": "worker"},
-                            {"Key": "CreatedBy", "Value": "ndt-manager"},
-                        ],
-                    }
-                ],
+                TagSpecifications=[{"ResourceType": "instance", "Tags": tags}],
                 UserData=user_data_b64,
+                **extra,
             )
+            instance_ids = [instance["InstanceId"] for instance in response["Instances"]]
+            run_span.set(instance_ids=instance_ids)
 
-            instance_id = response["Instances"][0]["InstanceId"]
-            logger.info(f"Created EC2 instance {instance_id}")
-
-            # Wait for instance to be running and status checks OK
-            waiter = self.ec2_client.get_waiter("instance_running")
-            waiter.wait(InstanceIds=[instance_id])
-            waiter_ok = self.ec2_client.get_waiter("instance_status_ok")
-            waiter_ok.wait(InstanceIds=[instance_id])
-
-            # Wait for SSH to be available and configure the instance
-            await self._wait_for_ssh_and_configure(instance_id)
-
-            return instance_id
-
-        except ClientError as e:
-            logger.error(f"Error creating EC2 instance: {e}")
-            raise HTTPException(status_code=500, detail=f"Failed to create EC2 instance: {e}")
+        logger.info(f"Created {count} x {specs['instance_type']} EC2 instances: {', '.join(instance_ids)}")
+        return instance_ids
 
     async def _get_ubuntu_ami(self) -> str:
-        """Get the latest Ubuntu 24.04 LTS AMI ID"""
+        """Worker AMI: the newest baked NDT image if there is one, else the latest Ubuntu 24.04 LTS"""
+        return await self._get_baked_ami() or await self._get_stock_ubuntu_ami()
+
+    async def _get_baked_ami(self) -> Optional[str]:
+        """Newest baked NDT worker AMI, or None (memoized for ami.lookup_ttl)"""
+        if not get_setting("ami.prefer_baked", True):
+            return None
         try:
-            response = self.ec2_client.describe_images(
-                Filters=[
-                    {"Name": "name", "Values": ["ubuntu/images/hvm-ssd/ubuntu-noble-24.04-amd64-server-*"]},
-                    {"Name": "state", "Values": ["available"]},
-                    {"Name": "architecture", "Values": ["x86_64"]},
-                ],
-                Owners=["099720109477"],  # Canonical
+            return await self.lookups.get(
+                BAKED_AMI_KEY, self.ami_builder.find_latest, ttl=float(get_setting("ami.lookup_ttl", 600))
             )
+        except Exception as e:
+            logger.error(f"Error looking up baked worker AMI: {e}")
+            return None
 
-            if not response.get("Images"):
-                logger.error("No Ubuntu 24.04 AMIs found")
-                # Fallbacks by region
-                region_amis = {
-                    "us-east-1": "ami-0c7217cdde317cfec",
-                    "us-west-2": "ami-017fecd1353bcc96e",
-                    "eu-central-1": "ami-02003f9f0fde924ea",
-                    "eu-west-1": "ami-0c1c30571d2dae5c9",
-                    "ap-southeast-1": "ami-047126e50991d067b",
-                }
-                current_region = self.ec2_client.meta.region_name
-                fallback_ami = region_amis.get(current_region, region_amis["us-east-1"])
-                logger.warning(f"Using fallback AMI {fallback_ami} for region {current_region}")
-                return fallback_ami
-
-            images = sorted(response["Images"], key=lambda x: x["CreationDate"], reverse=True)
-            ami_id = images[0]["ImageId"]
-            logger.info(f"Selected Ubuntu AMI: {ami_id}")
-            return ami_id
-
+    async def _get_stock_ubuntu_ami(self) -> str:
+        """Get the latest Ubuntu 24.04 LTS AMI ID (memoized)"""
+        try:
+            return await self.lookups.get(UBUNTU_AMI_KEY, self._lookup_ubuntu_ami)
         except Exception as e:
             logger.error(f"Error getting Ubuntu AMI: {e}")
+            # Fallbacks by region
             region_amis = {
                 "us-east-1": "ami-0c7217cdde317cfec",
                 "us-west-2": "ami-017fecd1353bcc96e",
@@ -382,7 +544,33 @@ class NDTManager:
             logger.warning(f"Using fallback AMI {fallback_ami} for region {current_region}")
             return fallback_ami
 
-    def _get_or_create_security_group(self) -> str:
+    async def _lookup_ubuntu_ami(self) -> str:
+        response = await run_blocking(
+            self.ec2_client.describe_images,
+            Filters=[
+                {"Name": "name", "Values": ["ubuntu/images/hvm-ssd/ubuntu-noble-24.04-amd64-server-*"]},
+                {"Name": "state", "Values": ["available"]},
+                {"Name": "architecture", "Values": ["x86_64"]},
+            ],
+            Owners=["099720109477"],  # Canonical
+        )
+
+        if not response.get("Images"):
+            raise LookupError("No Ubuntu 24.04 AMIs found")
+
+        image = max(response["Images"], key=lambda x: x["CreationDate"])
+        logger.info(f"Selected Ubuntu AMI: {image['ImageId']}")
+        return image["ImageId"]
+
+    async def _get_worker_security_group(self) -> str:
+        """ID of ndt-worker-sg in the default VPC, created on first use (memoized)"""
+        vpc_id = await self.lookups.get(DEFAULT_VPC_KEY, lambda: run_blocking(self._get_default_vpc_id))
+        return await self.lookups.get(
+            security_group_key("ndt-worker-sg", vpc_id),
+            lambda: run_blocking(self._get_or_create_security_group, vpc_id),
+        )
+
+    def _get_or_create_security_group(self, vpc_id: Optional[str] = None) -> str:
         """Get or create the security group used by NDT worker EC2 instances.
 
         Rules:
@@ -390,15 +578,14 @@ class NDTManager:
           - Ingress:
               * SSH 22/tcp from SSH_CIDR (default 0.0.0.0/0)
               * ICMP from SSH_CIDR
-              * VXLAN 4789/udp from this SG (self-reference)
-              * GRE (protocol 47) from this SG (self-reference)
+              * VXLAN 4789/udp from this SG (self-reference), one tunnel per cross-host link
               * (optional) gRPC/gNMI 50051–50100/tcp from SSH_CIDR
         """
         from botocore.exceptions import ClientError
 
         sg_name = "ndt-worker-sg"
         ssh_cidr = os.getenv("SSH_CIDR", "0.0.0.0/0")
-        vpc_id = self._get_default_vpc_id()
+        vpc_id = vpc_id or self._get_default_vpc_id()
 
         try:
             # Find existing SG by name within the same VPC
@@ -460,11 +647,11 @@ class NDTManager:
                     if e.response["Error"]["Code"] != "InvalidPermission.Duplicate":
                         raise
 
-            # Self-referencing rules for VXLAN & GRE
+            # Self-referencing rule for the VXLAN tunnels between workers
             self_ref = [{"GroupId": sg_id}]
+            vxlan_port = int(get_setting("links.vxlan_udp_port", 4789))
             tunnel_perms = [
-                {"IpProtocol": "udp", "FromPort": 4789, "ToPort": 4789, "UserIdGroupPairs": self_ref},
-                {"IpProtocol": "47", "FromPort": -1, "ToPort": -1, "UserIdGroupPairs": self_ref},
+                {"IpProtocol": "udp", "FromPort": vxlan_port, "ToPort": vxlan_port, "UserIdGroupPairs": self_ref},
             ]
             try:
                 self.ec2_client.authorize_security_group_ingress(GroupId=sg_id, IpPermissions=tunnel_perms)
@@ -488,8 +675,25 @@ class NDTManager:
             logger.error(f"Error getting default VPC: {e}")
             raise
 
-    def _get_user_data_script(self) -> str:
-        return r"""#!/bin/bash
+    def _get_user_data_script(self, baked: bool = False) -> str:
+        if baked:
+            # Packages, Docker, containerlab, kernel modules and sysctls are in the image
+            script = r"""#!/bin/bash
+set -euxo pipefail
+exec > >(tee -a /var/log/ndt-bootstrap.log) 2>&1
+
+systemctl start docker
+timeout 180 bash -c 'until docker info >/dev/null 2>&1; do sleep 3; done'
+
+if [ -n "${GHCR_USER:-}" ] && [ -n "${GHCR_TOKEN:-}" ]; then
+  echo "${GHCR_TOKEN}" | docker login ghcr.io -u "${GHCR_USER}" --password-stdin || true
+fi
+
+mkdir -p /opt/ndt/topos /opt/ndt/logs /opt/ndt/configs
+chown -R ubuntu:ubuntu /opt/ndt
+"""
+        else:
+            script = r"""#!/bin/bash
 set -euxo pipefail
 exec > >(tee -a /var/log/ndt-bootstrap.log) 2>&1
 
@@ -531,275 +735,1000 @@ printf '%s\n' 'net.ipv4.ip_forward=1' 'net.ipv6.conf.all.forwarding=1' >> /etc/s
 # Workspace
 mkdir -p /opt/ndt/topos /opt/ndt/logs /opt/ndt/configs
 chown -R ubuntu:ubuntu /opt/ndt
+"""
 
+        if self.registry_mirror is not None:
+            script += self.registry_mirror.bootstrap_script()
+
+        return script + """
 # Mark success for readiness checks
 touch /var/local/ndt_bootstrap_success
 """
 
-    async def _wait_for_ssh_and_configure(self, instance_id: str):
-        """Wait for SSH to be available and perform additional configuration"""
-        try:
-            response = self.ec2_client.describe_instances(InstanceIds=[instance_id])
-            instance = response["Reservations"][0]["Instances"][0]
-            public_ip = instance.get("PublicIpAddress")
+    async def _wait_for_instances_ready(self, instance_ids: List[str], status_checks: bool = True) -> List[str]:
+        """Wait for a batch of new instances to run, pass status checks and finish bootstrapping
 
-            if not public_ip:
-                logger.warning(f"No public IP for instance {instance_id}")
-                return
+        Returns the instances that became ready. Restarted standbys skip the status
+        checks: their bootstrap marker already exists, so SSH answering is enough.
+        """
+        if not instance_ids:
+            return []
 
+        ready_ids: List[str] = []
+        try:
+            # One waiter per stage covers the whole batch (off the event loop)
+            with span("instance_running", instances=len(instance_ids)):
+                waiter = self.ec2_client.get_waiter("instance_running")
+                await run_blocking(waiter.wait, InstanceIds=instance_ids, lane=DEPLOY_LANE)
+            if status_checks:
+                with span("instance_status_ok", instances=len(instance_ids)):
+                    waiter_ok = self.ec2_client.get_waiter("instance_status_ok")
+                    await run_blocking(waiter_ok.wait, InstanceIds=instance_ids, lane=DEPLOY_LANE)
+
+            instances = await self.describe_managed_instances(instance_ids)
+            pending: Dict[str, str] = {}
+            for instance in instances:
+                public_ip = instance.get("PublicIpAddress")
+                if public_ip:
+                    pending[instance["InstanceId"]] = public_ip
+                else:
+                    logger.warning(f"No public IP for instance {instance['InstanceId']}")
+
+            # Single polling loop for every instance still bootstrapping, one span per instance
+            bootstrap_spans = {instance_id: start_span("bootstrap", instance_id=instance_id) for instance_id in pending}
             max_attempts = 30
-            for attempt in range(max_attempts):
-                try:
-                    ssh = paramiko.SSHClient()
-                    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            try:
+                for attempt in range(max_attempts):
+                    ready = await asyncio.gather(
+                        *[self._check_bootstrap_ready(instance_id, ip, attempt) for instance_id, ip in pending.items()]
+                    )
+                    for instance_id, is_ready in zip(list(pending), ready):
+                        if is_ready:
+                            logger.info(f"Instance {instance_id} is ready")
+                            bootstrap_spans[instance_id].set(ssh_attempts=attempt + 1)
+                            bootstrap_spans[instance_id].finish()
+                            ready_ids.append(instance_id)
+                            del pending[instance_id]
+
+                    if not pending:
+                        break
+                    await asyncio.sleep(10)
+                else:
+                    logger.error(f"Instances {', '.join(pending)} did not become ready within timeout")
+                    for instance_id in pending:
+                        bootstrap_spans[instance_id].finish("bootstrap did not finish within timeout")
+            finally:
+                # Interrupted (error or cancellation): the stored trace must not show them running
+                for instance_id in pending:
+                    if bootstrap_spans[instance_id].ended is None:
+                        bootstrap_spans[instance_id].finish("bootstrap check interrupted")
 
-                    key_path = os.path.expanduser(self.ssh_key_path)
-                    ssh.connect(hostname=public_ip, username="ubuntu", key_filename=key_path, timeout=10)
+        except Exception as e:
+            logger.error(f"Error configuring instances {', '.join(instance_ids)}: {e}")
 
-                    # Check readiness file created by user-data
-                    stdin, stdout, stderr = ssh.exec_command(
-                        'test -f /var/local/ndt_bootstrap_success && echo "ready"'
-                    )
-                    result = stdout.read().decode().strip()
+        return ready_ids
 
-                    if result == "ready":
-                        logger.info(f"Instance {instance_id} is ready")
-                        ssh.close()
-                        break
+    async def _check_bootstrap_ready(self, instance_id: str, public_ip: str, attempt: int) -> bool:
+        try:
+            # Check readiness file created by user-data
+            result = await run_blocking(
+                self.ssh_pool.exec_command,
+                public_ip,
+                'test -f /var/local/ndt_bootstrap_success && echo "ready"',
+                timeout=10,
+            )
+            return result.stdout.strip() == "ready"
+        except Exception as e:
+            logger.debug(f"SSH attempt {attempt + 1} failed for {instance_id}: {e}")
+            return False
 
-                    ssh.close()
+    @staticmethod
+    def partition_report(topology: NetworkTopology, distribution: Dict[str, List[str]]) -> Dict:
+        """Cut size and balance of the final per-host distribution"""
+        return evaluate(list(distribution.values()), topology.nodes, topology.links).summary()
 
-                except Exception as e:
-                    logger.debug(f"SSH attempt {attempt + 1} failed for {instance_id}: {e}")
+    async def acquire_placement_lock(self) -> StateLock:
+        """Take the fleet-wide placement lock: one planner (or retiring autoscaler) at a time
 
-                await asyncio.sleep(10)
+        Reading free capacity and reserving it must not interleave with another
+        planner, nor with a worker being retired. The caller releases the lock.
+        """
+        lock = self.state.lock("placement", ttl=float(get_setting("placement.lock_ttl", 300)))
+        if not await lock.acquire(timeout=float(get_setting("placement.lock_timeout", 120))):
+            raise RuntimeError("Timed out waiting for the fleet placement lock")
+        return lock
+
+    async def distribute_topology(
+        self, topology: NetworkTopology, on_assigned: Optional[Callable[[str, List[str]], None]] = None
+    ) -> Dict[str, List[str]]:
+        """Distribute topology across multiple EC2 instances, reserving the capacity it takes
+
+        on_assigned(instance_id, nodes) is called as soon as a worker's partition is
+        final: right after planning for running workers, after launch for new ones.
+        """
+        with span("placement-lock"):
+            placement_lock = await self.acquire_placement_lock()
+
+        try:
+            for attempt in range(3):
+                with span("plan", attempt=attempt + 1) as plan_span:
+                    plan, fits = await self.plan_placement(topology)
+                    rejected = await self.reservations.reserve_all(
+                        topology.name,
+                        {
+                            instance_id: self._nodes_demand(topology, nodes)
+                            for instance_id, nodes in plan.existing.items()
+                        },
+                        fits,
+                    )
+                    plan_span.set(existing=len(plan.existing), new=len(plan.new_instances), rejected=rejected)
+                if not rejected:
+                    break
+                logger.warning(f"Capacity on {rejected[0]} was taken while planning {topology.name}; replanning")
             else:
-                logger.error(f"Instance {instance_id} did not become ready within timeout")
+                # Fall back to dedicated workers rather than oversubscribing a shared one
+                with PLACEMENT_SECONDS.time():
+                    plan = self.bin_packer.pack(topology.nodes, topology.links, [])
+        finally:
+            # Held only while reading and reserving free capacity: new workers get their
+            # reservations from launch_instances before any planner can see them
+            await placement_lock.release()
+
+        placement = {instance_id: list(nodes) for instance_id, nodes in plan.existing.items()}
+        if on_assigned is not None:
+            for instance_id, nodes in placement.items():
+                on_assigned(instance_id, nodes)
+        if plan.new_instances:
+            # Launch all missing capacity at once instead of one worker per chunk
+            with span("launch", instances=len(plan.new_instances)):
+                launched = await self.launch_instances(
+                    [size for size, _ in plan.new_instances],
+                    reservation_id=topology.name,
+                    demands=[self._nodes_demand(topology, nodes) for _, nodes in plan.new_instances],
+                )
+            for instance_id, (_, nodes) in zip(launched, plan.new_instances):
+                placement.setdefault(instance_id, []).extend(nodes)
+                if on_assigned is not None:
+                    on_assigned(instance_id, nodes)
 
-        except Exception as e:
-            logger.error(f"Error configuring instance {instance_id}: {e}")
-
-    async def distribute_topology(self, topology: NetworkTopology) -> Dict[str, List[str]]:
-        """Distribute topology across multiple EC2 instances"""
-        requirements = self.analyze_containerlab_requirements(topology)
-        node_count = len(topology.nodes)
-
-        if node_count <= 5:
-            instance_id = await self.find_suitable_ec2(requirements)
-            if not instance_id:
-                instance_id = await self.create_ec2_instance(requirements)
-            return {instance_id: list(topology.nodes.keys())}
-
-        # Larger topology: simple chunking by node count
-        nodes_per_instance = 5
-        node_list = list(topology.nodes.keys())
-        distribution: Dict[str, List[str]] = {}
-
-        for i in range(0, len(node_list), nodes_per_instance):
-            batch_nodes = node_list[i : i + nodes_per_instance]
-            batch_requirements = ContainerlabRequirements(
-                cpu_cores=max(2, len(batch_nodes)),
-                memory_gb=max(4, len(batch_nodes) * 1.5),
-                storage_gb=max(20, len(batch_nodes) * 3),
-                estimated_processes=len(batch_nodes) * 5,
+        return placement
+
+    def _nodes_demand(self, topology: NetworkTopology, nodes: List[str]) -> Resources:
+        return sum((self.bin_packer.node_demand(topology.nodes.get(node) or {}) for node in nodes), Resources())
+
+    async def plan_placement(
+        self, topology: NetworkTopology
+    ) -> Tuple[PackingPlan, Dict[str, Callable[[Resources], bool]]]:
+        """Bin-pack the topology onto free capacity from one fleet snapshot, then onto new workers
+
+        Also returns, per existing worker, the capacity check to re-run when reserving.
+        """
+        samples = await self.telemetry.get_snapshot()
+        reserved = await self.reservations.reserved()
+        # Workers the autoscaler is draining take no new partitions
+        draining = await self.autoscaler.draining()
+        samples = {instance_id: sample for instance_id, sample in samples.items() if instance_id not in draining}
+        bins, fits = self._existing_bins(samples, reserved)
+        with PLACEMENT_SECONDS.time():
+            plan = self.bin_packer.pack(topology.nodes, topology.links, bins)
+        return plan, fits
+
+    def _existing_bins(
+        self, samples: Dict[str, HostSample], reserved: Dict[str, Resources]
+    ) -> Tuple[List[Bin], Dict[str, Callable[[Resources], bool]]]:
+        """Free capacity of each reachable worker, kept under the configured utilization thresholds
+
+        Used capacity is the larger of what the worker measures and what is reserved on
+        it (plus the host overhead): reservations cover containers still starting, while
+        measurement covers anything running outside the ledger. The returned checks
+        apply the same rule to a worker's total reservations inside the ledger update.
+        """
+        bins = []
+        checks: Dict[str, Callable[[Resources], bool]] = {}
+        for instance_id, sample in samples.items():
+            resource = sample.resources
+            if not sample.ssh_accessible or resource.status != "running":
+                continue
+
+            limit = self.bin_packer.limit(Resources(
+                cpu=resource.cpu_cores,
+                memory=resource.memory_gb,
+                storage=resource.storage_gb,
+                containers=self.bin_packer.max_nodes_for_type(resource.instance_type),
+            ))
+            measured = Resources(
+                cpu=resource.cpu_cores - resource.available_cpu,
+                memory=resource.memory_gb - resource.available_memory_gb,
+                storage=resource.storage_gb - resource.available_storage_gb,
+                containers=sample.metrics.docker_containers if sample.metrics else 0,
             )
 
-            instance_id = await self.find_suitable_ec2(batch_requirements)
-            if not instance_id:
-                instance_id = await self.create_ec2_instance(batch_requirements)
+            def committed(reservations: Resources, measured: Resources = measured) -> Resources:
+                return measured.maximum(self.bin_packer.host_overhead + reservations)
+
+            def fits(reservations: Resources, limit: Resources = limit, committed=committed) -> bool:
+                return committed(reservations).fits_in(limit)
+
+            checks[instance_id] = fits
+            free = limit - committed(reserved.get(instance_id, Resources()))
+            bins.append(Bin(bin_id=instance_id, capacity=free, existing=True))
 
-            distribution[instance_id] = batch_nodes
+        return bins, checks
 
-        return distribution
+    async def _public_ip(self, instance_id: str) -> Optional[str]:
+        """Public IP from the telemetry snapshot, else from EC2"""
+        sample = self.telemetry.snapshot.get(instance_id)
+        if sample is not None and sample.resources.public_ip:
+            return sample.resources.public_ip
+        instances = await self.describe_managed_instances([instance_id])
+        return instances[0].get("PublicIpAddress") if instances else None
+
+    async def _private_ips(self, instance_ids: List[str]) -> Dict[str, str]:
+        """Private IPs of instances, the addresses VXLAN tunnels between workers use"""
+        instances = await self.describe_managed_instances(instance_ids)
+        return {
+            instance["InstanceId"]: instance["PrivateIpAddress"]
+            for instance in instances
+            if instance.get("PrivateIpAddress")
+        }
 
     async def deploy_topology_to_instance(
-        self, instance_id: str, topology: NetworkTopology, nodes: List[str]
+        self,
+        instance_id: str,
+        topology: NetworkTopology,
+        nodes: List[str],
+        prefetch_report: Optional[Dict[str, Dict]] = None,
+        link_plan: Optional[LinkPlan] = None,
     ) -> bool:
-        """Deploy a partial topology to a specific EC2 instance"""
-        try:
-            # Get instance details
-            response = self.ec2_client.describe_instances(InstanceIds=[instance_id])
-            instance = response["Reservations"][0]["Instances"][0]
-            public_ip = instance.get("PublicIpAddress")
+        """Deploy a partial topology to a specific EC2 instance
 
-            if not public_ip:
-                raise Exception(f"No public IP for instance {instance_id}")
-
-            # Build partial topology (only nodes assigned to this host + intra-host links)
-            all_nodes = topology.nodes
-            all_links = topology.links
-
-            partial_topology_config = {
-                "name": f"{topology.name}-{instance_id[-8:]}",
-                "mgmt": topology.mgmt,
-                "topology": {
-                    "nodes": {node: all_nodes[node] for node in nodes if node in all_nodes},
-                    "links": [
-                        link
-                        for link in all_links
-                        if (
-                            len(link.get("endpoints", [])) >= 2
-                            and all(ep.split(":")[0] in nodes for ep in link["endpoints"][:2])
-                        )
-                    ],
-                },
-            }
-
-            # Connect via SSH and deploy
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            key_path = os.path.expanduser(self.ssh_key_path)
-            ssh.connect(hostname=public_ip, username="ubuntu", key_filename=key_path, timeout=30)
-
-            # Create topology file
-            topology_yaml = yaml.dump(partial_topology_config, default_flow_style=False)
-
-            # Upload topology file
-            sftp = ssh.open_sftp()
-            topology_file = f"/opt/ndt/topos/{topology.name}-{instance_id[-8:]}".replace(" ", "_") + ".clab.yml"
-            with sftp.open(topology_file, "w") as f:
-                f.write(topology_yaml)
-            sftp.close()
-
-            # Deploy containerlab topology
-            stdin, stdout, stderr = ssh.exec_command(f"cd /opt/ndt/topos && sudo containerlab deploy -t {topology_file}")
-            exit_code = stdout.channel.recv_exit_status()
-            out = stdout.read().decode()
-            err = stderr.read().decode()
-
-            # Persist remote logs for later debugging
+        Links to nodes on other instances are deployed as this instance's end of
+        their VXLAN tunnel in link_plan. Waits for this worker's image prefetch
+        (if one was started) right before containerlab runs; its outcome is
+        stored in prefetch_report.
+        """
+        with span("instance", instance_id=instance_id, nodes=len(nodes)) as instance_span:
             try:
-                sftp = ssh.open_sftp()
-                with sftp.open(f"/opt/ndt/logs/clab-{topology.name}-{instance_id[-8:]}.log", "w") as f:
-                    f.write(out + "\n--- STDERR ---\n" + err)
-                sftp.close()
-            except Exception as e:
-                logger.warning(f"Could not write remote clab log: {e}")
+                # Get instance details
+                with span("describe_instances"):
+                    response = await run_blocking(self.ec2_client.describe_instances, InstanceIds=[instance_id])
+                    instance = response["Reservations"][0]["Instances"][0]
+                    public_ip = instance.get("PublicIpAddress")
+
+                if not public_ip:
+                    raise Exception(f"No public IP for instance {instance_id}")
+
+                # Build partial topology (nodes assigned to this host, local links and tunnel ends)
+                with span("build-topology-yaml") as yaml_span:
+                    yaml_started = time.perf_counter()
+                    all_nodes = topology.nodes
+                    if link_plan is not None:
+                        links = link_plan.links_for(instance_id)
+                    else:
+                        links = [
+                            link
+                            for link in topology.links
+                            if link_nodes(link) is not None and all(node in nodes for node in link_nodes(link))
+                        ]
+
+                    partial_topology_config = {
+                        "name": lab_name(topology.name, instance_id),
+                        "mgmt": topology.mgmt,
+                        "topology": {
+                            # Node images and settings may come from kinds/defaults
+                            **{
+                                section: topology.topology[section]
+                                for section in ("kinds", "defaults")
+                                if section in topology.topology
+                            },
+                            "nodes": {node: all_nodes[node] for node in nodes if node in all_nodes},
+                            "links": links,
+                        },
+                    }
+
+                    # Create topology file
+                    topology_yaml = yaml.dump(partial_topology_config, default_flow_style=False)
+                    TOPOLOGY_YAML_SECONDS.observe(time.perf_counter() - yaml_started)
+                    yaml_span.set(nodes=len(partial_topology_config["topology"]["nodes"]), links=len(links))
+                topology_file = f"/opt/ndt/topos/{topology.name}-{instance_id[-8:]}".replace(" ", "_") + ".clab.yml"
+                log_file = f"/opt/ndt/logs/clab-{topology.name}-{instance_id[-8:]}.log"
 
-            ssh.close()
+                with span("prefetch-wait"):
+                    prefetch = await self.prefetcher.wait(topology.name, instance_id)
+                if prefetch is not None and prefetch_report is not None:
+                    prefetch_report[instance_id] = prefetch
 
-            if exit_code != 0:
-                logger.error(
-                    f"containerlab failed on {instance_id} (code={exit_code}). "
-                    f"See /opt/ndt/logs/clab-{topology.name}-{instance_id[-8:]}.log"
+                exit_code = await run_blocking(
+                    self._upload_and_deploy, public_ip, topology_file, topology_yaml, log_file, lane=DEPLOY_LANE
                 )
+
+                if exit_code != 0:
+                    logger.error(
+                        f"containerlab failed on {instance_id} (code={exit_code}). "
+                        f"See /opt/ndt/logs/clab-{topology.name}-{instance_id[-8:]}.log"
+                    )
+                    instance_span.fail(f"containerlab exited with code {exit_code}")
+                    return False
+
+                logger.info(f"Successfully deployed topology to {instance_id}")
+                return True
+
+            except Exception as e:
+                logger.error(f"Error deploying topology to {instance_id}: {e}")
+                instance_span.fail(str(e))
                 return False
 
-            logger.info(f"Successfully deployed topology to {instance_id}")
-            return True
+    def _upload_and_deploy(self, public_ip: str, topology_file: str, topology_yaml: str, log_file: str) -> int:
+        """Upload a topology file, run containerlab deploy and keep its log on the worker (blocking)"""
+        started = time.perf_counter()
+        # Upload topology file over the pooled connection
+        with span("upload", bytes=len(topology_yaml)):
+            self.ssh_pool.write_file(public_ip, topology_file, topology_yaml)
+
+        # Deploy containerlab topology
+        with span("containerlab-deploy") as clab_span:
+            result = self.ssh_pool.exec_command(
+                public_ip, f"cd /opt/ndt/topos && sudo containerlab deploy -t {topology_file}"
+            )
+            clab_span.set(exit_status=result.exit_status)
+            if result.exit_status != 0:
+                clab_span.fail(f"exit status {result.exit_status}")
+        CLAB_DEPLOY_SECONDS.labels("ok" if result.exit_status == 0 else "failed").observe(time.perf_counter() - started)
 
+        # Persist remote logs for later debugging
+        try:
+            with span("save-log"):
+                self.ssh_pool.write_file(public_ip, log_file, result.stdout + "\n--- STDERR ---\n" + result.stderr)
         except Exception as e:
-            logger.error(f"Error deploying topology to {instance_id}: {e}")
-            return False
+            logger.warning(f"Could not write remote clab log: {e}")
+
+        return result.exit_status
+
+    def _destroy_on_instance(self, instance_id: str, topology_name: str):
+        """Run containerlab destroy for a topology's partition on one instance (blocking)"""
+        response = self.ec2_client.describe_instances(InstanceIds=[instance_id])
+        instance = response["Reservations"][0]["Instances"][0]
+        public_ip = instance.get("PublicIpAddress")
+
+        if public_ip:
+            self.ssh_pool.exec_command(
+                public_ip,
+                f"cd /opt/ndt/topos && sudo containerlab destroy -t {topology_name}-{instance_id[-8:]}.clab.yml",
+            )
 
 
 # FastAPI application
 app = FastAPI(title="NDT Manager", version="1.0.0")
 ndt_manager = NDTManager()
+alert_manager = ResourceAlertManager(
+    cpu_threshold=float(get_setting("resource_thresholds.cpu_threshold", 0.8)) * 100,
+    memory_threshold=float(get_setting("resource_thresholds.memory_threshold", 0.8)) * 100,
+    disk_threshold=float(get_setting("resource_thresholds.storage_threshold", 0.9)) * 100,
+)
 
 
-@app.post("/deploy-topology")
-async def deploy_topology(topology: NetworkTopology, background_tasks: BackgroundTasks):
-    """Deploy a network topology across EC2 instances"""
+@app.on_event("startup")
+async def start_background_services():
+    """Start the fleet telemetry refresher and the deployment job workers"""
+    if not await ndt_manager.state.ping():
+        logger.error(f"{ndt_manager.state.backend} state store is not reachable; deployment state will not be shared")
+    await ndt_manager.telemetry.start()
+    await ndt_manager.job_queue.start()
+    await ndt_manager.warm_pool.start()
+    await ndt_manager.autoscaler.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    """Stop background loops and close pooled SSH connections"""
+    await ndt_manager.autoscaler.stop()
+    await ndt_manager.job_queue.stop()
+    await ndt_manager.warm_pool.stop()
+    await ndt_manager.telemetry.stop()
+    await ndt_manager.state.close()
+    close_all_pools()
+    ndt_manager.metrics_history.close()
+    mark_process_dead()
+
+
+async def run_deployment_job(job: Job, topology: NetworkTopology, replacing: Optional[Dict] = None) -> Dict:
+    """Place, provision and deploy a topology, recording each phase on the job
+
+    Capacity reserved during placement is released if the job fails, and on the
+    instances whose deployment failed; the rest is held until the topology is destroyed.
+    The span tree of the run is stored whether it succeeds or not (GET /deployments/{name}/trace).
+
+    replacing is the deployment record of the running topology when the job
+    migrates it: the new placement is reserved (and new workers launched) while
+    the running lab is intact, and its old partitions are destroyed only right
+    before the new ones deploy. If the redeploy fails, the record keeps the old
+    placement with the failed migration noted, so the migration can be retried.
+    """
+    root = None
     try:
-        # Analyze requirements & distribute
+        with trace("deploy", topology=topology.name, job_id=job.job_id) as root:
+            try:
+                return await _run_deployment_phases(job, topology, replacing)
+            except BaseException as e:
+                await ndt_manager.reservations.release(topology.name, only_pending=True)
+                if replacing is not None:
+                    await _record_failed_migration(topology.name, str(e) or type(e).__name__)
+                # Tunnel VNIs stay with an earlier deployment of the same topology
+                if await ndt_manager.state.get(DEPLOYMENTS, topology.name) is None:
+                    await ndt_manager.link_realizer.release(topology.name)
+                raise
+    finally:
+        # Prefetches no deploy waited for (job failed, or the worker was unreachable)
+        ndt_manager.prefetcher.cancel(topology.name)
+        if root is not None:
+            await ndt_manager.state.put(
+                TRACES, topology.name, {"topology_name": topology.name, "job_id": job.job_id, **root.tree()}
+            )
+
+
+async def _run_deployment_phases(job: Job, topology: NetworkTopology, replacing: Optional[Dict] = None) -> Dict:
+    def prefetch_images(instance_id: str, nodes: List[str]):
+        # Pulls run while the remaining workers launch and the partial topologies are built
+        if get_setting("prefetch.enabled", True):
+            ndt_manager.prefetcher.start(topology.name, instance_id, node_images(topology.topology, nodes))
+
+    with job.phase("placement") as phase:
         requirements = ndt_manager.analyze_containerlab_requirements(topology)
-        distribution = await ndt_manager.distribute_topology(topology)
+        distribution = await ndt_manager.distribute_topology(topology, on_assigned=prefetch_images)
+        partition = ndt_manager.partition_report(topology, distribution)
+        phase.detail = (
+            f"{len(topology.nodes)} nodes on {len(distribution)} instances, "
+            f"{partition['cut_size']}/{partition['total_links']} links cross hosts"
+        )
+
+    with job.phase("links") as phase:
+        host_ips = await ndt_manager._private_ips(list(distribution)) if len(distribution) > 1 else {}
+        link_plan = await ndt_manager.link_realizer.plan(topology.name, topology.links, distribution, host_ips)
+        phase.detail = (
+            f"{len(link_plan.cross_host)}/{len(link_plan.links)} links tunnelled "
+            f"between {len(link_plan.host_pairs())} host pairs"
+        )
+
+    if replacing is not None:
+        # Placement and reservations succeeded, so nothing can stop the redeploy from here
+        # but the deploy itself; only now does the running lab go down
+        with job.phase("teardown") as phase:
+            await teardown_for_migration(topology.name, replacing, distribution, job.job_id)
+            phase.detail = f"destroyed on {len(replacing['distribution'])} instances"
 
-        # Deploy to each instance
+    with job.phase("deploy") as phase:
+        prefetch: Dict[str, Dict] = {}
         deployment_tasks = [
-            ndt_manager.deploy_topology_to_instance(instance_id, topology, nodes)
+            ndt_manager.deploy_topology_to_instance(
+                instance_id, topology, nodes, prefetch_report=prefetch, link_plan=link_plan
+            )
             for instance_id, nodes in distribution.items()
         ]
         results = await asyncio.gather(*deployment_tasks, return_exceptions=True)
         successful_deployments = sum(1 for r in results if r is True)
+        phase.detail = f"{successful_deployments}/{len(distribution)} instances deployed"
+        if successful_deployments == 0:
+            raise RuntimeError("Deployment failed on every instance")
+        if successful_deployments < len(distribution):
+            phase.status = PARTIAL
+
+        deployed = [instance_id for instance_id, result in zip(distribution, results) if result is True]
+        await ndt_manager.reservations.release(
+            topology.name,
+            [instance_id for instance_id in distribution if instance_id not in deployed],
+            only_pending=True,
+        )
+        await ndt_manager.reservations.commit(topology.name, deployed)
+        if replacing is not None:
+            # Workers the topology left keep nothing of it
+            await ndt_manager.reservations.release(
+                topology.name,
+                [instance_id for instance_id in replacing["distribution"] if instance_id not in distribution],
+            )
 
-        # Cross-host connectivity (GRE/VXLAN)
-        connectivity = {"attempted": False, "ok": True}
-        if len(distribution) > 1 and successful_deployments >= 2:
+    # Cross-host links: containerlab created the VXLAN ends; check both sides and recreate missing ones
+    connectivity = {"attempted": False, "ok": True, "hosts": {}, "tunnels": {}}
+    if link_plan.cross_host:
+        with job.phase("connectivity") as phase:
             connector = NetworkConnector()
             connectivity["attempted"] = True
-            key_path = os.path.expanduser(ndt_manager.ssh_key_path)
-            ok = await connector.setup_inter_instance_connectivity(
-                distribution, ndt_manager.ec2_client, key_path
-            )
-            connectivity["ok"] = bool(ok)
-
-        deployment_info = {
-            "topology_name": topology.name,
-            "total_instances": len(distribution),
-            "successful_deployments": successful_deployments,
-            "distribution": distribution,
-            "requirements": asdict(requirements),
-            "timestamp": datetime.now().isoformat(),
-            "connectivity": connectivity,
-        }
+            addresses = await asyncio.gather(*[ndt_manager._public_ip(instance_id) for instance_id in distribution])
+            public_ips = dict(zip(distribution, addresses))
+            hosts, tunnels = await connector.ensure_tunnels(link_plan, public_ips, ndt_manager.ssh_key_path)
+            connectivity["hosts"] = hosts
+            connectivity["tunnels"] = tunnels
+            connectivity["ok"] = all(state["up"] for state in tunnels.values())
+            phase.detail = f"{sum(state['up'] for state in tunnels.values())}/{len(tunnels)} tunnels up"
+            if not connectivity["ok"]:
+                phase.status = PARTIAL
+
+    deployment_info = {
+        "topology_name": topology.name,
+        "status": SUCCEEDED if successful_deployments == len(distribution) and connectivity["ok"] else PARTIAL,
+        "job_id": job.job_id,
+        "total_instances": len(distribution),
+        "successful_deployments": successful_deployments,
+        "distribution": distribution,
+        "partition": partition,
+        "links": link_plan.mapping(),
+        "link_summary": link_plan.summary(),
+        "prefetch": prefetch,
+        "requirements": asdict(requirements),
+        # Kept so the autoscaler can redeploy the topology elsewhere
+        "topology": topology.model_dump(),
+        "timestamp": datetime.now().isoformat(),
+        "connectivity": connectivity,
+    }
+
+    await ndt_manager.state.put(DEPLOYMENTS, topology.name, deployment_info)
+    return deployment_info
+
+
+def topology_lock(topology_name: str):
+    """Cross-process lock serializing deploy and destroy of one topology"""
+    return ndt_manager.state.lock(
+        f"topology:{topology_name}", ttl=float(get_setting("deployment.topology_lock_ttl", 3600))
+    )
+
+
+@app.post("/deploy-topology", status_code=202)
+async def deploy_topology(topology: NetworkTopology):
+    """Queue a topology deployment and return its job ID immediately
+
+    Follow progress with GET /jobs/{job_id}.
+    """
+    # Held for the whole job so no other process deploys or destroys this topology meanwhile
+    lock = topology_lock(topology.name)
+    if not await lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail=f"Topology {topology.name} is already being deployed or destroyed")
+
+    async def handler(job: Job) -> Dict:
+        try:
+            return await run_deployment_job(job, topology)
+        finally:
+            await lock.release()
 
-        ndt_manager.topology_deployments[topology.name] = deployment_info
+    try:
+        job = ndt_manager.job_queue.submit("deploy", topology.name, handler, lock=lock)
+    except QueueFullError as e:
+        await lock.release()
+        raise HTTPException(status_code=503, detail=str(e))
 
-        return {
-            "status": "success" if successful_deployments == len(distribution) else "partial",
-            "deployment_info": deployment_info,
-        }
+    return {"status": "accepted", "job_id": job.job_id, "job": job.to_dict()}
+
+
+@app.get("/jobs")
+async def list_jobs(status: Optional[str] = None):
+    """List deployment jobs, newest first"""
+    return {
+        "queue": ndt_manager.job_queue.stats(),
+        "jobs": await ndt_manager.job_queue.list_records(status),
+    }
 
-    except Exception as e:
-        logger.error(f"Error deploying topology: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0, since: int = -1):
+    """Get a job's status and phases
+
+    With ?wait=N the call long-polls for up to N seconds (max 60) until the job
+    changes past version `since` or finishes.
+    """
+    if wait > 0:
+        record = await ndt_manager.job_queue.wait_for_update(job_id, since, min(wait, 60))
+    else:
+        record = await ndt_manager.job_queue.get_record(job_id)
+
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return record
 
 
 @app.get("/resources")
-async def get_resources():
-    """Get current resource utilization of all managed EC2 instances"""
+async def get_resources(fresh: bool = False):
+    """Get resource utilization of all managed EC2 instances from the telemetry snapshot
+
+    Pass ?fresh=true to poll every worker before answering.
+    """
     try:
-        resources = await ndt_manager.poll_ec2_resources()
-        return {"timestamp": datetime.now().isoformat(), "instances": {k: asdict(v) for k, v in resources.items()}}
+        samples = await ndt_manager.telemetry.get_snapshot(fresh=fresh)
+        instances = {}
+        for instance_id, sample in samples.items():
+            instances[instance_id] = asdict(sample.resources)
+            instances[instance_id].update(
+                {
+                    "polled_at": sample.polled_at.isoformat(),
+                    "age_seconds": round(sample.age_seconds(), 1),
+                    "current_metrics": asdict(sample.metrics) if sample.metrics else None,
+                    **sample.service_status,
+                }
+            )
+
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "telemetry": ndt_manager.telemetry.metadata(),
+            "instances": instances,
+        }
     except Exception as e:
         logger.error(f"Error getting resources: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/resources/history")
+async def get_resources_history(
+    metric: str = "cpu_percent",
+    hours: float = 24,
+    instance_id: Optional[str] = None,
+    stats: str = "avg,p95,max",
+    tier: Optional[str] = None,
+    series: bool = False,
+):
+    """Range and aggregate queries over the workers' metrics history
+
+    e.g. ?metric=cpu_percent&hours=24&stats=p95 for the fleet's p95 CPU over a
+    day. Returns per-host and fleet-wide statistics from the finest tier that
+    covers the range (raw, 1m or 1h); series=true adds the points per host.
+    """
+    if tier is not None and tier not in TIERS:
+        raise HTTPException(status_code=400, detail=f"tier must be one of {', '.join(TIERS)}")
+    if instance_id and not ndt_manager.metrics_history.has_host(instance_id):
+        raise HTTPException(status_code=404, detail=f"No metrics history for {instance_id}")
+    requested = [stat.strip() for stat in stats.split(",") if stat.strip()]
+    if not requested or any(stat not in STATS for stat in requested):
+        raise HTTPException(status_code=400, detail=f"stats must be a comma-separated subset of {', '.join(STATS)}")
+
+    started = time.perf_counter()
+    try:
+        result = await run_blocking(
+            ndt_manager.metrics_history.query,
+            metric,
+            time.time() - hours * 3600,
+            instance_ids=[instance_id] if instance_id else None,
+            stats=requested,
+            tier=tier,
+            series=series,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["query_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+@app.get("/alerts")
+async def get_alerts():
+    """Evaluate resource alerts against the telemetry snapshot"""
+    samples = await ndt_manager.telemetry.get_snapshot()
+    alerts = alert_manager.check_alerts(samples)
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "telemetry": ndt_manager.telemetry.metadata(),
+        "alerts": alerts,
+    }
+
+
 @app.get("/deployments")
 async def get_deployments():
     """Get information about current topology deployments"""
-    return ndt_manager.topology_deployments
-
+    return await ndt_manager.state.all(DEPLOYMENTS)
+
+
+@app.get("/deployments/{topology_name}/trace")
+async def get_deployment_trace(topology_name: str):
+    """Span tree of the latest deploy of a topology (also kept when the deploy failed)
+
+    Spans start at start_ms from the deploy's start and nest: job phases, then
+    placement, EC2 launches and waiters, per-instance bootstrap, upload and
+    containerlab deploy, and per-host tunnel checks.
+    """
+    trace_info = await ndt_manager.state.get(TRACES, topology_name)
+    if trace_info is None:
+        raise HTTPException(status_code=404, detail=f"No deploy trace for {topology_name}")
+    return trace_info
+
+
+async def run_bake_job(job: Job, images: List[str]) -> Dict:
+    """Bake a worker AMI from stock Ubuntu, then make new workers use it"""
+    result = await ndt_manager.ami_builder.build(
+        base_ami=await ndt_manager._get_stock_ubuntu_ami(),
+        security_group_id=await ndt_manager._get_worker_security_group(),
+        key_name=os.getenv("AWS_KEY_PAIR_NAME", "default-key"),
+        ssh_pool=ndt_manager.ssh_pool,
+        images=images,
+        instance_type=get_setting("ami.builder_instance_type", "t3.large"),
+        # Workers cannot have a root volume smaller than the image's snapshot
+        volume_gb=min(int(specs["storage"]) for specs in ndt_manager.instance_specs.values()),
+        job=job,
+    )
+    ndt_manager.lookups.invalidate(BAKED_AMI_KEY)
+    result["pruned"] = await ndt_manager.ami_builder.prune(keep=int(get_setting("ami.keep_versions", 3)))
+    return result
+
+
+class BakeRequest(BaseModel):
+    images: Optional[List[str]] = None
+
+
+@app.post("/images/bake", status_code=202)
+async def bake_image(request: BakeRequest):
+    """Queue a worker AMI bake; images default to ami.prefetch_images
+
+    Follow progress with GET /jobs/{job_id}.
+    """
+    images = request.images if request.images is not None else (get_setting("ami.prefetch_images") or [])
+    lock = ndt_manager.state.lock("ami-bake", ttl=3600)
+    if not await lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A worker AMI bake is already running")
+
+    async def handler(job: Job) -> Dict:
+        try:
+            return await run_bake_job(job, images)
+        finally:
+            await lock.release()
 
-@app.delete("/topology/{topology_name}")
-async def destroy_topology(topology_name: str):
-    """Destroy a deployed topology"""
-    if topology_name not in ndt_manager.topology_deployments:
+    try:
+        job = ndt_manager.job_queue.submit("bake", "worker-ami", handler, lock=lock)
+    except QueueFullError as e:
+        await lock.release()
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {"status": "accepted", "job_id": job.job_id, "job": job.to_dict()}
+
+
+@app.get("/images")
+async def list_images():
+    """Baked worker AMIs, newest first, and the one new workers launch from"""
+    return {
+        "current": await ndt_manager._get_baked_ami(),
+        "images": await run_blocking(ndt_manager.ami_builder.list_images),
+    }
+
+
+@app.get("/registry-mirror")
+async def get_registry_mirror():
+    """Pull-through cache hit rates per upstream registry"""
+    if ndt_manager.registry_mirror is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "host": ndt_manager.registry_mirror.host,
+        "upstreams": await ndt_manager.registry_mirror.stats(),
+    }
+
+
+@app.get("/node-profiles")
+async def get_node_profiles_summary():
+    """Observed p50/p95 CPU cores and memory GB per node kind and image, next to the configured estimates"""
+    packer = ndt_manager.bin_packer
+    kinds = await run_blocking(ndt_manager.node_profiles.summary)
+    for kind, entry in kinds.items():
+        entry["configured"] = packer.configured_profile(kind)
+    return {
+        "learned_placement": packer.profiles is not None,
+        "percentile": packer.learned_percentile,
+        "min_samples": packer.learned_min_samples,
+        "headroom": packer.learned_headroom,
+        "kinds": kinds,
+    }
+
+
+@app.get("/warm-pool")
+async def get_warm_pool():
+    """Standby workers per size: ready, warming and the demand-based target"""
+    return await ndt_manager.warm_pool.status()
+
+
+@app.get("/reservations")
+async def get_reservations():
+    """Capacity reserved per instance, by topology"""
+    return await ndt_manager.reservations.snapshot()
+
+
+class BenchmarkRequest(BaseModel):
+    duration: int = 5  # seconds of iperf3 per host pair
+    ping_count: int = 20
+    streams: int = 1  # parallel iperf3 streams
+
+
+async def run_benchmark_job(job: Job, topology_name: str, request: BenchmarkRequest) -> Dict:
+    """Measure every host pair of a deployed topology and keep the result on its deployment record"""
+    deployment_info = await ndt_manager.state.get(DEPLOYMENTS, topology_name)
+    if deployment_info is None:
+        raise RuntimeError(f"Topology {topology_name} is no longer deployed")
+
+    hosts = list(deployment_info["distribution"])
+    with job.phase("addresses"):
+        public_ips = dict(zip(hosts, await asyncio.gather(*[ndt_manager._public_ip(host) for host in hosts])))
+        private_ips = await ndt_manager._private_ips(hosts)
+
+    benchmark = FabricBenchmark(
+        ndt_manager.ssh_pool,
+        ndt_manager.link_realizer,
+        duration=request.duration,
+        ping_count=request.ping_count,
+        streams=request.streams,
+    )
+    result = await benchmark.run(topology_name, deployment_info.get("links", {}), public_ips, private_ips, job=job)
+    result["status"] = PARTIAL if result["outliers"] else SUCCEEDED
+    result["timestamp"] = datetime.now().isoformat()
+
+    def record(info: Optional[Dict]) -> Optional[Dict]:
+        return {**info, "benchmark": result} if info is not None else None
+
+    await ndt_manager.state.update(DEPLOYMENTS, topology_name, record)
+    return result
+
+
+@app.post("/topology/{topology_name}/benchmark", status_code=202)
+async def benchmark_topology(topology_name: str, request: Optional[BenchmarkRequest] = None):
+    """Queue iperf3 and ping tests between every pair of hosts sharing cut links
+
+    The result (per-pair throughput, latency, loss and MTU check, a host
+    matrix and the outlier pairs) is the job result and is also kept on the
+    deployment record. Follow progress with GET /jobs/{job_id}.
+    """
+    request = request or BenchmarkRequest()
+    if await ndt_manager.state.get(DEPLOYMENTS, topology_name) is None:
         raise HTTPException(status_code=404, detail="Topology not found")
 
+    # Keeps the topology from being destroyed or redeployed under the benchmark
+    lock = topology_lock(topology_name)
+    if not await lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail=f"Topology {topology_name} is busy (deploy or destroy in progress)")
+
+    async def handler(job: Job) -> Dict:
+        try:
+            return await run_benchmark_job(job, topology_name, request)
+        finally:
+            await lock.release()
+
     try:
-        deployment_info = ndt_manager.topology_deployments[topology_name]
+        job = ndt_manager.job_queue.submit("bench", topology_name, handler, lock=lock)
+    except QueueFullError as e:
+        await lock.release()
+        raise HTTPException(status_code=503, detail=str(e))
 
-        # Destroy topology on each instance
-        for instance_id in deployment_info["distribution"].keys():
-            response = ndt_manager.ec2_client.describe_instances(InstanceIds=[instance_id])
-            instance = response["Reservations"][0]["Instances"][0]
-            public_ip = instance.get("PublicIpAddress")
+    return {"status": "accepted", "job_id": job.job_id, "job": job.to_dict()}
+
+
+async def teardown_deployment(topology_name: str, deployment_info: Dict):
+    """Destroy a topology on all its instances and give its capacity and tunnel VNIs back (topology lock held)"""
+    await asyncio.gather(
+        *[
+            run_blocking(ndt_manager._destroy_on_instance, instance_id, topology_name, lane=DEPLOY_LANE)
+            for instance_id in deployment_info["distribution"].keys()
+        ]
+    )
+
+    await ndt_manager.state.delete(DEPLOYMENTS, topology_name)
+    await ndt_manager.reservations.release(topology_name, list(deployment_info["distribution"].keys()))
+    await ndt_manager.link_realizer.release(topology_name)
+
+
+async def teardown_for_migration(
+    topology_name: str, deployment_info: Dict, target: Dict[str, List[str]], job_id: str
+):
+    """Destroy a migrating topology's current partitions (topology lock held)
+
+    Its record, committed reservations and tunnel VNIs stay: the record keeps
+    the old placement, noting the migration, until the redeploy replaces it.
+    """
+    migration = {"job_id": job_id, "status": "running", "target": target, "started_at": datetime.now().isoformat()}
+    await ndt_manager.state.update(
+        DEPLOYMENTS, topology_name, lambda current: {**(current or deployment_info), "migration": migration}
+    )
+    await asyncio.gather(
+        *[
+            run_blocking(ndt_manager._destroy_on_instance, instance_id, topology_name, lane=DEPLOY_LANE)
+            for instance_id in deployment_info["distribution"].keys()
+        ]
+    )
 
-            if public_ip:
-                ssh = paramiko.SSHClient()
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
-                key_path = os.path.expanduser(ndt_manager.ssh_key_path)
-                ssh.connect(hostname=public_ip, username="ubuntu", key_filename=key_path, timeout=30)
+async def _record_failed_migration(topology_name: str, error: str):
+    """Note on the record that the redeploy after teardown failed; before teardown the lab is untouched"""
+    def fail(current: Optional[Dict]) -> Optional[Dict]:
+        if current is None or "migration" not in current:
+            return current
+        return {**current, "migration": {**current["migration"], "status": "failed", "error": error}}
 
-                stdin, stdout, stderr = ssh.exec_command(
-                    f"cd /opt/ndt/topos && sudo containerlab destroy -t {topology_name}-{instance_id[-8:]}.clab.yml"
-                )
-                _ = stdout.channel.recv_exit_status()
-                ssh.close()
+    record = await ndt_manager.state.update(DEPLOYMENTS, topology_name, fail)
+    if record is not None and "migration" in record:
+        logger.error(f"Migration of {topology_name} failed after teardown; the old placement is kept for a retry")
+    else:
+        logger.warning(f"Migration of {topology_name} aborted before teardown; the topology is still running")
+
+
+async def submit_migration(topology_name: str) -> Optional[str]:
+    """Queue a redeploy of a topology away from draining workers; returns the job ID, or None if it cannot run now
+
+    The new placement is reserved before the running lab is destroyed, so a
+    migration that cannot be placed leaves the topology as it was. Its nodes
+    restart on their new workers.
+    """
+    deployment_info = await ndt_manager.state.get(DEPLOYMENTS, topology_name)
+    if deployment_info is None or "topology" not in deployment_info:
+        logger.warning(f"Cannot migrate {topology_name}: its deployment record has no topology definition")
+        return None
+
+    lock = topology_lock(topology_name)
+    if not await lock.acquire(blocking=False):
+        return None
+    topology = NetworkTopology(**deployment_info["topology"])
+
+    async def handler(job: Job) -> Dict:
+        try:
+            return await run_deployment_job(job, topology, replacing=deployment_info)
+        finally:
+            await lock.release()
+
+    try:
+        job = ndt_manager.job_queue.submit("migrate", topology_name, handler, lock=lock)
+    except QueueFullError as e:
+        await lock.release()
+        logger.warning(f"Cannot migrate {topology_name}: {e}")
+        return None
+    return job.job_id
+
+
+ndt_manager.autoscaler.migrate_topology = submit_migration
+
+
+@app.get("/autoscaler")
+async def get_autoscaler():
+    """Autoscaler settings, fleet headroom and how each worker is classified"""
+    return await ndt_manager.autoscaler.status()
+
+
+@app.get("/autoscaler/decisions")
+async def get_autoscaler_decisions(limit: int = 50):
+    """Recent autoscaler decisions, newest first"""
+    return {"decisions": await ndt_manager.autoscaler.decisions(limit)}
+
+
+@app.post("/autoscaler/evaluate")
+async def evaluate_autoscaler(dry_run: bool = True):
+    """Run an autoscaler round now (by default only deciding and logging) and return its decisions"""
+    return {"decisions": await ndt_manager.autoscaler.evaluate(dry_run=dry_run)}
+
+
+@app.delete("/topology/{topology_name}")
+async def destroy_topology(topology_name: str):
+    """Destroy a deployed topology"""
+    lock = topology_lock(topology_name)
+    if not await lock.acquire(timeout=10):
+        raise HTTPException(status_code=409, detail=f"Topology {topology_name} is busy (deploy or destroy in progress)")
+
+    try:
+        deployment_info = await ndt_manager.state.get(DEPLOYMENTS, topology_name)
+        if deployment_info is None:
+            raise HTTPException(status_code=404, detail="Topology not found")
 
-        # Remove from deployments
-        del ndt_manager.topology_deployments[topology_name]
+        await teardown_deployment(topology_name, deployment_info)
+        await ndt_manager.state.delete(TRACES, topology_name)
 
         return {"status": "success", "message": f"Topology {topology_name} destroyed"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error destroying topology: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await lock.release()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint: fleet gauges, hot-path latency histograms and job queue depth
+
+    Any API process can answer: histograms are merged across processes and the
+    gauges come from the published fleet snapshot and the shared job records.
+    """
+    samples = await ndt_manager.telemetry.get_snapshot()
+    jobs_by_status: Dict[str, int] = {}
+    for record in await ndt_manager.job_queue.list_records():
+        jobs_by_status[record["status"]] = jobs_by_status.get(record["status"], 0) + 1
+    body, content_type = render(samples, jobs_by_status)
+    return Response(content=body, media_type=content_type)
 
 
 @app.get("/health")
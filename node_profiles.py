@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Node Profiles for NDT
+Observed CPU and memory of containerlab nodes, as p50/p95 profiles per kind and image
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, Iterable, List, Optional, Tuple
+
+from config_loader import data_path, get_setting
+
+if TYPE_CHECKING:
+    from resource_monitor import ContainerUsage
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = {'p50': 50, 'p95': 95}
+
+# (cpu cores, memory GB) of one container at one poll
+Sample = Tuple[float, float]
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+
+def summarize(samples: List[Sample]) -> Dict:
+    """Sample count plus percentiles and maximum of CPU cores and memory GB"""
+    summary: Dict = {'samples': len(samples)}
+    for index, resource in enumerate(('cpu', 'memory')):
+        values = [sample[index] for sample in samples]
+        summary[resource] = {name: round(percentile(values, q), 3) for name, q in PERCENTILES.items()}
+        summary[resource]['max'] = round(max(values), 3)
+    return summary
+
+class NodeProfiles:
+    """Rolling window of per-container samples for each (kind, image), saved as JSON
+
+    Every telemetry poll contributes one sample per running containerlab node, so
+    the window follows image upgrades and changing lab workloads. The file is
+    rewritten at most every save_interval seconds.
+    """
+
+    def __init__(self, path: str, max_samples: int = 2000, save_interval: float = 300):
+        self.path = path
+        self.max_samples = max_samples
+        self.save_interval = save_interval
+        self._samples: Dict[Tuple[str, str], Deque[Sample]] = {}
+        self._lock = threading.Lock()
+        self._next_save = time.monotonic() + save_interval
+        self._loaded_mtime: Optional[float] = None
+        self._load()
+
+    @classmethod
+    def from_config(cls) -> 'NodeProfiles':
+        return cls(
+            data_path(get_setting('node_profiles.path', 'node_profiles.json')),
+            max_samples=int(get_setting('node_profiles.max_samples', 2000)),
+            save_interval=float(get_setting('node_profiles.save_interval', 300)),
+        )
+
+    def _window(self, kind: str, image: str) -> Deque[Sample]:
+        key = (kind, image)
+        if key not in self._samples:
+            self._samples[key] = deque(maxlen=self.max_samples)
+        return self._samples[key]
+
+    def record(self, containers: Iterable['ContainerUsage']):
+        """Add one poll's container usage (blocking: may save the file)"""
+        with self._lock:
+            for container in containers:
+                # Containers seen for the first time have no CPU rate yet
+                if container.cpu_cores is None or not container.kind:
+                    continue
+                self._window(container.kind, container.image).append((container.cpu_cores, container.memory_gb))
+            due = time.monotonic() >= self._next_save
+            if due:
+                self._next_save = time.monotonic() + self.save_interval
+        if due:
+            self.save()
+
+    def profile(self, kind: str, image: Optional[str] = None, min_samples: int = 1) -> Optional[Dict]:
+        """Profile of a kind and image; falls back to all images of the kind when the image has too few samples"""
+        with self._lock:
+            samples = list(self._samples.get((kind, image), ())) if image else []
+            if len(samples) < min_samples:
+                samples = [sample for (k, _), window in self._samples.items() if k == kind for sample in window]
+        if not samples or len(samples) < min_samples:
+            return None
+        return summarize(samples)
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per kind: the profile across its images and one per image"""
+        with self._lock:
+            windows = {key: list(window) for key, window in self._samples.items() if window}
+
+        kinds: Dict[str, Dict] = {}
+        for (kind, image), samples in sorted(windows.items()):
+            entry = kinds.setdefault(kind, {'all_images': None, 'images': {}})
+            entry['images'][image] = summarize(samples)
+        for kind, entry in kinds.items():
+            entry['all_images'] = summarize([s for (k, _), samples in windows.items() if k == kind for s in samples])
+        return kinds
+
+    def save(self):
+        """Write the sample windows atomically (blocking)"""
+        with self._lock:
+            data: Dict[str, Dict[str, List[Sample]]] = {}
+            for (kind, image), window in self._samples.items():
+                data.setdefault(kind, {})[image] = list(window)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        try:
+            with open(temporary, 'w') as f:
+                json.dump({'samples': data}, f)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save node profiles to {self.path}: {e}")
+
+    def reload(self):
+        """Re-read the file when another process saved it since (blocking)"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self._load(replace=True)
+
+    def _load(self, replace: bool = False):
+        try:
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path) as f:
+                data = json.load(f).get('samples', {})
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable node profiles in {self.path}: {e}")
+            return
+
+        with self._lock:
+            if replace:
+                self._samples = {}
+            for kind, images in data.items():
+                for image, samples in images.items():
+                    self._window(kind, image).extend((float(cpu), float(memory)) for cpu, memory in samples)
+            self._loaded_mtime = mtime
+        logger.info(f"Loaded node profiles for {len(data)} kinds from {self.path}")
+
+_profiles: Optional[NodeProfiles] = None
+_profiles_lock = threading.Lock()
+
+def get_node_profiles() -> NodeProfiles:
+    """Process-wide node profiles under node_profiles.path"""
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            _profiles = NodeProfiles.from_config()
+        return _profiles
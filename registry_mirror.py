@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Registry Mirror for NDT
+Pull-through registry caches on the manager: worker Docker configuration, image rewriting and hit rates
+"""
+
+import json
+import logging
+import urllib.request
+from typing import Dict, Optional, Tuple
+
+from async_executor import OPERATIONS_LANE, run_blocking
+from config_loader import get_setting
+
+logger = logging.getLogger(__name__)
+
+DOCKER_HUB = 'docker.io'
+
+# One registry:2 proxy per upstream (a proxy can only front a single remote)
+DEFAULT_UPSTREAMS = {
+    DOCKER_HUB: {'port': 5000, 'debug_port': 5050},
+    'ghcr.io': {'port': 5001, 'debug_port': 5051},
+}
+
+def split_image(image: str) -> Tuple[str, str]:
+    """(registry, repository:tag) of an image reference, with Docker Hub made explicit"""
+    first, _, rest = image.partition('/')
+    if rest and ('.' in first or ':' in first or first == 'localhost'):
+        return first, rest
+    if not rest:
+        # Official image such as alpine:latest
+        return DOCKER_HUB, f'library/{image}'
+    return DOCKER_HUB, image
+
+class RegistryMirror:
+    """Pull-through caches reachable from workers at host:port, one per upstream registry
+
+    Docker Hub is mirrored transparently through the daemon's registry-mirrors;
+    other registries (the daemon only mirrors Docker Hub) are pulled by rewriting
+    the image reference to the mirror and re-tagging it.
+    """
+
+    def __init__(self, host: str, upstreams: Optional[Dict[str, Dict]] = None):
+        self.host = host
+        self.upstreams = upstreams or DEFAULT_UPSTREAMS
+
+    @classmethod
+    def from_config(cls) -> Optional['RegistryMirror']:
+        if not get_setting('registry_mirror.enabled', False):
+            return None
+        host = get_setting('registry_mirror.host')
+        if not host:
+            logger.warning("registry_mirror.enabled is set but registry_mirror.host is empty; mirror not used")
+            return None
+        return cls(host, get_setting('registry_mirror.upstreams') or DEFAULT_UPSTREAMS)
+
+    def endpoint(self, registry: str) -> Optional[str]:
+        upstream = self.upstreams.get(registry)
+        return f"{self.host}:{upstream['port']}" if upstream else None
+
+    def daemon_config(self) -> Dict:
+        """Docker daemon settings that make a worker use the mirrors (plain HTTP on the private network)"""
+        config = {'insecure-registries': sorted(self.endpoint(registry) for registry in self.upstreams)}
+        if DOCKER_HUB in self.upstreams:
+            config['registry-mirrors'] = [f'http://{self.endpoint(DOCKER_HUB)}']
+        return config
+
+    def bootstrap_script(self) -> str:
+        """Shell snippet for worker user-data; merges into any existing daemon.json"""
+        settings = json.dumps(self.daemon_config())
+        return f"""
+# Pull-through registry mirror on the manager
+mkdir -p /etc/docker
+python3 - << 'EOF'
+import json, os
+path = '/etc/docker/daemon.json'
+config = json.load(open(path)) if os.path.exists(path) else {{}}
+config.update({settings})
+json.dump(config, open(path, 'w'), indent=2)
+EOF
+systemctl restart docker
+timeout 180 bash -c 'until docker info >/dev/null 2>&1; do sleep 3; done'
+"""
+
+    def mirror_ref(self, image: str) -> Optional[str]:
+        """Mirror reference to pull instead of image, or None when the daemon mirror (or nothing) applies"""
+        registry, path = split_image(image)
+        if registry == DOCKER_HUB or registry not in self.upstreams:
+            return None
+        return f'{self.endpoint(registry)}/{path}'
+
+    def _fetch_vars(self, registry: str) -> Dict:
+        url = f"http://{self.host}:{self.upstreams[registry]['debug_port']}/debug/vars"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return json.load(response)
+
+    async def stats(self) -> Dict[str, Dict]:
+        """Request, hit and byte counters per upstream, from each registry's expvar endpoint"""
+        report = {}
+        for registry in self.upstreams:
+            try:
+                expvars = await run_blocking(self._fetch_vars, registry, lane=OPERATIONS_LANE)
+                proxy = expvars.get('registry', {}).get('proxy', {})
+            except Exception as e:
+                report[registry] = {'endpoint': self.endpoint(registry), 'reachable': False, 'error': str(e)}
+                continue
+
+            entry = {'endpoint': self.endpoint(registry), 'reachable': True}
+            for kind in ('blobs', 'manifests'):
+                counters = proxy.get(kind, {})
+                requests = counters.get('Requests', 0)
+                entry[kind] = {
+                    'requests': requests,
+                    'hits': counters.get('Hits', 0),
+                    'misses': counters.get('Misses', 0),
+                    'hit_rate': round(counters.get('Hits', 0) / requests, 3) if requests else None,
+                    'bytes_from_upstream': counters.get('BytesPulled', 0),
+                    'bytes_served': counters.get('BytesPushed', 0),
+                }
+            report[registry] = entry
+        return report
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Capacity Reservation Ledger for NDT
+Per-instance record of resources committed to topologies, updated atomically through the state store
+"""
+
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from bin_packer import Resources
+from state_store import RESERVATIONS, StateStore
+
+logger = logging.getLogger(__name__)
+
+# Reservation states
+PENDING = 'pending'      # placement chosen, containers not (fully) running yet; expires if never committed
+COMMITTED = 'committed'  # topology deployed; held until destroy
+
+# Pending entries live next to the committed entry of the same topology, so a failed redeploy leaves it intact
+_PENDING_SUFFIX = '#pending'
+
+def pending_key(reservation_id: str) -> str:
+    return f'{reservation_id}{_PENDING_SUFFIX}'
+
+class ReservationLedger:
+    """Tracks committed capacity per worker so concurrent planners never oversubscribe it"""
+
+    def __init__(self, store: StateStore, pending_ttl: float = 3600):
+        self.store = store
+        self.pending_ttl = pending_ttl
+
+    @staticmethod
+    def _live_entries(entries: Optional[Dict]) -> Dict[str, Dict]:
+        now = time.time()
+        return {
+            reservation_id: entry
+            for reservation_id, entry in (entries or {}).items()
+            if entry.get('expires_at') is None or entry['expires_at'] > now
+        }
+
+    @staticmethod
+    def _total(entries: Dict[str, Dict]) -> Resources:
+        # A redeploy replaces the topology's containers in place: its pending and committed
+        # entries on one worker count once, at their per-dimension maximum
+        per_reservation: Dict[str, Resources] = {}
+        for key, entry in entries.items():
+            reservation_id = key[:-len(_PENDING_SUFFIX)] if key.endswith(_PENDING_SUFFIX) else key
+            demand = Resources(entry['cpu'], entry['memory'], entry['storage'], entry['containers'])
+            per_reservation[reservation_id] = per_reservation.get(reservation_id, Resources()).maximum(demand)
+        return sum(per_reservation.values(), Resources())
+
+    async def reserved(self) -> Dict[str, Resources]:
+        """Outstanding reservations summed per instance"""
+        ledger = await self.store.all(RESERVATIONS)
+        return {instance_id: self._total(self._live_entries(entries)) for instance_id, entries in ledger.items()}
+
+    async def reserve(self,
+                      reservation_id: str,
+                      instance_id: str,
+                      demand: Resources,
+                      fits: Optional[Callable[[Resources], bool]] = None) -> bool:
+        """Atomically add a pending reservation if fits(all reservations incl. this one) allows it
+
+        A committed reservation under the same ID (the deployed topology) is kept
+        until commit replaces it or release drops it.
+        """
+        accepted = False
+
+        def apply(entries: Optional[Dict]) -> Optional[Dict]:
+            nonlocal accepted
+            live = self._live_entries(entries)
+            candidate = {
+                **live,
+                pending_key(reservation_id): {
+                    **demand.as_dict(),
+                    'state': PENDING,
+                    'created_at': time.time(),
+                    'expires_at': time.time() + self.pending_ttl,
+                },
+            }
+            if fits is not None and not fits(self._total(candidate)):
+                accepted = False
+                return entries
+            accepted = True
+            return candidate
+
+        await self.store.update(RESERVATIONS, instance_id, apply)
+        if not accepted:
+            logger.info(f"Reservation {reservation_id} no longer fits on {instance_id}")
+        return accepted
+
+    async def reserve_all(self,
+                          reservation_id: str,
+                          demands: Dict[str, Resources],
+                          fits: Dict[str, Callable[[Resources], bool]]) -> List[str]:
+        """Reserve on every instance or none; returns the instances that rejected the reservation"""
+        reserved: List[str] = []
+        for instance_id, demand in demands.items():
+            if await self.reserve(reservation_id, instance_id, demand, fits.get(instance_id)):
+                reserved.append(instance_id)
+            else:
+                await self.release(reservation_id, reserved, only_pending=True)
+                return [instance_id]
+        return []
+
+    async def commit(self, reservation_id: str, instance_ids: Iterable[str]):
+        """Turn the pending reservation into the committed one, held until release (the topology is deployed)"""
+        def apply(entries: Optional[Dict]) -> Optional[Dict]:
+            live = self._live_entries(entries)
+            pending = live.pop(pending_key(reservation_id), None)
+            if pending is not None:
+                live[reservation_id] = {**pending, 'state': COMMITTED, 'expires_at': None}
+            return live or None
+
+        for instance_id in instance_ids:
+            await self.store.update(RESERVATIONS, instance_id, apply)
+
+    async def release(self,
+                      reservation_id: str,
+                      instance_ids: Optional[Iterable[str]] = None,
+                      only_pending: bool = False):
+        """Drop a reservation from the given instances (default: everywhere)
+
+        only_pending keeps committed entries, e.g. those of an earlier successful
+        deployment of the same topology when a redeploy fails.
+        """
+        if instance_ids is None:
+            instance_ids = list((await self.store.all(RESERVATIONS)).keys())
+
+        def apply(entries: Optional[Dict]) -> Optional[Dict]:
+            live = self._live_entries(entries)
+            live.pop(pending_key(reservation_id), None)
+            if not only_pending:
+                live.pop(reservation_id, None)
+            return live or None
+
+        for instance_id in instance_ids:
+            await self.store.update(RESERVATIONS, instance_id, apply)
+
+    async def snapshot(self) -> Dict[str, Dict[str, Dict]]:
+        """Live reservations per instance, for the API"""
+        ledger = await self.store.all(RESERVATIONS)
+        return {instance_id: self._live_entries(entries) for instance_id, entries in ledger.items()
+                if self._live_entries(entries)}
@@ -8,16 +8,30 @@ import asyncio
 import json
 import logging
 import os
+import threading
 import time
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from datetime import datetime, timedelta
 import boto3
-import paramiko
 from botocore.exceptions import ClientError
+from ssh_pool import get_ssh_pool
+from async_executor import run_blocking
+from instance_specs import get_spec_cache
+from metrics_store import get_metrics_store
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class ContainerUsage:
+    """One containerlab node's usage on a worker, from its cgroup"""
+    node: str
+    kind: str
+    image: str
+    lab: str
+    cpu_cores: Optional[float]  # None on the first poll of a container (a rate needs two samples)
+    memory_gb: float
+
 @dataclass
 class SystemMetrics:
     timestamp: datetime
@@ -33,6 +47,7 @@ class SystemMetrics:
     network_connections: int
     docker_containers: int
     docker_running: int
+    containers: List[ContainerUsage] = field(default_factory=list)
 
 @dataclass
 class InstanceResourceInfo:
@@ -66,6 +81,192 @@ class InstanceResourceInfo:
     containerlab_installed: bool
     last_checked: datetime
 
+# Remote probe: one python3 invocation on the worker that reads everything a poll needs
+# and prints a single JSON document. Kept to the stdlib so it runs on a stock Ubuntu image.
+METRICS_PROBE_SCRIPT = r'''
+import json, os, shutil, subprocess, sys, time
+
+def read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return ''
+
+def run(args):
+    try:
+        return subprocess.run(args, capture_output=True, text=True, timeout=10).stdout
+    except Exception:
+        return ''
+
+def cpu_times():
+    return [int(x) for x in read('/proc/stat').splitlines()[0].split()[1:]]
+
+# On a host's first poll the manager has no earlier counters to diff against: two reads
+# bracketing the probe give it a current CPU figure. Later polls read once and never wait.
+first_sample = 'first-sample' in sys.argv[1:]
+cpu_start, cpu_start_time = (cpu_times() if first_sample else None), time.monotonic()
+meminfo = {}
+for line in read('/proc/meminfo').splitlines():
+    key, _, value = line.partition(':')
+    meminfo[key] = int(value.split()[0]) if value.split() else 0
+disk = os.statvfs('/')
+
+connections = 0
+for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+    for line in read(table).splitlines()[1:]:
+        fields = line.split()
+        if len(fields) > 3 and fields[3] == '01':
+            connections += 1
+
+states = run(['sudo', '-n', 'docker', 'ps', '-a', '--format', '{{.State}}']).split()
+
+def stat_file(path):
+    return dict(line.split()[:2] for line in read(path).splitlines() if len(line.split()) >= 2)
+
+def cgroup_usage(container_id):
+    """Cumulative CPU microseconds and working-set bytes (usage minus inactive page cache, like docker stats)"""
+    # cgroup v2 with the systemd or the cgroupfs driver
+    for base in ('/sys/fs/cgroup/system.slice/docker-%s.scope' % container_id, '/sys/fs/cgroup/docker/' + container_id):
+        cpu = stat_file(base + '/cpu.stat')
+        if cpu:
+            memory = int(read(base + '/memory.current') or 0) - int(stat_file(base + '/memory.stat').get('inactive_file', 0))
+            return int(cpu.get('usage_usec', 0)), memory
+    # cgroup v1
+    usage = read('/sys/fs/cgroup/cpuacct/docker/%s/cpuacct.usage' % container_id).strip()
+    if usage:
+        base = '/sys/fs/cgroup/memory/docker/' + container_id
+        memory = int(read(base + '/memory.usage_in_bytes') or 0) - int(stat_file(base + '/memory.stat').get('total_inactive_file', 0))
+        return int(usage) // 1000, memory
+    return None
+
+# Running containerlab nodes, identified by the labels containerlab puts on them
+containers = []
+listing = run(['sudo', '-n', 'docker', 'ps', '--no-trunc', '--filter', 'label=containerlab', '--format',
+               '{{.ID}}\t{{.Image}}\t{{.Label "clab-node-name"}}\t{{.Label "clab-node-kind"}}\t{{.Label "containerlab"}}'])
+for line in listing.splitlines():
+    fields = line.split('\t')
+    usage = cgroup_usage(fields[0]) if len(fields) == 5 else None
+    if usage is not None:
+        containers.append({'id': fields[0], 'image': fields[1], 'node': fields[2], 'kind': fields[3], 'lab': fields[4],
+                           'cpu_usec': usage[0], 'memory_bytes': max(0, usage[1])})
+
+if first_sample:
+    time.sleep(max(0.0, 0.5 - (time.monotonic() - cpu_start_time)))
+
+print(json.dumps({
+    'cpu_times_start': cpu_start,
+    'cpu_times': cpu_times(),
+    'cpu_count': os.cpu_count(),
+    'loadavg': [float(x) for x in read('/proc/loadavg').split()[:3]],
+    'mem_total_kb': meminfo.get('MemTotal', 0),
+    'mem_available_kb': meminfo.get('MemAvailable', meminfo.get('MemFree', 0)),
+    'disk_total_bytes': disk.f_blocks * disk.f_frsize,
+    'disk_free_bytes': disk.f_bfree * disk.f_frsize,
+    'disk_avail_bytes': disk.f_bavail * disk.f_frsize,
+    'processes': sum(1 for entry in os.listdir('/proc') if entry.isdigit()),
+    'connections': connections,
+    'docker_active': run(['systemctl', 'is-active', 'docker']).strip() == 'active',
+    'docker_containers': len(states),
+    'docker_running': sum(1 for state in states if state == 'running'),
+    'containerlab_installed': bool(shutil.which('containerlab')),
+    'containers': containers,
+    'time': time.time(),
+}))
+'''
+
+def metrics_probe_command(first_sample: bool = False) -> str:
+    """Shell command running the probe; first_sample adds the in-probe CPU window"""
+    args = ' first-sample' if first_sample else ''
+    return f"python3 -{args} <<'NDT_PROBE'\n{METRICS_PROBE_SCRIPT}\nNDT_PROBE"
+
+class CPUSampler:
+    """Turns cumulative /proc/stat counters into CPU utilization between consecutive polls of a host"""
+    
+    def __init__(self):
+        self._previous: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _totals(cpu_times: List[int]) -> Tuple[int, int]:
+        # user nice system idle iowait irq softirq steal; guest time is already part of user/nice
+        busy_and_idle = cpu_times[:8]
+        idle = cpu_times[3] + (cpu_times[4] if len(cpu_times) > 4 else 0)
+        return sum(busy_and_idle), idle
+    
+    def has_sample(self, host: str) -> bool:
+        """Whether the next poll of host can be measured against a stored sample"""
+        with self._lock:
+            return host in self._previous
+    
+    def sample(self, host: str, cpu_times: List[int], baseline: Optional[List[int]] = None) -> float:
+        """Record a counter sample for host and return utilization percent since its previous sample
+        
+        On a host's first poll the interval starts at baseline, the earlier read
+        taken by the same probe, instead of at boot. Probes of hosts with a stored
+        sample carry no baseline; if a reboot reset the counters in between, the
+        interval is the (short) time since that reboot.
+        """
+        total, idle = self._totals(cpu_times)
+        
+        with self._lock:
+            previous = self._previous.get(host)
+            self._previous[host] = (total, idle)
+        
+        if previous is None or total <= previous[0] or idle < previous[1]:
+            previous = self._totals(baseline) if baseline else (0, 0)
+        
+        total_delta = total - previous[0]
+        idle_delta = idle - previous[1]
+        if total_delta <= 0:
+            return 0.0
+        return max(0.0, min(100.0, (1 - idle_delta / total_delta) * 100))
+    
+    def forget(self, host: str):
+        """Drop the stored sample for a host (e.g. after it is terminated)"""
+        with self._lock:
+            self._previous.pop(host, None)
+
+class ContainerSampler:
+    """Turns cumulative cgroup CPU time into cores used by each container between consecutive polls of a host"""
+    
+    def __init__(self):
+        self._previous: Dict[str, Dict[str, Tuple[int, float]]] = {}
+        self._lock = threading.Lock()
+    
+    def sample(self, host: str, probe: Dict) -> List[ContainerUsage]:
+        """Usage of every containerlab container in a probe document"""
+        now = probe.get('time', time.time())
+        current: Dict[str, Tuple[int, float]] = {}
+        usages = []
+        
+        with self._lock:
+            previous = self._previous.get(host, {})
+            for container in probe.get('containers', []):
+                cpu_usec = container['cpu_usec']
+                current[container['id']] = (cpu_usec, now)
+                
+                cpu_cores = None
+                before = previous.get(container['id'])
+                if before is not None and cpu_usec >= before[0] and now > before[1]:
+                    cpu_cores = round((cpu_usec - before[0]) / 1e6 / (now - before[1]), 3)
+                
+                usages.append(ContainerUsage(
+                    node=container['node'],
+                    kind=container['kind'],
+                    image=container['image'],
+                    lab=container['lab'],
+                    cpu_cores=cpu_cores,
+                    memory_gb=round(container['memory_bytes'] / 1024 ** 3, 3),
+                ))
+            # Containers gone since the last poll are dropped with the rest of the old sample
+            self._previous[host] = current
+        return usages
+    
+    def forget(self, host: str):
+        with self._lock:
+            self._previous.pop(host, None)
+
 class SSHResourceCollector:
     """Collects resource information via SSH"""
     
@@ -73,176 +274,88 @@ class SSHResourceCollector:
         self.ssh_key_path = os.path.expanduser(ssh_key_path)
         self.username = username
         self.timeout = timeout
+        self.ssh_pool = get_ssh_pool(self.ssh_key_path)
+        self.cpu_sampler = CPUSampler()
+        self.container_sampler = ContainerSampler()
     
-    async def collect_metrics(self, ip_address: str) -> Optional[SystemMetrics]:
-        """Collect system metrics from a remote instance via SSH"""
-        try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            ssh.connect(
-                hostname=ip_address,
-                username=self.username,
-                key_filename=self.ssh_key_path,
-                timeout=self.timeout
-            )
-            
-            metrics = SystemMetrics(
-                timestamp=datetime.now(),
-                cpu_percent=await self._get_cpu_usage(ssh),
-                memory_percent=0,
-                memory_used_gb=0,
-                memory_total_gb=0,
-                disk_percent=0,
-                disk_used_gb=0,
-                disk_total_gb=0,
-                load_average=(0, 0, 0),
-                process_count=0,
-                network_connections=0,
-                docker_containers=0,
-                docker_running=0
-            )
-            
-            # Collect all metrics
-            metrics.memory_percent, metrics.memory_used_gb, metrics.memory_total_gb = await self._get_memory_usage(ssh)
-            metrics.disk_percent, metrics.disk_used_gb, metrics.disk_total_gb = await self._get_disk_usage(ssh)
-            metrics.load_average = await self._get_load_average(ssh)
-            metrics.process_count = await self._get_process_count(ssh)
-            metrics.network_connections = await self._get_network_connections(ssh)
-            metrics.docker_containers, metrics.docker_running = await self._get_docker_info(ssh)
-            
-            ssh.close()
-            return metrics
-            
-        except Exception as e:
-            logger.debug(f"Error collecting metrics from {ip_address}: {e}")
-            return None
-    
-    async def _get_cpu_usage(self, ssh) -> float:
-        """Get CPU usage percentage"""
-        try:
-            # Use top to get CPU usage
-            stdin, stdout, stderr = ssh.exec_command(
-                "top -bn1 | grep 'Cpu(s)' | awk '{print $2}' | sed 's/%us,//'"
-            )
-            result = stdout.read().decode().strip()
-            return float(result) if result else 0.0
-        except:
-            return 0.0
-    
-    async def _get_memory_usage(self, ssh) -> Tuple[float, float, float]:
-        """Get memory usage (percent, used GB, total GB)"""
-        try:
-            # Get memory info in GB
-            stdin, stdout, stderr = ssh.exec_command(
-                "free -g | awk 'NR==2{printf \"%.2f %.2f %.2f\", $3/$2*100, $3, $2}'"
-            )
-            result = stdout.read().decode().strip()
-            if result:
-                parts = result.split()
-                return float(parts[0]), float(parts[1]), float(parts[2])
-            return 0.0, 0.0, 0.0
-        except:
-            return 0.0, 0.0, 0.0
+    def run_probe(self, ip_address: str) -> Dict:
+        """Run the metrics probe on a host and return its decoded JSON document (blocking)"""
+        first_sample = not self.cpu_sampler.has_sample(ip_address)
+        result = self.ssh_pool.exec_command(
+            ip_address, metrics_probe_command(first_sample), timeout=self.timeout, username=self.username
+        )
+        if result.exit_status != 0:
+            raise RuntimeError(f"metrics probe exited with {result.exit_status}: {result.stderr.strip()}")
+        return json.loads(result.stdout)
     
-    async def _get_disk_usage(self, ssh) -> Tuple[float, float, float]:
-        """Get disk usage (percent, used GB, total GB)"""
-        try:
-            stdin, stdout, stderr = ssh.exec_command(
-                "df -BG / | awk 'NR==2{printf \"%.2f %.2f %.2f\", $3/$2*100, $3, $2}' | sed 's/G//g'"
-            )
-            result = stdout.read().decode().strip()
-            if result:
-                parts = result.split()
-                return float(parts[0]), float(parts[1]), float(parts[2])
-            return 0.0, 0.0, 0.0
-        except:
-            return 0.0, 0.0, 0.0
+    def parse_metrics(self, ip_address: str, probe: Dict) -> SystemMetrics:
+        """Convert a probe document into SystemMetrics"""
+        gib = 1024 ** 3
+        
+        # Utilization over the interval since this host's previous poll, not since boot
+        cpu_percent = self.cpu_sampler.sample(ip_address, probe['cpu_times'], probe.get('cpu_times_start'))
+        
+        mem_total_gb = probe['mem_total_kb'] / 1024 ** 2
+        mem_used_gb = (probe['mem_total_kb'] - probe['mem_available_kb']) / 1024 ** 2
+        
+        # Same convention as df: used / (used + available to unprivileged users)
+        disk_total_gb = probe['disk_total_bytes'] / gib
+        disk_used_gb = (probe['disk_total_bytes'] - probe['disk_free_bytes']) / gib
+        disk_usable_gb = disk_used_gb + probe['disk_avail_bytes'] / gib
+        
+        return SystemMetrics(
+            timestamp=datetime.now(),
+            cpu_percent=round(cpu_percent, 2),
+            memory_percent=round(mem_used_gb / mem_total_gb * 100, 2) if mem_total_gb else 0.0,
+            memory_used_gb=round(mem_used_gb, 2),
+            memory_total_gb=round(mem_total_gb, 2),
+            disk_percent=round(disk_used_gb / disk_usable_gb * 100, 2) if disk_usable_gb else 0.0,
+            disk_used_gb=round(disk_used_gb, 2),
+            disk_total_gb=round(disk_total_gb, 2),
+            load_average=tuple(probe['loadavg']),
+            process_count=probe['processes'],
+            network_connections=probe['connections'],
+            docker_containers=probe['docker_containers'],
+            docker_running=probe['docker_running'],
+            containers=self.container_sampler.sample(ip_address, probe)
+        )
     
-    async def _get_load_average(self, ssh) -> Tuple[float, float, float]:
-        """Get system load average"""
-        try:
-            stdin, stdout, stderr = ssh.exec_command("uptime | awk -F'load average:' '{print $2}'")
-            result = stdout.read().decode().strip()
-            if result:
-                loads = [float(x.strip().rstrip(',')) for x in result.split()]
-                return tuple(loads[:3])
-            return 0.0, 0.0, 0.0
-        except:
-            return 0.0, 0.0, 0.0
+    @staticmethod
+    def parse_service_status(probe: Optional[Dict]) -> Dict[str, bool]:
+        """Service health flags from a probe document (None means the host was unreachable)"""
+        if probe is None:
+            return {
+                'ssh_accessible': False,
+                'docker_running': False,
+                'containerlab_installed': False
+            }
+        return {
+            'ssh_accessible': True,
+            'docker_running': probe['docker_active'],
+            'containerlab_installed': probe['containerlab_installed']
+        }
     
-    async def _get_process_count(self, ssh) -> int:
-        """Get total process count"""
+    def _collect_blocking(self, ip_address: str) -> Tuple[Optional[SystemMetrics], Dict[str, bool]]:
         try:
-            stdin, stdout, stderr = ssh.exec_command("ps aux | wc -l")
-            result = stdout.read().decode().strip()
-            return int(result) if result else 0
-        except:
-            return 0
+            probe = self.run_probe(ip_address)
+            return self.parse_metrics(ip_address, probe), self.parse_service_status(probe)
+        except Exception as e:
+            logger.debug(f"Error probing {ip_address}: {e}")
+            return None, self.parse_service_status(None)
     
-    async def _get_network_connections(self, ssh) -> int:
-        """Get active network connections count"""
-        try:
-            stdin, stdout, stderr = ssh.exec_command("netstat -an | grep ESTABLISHED | wc -l")
-            result = stdout.read().decode().strip()
-            return int(result) if result else 0
-        except:
-            return 0
+    async def collect(self, ip_address: str) -> Tuple[Optional[SystemMetrics], Dict[str, bool]]:
+        """Collect metrics and service status with a single remote probe"""
+        return await run_blocking(self._collect_blocking, ip_address)
     
-    async def _get_docker_info(self, ssh) -> Tuple[int, int]:
-        """Get Docker container information (total, running)"""
-        try:
-            # Total containers
-            stdin, stdout, stderr = ssh.exec_command("sudo docker ps -a --format '{{.ID}}' | wc -l")
-            total = int(stdout.read().decode().strip() or 0)
-            
-            # Running containers
-            stdin, stdout, stderr = ssh.exec_command("sudo docker ps --format '{{.ID}}' | wc -l")
-            running = int(stdout.read().decode().strip() or 0)
-            
-            return total, running
-        except:
-            return 0, 0
+    async def collect_metrics(self, ip_address: str) -> Optional[SystemMetrics]:
+        """Collect system metrics from a remote instance via SSH"""
+        metrics, _ = await self.collect(ip_address)
+        return metrics
     
     async def check_service_status(self, ip_address: str) -> Dict[str, bool]:
         """Check status of required services"""
-        try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            ssh.connect(
-                hostname=ip_address,
-                username=self.username,
-                key_filename=self.ssh_key_path,
-                timeout=self.timeout
-            )
-            
-            status = {
-                'ssh_accessible': True,
-                'docker_running': False,
-                'containerlab_installed': False
-            }
-            
-            # Check Docker service
-            stdin, stdout, stderr = ssh.exec_command("sudo systemctl is-active docker")
-            docker_status = stdout.read().decode().strip()
-            status['docker_running'] = docker_status == "active"
-            
-            # Check containerlab installation
-            stdin, stdout, stderr = ssh.exec_command("which containerlab")
-            clab_path = stdout.read().decode().strip()
-            status['containerlab_installed'] = bool(clab_path)
-            
-            ssh.close()
-            return status
-            
-        except Exception as e:
-            logger.debug(f"Error checking service status for {ip_address}: {e}")
-            return {
-                'ssh_accessible': False,
-                'docker_running': False,
-                'containerlab_installed': False
-            }
+        _, status = await self.collect(ip_address)
+        return status
 
 class EC2ResourceMonitor:
     """Main EC2 resource monitoring class"""
@@ -251,6 +364,8 @@ class EC2ResourceMonitor:
         self.ec2_client = boto3.client('ec2', region_name=region)
         self.ec2_resource = boto3.resource('ec2', region_name=region)
         self.ssh_collector = SSHResourceCollector(ssh_key_path)
+        self.spec_cache = get_spec_cache(self.ec2_client)
+        self.history = get_metrics_store()
         self.region = region
         self.instance_cache = {}
         self.last_update = None
@@ -268,7 +383,8 @@ class EC2ResourceMonitor:
         
         try:
             # Query EC2 for managed instances
-            response = self.ec2_client.describe_instances(
+            response = await run_blocking(
+                self.ec2_client.describe_instances,
                 Filters=[
                     {'Name': 'tag:NDT-Managed', 'Values': ['true']},
                     {'Name': 'instance-state-name', 'Values': ['running', 'stopped', 'stopping', 'pending']}
@@ -277,12 +393,20 @@ class EC2ResourceMonitor:
             
             instances = {}
             
+            # Fill the spec cache for every described instance in one batch
+            described = [
+                instance_data
+                for reservation in response['Reservations']
+                for instance_data in reservation['Instances']
+            ]
+            await self.spec_cache.prime(described)
+            
             for reservation in response['Reservations']:
                 for instance_data in reservation['Instances']:
                     instance_id = instance_data['InstanceId']
                     
                     # Get instance specifications
-                    specs = await self._get_instance_specifications(instance_data['InstanceType'])
+                    specs = self._get_instance_specifications(instance_data)
                     
                     # Parse tags
                     tags = {tag['Key']: tag['Value'] for tag in instance_data.get('Tags', [])}
@@ -352,12 +476,12 @@ class EC2ResourceMonitor:
     async def _collect_single_instance_metrics(self, instance_info: InstanceResourceInfo, ip: str):
         """Collect metrics for a single instance"""
         try:
-            # Collect system metrics
-            metrics = await self.ssh_collector.collect_metrics(ip)
+            # Collect system metrics and service status in one probe
+            metrics, service_status = await self.ssh_collector.collect(ip)
             instance_info.current_metrics = metrics
+            if metrics:
+                await run_blocking(self.history.record, instance_info.instance_id, metrics)
             
-            # Check service status
-            service_status = await self.ssh_collector.check_service_status(ip)
             instance_info.ssh_accessible = service_status['ssh_accessible']
             instance_info.docker_running = service_status['docker_running']
             instance_info.containerlab_installed = service_status['containerlab_installed']
@@ -374,33 +498,9 @@ class EC2ResourceMonitor:
             logger.debug(f"Error collecting metrics for {instance_info.instance_id}: {e}")
             instance_info.ssh_accessible = False
     
-    async def _get_instance_specifications(self, instance_type: str) -> Dict:
-        """Get EC2 instance type specifications"""
-        try:
-            response = self.ec2_client.describe_instance_types(InstanceTypes=[instance_type])
-            instance_info = response['InstanceTypes'][0]
-            
-            return {
-                'cpu': instance_info['VCpuInfo']['DefaultVCpus'],
-                'memory': instance_info['MemoryInfo']['SizeInMiB'] / 1024,  # Convert to GB
-                'storage': 20  # Default EBS storage, will be overridden by actual disk size
-            }
-        except Exception as e:
-            logger.debug(f"Error getting specs for {instance_type}: {e}")
-            # Fallback specifications
-            fallback_specs = {
-                't3.micro': {'cpu': 2, 'memory': 1, 'storage': 8},
-                't3.small': {'cpu': 2, 'memory': 2, 'storage': 20},
-                't3.medium': {'cpu': 2, 'memory': 4, 'storage': 20},
-                't3.large': {'cpu': 2, 'memory': 8, 'storage': 20},
-                't3.xlarge': {'cpu': 4, 'memory': 16, 'storage': 20},
-                't3.2xlarge': {'cpu': 8, 'memory': 32, 'storage': 20},
-                'c5.large': {'cpu': 2, 'memory': 4, 'storage': 20},
-                'c5.xlarge': {'cpu': 4, 'memory': 8, 'storage': 20},
-                'm5.large': {'cpu': 2, 'memory': 8, 'storage': 20},
-                'm5.xlarge': {'cpu': 4, 'memory': 16, 'storage': 20},
-            }
-            return fallback_specs.get(instance_type, {'cpu': 2, 'memory': 4, 'storage': 20})
+    def _get_instance_specifications(self, instance_data: Dict) -> Dict:
+        """Get EC2 instance specifications from the shared spec cache"""
+        return self.spec_cache.specs_for_instance(instance_data)
     
     async def find_suitable_instances(self, 
                                     cpu_required: float, 
@@ -502,15 +602,11 @@ class EC2ResourceMonitor:
         return summary
     
     async def get_instance_metrics_history(self, instance_id: str, hours: int = 24) -> List[SystemMetrics]:
-        """Get historical metrics for an instance (placeholder for future implementation)"""
-        # This would typically involve storing metrics in a database
-        # For now, return current metrics only
-        instances = await self.get_all_managed_instances()
-        
-        if instance_id in instances and instances[instance_id].current_metrics:
-            return [instances[instance_id].current_metrics]
+        """Get historical metrics for an instance from the metrics store, oldest first
         
-        return []
+        Longer ranges come from the 1-minute or 1-hour tier (bucket means).
+        """
+        return await run_blocking(self.history.samples, instance_id, time.time() - hours * 3600)
     
     def serialize_instances(self, instances: Dict[str, InstanceResourceInfo]) -> Dict:
         """Serialize instance information for JSON response"""
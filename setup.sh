@@ -185,6 +185,25 @@ else
     print_status "✓ Docker is already installed"
 fi
 
+# Pull-through registry caches for workers (enable registry_mirror in config.yaml to use them)
+print_header "Starting pull-through registry mirrors..."
+start_registry_mirror() {
+    local name=$1 port=$2 debug_port=$3 upstream=$4
+    if sudo docker ps -a --format '{{.Names}}' | grep -qx "$name"; then
+        sudo docker start "$name" > /dev/null
+    else
+        sudo docker run -d --name "$name" --restart unless-stopped \
+            -p "$port:5000" -p "$debug_port:5050" \
+            -e REGISTRY_PROXY_REMOTEURL="$upstream" \
+            -e REGISTRY_HTTP_DEBUG_ADDR=:5050 \
+            -v "$name:/var/lib/registry" \
+            registry:2 > /dev/null
+    fi
+}
+start_registry_mirror ndt-registry-dockerhub 5000 5050 https://registry-1.docker.io
+start_registry_mirror ndt-registry-ghcr 5001 5051 https://ghcr.io
+print_status "✓ Registry mirrors on ports 5000 (Docker Hub) and 5001 (ghcr.io)"
+
 # Install and configure Redis
 print_header "Installing and configuring Redis..."
 sudo apt-get install -y redis-server
@@ -362,11 +381,13 @@ Environment=PATH=$SCRIPT_DIR/venv/bin
 Environment=PYTHONPATH=$SCRIPT_DIR
 Environment=NDT_INSTANCE_TYPE=$INSTANCE_TYPE
 Environment=NDT_MANAGER_MODE=true
+Environment=PROMETHEUS_MULTIPROC_DIR=$SCRIPT_DIR/data/prometheus
 
 # Load environment variables
 EnvironmentFile=$SCRIPT_DIR/.env
 
 # Main service command
+ExecStartPre=/bin/sh -c 'rm -rf $SCRIPT_DIR/data/prometheus && mkdir -p $SCRIPT_DIR/data/prometheus'
 ExecStart=$SCRIPT_DIR/venv/bin/uvicorn ndt_manager:app --host 0.0.0.0 --port 8000 --workers 2
 ExecReload=/bin/kill -HUP \$MAINPID
 
@@ -457,6 +478,10 @@ echo "Public URL: http://$PUBLIC_IP:8000"
 echo "Documentation: http://$PUBLIC_IP:8000/docs"
 echo ""
 
+# The API processes share Prometheus metrics through files here; clear the previous run's
+export PROMETHEUS_MULTIPROC_DIR="\${PROMETHEUS_MULTIPROC_DIR:-\$(pwd)/data/prometheus}"
+rm -rf "\$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "\$PROMETHEUS_MULTIPROC_DIR"
+
 # Start the application
 exec uvicorn ndt_manager:app \\
     --host 0.0.0.0 \\
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+SSH Connection Pool for NDT
+Process-wide pool of persistent paramiko connections to worker instances
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional, Tuple
+
+import paramiko
+
+from instrumentation import SSH_COMMAND_SECONDS, SSH_CONNECT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CommandResult:
+    exit_status: int
+    stdout: str
+    stderr: str
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_status == 0
+
+@dataclass
+class _HostEntry:
+    host: str
+    username: str
+    semaphore: threading.BoundedSemaphore
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    client: Optional[paramiko.SSHClient] = None
+    active_sessions: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+class SSHConnectionPool:
+    """Keeps one multiplexed SSH transport per worker host and hands out sessions on it"""
+
+    def __init__(self,
+                 key_path: str = '~/.ssh/id_rsa',
+                 username: str = 'ubuntu',
+                 connect_timeout: int = 30,
+                 keepalive_interval: int = 30,
+                 max_sessions_per_host: int = 8,
+                 idle_timeout: int = 300):
+        self.key_path = os.path.expanduser(key_path)
+        self.username = username
+        self.connect_timeout = connect_timeout
+        self.keepalive_interval = keepalive_interval
+        # sshd defaults to MaxSessions 10, stay below it
+        self.max_sessions_per_host = max_sessions_per_host
+        self.idle_timeout = idle_timeout
+        self._entries: Dict[Tuple[str, str], _HostEntry] = {}
+        self._lock = threading.Lock()
+
+    def _get_entry(self, host: str, username: str) -> _HostEntry:
+        with self._lock:
+            key = (host, username)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _HostEntry(
+                    host=host,
+                    username=username,
+                    semaphore=threading.BoundedSemaphore(self.max_sessions_per_host)
+                )
+                self._entries[key] = entry
+            # Touch under the pool lock so a concurrent evict_idle cannot drop an entry being leased
+            entry.last_used = time.monotonic()
+            return entry
+
+    def _connect(self, entry: _HostEntry, timeout: Optional[int]) -> paramiko.SSHClient:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        with SSH_CONNECT_SECONDS.time():
+            client.connect(
+                hostname=entry.host,
+                username=entry.username,
+                key_filename=self.key_path,
+                timeout=timeout or self.connect_timeout,
+                banner_timeout=timeout or self.connect_timeout
+            )
+        transport = client.get_transport()
+        if transport is not None and self.keepalive_interval:
+            transport.set_keepalive(self.keepalive_interval)
+        logger.debug(f"Opened pooled SSH connection to {entry.username}@{entry.host}")
+        return client
+
+    def _ensure_client(self, entry: _HostEntry, timeout: Optional[int]) -> paramiko.SSHClient:
+        """Return a live client for the entry, reconnecting if the transport has died"""
+        with entry.lock:
+            client = entry.client
+            transport = client.get_transport() if client else None
+            if transport is None or not transport.is_active():
+                if client is not None:
+                    logger.debug(f"Reconnecting stale SSH transport to {entry.host}")
+                    self._close_client(client)
+                entry.client = None
+                entry.client = self._connect(entry, timeout)
+            return entry.client
+
+    def _invalidate(self, entry: _HostEntry, client: paramiko.SSHClient):
+        with entry.lock:
+            if entry.client is client:
+                entry.client = None
+        self._close_client(client)
+
+    @staticmethod
+    def _close_client(client: paramiko.SSHClient):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def session(self,
+                host: str,
+                username: Optional[str] = None,
+                timeout: Optional[int] = None) -> Iterator[paramiko.SSHClient]:
+        """Lease the pooled client for a host, holding one of its session slots"""
+        self.evict_idle()
+        entry = self._get_entry(host, username or self.username)
+
+        if not entry.semaphore.acquire(timeout=timeout or self.connect_timeout):
+            raise TimeoutError(f"No free SSH session slot for {host}")
+
+        with entry.lock:
+            entry.active_sessions += 1
+        try:
+            yield self._ensure_client(entry, timeout)
+        finally:
+            with entry.lock:
+                entry.active_sessions -= 1
+                entry.last_used = time.monotonic()
+            entry.semaphore.release()
+
+    def exec_command(self,
+                     host: str,
+                     command: str,
+                     timeout: Optional[int] = None,
+                     username: Optional[str] = None) -> CommandResult:
+        """Run a command on a host over the pooled transport and wait for its exit status"""
+        entry = self._get_entry(host, username or self.username)
+
+        for attempt in range(2):
+            with self.session(host, username=username, timeout=timeout) as client:
+                try:
+                    channel = client.get_transport().open_session(timeout=timeout)
+                except (paramiko.SSHException, EOFError, socket.error, AttributeError) as e:
+                    # Channel could not be opened, so the command never ran: safe to reconnect and retry
+                    self._invalidate(entry, client)
+                    if attempt:
+                        raise
+                    logger.debug(f"Retrying command on {host} after transport failure: {e}")
+                    continue
+
+                try:
+                    if timeout:
+                        channel.settimeout(timeout)
+                    started = time.perf_counter()
+                    channel.exec_command(command)
+                    stdout = channel.makefile('r')
+                    stderr = channel.makefile_stderr('r')
+                    out = stdout.read().decode(errors='replace')
+                    err = stderr.read().decode(errors='replace')
+                    exit_status = channel.recv_exit_status()
+                    SSH_COMMAND_SECONDS.observe(time.perf_counter() - started)
+                    return CommandResult(exit_status=exit_status, stdout=out, stderr=err)
+                finally:
+                    channel.close()
+
+    def write_file(self,
+                   host: str,
+                   remote_path: str,
+                   content: str,
+                   username: Optional[str] = None):
+        """Write a text file on a host over SFTP on the pooled transport"""
+        with self.session(host, username=username) as client:
+            sftp = client.open_sftp()
+            try:
+                with sftp.open(remote_path, 'w') as f:
+                    f.write(content)
+            finally:
+                sftp.close()
+
+    def evict_idle(self) -> int:
+        """Close connections that have had no sessions for longer than idle_timeout"""
+        now = time.monotonic()
+        evicted = []
+
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                # An entry whose lock is held is connecting or being leased, so it is not idle
+                if not entry.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if entry.active_sessions == 0 and now - entry.last_used > self.idle_timeout:
+                        evicted.append(entry.client)
+                        del self._entries[key]
+                finally:
+                    entry.lock.release()
+
+        for client in evicted:
+            if client is not None:
+                self._close_client(client)
+
+        if evicted:
+            logger.debug(f"Evicted {len(evicted)} idle SSH connections")
+        return len(evicted)
+
+    def close_host(self, host: str):
+        """Drop all pooled connections to a host (e.g. after it is terminated)"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == host]
+            entries = [self._entries.pop(key) for key in keys]
+
+        for entry in entries:
+            if entry.client is not None:
+                self._close_client(entry.client)
+
+    def close_all(self):
+        """Close every pooled connection"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+
+        for entry in entries:
+            if entry.client is not None:
+                self._close_client(entry.client)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-host view of pooled connections"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                f"{entry.username}@{entry.host}": {
+                    'connected': bool(entry.client and entry.client.get_transport()
+                                      and entry.client.get_transport().is_active()),
+                    'active_sessions': entry.active_sessions,
+                    'idle_seconds': round(now - entry.last_used, 1)
+                }
+                for entry in self._entries.values()
+            }
+
+_pools: Dict[str, SSHConnectionPool] = {}
+_pool_lock = threading.Lock()
+
+def get_ssh_pool(key_path: Optional[str] = None, username: str = 'ubuntu') -> SSHConnectionPool:
+    """Return the process-wide SSH connection pool for a key, creating it on first use
+
+    Callers using the same key share connections; a caller with another key
+    gets its own pool rather than connections authenticated with the first key.
+    """
+    key_path = os.path.expanduser(key_path or os.getenv('SSH_KEY_PATH', '~/.ssh/id_rsa'))
+    with _pool_lock:
+        if key_path not in _pools:
+            _pools[key_path] = SSHConnectionPool(
+                key_path=key_path,
+                username=username,
+                max_sessions_per_host=int(os.getenv('SSH_MAX_SESSIONS_PER_HOST', 8)),
+                idle_timeout=int(os.getenv('SSH_IDLE_TIMEOUT', 300))
+            )
+        return _pools[key_path]
+
+def close_all_pools():
+    """Close the connections of every pool (shutdown)"""
+    with _pool_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
@@ -51,6 +51,10 @@ echo "Public URL: http://:8000"
 echo "Documentation: http://:8000/docs"
 echo ""
 
+# The API processes share Prometheus metrics through files here; clear the previous run's
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-$(pwd)/data/prometheus}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # Start the application
 exec uvicorn ndt_manager:app \
     --host 0.0.0.0 \
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+State Store for NDT Manager
+Shared deployment, instance and job state with in-memory and Redis backends
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Callable, Dict, Optional
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import LockError, WatchError
+except ImportError:  # Redis backend is optional
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Namespaces used by the manager
+DEPLOYMENTS = 'deployments'
+INSTANCES = 'instances'
+JOBS = 'jobs'
+RESERVATIONS = 'reservations'
+WARM_POOL = 'warm_pool'
+POOL_DEMAND = 'pool_demand'
+WORKER_IMAGES = 'worker_images'
+VXLAN_VNIS = 'vxlan_vnis'
+TRACES = 'traces'
+AUTOSCALER_WORKERS = 'autoscaler_workers'
+AUTOSCALER_LOG = 'autoscaler_log'
+TELEMETRY = 'telemetry'
+
+UpdateFn = Callable[[Optional[Dict]], Optional[Dict]]
+
+class StateLock:
+    """Named lock shared by every process using the same store"""
+
+    name: str = ''
+
+    @property
+    def token(self) -> Optional[str]:
+        """Identifies this holder while the lock is held; see StateStore.break_lock"""
+        raise NotImplementedError
+
+    async def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        raise NotImplementedError
+
+    async def release(self):
+        raise NotImplementedError
+
+    async def extend(self) -> bool:
+        """Restart the expiry of a held lock at its full ttl; False when it was lost"""
+        raise NotImplementedError
+
+    async def __aenter__(self):
+        if not await self.acquire():
+            raise TimeoutError('Could not acquire state lock')
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+class StateStore:
+    """Namespaced JSON documents with atomic read-modify-write and named locks"""
+
+    backend = 'base'
+
+    async def get(self, namespace: str, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def put(self, namespace: str, key: str, value: Dict):
+        raise NotImplementedError
+
+    async def delete(self, namespace: str, key: str) -> bool:
+        raise NotImplementedError
+
+    async def all(self, namespace: str) -> Dict[str, Dict]:
+        raise NotImplementedError
+
+    async def update(self, namespace: str, key: str, fn: UpdateFn) -> Optional[Dict]:
+        """Atomically replace a value with fn(current); fn returning None deletes it"""
+        raise NotImplementedError
+
+    def lock(self, name: str, ttl: float = 60) -> StateLock:
+        """A lock that expires after ttl seconds if its holder dies"""
+        raise NotImplementedError
+
+    async def break_lock(self, name: str, token: str) -> bool:
+        """Release a lock on behalf of a holder known to be dead, if that holder (token) still has it"""
+        raise NotImplementedError
+
+    async def ping(self) -> bool:
+        return True
+
+    async def close(self):
+        pass
+
+class _MemoryLock(StateLock):
+    def __init__(self, name: str, lock: asyncio.Lock, holders: Dict[str, str]):
+        self.name = name
+        self._lock = lock
+        # Token of the current holder per lock name, shared by all handles on the store
+        self._holders = holders
+        self._token: Optional[str] = None
+
+    @property
+    def token(self) -> Optional[str]:
+        return self._token if self._holders.get(self.name) == self._token else None
+
+    async def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        if not blocking:
+            if self._lock.locked():
+                return False
+            await self._lock.acquire()
+        else:
+            try:
+                await asyncio.wait_for(self._lock.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return False
+        self._token = uuid.uuid4().hex
+        self._holders[self.name] = self._token
+        return True
+
+    async def release(self):
+        # Only the holder releases; after break_lock the lock may belong to someone else
+        if self.token is not None:
+            self._holders.pop(self.name)
+            self._lock.release()
+
+    async def extend(self) -> bool:
+        # In-process locks never expire
+        return self.token is not None
+
+class InMemoryStateStore(StateStore):
+    """Single-process store; state is lost on restart"""
+
+    backend = 'memory'
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, str]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_holders: Dict[str, str] = {}
+
+    # Values are stored serialized so callers never share mutable state with the store
+    async def get(self, namespace: str, key: str) -> Optional[Dict]:
+        raw = self._data.get(namespace, {}).get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def put(self, namespace: str, key: str, value: Dict):
+        self._data.setdefault(namespace, {})[key] = json.dumps(value, default=str)
+
+    async def delete(self, namespace: str, key: str) -> bool:
+        return self._data.get(namespace, {}).pop(key, None) is not None
+
+    async def all(self, namespace: str) -> Dict[str, Dict]:
+        return {key: json.loads(raw) for key, raw in self._data.get(namespace, {}).items()}
+
+    async def update(self, namespace: str, key: str, fn: UpdateFn) -> Optional[Dict]:
+        # No await between read and write, so this is atomic on the event loop
+        raw = self._data.get(namespace, {}).get(key)
+        new_value = fn(json.loads(raw) if raw is not None else None)
+        if new_value is None:
+            self._data.get(namespace, {}).pop(key, None)
+        else:
+            self._data.setdefault(namespace, {})[key] = json.dumps(new_value, default=str)
+        return new_value
+
+    def lock(self, name: str, ttl: float = 60) -> StateLock:
+        if name not in self._locks:
+            self._locks[name] = asyncio.Lock()
+        return _MemoryLock(name, self._locks[name], self._lock_holders)
+
+    async def break_lock(self, name: str, token: str) -> bool:
+        if name not in self._locks or self._lock_holders.get(name) != token:
+            return False
+        self._lock_holders.pop(name)
+        self._locks[name].release()
+        return True
+
+class _RedisLock(StateLock):
+    def __init__(self, name: str, lock):
+        self.name = name
+        self._lock = lock
+
+    @property
+    def token(self) -> Optional[str]:
+        token = self._lock.local.token
+        return token.decode() if isinstance(token, bytes) else token
+
+    async def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        return await self._lock.acquire(blocking=blocking, blocking_timeout=timeout)
+
+    async def release(self):
+        try:
+            await self._lock.release()
+        except LockError:
+            # Expired or already released; nothing left to do
+            pass
+
+    async def extend(self) -> bool:
+        try:
+            return bool(await self._lock.reacquire())
+        except LockError:
+            # Expired and possibly taken by another process
+            return False
+
+class RedisStateStore(StateStore):
+    """One Redis hash per namespace; updates use WATCH/MULTI optimistic transactions"""
+
+    backend = 'redis'
+
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 6379,
+                 db: int = 0,
+                 password: Optional[str] = None,
+                 prefix: str = 'ndt'):
+        if aioredis is None:
+            raise RuntimeError("The redis package is required for the Redis state store")
+        self.prefix = prefix
+        self._client = aioredis.Redis(host=host, port=port, db=db, password=password or None, decode_responses=True)
+
+    def _key(self, namespace: str) -> str:
+        return f'{self.prefix}:{namespace}'
+
+    async def get(self, namespace: str, key: str) -> Optional[Dict]:
+        raw = await self._client.hget(self._key(namespace), key)
+        return json.loads(raw) if raw is not None else None
+
+    async def put(self, namespace: str, key: str, value: Dict):
+        await self._client.hset(self._key(namespace), key, json.dumps(value, default=str))
+
+    async def delete(self, namespace: str, key: str) -> bool:
+        return bool(await self._client.hdel(self._key(namespace), key))
+
+    async def all(self, namespace: str) -> Dict[str, Dict]:
+        raw = await self._client.hgetall(self._key(namespace))
+        return {key: json.loads(value) for key, value in raw.items()}
+
+    async def update(self, namespace: str, key: str, fn: UpdateFn) -> Optional[Dict]:
+        hash_key = self._key(namespace)
+        async with self._client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(hash_key)
+                    raw = await pipe.hget(hash_key, key)
+                    new_value = fn(json.loads(raw) if raw is not None else None)
+
+                    pipe.multi()
+                    if new_value is None:
+                        pipe.hdel(hash_key, key)
+                    else:
+                        pipe.hset(hash_key, key, json.dumps(new_value, default=str))
+                    await pipe.execute()
+                    return new_value
+                except WatchError:
+                    # Another process wrote the namespace between WATCH and EXEC: re-read and retry
+                    continue
+
+    def lock(self, name: str, ttl: float = 60) -> StateLock:
+        return _RedisLock(name, self._client.lock(f'{self.prefix}:lock:{name}', timeout=ttl))
+
+    async def break_lock(self, name: str, token: str) -> bool:
+        # Compare and delete in one step, so a lock that expired and was taken again is left alone
+        script = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+        return bool(await self._client.eval(script, 1, f'{self.prefix}:lock:{name}', token))
+
+    async def ping(self) -> bool:
+        try:
+            return bool(await self._client.ping())
+        except Exception as e:
+            logger.error(f"Redis state store unreachable: {e}")
+            return False
+
+    async def close(self):
+        await self._client.aclose()
+
+class Leadership:
+    """Elects one process among all sharing a store to run a background duty
+
+    The leader holds a named lock and extends it on every check; if the leader
+    dies the lock expires after ttl and the next check of another process takes
+    over. Checks must come more often than ttl.
+    """
+
+    def __init__(self, store: StateStore, name: str, ttl: float = 30):
+        self.name = name
+        self._lock = store.lock(f'leader:{name}', ttl=ttl)
+        self.is_leader = False
+
+    async def check(self) -> bool:
+        """Keep or try to take leadership; True while this process leads"""
+        try:
+            if self.is_leader:
+                self.is_leader = await self._lock.extend()
+                if not self.is_leader:
+                    logger.warning(f"Lost {self.name} leadership")
+            else:
+                self.is_leader = await self._lock.acquire(blocking=False)
+                if self.is_leader:
+                    logger.info(f"This process now leads {self.name}")
+        except Exception as e:
+            logger.error(f"{self.name} leader election failed: {e}")
+            self.is_leader = False
+        return self.is_leader
+
+    async def resign(self):
+        if self.is_leader:
+            self.is_leader = False
+            await self._lock.release()
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+def get_state_store() -> StateStore:
+    """Return the process-wide store
+
+    NDT_STATE_BACKEND selects 'memory' or 'redis'; by default Redis is used
+    whenever REDIS_HOST is set.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = os.getenv('NDT_STATE_BACKEND') or ('redis' if os.getenv('REDIS_HOST') else 'memory')
+            if backend == 'redis':
+                _store = RedisStateStore(
+                    host=os.getenv('REDIS_HOST', '127.0.0.1'),
+                    port=int(os.getenv('REDIS_PORT', 6379)),
+                    db=int(os.getenv('REDIS_DB', 0)),
+                    password=os.getenv('REDIS_PASSWORD'),
+                )
+            else:
+                _store = InMemoryStateStore()
+            logger.info(f"Using {_store.backend} state store")
+        return _store
@@ -0,0 +1,20 @@
+"""Shared pytest setup: the application modules live at the repository root"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing ndt_manager builds boto3 clients and opens the metrics history; keep both off real config
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('NDT_DATA_DIR', tempfile.mkdtemp(prefix='ndt-tests-'))
+
+import pytest
+
+from state_store import InMemoryStateStore
+
+@pytest.fixture
+def store() -> InMemoryStateStore:
+    """A fresh single-process state store"""
+    return InMemoryStateStore()
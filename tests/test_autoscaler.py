@@ -0,0 +1,252 @@
+"""Autoscaler decision rounds against a fake fleet"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from autoscaler import (ACTIVE, DRAIN, DRAINING, RETIRE, SCALE_UP, STOPPED, UNDRAIN, Autoscaler,
+                        utilization)
+from bin_packer import Bin, BinPacker, Resources
+from reservations import ReservationLedger
+from state_store import AUTOSCALER_WORKERS, DEPLOYMENTS, InMemoryStateStore
+
+INSTANCE_TYPES = {'medium': {'instance_type': 't3.medium', 'cpu': 2, 'memory': 4, 'storage': 30, 'max_nodes': 10}}
+
+class FakeHistory:
+    """Metrics history answering utilization() from fixed per-host figures"""
+
+    def __init__(self):
+        self.hosts = {}
+
+    def query(self, metric, start, instance_ids=None, stats=()):
+        field = {'cpu_percent': 'cpu', 'memory_percent': 'memory', 'docker_running': 'containers'}[metric]
+        result = {'hosts': {}}
+        for instance_id in instance_ids:
+            host = self.hosts.get(instance_id, {'samples': 0})
+            value = host.get(field)
+            result['hosts'][instance_id] = {'count': host['samples'], 'p95': value, 'max': value}
+        return result
+
+class FakeEC2:
+    def __init__(self):
+        self.terminated, self.stopped = [], []
+
+    def terminate_instances(self, InstanceIds):
+        self.terminated.extend(InstanceIds)
+
+    def stop_instances(self, InstanceIds):
+        self.stopped.extend(InstanceIds)
+
+    def get_waiter(self, name):
+        return SimpleNamespace(wait=lambda InstanceIds: None)
+
+class FakeManager:
+    def __init__(self, store: InMemoryStateStore):
+        self.state = store
+        self.reservations = ReservationLedger(store)
+        self.metrics_history = FakeHistory()
+        self.bin_packer = BinPacker(INSTANCE_TYPES)
+        self.ec2_client = FakeEC2()
+        self.job_queue = SimpleNamespace(jobs={})
+        self.samples = {}
+        self.launched = []
+        self.retired = []
+        self.telemetry = SimpleNamespace(get_snapshot=self._snapshot, leading=True)
+
+    async def _snapshot(self):
+        return dict(self.samples)
+
+    def add_worker(self, instance_id: str, running_containers: int = 0, cpu: float = 2, memory: float = 4):
+        resources = SimpleNamespace(instance_type='t3.medium', status='running',
+                                    cpu_cores=cpu, memory_gb=memory, storage_gb=30)
+        self.samples[instance_id] = SimpleNamespace(
+            resources=resources, ssh_accessible=True, metrics=SimpleNamespace(docker_running=running_containers))
+
+    def _existing_bins(self, samples, reserved):
+        bins = []
+        for instance_id, sample in samples.items():
+            r = sample.resources
+            capacity = Resources(r.cpu_cores, r.memory_gb, r.storage_gb, 10) - reserved.get(instance_id, Resources())
+            bins.append(Bin(instance_id, capacity, existing=True))
+        return bins, {}
+
+    async def acquire_placement_lock(self):
+        lock = self.state.lock('placement')
+        await lock.acquire()
+        return lock
+
+    async def instance_retired(self, instance_ids, stopped=False):
+        self.retired.extend((instance_id, stopped) for instance_id in instance_ids)
+
+    async def launch_instances(self, sizes):
+        self.launched.extend(sizes)
+        return [f'i-new{len(self.launched)}']
+
+@pytest.fixture
+def fleet():
+    store = InMemoryStateStore()
+    manager = FakeManager(store)
+    return manager, store
+
+def autoscaler(manager, store, **kwargs) -> Autoscaler:
+    options = dict(cooldown=60, min_samples=3, min_workers=1, headroom={'cpu': 0, 'memory': 0})
+    options.update(kwargs)
+    return Autoscaler(manager, store, **options)
+
+async def settle(scaler: Autoscaler):
+    """Wait for the launches and retirements a round started in the background"""
+    await asyncio.gather(*scaler._scaling, *scaler._retiring.values())
+
+def actions(decisions):
+    return [(d['action'], d['instance_id']) for d in decisions]
+
+def test_utilization_reads_p95_and_peak_per_host():
+    history = FakeHistory()
+    history.hosts['i-1'] = {'samples': 12, 'cpu': 4.5, 'memory': 30.0, 'containers': 2}
+    assert utilization(history, ['i-1'], 3600) == {
+        'i-1': {'samples': 12, 'cpu_p95': 4.5, 'memory_p95': 30.0, 'containers_max': 2}}
+    assert utilization(history, [], 3600) == {}
+
+def test_empty_worker_is_retired_after_the_cooldown(fleet):
+    manager, store = fleet
+    manager.add_worker('i-busy', running_containers=3)
+    manager.add_worker('i-empty')
+    scaler = autoscaler(manager, store)
+
+    async def scenario():
+        # First round only starts the cooldown
+        assert await scaler.evaluate() == []
+        assert (await store.get(AUTOSCALER_WORKERS, 'i-empty'))['empty_since']
+
+        await store.update(AUTOSCALER_WORKERS, 'i-empty', lambda r: {**r, 'empty_since': time.time() - 120})
+        decisions = await scaler.evaluate()
+        await settle(scaler)
+        return decisions
+
+    decisions = asyncio.run(scenario())
+    assert actions(decisions) == [(RETIRE, 'i-empty')]
+    assert manager.ec2_client.terminated == ['i-empty']
+    assert manager.retired == [('i-empty', False)]
+    assert asyncio.run(store.get(AUTOSCALER_WORKERS, 'i-empty')) is None
+
+def test_retirement_backs_off_when_a_deploy_reserves_the_worker(fleet):
+    manager, store = fleet
+    manager.add_worker('i-busy', running_containers=3)
+    manager.add_worker('i-empty')
+    scaler = autoscaler(manager, store)
+
+    async def scenario():
+        await store.put(AUTOSCALER_WORKERS, 'i-empty', {'empty_since': time.time() - 120})
+        # A planner holds the placement lock while the round decides
+        lock = await manager.acquire_placement_lock()
+        decisions = await scaler.evaluate()
+        assert (await store.get(AUTOSCALER_WORKERS, 'i-empty'))['state'] == DRAINING
+        # ... and reserves the worker from the fleet view it read before the drain
+        await manager.reservations.reserve('topo', 'i-empty', Resources(cpu=0.5, containers=1))
+        await lock.release()
+        await settle(scaler)
+        return decisions, await store.get(AUTOSCALER_WORKERS, 'i-empty'), await scaler.decisions()
+
+    decisions, record, log = asyncio.run(scenario())
+    assert actions(decisions) == [(RETIRE, 'i-empty')]
+    assert manager.ec2_client.terminated == []
+    assert record is None or record.get('state', ACTIVE) == ACTIVE
+    assert log[0]['action'] == UNDRAIN
+
+def test_retire_action_stop_keeps_the_worker_for_restarts(fleet):
+    manager, store = fleet
+    manager.add_worker('i-busy', running_containers=3)
+    manager.add_worker('i-empty')
+    scaler = autoscaler(manager, store, retire_action='stop')
+
+    async def scenario():
+        await store.put(AUTOSCALER_WORKERS, 'i-empty', {'empty_since': time.time() - 120})
+        await scaler.evaluate()
+        await settle(scaler)
+        return await store.get(AUTOSCALER_WORKERS, 'i-empty')
+
+    assert asyncio.run(scenario())['state'] == STOPPED
+    assert manager.ec2_client.stopped == ['i-empty']
+    assert manager.retired == [('i-empty', True)]
+
+def test_min_workers_is_kept(fleet):
+    manager, store = fleet
+    manager.add_worker('i-empty')
+    scaler = autoscaler(manager, store, min_workers=1)
+
+    async def scenario():
+        await store.put(AUTOSCALER_WORKERS, 'i-empty', {'empty_since': time.time() - 120})
+        return await scaler.evaluate()
+
+    assert asyncio.run(scenario()) == []
+    assert manager.ec2_client.terminated == []
+
+def test_scale_up_below_headroom(fleet):
+    manager, store = fleet
+    manager.add_worker('i-1', running_containers=3)
+    scaler = autoscaler(manager, store, headroom={'cpu': 1, 'memory': 2, 'size': 'medium'})
+
+    async def scenario():
+        await manager.reservations.reserve('topo', 'i-1', Resources(cpu=1.5, memory=3, containers=3))
+        await manager.reservations.commit('topo', ['i-1'])
+        await store.put(DEPLOYMENTS, 'topo', {'distribution': {'i-1': ['a', 'b', 'c']}})
+        decisions = await scaler.evaluate()
+        await settle(scaler)
+        return decisions
+
+    assert actions(asyncio.run(scenario())) == [(SCALE_UP, None)]
+    assert manager.launched == ['medium']
+
+def test_idle_underfilled_worker_is_drained_when_it_fits_elsewhere(fleet):
+    manager, store = fleet
+    manager.add_worker('i-small-load', running_containers=1)
+    manager.add_worker('i-other', running_containers=2)
+    manager.metrics_history.hosts['i-small-load'] = {'samples': 10, 'cpu': 2.0, 'memory': 10.0, 'containers': 1}
+    scaler = autoscaler(manager, store, underfill_share=0.25)
+
+    async def scenario():
+        for name, instance_id, demand in (('lab', 'i-small-load', Resources(0.2, 0.5, 1, 1)),
+                                          ('big', 'i-other', Resources(1.0, 2.0, 2, 2))):
+            await manager.reservations.reserve(name, instance_id, demand)
+            await manager.reservations.commit(name, [instance_id])
+            await store.put(DEPLOYMENTS, name, {'distribution': {instance_id: ['n']}})
+        decisions = await scaler.evaluate()
+        return decisions, await scaler.draining()
+
+    decisions, draining = asyncio.run(scenario())
+    assert actions(decisions) == [(DRAIN, 'i-small-load')]
+    assert decisions[0]['topologies'] == ['lab']
+    assert draining == {'i-small-load'}
+
+def test_busy_worker_is_not_drained(fleet):
+    manager, store = fleet
+    manager.add_worker('i-1', running_containers=1)
+    manager.add_worker('i-2', running_containers=1)
+    manager.metrics_history.hosts['i-1'] = {'samples': 10, 'cpu': 60.0, 'memory': 10.0, 'containers': 1}
+
+    async def scenario():
+        await manager.reservations.reserve('lab', 'i-1', Resources(0.2, 0.5, 1, 1))
+        await store.put(DEPLOYMENTS, 'lab', {'distribution': {'i-1': ['n']}})
+        return await autoscaler(manager, store).evaluate()
+
+    assert asyncio.run(scenario()) == []
+
+def test_dry_run_only_logs(fleet):
+    manager, store = fleet
+    manager.add_worker('i-busy', running_containers=3)
+    manager.add_worker('i-empty')
+    scaler = autoscaler(manager, store)
+
+    async def scenario():
+        await store.put(AUTOSCALER_WORKERS, 'i-empty', {'empty_since': time.time() - 120})
+        decisions = await scaler.evaluate(dry_run=True)
+        await settle(scaler)
+        return decisions, await store.get(AUTOSCALER_WORKERS, 'i-empty')
+
+    decisions, record = asyncio.run(scenario())
+    assert actions(decisions) == [(RETIRE, 'i-empty')]
+    assert decisions[0]['dry_run'] is True
+    assert manager.ec2_client.terminated == []
+    assert 'state' not in record
@@ -0,0 +1,99 @@
+"""Resource-weighted placement onto existing and new workers"""
+
+from bin_packer import Bin, BinPacker, Resources
+from node_profiles import NodeProfiles
+from resource_monitor import ContainerUsage
+
+INSTANCE_TYPES = {
+    'small': {'instance_type': 't3.small', 'cpu': 2, 'memory': 4, 'storage': 30, 'max_nodes': 4, 'cost_per_hour': 0.02},
+    'large': {'instance_type': 't3.xlarge', 'cpu': 8, 'memory': 16, 'storage': 60, 'max_nodes': 16, 'cost_per_hour': 0.17},
+}
+NODE_RESOURCES = {
+    'default': {'cpu': 0.25, 'memory': 0.5, 'storage': 1},
+    'router': {'cpu': 1.0, 'memory': 2.0, 'storage': 2},
+}
+NO_OVERHEAD = {'cpu': 0, 'memory': 0, 'storage': 0}
+
+def packer(**kwargs) -> BinPacker:
+    return BinPacker(INSTANCE_TYPES, NODE_RESOURCES, host_overhead=NO_OVERHEAD, **kwargs)
+
+def link(a: str, b: str) -> dict:
+    return {'endpoints': [f'{a}:eth1', f'{b}:eth1']}
+
+def test_resources_arithmetic_and_fit():
+    demand = Resources(1, 2, 3, 1)
+    assert demand + demand == Resources(2, 4, 6, 2)
+    assert demand.fits_in(Resources(1, 2, 3, 1))
+    assert not demand.fits_in(Resources(1, 1.9, 3, 1))
+    assert demand.dominant_share(Resources(4, 4, 30, 10)) == 0.5
+    assert Resources(1).dominant_share(Resources()) == float('inf')
+    assert Resources().dominant_share(Resources(1, 1, 1, 1)) == 0.0
+
+def test_node_demand_uses_kind_or_default():
+    bp = packer()
+    assert bp.node_demand({'kind': 'router'}) == Resources(1.0, 2.0, 2.0, 1.0)
+    assert bp.node_demand({'kind': 'unknown'}) == Resources(0.25, 0.5, 1.0, 1.0)
+
+def test_type_capacity_subtracts_host_overhead():
+    bp = BinPacker(INSTANCE_TYPES, NODE_RESOURCES, host_overhead={'cpu': 0.5, 'memory': 1, 'storage': 10})
+    assert bp.type_capacity('small') == Resources(1.5, 3, 20, 4)
+    assert bp.max_nodes_for_type('t3.xlarge') == 16
+    assert bp.max_nodes_for_type('m5.large') == bp.default_max_nodes
+
+def test_existing_capacity_is_used_before_launching():
+    existing = [Bin('i-1', Resources(4, 8, 50, 10), existing=True)]
+    nodes = {f'n{i}': {} for i in range(4)}
+
+    plan = packer().pack(nodes, [], existing)
+
+    assert sorted(plan.existing['i-1']) == sorted(nodes)
+    assert plan.new_instances == []
+    assert plan.estimated_cost_per_hour == 0
+
+def test_cheapest_new_workers_for_the_remainder():
+    # Four routers: 2 small workers (0.04/h) beat one large worker (0.17/h)
+    nodes = {f'r{i}': {'kind': 'router'} for i in range(4)}
+
+    plan = packer().pack(nodes, [link('r0', 'r1'), link('r2', 'r3')], [])
+
+    assert [size for size, _ in plan.new_instances] == ['small', 'small']
+    assert sorted(map(sorted, (names for _, names in plan.new_instances))) == [['r0', 'r1'], ['r2', 'r3']]
+    assert round(plan.estimated_cost_per_hour, 2) == 0.04
+
+def test_count_objective_prefers_fewer_workers():
+    nodes = {f'r{i}': {'kind': 'router'} for i in range(4)}
+    plan = packer(objective='count').pack(nodes, [], [])
+    assert [size for size, _ in plan.new_instances] == ['large']
+
+def test_container_slots_limit_a_worker():
+    nodes = {f'n{i}': {} for i in range(5)}
+    plan = packer().pack(nodes, [], [])
+    # Five light nodes fit a small worker on CPU and memory but it has four container slots
+    assert sorted(len(names) for _, names in plan.new_instances) == [1, 4]
+
+def test_oversized_node_goes_alone_on_the_largest_type():
+    bp = BinPacker(INSTANCE_TYPES, {'default': {'cpu': 32, 'memory': 1, 'storage': 1}}, host_overhead=NO_OVERHEAD)
+    plan = bp.pack({'huge': {}}, [], [])
+    assert plan.new_instances == [('large', ['huge'])]
+
+def test_learned_profiles_replace_configured_cpu_and_memory(tmp_path):
+    profiles = NodeProfiles(str(tmp_path / 'profiles.json'))
+    profiles.record([ContainerUsage('r', 'router', 'img', 'lab', 0.1, 0.4)] * 5)
+
+    bp = packer(profiles=profiles, learned_min_samples=5, learned_headroom=1.5)
+
+    demand = bp.node_demand({'kind': 'router', 'image': 'img'})
+    assert (round(demand.cpu, 3), round(demand.memory, 3), demand.storage) == (0.15, 0.6, 2.0)
+    # Too few samples for this kind: configured estimate
+    assert bp.node_demand({'kind': 'default'}) == Resources(0.25, 0.5, 1.0, 1.0)
+
+def test_new_workers_respect_the_utilization_thresholds():
+    bp = packer(thresholds={'cpu_threshold': 0.5, 'memory_threshold': 0.75, 'storage_threshold': 0.5})
+    assert bp.type_capacity('small') == Resources(1, 3, 15, 4)
+    assert bp.limit(Resources(8, 16, 60, 16)) == bp.type_capacity('large')
+
+    # Two routers fill a small worker's 2 vCPUs, but only one stays under a 50% CPU threshold
+    plan = bp.pack({'r0': {'kind': 'router'}, 'r1': {'kind': 'router'}}, [link('r0', 'r1')], [])
+
+    assert [size for size, _ in plan.new_instances] == ['small', 'small']
+    assert all(usage['used']['cpu'] <= usage['capacity']['cpu'] for usage in plan.bin_usage.values())
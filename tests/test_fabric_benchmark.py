@@ -0,0 +1,75 @@
+"""Fabric benchmark scheduling and output parsing"""
+
+import json
+
+from fabric_benchmark import FabricBenchmark, host_pairs, schedule
+
+PING = """PING 10.254.0.2 (10.254.0.2) 56(84) bytes of data.
+
+--- 10.254.0.2 ping statistics ---
+20 packets transmitted, 19 received, 5% packet loss, time 3805ms
+rtt min/avg/max/mdev = 0.412/0.538/0.911/0.102 ms"""
+
+def iperf(bits_per_second: float, retransmits: int = 3) -> str:
+    return json.dumps({'end': {'sum_received': {'bits_per_second': bits_per_second},
+                               'sum_sent': {'retransmits': retransmits}}})
+
+def output(ping: str = PING, mtu: str = 'ok', iperf_json: str = iperf(941.5e6)) -> str:
+    return f"--- ping ---\n{ping}\n--- mtu ---\n{mtu}\n--- iperf ---\n{iperf_json}\n"
+
+def test_host_pairs_group_cut_links():
+    links = {
+        'l1': {'a_host': 'i-1', 'b_host': 'i-2'},
+        'l2': {'a_host': 'i-2', 'b_host': 'i-1'},
+        'l3': {'a_host': 'i-1', 'b_host': 'i-1'},
+        'l4': {'a_host': 'i-3', 'b_host': 'i-1'},
+    }
+    assert host_pairs(links) == {('i-1', 'i-2'): ['l1', 'l2'], ('i-1', 'i-3'): ['l4']}
+
+def test_schedule_rounds_are_host_disjoint_and_cover_every_pair():
+    pairs = [('a', 'b'), ('a', 'c'), ('b', 'c'), ('c', 'd'), ('a', 'd'), ('b', 'd')]
+    rounds = schedule(pairs)
+
+    assert sorted(pair for round_ in rounds for pair in round_) == sorted(pairs)
+    for round_ in rounds:
+        hosts = [host for pair in round_ for host in pair]
+        assert len(hosts) == len(set(hosts))
+    # A complete graph on four hosts splits into three perfect matchings
+    assert len(rounds) == 3
+
+def test_schedule_of_disjoint_pairs_is_one_round():
+    assert schedule([('a', 'b'), ('c', 'd')]) == [[('a', 'b'), ('c', 'd')]]
+
+def test_parse_full_output():
+    result = FabricBenchmark._parse(output())
+    assert result == {
+        'loss_percent': 5.0,
+        'rtt_min_ms': 0.412,
+        'rtt_avg_ms': 0.538,
+        'rtt_max_ms': 0.911,
+        'jitter_ms': 0.102,
+        'mtu_ok': True,
+        'throughput_mbps': 941.5,
+        'retransmits': 3,
+    }
+
+def test_parse_failed_mtu_and_iperf_error():
+    result = FabricBenchmark._parse(output(mtu='fail', iperf_json=json.dumps({'error': 'unable to connect'})))
+    assert result['mtu_ok'] is False
+    assert result['error'] == 'iperf3: unable to connect'
+    assert 'throughput_mbps' not in result
+
+def test_parse_missing_iperf_output():
+    result = FabricBenchmark._parse(output(ping='', iperf_json=''))
+    assert result['error'] == 'iperf3 produced no result'
+    assert 'loss_percent' not in result
+
+def test_outliers():
+    report = [
+        {'hosts': ['a', 'b'], 'throughput_mbps': 900, 'loss_percent': 0, 'mtu_ok': True},
+        {'hosts': ['a', 'c'], 'throughput_mbps': 880, 'loss_percent': 0, 'mtu_ok': True},
+        {'hosts': ['b', 'c'], 'throughput_mbps': 300, 'loss_percent': 2.5, 'mtu_ok': False},
+    ]
+    outliers = FabricBenchmark._outliers(report)
+    assert [entry['hosts'] for entry in outliers] == [['b', 'c']]
+    assert len(outliers[0]['reasons']) == 3
@@ -0,0 +1,49 @@
+"""Per-worker state dropped when the autoscaler or the warm pool retires a worker"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import ndt_manager as app
+from resource_monitor import SSHResourceCollector
+
+class FakePool:
+    def __init__(self):
+        self.closed = []
+
+    def close_host(self, host):
+        self.closed.append(host)
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = app.ndt_manager
+    monkeypatch.setattr(manager, 'ssh_pool', FakePool())
+    monkeypatch.setattr(manager, 'resource_collector', SSHResourceCollector('~/.ssh/id_rsa'))
+    resources = SimpleNamespace(public_ip='54.0.0.1', private_ip='10.0.0.1')
+    monkeypatch.setattr(manager.telemetry, 'snapshot', {'i-known': SimpleNamespace(resources=resources)})
+
+    async def describe_managed_instances(instance_ids=None):
+        return [{'InstanceId': 'i-standby', 'PublicIpAddress': '54.0.0.2', 'PrivateIpAddress': '10.0.0.2'}]
+
+    monkeypatch.setattr(manager, 'describe_managed_instances', describe_managed_instances)
+    monkeypatch.setattr(manager.spec_cache, 'root_volumes', {'i-known': 50, 'i-standby': 30})
+    monkeypatch.setattr(manager.spec_cache, '_save', lambda: None)
+    return manager
+
+def test_connections_to_retired_workers_are_closed(manager):
+    asyncio.run(manager.instance_retired(['i-known', 'i-standby']))
+    assert manager.ssh_pool.closed == ['54.0.0.1', '10.0.0.1', '54.0.0.2', '10.0.0.2']
+
+def test_samples_of_retired_workers_are_forgotten(manager):
+    collector = manager.resource_collector
+    collector.cpu_sampler.sample('54.0.0.1', [1, 0, 0, 1, 0, 0, 0, 0], [0] * 8)
+    collector.container_sampler.sample('54.0.0.1', {'time': 1, 'containers': []})
+    asyncio.run(manager.instance_retired(['i-known']))
+    assert not collector.cpu_sampler.has_sample('54.0.0.1')
+    assert '54.0.0.1' not in collector.container_sampler._previous
+
+def test_root_volumes_are_dropped_for_terminated_workers_only(manager):
+    asyncio.run(manager.instance_retired(['i-standby'], stopped=True))
+    asyncio.run(manager.instance_retired(['i-known']))
+    assert manager.spec_cache.root_volumes == {'i-standby': 30}
@@ -0,0 +1,56 @@
+"""Prometheus exposition: per-scrape fleet gauges and metrics merged across API processes"""
+
+import os
+import subprocess
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('prometheus_client')
+
+import instrumentation
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def sample(instance_type: str, cpu: float):
+    metrics = SimpleNamespace(cpu_percent=cpu, memory_percent=40.0, disk_percent=10.0,
+                              docker_containers=3, docker_running=2)
+    return SimpleNamespace(instance_type=instance_type, metrics=metrics, age_seconds=lambda: 5.0)
+
+def test_fleet_and_job_gauges_come_from_the_given_snapshot():
+    body, _ = instrumentation.render({'i-1': sample('t3.large', 12.5)}, {'queued': 3, 'running': 1})
+    text = body.decode()
+    assert 'ndt_worker_cpu_percent{instance_id="i-1",instance_type="t3.large"} 12.5' in text
+    assert 'ndt_worker_containers{instance_id="i-1",instance_type="t3.large",state="running"} 2.0' in text
+    assert 'ndt_job_queue_depth 3.0' in text
+    assert 'ndt_jobs_running 1.0' in text
+
+    # A worker missing from the next snapshot is gone from the next scrape
+    body, _ = instrumentation.render({}, {})
+    assert 'i-1' not in body.decode()
+    assert 'ndt_job_queue_depth 0.0' in body.decode()
+
+OBSERVE = '''
+import instrumentation
+instrumentation.PLACEMENT_SECONDS.observe(0.2)
+instrumentation.mark_process_dead()
+'''
+
+SCRAPE = '''
+import instrumentation
+print(instrumentation.render({}, {})[0].decode())
+'''
+
+def test_scrapes_merge_every_process(tmp_path):
+    env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(tmp_path)}
+
+    def python(code: str) -> str:
+        return subprocess.run([sys.executable, '-c', code], cwd=REPO, env=env,
+                              capture_output=True, text=True, check=True).stdout
+
+    # Two API processes observe a placement each, then exit
+    python(OBSERVE)
+    python(OBSERVE)
+    assert 'ndt_placement_seconds_count 2.0' in python(SCRAPE)
@@ -0,0 +1,158 @@
+"""Job queue: running jobs, shared records, heartbeats and recovery of interrupted jobs"""
+
+import asyncio
+import time
+
+import pytest
+
+from job_queue import FAILED, PARTIAL, QUEUED, RUNNING, SUCCEEDED, JobQueue, QueueFullError
+from state_store import JOBS
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def finished(queue: JobQueue, job_id: str) -> dict:
+    record = await queue.wait_for_update(job_id, -1, timeout=5)
+    while record['status'] not in (SUCCEEDED, PARTIAL, FAILED):
+        record = await queue.wait_for_update(job_id, record['version'], timeout=5)
+    await asyncio.gather(*queue._pending_writes)
+    return record
+
+def test_jobs_run_and_publish_their_records(store):
+    async def scenario():
+        queue = JobQueue(store, max_workers=2)
+        await queue.start()
+
+        async def deploy(job):
+            with job.phase('deploy') as phase:
+                phase.detail = 'done'
+            return {'status': PARTIAL}
+
+        async def broken(job):
+            raise RuntimeError('no capacity')
+
+        first = queue.submit('deploy', 'lab1', deploy)
+        second = queue.submit('deploy', 'lab2', broken)
+        results = await finished(queue, first.job_id), await finished(queue, second.job_id)
+        stored = await store.get(JOBS, first.job_id)
+        await queue.stop()
+        return queue, results, stored
+
+    queue, (first, second), stored = run(scenario())
+    assert first['status'] == PARTIAL and first['phases'][0]['status'] == SUCCEEDED
+    assert second['status'] == FAILED and second['error'] == 'no capacity'
+    assert stored['status'] == PARTIAL and stored['owner'] == queue.owner
+
+def test_full_queue_rejects_jobs(store):
+    async def scenario():
+        queue = JobQueue(store, max_queued=1)
+
+        async def handler(job):
+            return {}
+
+        queue.submit('deploy', 'lab1', handler)
+        with pytest.raises(QueueFullError):
+            queue.submit('deploy', 'lab2', handler)
+
+    run(scenario())
+
+def test_heartbeat_does_not_wake_long_pollers(store):
+    async def scenario():
+        queue = JobQueue(store)
+
+        async def handler(job):
+            return {}
+
+        job = queue.submit('deploy', 'lab', handler)
+        await asyncio.gather(*queue._pending_writes)
+        before = await store.get(JOBS, job.job_id)
+        await asyncio.sleep(0.01)
+        await queue._heartbeat()
+        return before, await store.get(JOBS, job.job_id)
+
+    before, after = run(scenario())
+    assert after['heartbeat_at'] > before['heartbeat_at']
+    assert after['version'] == before['version']
+
+def orphan(job_id: str, status: str, heartbeat_at: float, lock=None) -> dict:
+    return {
+        'job_id': job_id, 'kind': 'deploy', 'target': 'lab', 'status': status, 'current_phase': 'deploy',
+        'created_at': '2026-01-01T00:00:00', 'started_at': None, 'finished_at': None,
+        'phases': [{'name': 'deploy', 'status': RUNNING, 'finished_at': None}],
+        'result': None, 'error': None, 'version': 3,
+        'owner': 'gone:1234:abcdef', 'heartbeat_at': heartbeat_at, 'lock': lock,
+    }
+
+def test_jobs_of_a_dead_process_are_failed_and_their_locks_freed(store):
+    async def scenario():
+        # The dead process took the topology lock for its deploy
+        dead_lock = store.lock('topology:lab')
+        assert await dead_lock.acquire(blocking=False)
+        lock = {'name': dead_lock.name, 'token': dead_lock.token}
+        await store.put(JOBS, 'stale', orphan('stale', RUNNING, time.time() - 3600, lock))
+        await store.put(JOBS, 'queued', orphan('queued', QUEUED, time.time() - 3600))
+        await store.put(JOBS, 'alive', orphan('alive', RUNNING, time.time()))
+
+        queue = JobQueue(store, heartbeat_interval=15)
+        recovered = await queue.recover_orphans()
+        relocked = await store.lock('topology:lab').acquire(blocking=False)
+        return recovered, await store.all(JOBS), relocked
+
+    recovered, records, relocked = run(scenario())
+    assert sorted(recovered) == ['queued', 'stale']
+    stale = records['stale']
+    assert stale['status'] == FAILED and stale['error'].startswith('interrupted')
+    assert stale['phases'][0]['status'] == FAILED and stale['version'] == 4
+    assert records['alive']['status'] == RUNNING
+    assert relocked
+
+def test_waiting_on_an_interrupted_job_ends(store):
+    async def scenario():
+        await store.put(JOBS, 'stale', orphan('stale', RUNNING, time.time() - 3600))
+        queue = JobQueue(store, remote_poll_interval=0.01)
+        waiter = asyncio.create_task(queue.wait_for_update('stale', 3, timeout=5))
+        await asyncio.sleep(0.05)
+        await queue.recover_orphans()
+        return await waiter
+
+    assert run(scenario())['status'] == FAILED
+
+def test_break_lock_leaves_a_retaken_lock_alone(store):
+    async def scenario():
+        first = store.lock('topology:lab')
+        await first.acquire()
+        token = first.token
+        await first.release()
+        second = store.lock('topology:lab')
+        await second.acquire()
+        return await store.break_lock('topology:lab', token), second.token
+
+    broken, holder = run(scenario())
+    assert not broken and holder is not None
+
+def test_stop_fails_queued_jobs_and_frees_their_locks(store):
+    async def scenario():
+        queue = JobQueue(store, max_workers=1)
+        await queue.start()
+        started = asyncio.Event()
+
+        async def slow(job):
+            started.set()
+            await asyncio.sleep(60)
+            return {}
+
+        async def handler(job):
+            return {}
+
+        queue.submit('deploy', 'busy', slow)
+        lock = store.lock('topology:waiting')
+        await lock.acquire()
+        waiting = queue.submit('deploy', 'waiting', handler, lock=lock)
+        await started.wait()
+        await queue.stop()
+        return waiting, await store.get(JOBS, waiting.job_id), await store.lock('topology:waiting').acquire(blocking=False)
+
+    job, record, relocked = run(scenario())
+    assert job.status == FAILED and record['status'] == FAILED
+    assert record['error'].startswith('interrupted')
+    assert relocked
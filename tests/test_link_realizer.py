@@ -0,0 +1,84 @@
+"""Cut links become VXLAN tunnels with fleet-unique, per-link stable VNIs"""
+
+import asyncio
+
+import pytest
+
+from link_realizer import LinkRealizer, link_endpoints
+
+HOST_IPS = {'i-a': '10.0.0.1', 'i-b': '10.0.0.2'}
+
+def test_brief_and_extended_endpoints_parse_alike():
+    brief = {'endpoints': ['r1:eth1', 'r2:eth2']}
+    extended = {'endpoints': [{'node': 'r1', 'interface': 'eth1'}, {'node': 'r2', 'interface': 'eth2'}]}
+    assert link_endpoints(brief) == link_endpoints(extended) == (('r1', 'eth1'), ('r2', 'eth2'))
+    assert link_endpoints({'endpoints': ['r1:eth1']}) is None
+
+def test_vnis_are_stable_per_link_and_unique_across_topologies(store):
+    realizer = LinkRealizer(store, vni_base=100)
+
+    async def scenario():
+        first = await realizer.allocate('lab1', ['x', 'y'])
+        assert first == {'x': 100, 'y': 101}
+        assert await realizer.allocate('lab2', ['x']) == {'x': 102}
+
+        # Redeploy keeps the VNIs of surviving links and drops the rest
+        assert await realizer.allocate('lab1', ['y', 'z']) == {'y': 101, 'z': 100}
+
+        await realizer.release('lab1')
+        assert await realizer.allocate('lab3', ['a', 'b']) == {'a': 100, 'b': 101}
+        assert await realizer.allocate('lab2', []) == {}
+        await realizer.release('lab3')
+        assert await realizer.allocate('lab4', ['a']) == {'a': 100}
+
+    asyncio.run(scenario())
+
+def test_links_for_gives_each_host_its_local_links_and_tunnel_ends(store):
+    realizer = LinkRealizer(store, vni_base=5000, mtu=1450)
+    local = {'endpoints': ['r1:eth9', 'r3:eth9'], 'mtu': 9000}
+    links = [
+        {'endpoints': ['r1:eth1', 'r2:eth1']},
+        {'endpoints': [{'node': 'r3', 'interface': 'eth2'}, {'node': 'r2', 'interface': 'eth2'}]},
+        local,
+        # Pseudo-node ends stay with the node on the other side
+        {'endpoints': ['r2:eth3', 'host:r2-eth3']},
+        {'endpoints': ['r1:eth4', 'ghost:eth1']},
+    ]
+    distribution = {'i-a': ['r1', 'r3'], 'i-b': ['r2']}
+
+    async def scenario():
+        plan = await realizer.plan('lab', links, distribution, HOST_IPS)
+
+        assert plan.summary()['total_links'] == 4
+        assert plan.summary()['tunnelled_links'] == 2
+        assert plan.unplaced == [links[4]]
+
+        assert plan.links_for('i-a') == [
+            {'type': 'vxlan', 'endpoint': {'node': 'r1', 'interface': 'eth1'},
+             'remote': '10.0.0.2', 'vni': 5000, 'udp-port': 4789, 'mtu': 1450},
+            {'type': 'vxlan', 'endpoint': {'node': 'r3', 'interface': 'eth2'},
+             'remote': '10.0.0.2', 'vni': 5001, 'udp-port': 4789, 'mtu': 1450},
+            local,
+        ]
+        assert plan.links_for('i-b') == [
+            {'type': 'vxlan', 'endpoint': {'node': 'r2', 'interface': 'eth1'},
+             'remote': '10.0.0.1', 'vni': 5000, 'udp-port': 4789, 'mtu': 1450},
+            {'type': 'vxlan', 'endpoint': {'node': 'r2', 'interface': 'eth2'},
+             'remote': '10.0.0.1', 'vni': 5001, 'udp-port': 4789, 'mtu': 1450},
+            links[3],
+        ]
+        assert plan.mapping()['r2:eth3--host:r2-eth3']['realized_as'] == 'veth'
+
+    asyncio.run(scenario())
+
+def test_cut_link_to_a_host_without_address_is_refused(store):
+    realizer = LinkRealizer(store)
+    links = [{'endpoints': ['r1:eth1', 'r2:eth1']}]
+
+    async def scenario():
+        with pytest.raises(ValueError, match='i-b'):
+            await realizer.plan('lab', links, {'i-a': ['r1'], 'i-b': ['r2']}, {'i-a': '10.0.0.1'})
+        # Nothing was allocated for the refused plan
+        assert await realizer.allocate('other', ['x']) == {'x': 10000}
+
+    asyncio.run(scenario())
@@ -0,0 +1,130 @@
+"""Metrics history ring buffers: wrap-around, downsampling, tier choice and queries"""
+
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+from metrics_store import METRIC_FIELDS, MetricsStore, RingFile, _percentile
+from resource_monitor import SystemMetrics
+
+CPU = METRIC_FIELDS.index('cpu_percent')
+
+def values(cpu: float) -> list:
+    row = [0.0] * len(METRIC_FIELDS)
+    row[CPU] = cpu
+    return row
+
+def metrics(timestamp: float, cpu: float) -> SystemMetrics:
+    return SystemMetrics(datetime.fromtimestamp(timestamp), cpu, 50, 2, 4, 10, 3, 30, (0.5, 0.4, 0.3), 100, 5, 2, 1)
+
+@pytest.fixture
+def ring(tmp_path):
+    rings = []
+
+    def open_ring(capacity: int = 4, bucket: int = 0, name: str = 'host.raw.ring') -> RingFile:
+        rings.append(RingFile(str(tmp_path / name), capacity, bucket))
+        return rings[-1]
+
+    yield open_ring
+    for opened in rings:
+        opened.close()
+
+def test_percentile_interpolates_like_numpy():
+    assert _percentile([1, 2, 3, 4], 50) == 2.5
+    assert _percentile([1, 2, 3, 4], 100) == 4
+    assert _percentile([7], 95) == 7
+
+def test_raw_ring_wraps_around_keeping_the_newest(ring):
+    raw = ring(capacity=4)
+    for t in range(6):
+        raw.append(1000 + t, values(t))
+
+    assert [ts for ts, _ in raw.rows(0, 2000)] == [1002, 1003, 1004, 1005]
+    assert [row[CPU] for _, row in raw.rows(0, 2000)] == [2, 3, 4, 5]
+    # Wrapped past 1001: no longer covers it
+    assert raw.covers(1002)
+    assert not raw.covers(1001)
+
+def test_downsampled_tier_folds_samples_into_buckets(ring):
+    minute = ring(bucket=60, name='host.1m.ring')
+    for t, cpu in ((0, 10), (20, 30), (59, 20), (60, 80)):
+        minute.append(6000 + t, values(cpu))
+
+    rows = minute.rows(0, 10000)
+    assert [ts for ts, _ in rows] == [6000, 6060]
+    assert rows[0][1][CPU] == pytest.approx(20)
+    assert rows[1][1][CPU] == 80
+    timestamps, maxes = minute.window(0, 10000, CPU, column='max')
+    assert list(maxes) == [30, 80]
+
+def test_ring_reopens_with_its_data_and_capacity(tmp_path):
+    path = str(tmp_path / 'host.raw.ring')
+    first = RingFile(path, 8, 0)
+    first.append(1000, values(42))
+    first.close()
+
+    reopened = RingFile(path, 100, 0)
+    try:
+        assert reopened.capacity == 8
+        assert [row[CPU] for _, row in reopened.rows(0, 2000)] == [42]
+    finally:
+        reopened.close()
+
+def test_concurrent_appends_from_threads_lose_nothing(ring):
+    raw = ring(capacity=1000)
+    threads = [threading.Thread(target=lambda offset=offset: [raw.append(offset * 100 + t, values(1)) for t in range(100)])
+               for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(raw.rows(0, 10000)) == 800
+
+def test_query_aggregates_per_host_and_fleet(tmp_path):
+    store = MetricsStore(str(tmp_path), capacities={'raw': 100, '1m': 100, '1h': 100})
+    try:
+        for t, cpu in enumerate((10, 20, 30, 40)):
+            store.record('i-1', metrics(100_000 + t, cpu))
+        store.record('i-2', metrics(100_000, 90))
+
+        result = store.query('cpu_percent', 99_000, end=101_000, stats=('avg', 'max', 'count'), series=True)
+
+        assert result['tier'] == 'raw'
+        assert result['hosts']['i-1'] == {'avg': 25.0, 'max': 40.0, 'count': 4,
+                                          'series': [[100000.0, 10.0], [100001.0, 20.0],
+                                                     [100002.0, 30.0], [100003.0, 40.0]]}
+        assert result['fleet']['count'] == 5
+        assert result['fleet']['max'] == 90.0
+        assert store.hosts() == ['i-1', 'i-2']
+    finally:
+        store.close()
+
+def test_coarser_tier_once_raw_has_wrapped(tmp_path):
+    store = MetricsStore(str(tmp_path), capacities={'raw': 3, '1m': 100, '1h': 100})
+    try:
+        for t in range(0, 600, 60):
+            store.record('i-1', metrics(100_020 + t, 50))
+        assert store.choose_tier(100_020, ['i-1']) == '1m'
+        assert store.choose_tier(100_020 + 480, ['i-1']) == 'raw'
+    finally:
+        store.close()
+
+def test_queries_for_unknown_hosts_create_no_files(tmp_path):
+    store = MetricsStore(str(tmp_path))
+    try:
+        result = store.query('cpu_percent', 0, instance_ids=['bogus'], stats=('avg', 'count'))
+        assert result['hosts']['bogus'] == {'avg': None, 'count': 0}
+        assert store.samples('bogus', 0) == []
+        assert not store.has_host('bogus')
+        assert os.listdir(tmp_path) == []
+    finally:
+        store.close()
+
+def test_unknown_metric_or_stat_is_rejected(tmp_path):
+    store = MetricsStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.query('bogus_metric', 0)
+    with pytest.raises(ValueError):
+        store.query('cpu_percent', 0, stats=('p42x',))
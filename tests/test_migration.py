@@ -0,0 +1,96 @@
+"""Autoscaler migrations: the running lab stays up until its new placement is reserved"""
+
+import asyncio
+
+import pytest
+
+import ndt_manager as app
+from bin_packer import Resources
+from job_queue import Job
+from link_realizer import LinkRealizer
+from reservations import PENDING, ReservationLedger, pending_key
+from state_store import DEPLOYMENTS, RESERVATIONS
+
+TOPOLOGY = app.NetworkTopology(name='lab', topology={
+    'nodes': {'r1': {'kind': 'linux'}, 'r2': {'kind': 'linux'}},
+    'links': [{'endpoints': ['r1:eth1', 'r2:eth1']}],
+})
+
+RECORD = {
+    'topology_name': 'lab',
+    'status': 'succeeded',
+    'distribution': {'i-old': ['r1', 'r2']},
+    'topology': TOPOLOGY.model_dump(),
+}
+
+@pytest.fixture
+def fleet(store, monkeypatch):
+    """The manager on an in-memory store, with workers faked at the SSH/EC2 boundary"""
+    manager = app.ndt_manager
+    monkeypatch.setattr(manager, 'state', store)
+    monkeypatch.setattr(manager, 'reservations', ReservationLedger(store))
+    monkeypatch.setattr(manager, 'link_realizer', LinkRealizer(store))
+    fleet = type('Fleet', (), {})()
+    fleet.destroyed, fleet.deploy_ok, fleet.placement = [], True, {'i-new': ['r1', 'r2']}
+
+    async def distribute_topology(topology, on_assigned=None):
+        if fleet.placement is None:
+            raise RuntimeError('no capacity for lab')
+        for instance_id, nodes in fleet.placement.items():
+            await manager.reservations.reserve(topology.name, instance_id, Resources(1, 1, 1, len(nodes)))
+        return fleet.placement
+
+    async def deploy_topology_to_instance(instance_id, topology, nodes, prefetch_report=None, link_plan=None):
+        return fleet.deploy_ok
+
+    monkeypatch.setattr(manager, 'distribute_topology', distribute_topology)
+    monkeypatch.setattr(manager, 'deploy_topology_to_instance', deploy_topology_to_instance)
+    monkeypatch.setattr(manager, '_destroy_on_instance', lambda instance_id, name: fleet.destroyed.append(instance_id))
+
+    async def running_lab():
+        await store.put(DEPLOYMENTS, 'lab', RECORD)
+        await manager.reservations.reserve('lab', 'i-old', Resources(1, 1, 1, 2))
+        await manager.reservations.commit('lab', ['i-old'])
+
+    fleet.store, fleet.running_lab = store, running_lab
+    return fleet
+
+def migrate(fleet):
+    async def scenario():
+        await fleet.running_lab()
+        job = Job(job_id='job1', kind='migrate', target='lab')
+        try:
+            await app.run_deployment_job(job, TOPOLOGY, replacing=RECORD)
+            error = None
+        except RuntimeError as e:
+            error = str(e)
+        return error, await fleet.store.get(DEPLOYMENTS, 'lab'), await fleet.store.all(RESERVATIONS)
+    return asyncio.run(scenario())
+
+def test_unplaceable_migration_leaves_the_lab_running(fleet):
+    fleet.placement = None
+    error, record, reservations = migrate(fleet)
+    assert error == 'no capacity for lab'
+    assert fleet.destroyed == []
+    assert record == RECORD
+    assert list(reservations) == ['i-old'] and list(reservations['i-old']) == ['lab']
+
+def test_failed_redeploy_keeps_the_old_placement_for_a_retry(fleet):
+    fleet.deploy_ok = False
+    error, record, reservations = migrate(fleet)
+    assert error == 'Deployment failed on every instance'
+    assert fleet.destroyed == ['i-old']
+    assert record['distribution'] == {'i-old': ['r1', 'r2']}
+    assert record['migration']['status'] == 'failed'
+    assert record['migration']['target'] == {'i-new': ['r1', 'r2']}
+    # The new workers' pending reservations are gone; the old committed one still backs the record
+    assert list(reservations) == ['i-old'] and 'lab' in reservations['i-old']
+
+def test_successful_migration_moves_record_and_capacity(fleet):
+    error, record, reservations = migrate(fleet)
+    assert error is None
+    assert fleet.destroyed == ['i-old']
+    assert record['distribution'] == {'i-new': ['r1', 'r2']} and 'migration' not in record
+    assert list(reservations) == ['i-new']
+    assert 'lab' in reservations['i-new'] and pending_key('lab') not in reservations['i-new']
+    assert reservations['i-new']['lab']['state'] != PENDING
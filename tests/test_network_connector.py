@@ -0,0 +1,80 @@
+"""Tunnel checks: per-host script output decides which tunnel ends are up"""
+
+import asyncio
+
+import pytest
+
+import deployment_manager
+from deployment_manager import NetworkConnector
+from link_realizer import LinkRealizer
+from ssh_pool import CommandResult
+
+LINKS = [{'endpoints': [f'r1:eth{i}', f'r2:eth{i}']} for i in (1, 2, 3)]
+L1, L2, L3 = (f'r1:eth{i}--r2:eth{i}' for i in (1, 2, 3))
+DISTRIBUTION = {'i-a': ['r1'], 'i-b': ['r2']}
+HOST_IPS = {'i-a': '10.0.0.1', 'i-b': '10.0.0.2'}
+PUBLIC_IPS = {'i-a': '54.0.0.1', 'i-b': '54.0.0.2'}
+
+class ScriptedPool:
+    """Answers each host's tunnel script with canned output, or raises"""
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.commands = {}
+
+    def exec_command(self, host, command, timeout=None):
+        self.commands[host] = command
+        output = self.outputs[host]
+        if isinstance(output, Exception):
+            raise output
+        return CommandResult(0, output, '')
+
+@pytest.fixture
+def ensure(store, monkeypatch):
+    def run(outputs, public_ips=PUBLIC_IPS):
+        pool = ScriptedPool(outputs)
+        monkeypatch.setattr(deployment_manager, 'get_ssh_pool', lambda key_path: pool)
+
+        async def scenario():
+            plan = await LinkRealizer(store).plan('lab', LINKS, DISTRIBUTION, HOST_IPS)
+            return await NetworkConnector().ensure_tunnels(plan, public_ips, '~/.ssh/id_rsa')
+
+        hosts, links = asyncio.run(scenario())
+        return hosts, links, pool
+    return run
+
+def test_present_created_and_failed_lines_are_collected(ensure):
+    hosts, links, pool = ensure({
+        '54.0.0.1': f'present {L1}\ncreated {L2}\nfailed {L3}\n',
+        '54.0.0.2': f'present {L1}\nRTNETLINK answers: File exists\npresent {L2}\npresent {L3}\n',
+    })
+
+    assert hosts['i-a']['present'] == [L1]
+    assert hosts['i-a']['created'] == [L2]
+    assert hosts['i-a']['failed'] == [L3]
+    assert not hosts['i-a']['ok'] and hosts['i-b']['ok']
+    assert links[L1] == {'vni': 10000, 'up': True, 'a_up': True, 'b_up': True}
+    assert links[L2]['up']
+    assert links[L3] == {'vni': 10002, 'up': False, 'a_up': False, 'b_up': True}
+    # Each host checks its own container's end against the peer's tunnel address
+    assert 'clab-lab-i-a-r1' in pool.commands['54.0.0.1'] and '10.0.0.2' in pool.commands['54.0.0.1']
+
+def test_ends_the_script_never_reported_count_as_failed(ensure):
+    hosts, links, _ = ensure({
+        '54.0.0.1': f'present {L1}\npresent {L2}\npresent {L3}\n',
+        # Died after the first end
+        '54.0.0.2': f'created {L1}\n',
+    })
+
+    assert hosts['i-b']['created'] == [L1]
+    assert hosts['i-b']['failed'] == [L2, L3]
+    assert [link_id for link_id, state in links.items() if state['up']] == [L1]
+    assert links[L2] == {'vni': 10001, 'up': False, 'a_up': True, 'b_up': False}
+
+def test_unreachable_host_takes_all_its_tunnels_down(ensure):
+    hosts, links, _ = ensure({'54.0.0.1': ConnectionError('timed out')},
+                             public_ips={'i-a': '54.0.0.1'})
+
+    assert hosts['i-a']['error'] == 'timed out'
+    assert hosts['i-b']['error'] == 'no address'
+    assert not any(state['a_up'] or state['b_up'] for state in links.values())
@@ -0,0 +1,58 @@
+"""Learned node resource profiles"""
+
+from node_profiles import NodeProfiles, percentile, summarize
+from resource_monitor import ContainerUsage
+
+def usage(kind: str, image: str, cpu, memory: float = 1.0) -> ContainerUsage:
+    return ContainerUsage('node', kind, image, 'lab', cpu, memory)
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 100) == 100
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([5, 1, 3], 50) == 3
+
+def test_summarize():
+    summary = summarize([(0.1, 1.0), (0.2, 2.0), (0.9, 3.0)])
+    assert summary == {
+        'samples': 3,
+        'cpu': {'p50': 0.2, 'p95': 0.9, 'max': 0.9},
+        'memory': {'p50': 2.0, 'p95': 3.0, 'max': 3.0},
+    }
+
+def test_first_poll_of_a_container_is_skipped(tmp_path):
+    profiles = NodeProfiles(str(tmp_path / 'p.json'))
+    profiles.record([usage('linux', 'alpine', None), usage('', 'alpine', 0.5)])
+    assert profiles.summary() == {}
+
+def test_image_profile_falls_back_to_the_kind(tmp_path):
+    profiles = NodeProfiles(str(tmp_path / 'p.json'))
+    profiles.record([usage('srl', 'srlinux:23', 1.0)] * 3 + [usage('srl', 'srlinux:24', 2.0)])
+
+    assert profiles.profile('srl', 'srlinux:23', min_samples=3)['samples'] == 3
+    # Too few samples of this image: every image of the kind
+    assert profiles.profile('srl', 'srlinux:24', min_samples=3)['samples'] == 4
+    assert profiles.profile('srl', min_samples=5) is None
+    assert profiles.profile('ceos') is None
+
+def test_window_keeps_the_most_recent_samples(tmp_path):
+    profiles = NodeProfiles(str(tmp_path / 'p.json'), max_samples=2)
+    profiles.record([usage('linux', 'alpine', cpu) for cpu in (5.0, 0.1, 0.2)])
+    assert profiles.profile('linux', 'alpine')['cpu']['max'] == 0.2
+
+def test_saved_profiles_load_and_reload(tmp_path):
+    path = str(tmp_path / 'p.json')
+    writer = NodeProfiles(path)
+    writer.record([usage('linux', 'alpine', 0.5)])
+    writer.save()
+
+    reader = NodeProfiles(path)
+    assert reader.profile('linux', 'alpine')['samples'] == 1
+
+    writer.record([usage('linux', 'alpine', 0.5)])
+    writer.save()
+    reader._loaded_mtime = None  # file systems with coarse mtimes may not tick between the saves
+    reader.reload()
+    assert reader.profile('linux', 'alpine')['samples'] == 2
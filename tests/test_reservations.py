@@ -0,0 +1,89 @@
+"""Capacity reservation ledger"""
+
+import asyncio
+
+from bin_packer import Resources
+from reservations import COMMITTED, ReservationLedger, pending_key
+from state_store import InMemoryStateStore
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def ledger(pending_ttl: float = 3600) -> ReservationLedger:
+    return ReservationLedger(InMemoryStateStore(), pending_ttl=pending_ttl)
+
+def under(limit: float):
+    return lambda total: total.cpu <= limit
+
+def test_reserve_respects_fit_check():
+    async def scenario():
+        ledger_ = ledger()
+        assert await ledger_.reserve('a', 'i-1', Resources(cpu=2), under(3))
+        assert not await ledger_.reserve('b', 'i-1', Resources(cpu=2), under(3))
+        assert (await ledger_.reserved())['i-1'].cpu == 2
+    run(scenario())
+
+def test_reserve_all_is_all_or_nothing():
+    async def scenario():
+        ledger_ = ledger()
+        await ledger_.reserve('other', 'i-2', Resources(cpu=3))
+        rejected = await ledger_.reserve_all('t', {'i-1': Resources(cpu=1), 'i-2': Resources(cpu=1)},
+                                             {'i-2': under(3)})
+        assert rejected == ['i-2']
+        reserved = await ledger_.reserved()
+        assert reserved.get('i-1', Resources()).cpu == 0
+        assert reserved['i-2'].cpu == 3
+    run(scenario())
+
+def test_pending_reservations_expire():
+    async def scenario():
+        ledger_ = ledger(pending_ttl=-1)
+        await ledger_.reserve('t', 'i-1', Resources(cpu=1))
+        assert (await ledger_.reserved())['i-1'].cpu == 0
+    run(scenario())
+
+def test_commit_keeps_the_reservation_past_the_ttl():
+    async def scenario():
+        ledger_ = ledger()
+        await ledger_.reserve('t', 'i-1', Resources(cpu=1))
+        await ledger_.commit('t', ['i-1'])
+        entries = (await ledger_.snapshot())['i-1']
+        assert list(entries) == ['t']
+        assert entries['t']['state'] == COMMITTED
+        assert entries['t']['expires_at'] is None
+    run(scenario())
+
+def test_failed_redeploy_restores_the_committed_reservation():
+    async def scenario():
+        ledger_ = ledger()
+        await ledger_.reserve('t', 'i-1', Resources(cpu=1, memory=2))
+        await ledger_.commit('t', ['i-1'])
+
+        # Redeploy: pending next to the committed entry, counted once at the maximum
+        await ledger_.reserve('t', 'i-1', Resources(cpu=2, memory=1))
+        assert set((await ledger_.snapshot())['i-1']) == {'t', pending_key('t')}
+        assert (await ledger_.reserved())['i-1'] == Resources(cpu=2, memory=2)
+
+        await ledger_.release('t', only_pending=True)
+        assert (await ledger_.reserved())['i-1'] == Resources(cpu=1, memory=2)
+    run(scenario())
+
+def test_successful_redeploy_replaces_the_committed_reservation():
+    async def scenario():
+        ledger_ = ledger()
+        await ledger_.reserve('t', 'i-1', Resources(cpu=1))
+        await ledger_.commit('t', ['i-1'])
+        await ledger_.reserve('t', 'i-1', Resources(cpu=0.5))
+        await ledger_.commit('t', ['i-1'])
+        assert (await ledger_.reserved())['i-1'].cpu == 0.5
+    run(scenario())
+
+def test_release_drops_everything():
+    async def scenario():
+        ledger_ = ledger()
+        await ledger_.reserve('t', 'i-1', Resources(cpu=1))
+        await ledger_.commit('t', ['i-1'])
+        await ledger_.reserve('t', 'i-1', Resources(cpu=1))
+        await ledger_.release('t')
+        assert await ledger_.snapshot() == {}
+    run(scenario())
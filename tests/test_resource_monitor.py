@@ -0,0 +1,74 @@
+"""CPU utilization from /proc/stat counter deltas"""
+
+import subprocess
+import time
+
+from resource_monitor import CPUSampler, SSHResourceCollector
+from ssh_pool import CommandResult
+
+def times(busy: int, idle: int) -> list:
+    # user nice system idle iowait irq softirq steal
+    return [busy, 0, 0, idle, 0, 0, 0, 0]
+
+def test_first_poll_uses_in_probe_baseline_not_boot_average():
+    sampler = CPUSampler()
+    # Since boot the host was 90% idle, during the probe it was fully busy
+    assert sampler.sample('h', times(1100, 9000), baseline=times(1000, 9000)) == 100.0
+
+def test_later_polls_measure_since_previous_poll():
+    sampler = CPUSampler()
+    sampler.sample('h', times(100, 100), baseline=times(90, 100))
+    assert sampler.sample('h', times(150, 150), baseline=times(149, 150)) == 50.0
+
+def test_counter_reset_falls_back_to_baseline():
+    sampler = CPUSampler()
+    sampler.sample('h', times(5000, 5000), baseline=times(4990, 5000))
+    # Rebooted: counters went backwards
+    assert sampler.sample('h', times(30, 70), baseline=times(20, 60)) == 50.0
+
+def test_idle_counters_report_zero():
+    sampler = CPUSampler()
+    assert sampler.sample('h', times(10, 10), baseline=times(10, 10)) == 0.0
+
+def test_hosts_are_independent_and_forgettable():
+    sampler = CPUSampler()
+    sampler.sample('a', times(100, 100), baseline=times(100, 90))
+    sampler.forget('a')
+    assert sampler.sample('a', times(200, 100), baseline=times(100, 100)) == 100.0
+
+def test_probe_of_known_host_carries_no_baseline():
+    sampler = CPUSampler()
+    assert not sampler.has_sample('h')
+    sampler.sample('h', times(100, 100), baseline=times(90, 100))
+    assert sampler.has_sample('h')
+    assert sampler.sample('h', times(150, 150)) == 50.0
+
+class LocalPool:
+    """Runs probe commands on this machine instead of over SSH"""
+
+    def __init__(self):
+        self.commands = []
+
+    def exec_command(self, host, command, timeout=None, username=None):
+        self.commands.append(command)
+        result = subprocess.run(['bash', '-c', command], capture_output=True, text=True, timeout=timeout)
+        return CommandResult(result.returncode, result.stdout, result.stderr)
+
+def test_only_the_first_poll_of_a_host_waits_for_the_cpu_window():
+    collector = SSHResourceCollector('~/.ssh/id_rsa')
+    collector.ssh_pool = LocalPool()
+
+    def poll():
+        started = time.monotonic()
+        probe = collector.run_probe('10.0.0.1')
+        collector.parse_metrics('10.0.0.1', probe)
+        return probe, time.monotonic() - started
+
+    first, first_seconds = poll()
+    assert first['cpu_times_start'] is not None and first_seconds >= 0.5
+
+    second, second_seconds = poll()
+    assert second['cpu_times_start'] is None
+    assert collector.ssh_pool.commands[0].startswith('python3 - first-sample <<')
+    assert collector.ssh_pool.commands[1].startswith('python3 - <<')
+    assert second_seconds < 0.5
@@ -0,0 +1,20 @@
+"""SSH connection pools: one per key"""
+
+import os
+
+import ssh_pool
+from ssh_pool import close_all_pools, get_ssh_pool
+
+def test_callers_with_the_same_key_share_a_pool(monkeypatch):
+    monkeypatch.setattr(ssh_pool, '_pools', {})
+    monkeypatch.setenv('SSH_KEY_PATH', '~/.ssh/ndt.pem')
+    assert get_ssh_pool('~/.ssh/ndt.pem') is get_ssh_pool(os.path.expanduser('~/.ssh/ndt.pem'))
+    # No key means the configured default
+    assert get_ssh_pool() is get_ssh_pool('~/.ssh/ndt.pem')
+
+def test_another_key_gets_its_own_pool(monkeypatch):
+    monkeypatch.setattr(ssh_pool, '_pools', {})
+    first, second = get_ssh_pool('/keys/a.pem'), get_ssh_pool('/keys/b.pem')
+    assert first is not second
+    assert (first.key_path, second.key_path) == ('/keys/a.pem', '/keys/b.pem')
+    close_all_pools()
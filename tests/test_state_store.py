@@ -0,0 +1,31 @@
+"""In-memory state store: atomic updates and leader election"""
+
+import asyncio
+
+from state_store import InMemoryStateStore, Leadership
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_update_replaces_and_deletes():
+    async def scenario():
+        store = InMemoryStateStore()
+        await store.update('ns', 'key', lambda current: {'count': (current or {}).get('count', 0) + 1})
+        await store.update('ns', 'key', lambda current: {'count': current['count'] + 1})
+        assert await store.get('ns', 'key') == {'count': 2}
+        await store.update('ns', 'key', lambda current: None)
+        assert await store.get('ns', 'key') is None
+    run(scenario())
+
+def test_one_leader_until_it_resigns():
+    async def scenario():
+        store = InMemoryStateStore()
+        first, second = Leadership(store, 'duty'), Leadership(store, 'duty')
+        assert await first.check()
+        assert not await second.check()
+        # The leader keeps its lock on later checks
+        assert await first.check()
+        await first.resign()
+        assert await second.check()
+        assert not await first.check()
+    run(scenario())
@@ -0,0 +1,71 @@
+"""Link-aware topology partitioning"""
+
+from topology_partitioner import TopologyPartitioner, build_graph, evaluate, link_nodes
+
+def link(a: str, b: str) -> dict:
+    return {'endpoints': [f'{a}:eth1', f'{b}:eth1']}
+
+def ring(prefix: str, size: int) -> list:
+    names = [f'{prefix}{i}' for i in range(size)]
+    return [link(names[i], names[(i + 1) % size]) for i in range(size)]
+
+def test_link_nodes_brief_and_extended_forms():
+    assert link_nodes(link('a', 'b')) == ('a', 'b')
+    assert link_nodes({'endpoints': [{'node': 'a', 'interface': 'e1'}, {'node': 'b', 'interface': 'e1'}]}) == ('a', 'b')
+    assert link_nodes({'endpoints': ['a:eth1']}) is None
+
+def test_build_graph_counts_parallel_links_and_skips_foreign_ends():
+    nodes = {'a': {}, 'b': {}}
+    graph = build_graph(nodes, [link('a', 'b'), link('a', 'b'), link('a', 'a'), link('a', 'host')])
+    assert graph == {'a': {'b': 2}, 'b': {'a': 2}}
+
+def test_evaluate_counts_cut_links():
+    nodes = {name: {} for name in 'abcd'}
+    plan = evaluate([['a', 'b'], ['c', 'd']], nodes, [link('a', 'b'), link('b', 'c'), link('c', 'd')])
+    assert plan.cut_links == [('b', 'c')]
+    assert plan.total_links == 3
+    assert plan.balance == 1.0
+
+def test_fits_in_one_part():
+    nodes = {name: {} for name in 'abc'}
+    plan = TopologyPartitioner(capacity=5).partition(nodes, [link('a', 'b')])
+    assert plan.parts == [['a', 'b', 'c']]
+    assert plan.cut_size == 0
+
+def test_two_rings_with_one_bridge_are_split_at_the_bridge():
+    # Interleaved node order: partitioning by order would cut most links
+    left, right = [f'l{i}' for i in range(4)], [f'r{i}' for i in range(4)]
+    nodes = {name: {} for pair in zip(left, right) for name in pair}
+    links = ring('l', 4) + ring('r', 4) + [link('l0', 'r0')]
+
+    plan = TopologyPartitioner(capacity=4).partition(nodes, links)
+
+    assert sorted(map(sorted, plan.parts)) == [sorted(left), sorted(right)]
+    assert plan.cut_size == 1
+
+def test_parts_respect_capacity():
+    nodes = {f'n{i}': {} for i in range(10)}
+    links = [link(f'n{i}', f'n{i + 1}') for i in range(9)]
+
+    plan = TopologyPartitioner(capacity=3).partition(nodes, links)
+
+    assert len(plan.parts) == 4
+    assert all(load <= 3 for load in plan.loads)
+    assert sorted(name for part in plan.parts for name in part) == sorted(nodes)
+    # A chain cut into four pieces needs only three cut links
+    assert plan.cut_size == 3
+
+def test_weights_drive_the_split():
+    nodes = {'big': {'kind': 'heavy'}, 'a': {}, 'b': {}, 'c': {}}
+    weight = lambda name, config: 3.0 if config.get('kind') == 'heavy' else 1.0
+
+    plan = TopologyPartitioner(capacity=3, weight_fn=weight).partition(nodes, [link('big', 'a')])
+
+    assert ['big'] in plan.parts
+    assert sorted(plan.loads) == [3.0, 3.0]
+
+def test_fixed_number_of_parts():
+    nodes = {name: {} for name in 'abcdef'}
+    plan = TopologyPartitioner(capacity=10).partition(nodes, [], num_parts=3)
+    assert len(plan.parts) == 3
+    assert plan.loads == [2.0, 2.0, 2.0]
@@ -0,0 +1,56 @@
+"""Nested deploy spans"""
+
+import asyncio
+
+import pytest
+
+from tracing import FAILED, OK, current_span, span, start_span, trace
+
+def test_spans_nest_under_the_current_span():
+    with trace('deploy') as root:
+        with span('plan'):
+            with span('pack', nodes=3):
+                pass
+        with span('launch'):
+            pass
+    tree = root.to_dict()
+    assert [child['name'] for child in tree['children']] == ['plan', 'launch']
+    assert tree['children'][0]['children'][0]['attributes'] == {'nodes': 3}
+    assert tree['status'] == OK
+    assert current_span() is None
+
+def test_an_exception_fails_and_ends_the_span():
+    with pytest.raises(RuntimeError):
+        with trace('deploy') as root:
+            with span('yaml'):
+                raise RuntimeError('bad topology')
+    yaml_span = root.children[0]
+    assert yaml_span.status == FAILED
+    assert yaml_span.error == 'bad topology'
+    assert yaml_span.ended is not None
+    assert root.status == FAILED
+
+def test_concurrent_tasks_attach_to_their_parent():
+    async def deploy(instance_id: str):
+        with span('deploy-instance', instance_id=instance_id):
+            await asyncio.sleep(0)
+            with span('upload'):
+                await asyncio.sleep(0)
+
+    async def scenario():
+        with trace('deploy') as root:
+            await asyncio.gather(deploy('i-1'), deploy('i-2'))
+        return root
+
+    root = asyncio.run(scenario())
+    assert sorted(child.attributes['instance_id'] for child in root.children) == ['i-1', 'i-2']
+    assert all([grandchild.name for grandchild in child.children] == ['upload'] for child in root.children)
+
+def test_start_span_is_finished_by_the_caller():
+    with trace('deploy') as root:
+        bootstrap = start_span('bootstrap')
+    assert root.children == [bootstrap]
+    assert bootstrap.ended is None
+    bootstrap.finish('timeout')
+    bootstrap.finish()
+    assert bootstrap.status == FAILED and bootstrap.error == 'timeout'
@@ -0,0 +1,163 @@
+"""Warm pool claims and reconciliation against a fake EC2"""
+
+import asyncio
+import time
+
+from botocore.exceptions import ClientError
+
+from state_store import POOL_DEMAND, WARM_POOL
+from warm_pool import CLAIMED, READY, STANDBY_TAG, WARMING, WARMING_TIMEOUT, WarmPool
+
+SIZES = {'small': {'min': 0, 'max': 2}}
+
+class FakeEC2:
+    """Standbys by instance id with their tags; records start, tag and terminate calls"""
+
+    def __init__(self):
+        self.standbys = {}
+        self.started, self.terminated = [], []
+        self.start_error = None
+
+    def describe_instances(self, Filters):
+        instances = [
+            {'InstanceId': instance_id, 'Tags': [{'Key': k, 'Value': v} for k, v in tags.items()]}
+            for instance_id, tags in self.standbys.items()
+        ]
+        return {'Reservations': [{'Instances': instances}]}
+
+    def start_instances(self, InstanceIds):
+        if self.start_error:
+            raise ClientError({'Error': {'Code': self.start_error, 'Message': ''}}, 'StartInstances')
+        self.started.extend(InstanceIds)
+
+    def create_tags(self, Resources, Tags):
+        for instance_id in Resources:
+            self.standbys.setdefault(instance_id, {}).update({tag['Key']: tag['Value'] for tag in Tags})
+
+    def delete_tags(self, Resources, Tags):
+        for instance_id in Resources:
+            for tag in Tags:
+                self.standbys.get(instance_id, {}).pop(tag['Key'], None)
+
+    def terminate_instances(self, InstanceIds):
+        self.terminated.extend(InstanceIds)
+        for instance_id in InstanceIds:
+            self.standbys.pop(instance_id, None)
+
+class FakeManager:
+    def __init__(self, ec2: FakeEC2):
+        self.ec2_client = ec2
+        self.retired = []
+
+    async def instance_retired(self, instance_ids, stopped=False):
+        self.retired.extend(instance_ids)
+
+def pool(store, ec2=None, **kwargs) -> WarmPool:
+    return WarmPool(FakeManager(ec2 or FakeEC2()), store, sizes=SIZES, **kwargs)
+
+async def add_standby(store, ec2, instance_id, state=READY, size='small', created_at=None):
+    await store.put(WARM_POOL, instance_id, {
+        'instance_id': instance_id, 'size': size, 'state': state,
+        'created_at': created_at if created_at is not None else time.time(),
+    })
+    ec2.standbys[instance_id] = {'NDT-Managed': STANDBY_TAG, 'NDT-Pool-State': state, 'NDT-Pool-Size': size}
+
+def test_concurrent_claims_never_share_a_standby(store):
+    ec2 = FakeEC2()
+    # Two manager processes sharing one store
+    first, second = pool(store, ec2), pool(store, ec2)
+
+    async def scenario():
+        await add_standby(store, ec2, 'i-ready')
+        results = await asyncio.gather(first.claim_many(['small']), second.claim_many(['small']))
+        assert sorted(results, key=len) == [{}, {0: 'i-ready'}]
+        assert ec2.started == ['i-ready']
+        assert ec2.standbys['i-ready']['NDT-Managed'] == 'true'
+        assert 'NDT-Pool-State' not in ec2.standbys['i-ready']
+        assert await store.all(WARM_POOL) == {}
+
+    asyncio.run(scenario())
+
+def test_claim_takes_only_ready_standbys_of_the_size_oldest_first(store):
+    ec2 = FakeEC2()
+    warm = pool(store, ec2)
+
+    async def scenario():
+        await add_standby(store, ec2, 'i-warming', state=WARMING, created_at=1)
+        await add_standby(store, ec2, 'i-new', created_at=3)
+        await add_standby(store, ec2, 'i-old', created_at=2)
+        assert await warm.claim_many(['small', 'small', 'large']) == {0: 'i-old', 1: 'i-new'}
+        assert list(await store.all(WARM_POOL)) == ['i-warming']
+        # Every request counts towards sizing, pooled or not
+        assert len((await store.get(POOL_DEMAND, 'small'))['events']) == 2
+        assert len((await store.get(POOL_DEMAND, 'large'))['events']) == 1
+
+    asyncio.run(scenario())
+
+def test_take_is_refused_once_claimed(store):
+    warm = pool(store)
+
+    async def scenario():
+        await store.put(WARM_POOL, 'i-1', {'instance_id': 'i-1', 'size': 'small', 'state': READY, 'created_at': 0})
+        assert await warm._take('i-1')
+        assert (await store.get(WARM_POOL, 'i-1'))['state'] == CLAIMED
+        assert not await warm._take('i-1')
+        assert not await warm._take('i-missing')
+
+    asyncio.run(scenario())
+
+def test_standby_that_fails_to_start_is_dropped_for_a_fresh_launch(store):
+    ec2 = FakeEC2()
+    ec2.start_error = 'InsufficientInstanceCapacity'
+    warm = pool(store, ec2)
+
+    async def scenario():
+        await add_standby(store, ec2, 'i-ready')
+        assert await warm.claim_many(['small']) == {}
+        assert ec2.terminated == ['i-ready']
+        assert warm.manager.retired == ['i-ready']
+        assert await store.all(WARM_POOL) == {}
+
+    asyncio.run(scenario())
+
+def test_reconcile_aligns_records_with_ec2(store):
+    ec2 = FakeEC2()
+    warm = pool(store, ec2)
+
+    async def scenario():
+        await add_standby(store, ec2, 'i-kept')
+        # Record whose instance is gone from EC2
+        await add_standby(store, ec2, 'i-gone')
+        del ec2.standbys['i-gone']
+        # Ready standby that outlived its record (manager restart)
+        ec2.standbys['i-adopt'] = {'NDT-Managed': STANDBY_TAG, 'NDT-Pool-State': READY, 'NDT-Pool-Size': 'small'}
+        # Warming when its manager died, and a size that is no longer pooled
+        ec2.standbys['i-half'] = {'NDT-Managed': STANDBY_TAG, 'NDT-Pool-Size': 'small'}
+        ec2.standbys['i-unpooled'] = {'NDT-Managed': STANDBY_TAG, 'NDT-Pool-State': READY, 'NDT-Pool-Size': 'huge'}
+        # Still warming long after any warming task could be alive
+        await add_standby(store, ec2, 'i-stale', state=WARMING, created_at=time.time() - WARMING_TIMEOUT - 1)
+
+        await warm._reconcile()
+
+        records = await store.all(WARM_POOL)
+        assert sorted(records) == ['i-adopt', 'i-kept']
+        assert records['i-adopt']['state'] == READY and records['i-adopt']['size'] == 'small'
+        assert sorted(ec2.terminated) == ['i-half', 'i-stale', 'i-unpooled']
+
+    asyncio.run(scenario())
+
+def test_refill_retires_surplus_ready_standbys_oldest_first(store):
+    ec2 = FakeEC2()
+    warm = pool(store, ec2)
+
+    async def scenario():
+        # One worker requested recently: the pool keeps one standby
+        await warm.record_demand(['small'])
+        await add_standby(store, ec2, 'i-old', created_at=1)
+        await add_standby(store, ec2, 'i-new', created_at=2)
+        await warm.refill()
+        assert ec2.terminated == ['i-old']
+        assert list(await store.all(WARM_POOL)) == ['i-new']
+        assert (await warm.status())['sizes']['small'] == {'min': 0, 'max': 2, 'target': 1, 'ready': 1, 'warming': 0}
+
+    asyncio.run(scenario())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Topology Partitioner for NDT
+Link-aware splitting of containerlab topologies across hosts (greedy growing + Kernighan-Lin refinement)
+"""
+
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Graph = Dict[str, Dict[str, float]]
+WeightFn = Callable[[str, Dict], float]
+
+def link_nodes(link: Dict) -> Optional[Tuple[str, str]]:
+    """Node names at the two ends of a containerlab link, or None
+
+    Handles both the brief form (endpoints: ["a:eth1", "b:eth1"]) and the
+    extended form (endpoints: [{node: a, interface: eth1}, ...]).
+    """
+    endpoints = link.get('endpoints', [])
+    if len(endpoints) < 2:
+        return None
+
+    names = []
+    for endpoint in endpoints[:2]:
+        if isinstance(endpoint, dict):
+            names.append(endpoint.get('node'))
+        else:
+            names.append(str(endpoint).split(':')[0])
+
+    if not all(names):
+        return None
+    return names[0], names[1]
+
+def build_graph(nodes: Dict[str, Dict], links: List[Dict]) -> Graph:
+    """Adjacency map weighted by the number of links between each node pair"""
+    graph: Graph = {name: {} for name in nodes}
+    for link in links:
+        ends = link_nodes(link)
+        # Skip host:/macvlan: style endpoints and self-loops
+        if ends is None or ends[0] == ends[1] or ends[0] not in graph or ends[1] not in graph:
+            continue
+        a, b = ends
+        graph[a][b] = graph[a].get(b, 0) + 1
+        graph[b][a] = graph[b].get(a, 0) + 1
+    return graph
+
+@dataclass
+class PartitionPlan:
+    """Node groups plus the quality figures of the split"""
+    parts: List[List[str]]
+    loads: List[float]
+    cut_links: List[Tuple[str, str]] = field(default_factory=list)
+    total_links: int = 0
+
+    @property
+    def cut_size(self) -> int:
+        return len(self.cut_links)
+
+    @property
+    def balance(self) -> float:
+        """Heaviest part relative to the mean (1.0 is perfectly balanced)"""
+        if not self.loads or sum(self.loads) == 0:
+            return 1.0
+        return max(self.loads) / (sum(self.loads) / len(self.loads))
+
+    def summary(self) -> Dict:
+        return {
+            'parts': len(self.parts),
+            'part_sizes': [len(part) for part in self.parts],
+            'part_loads': [round(load, 2) for load in self.loads],
+            'balance': round(self.balance, 3),
+            'cut_size': self.cut_size,
+            'total_links': self.total_links,
+        }
+
+def evaluate(parts: List[List[str]], nodes: Dict[str, Dict], links: List[Dict],
+             weight_fn: Optional[WeightFn] = None) -> PartitionPlan:
+    """Build a PartitionPlan for an existing grouping (e.g. the final host distribution)"""
+    weight_fn = weight_fn or (lambda name, config: 1.0)
+    assignment = {name: index for index, part in enumerate(parts) for name in part}
+
+    cut_links = []
+    total_links = 0
+    for link in links:
+        ends = link_nodes(link)
+        if ends is None or ends[0] not in assignment or ends[1] not in assignment or ends[0] == ends[1]:
+            continue
+        total_links += 1
+        if assignment[ends[0]] != assignment[ends[1]]:
+            cut_links.append(ends)
+
+    loads = [sum(weight_fn(name, nodes.get(name) or {}) for name in part) for part in parts]
+    return PartitionPlan(parts=parts, loads=loads, cut_links=cut_links, total_links=total_links)
+
+class TopologyPartitioner:
+    """Splits nodes into capacity-bounded parts while keeping densely linked nodes together"""
+
+    def __init__(self,
+                 capacity: float,
+                 weight_fn: Optional[WeightFn] = None,
+                 imbalance: float = 0.2,
+                 max_passes: int = 10):
+        self.capacity = capacity
+        self.weight_fn = weight_fn or (lambda name, config: 1.0)
+        # How far refinement may push a part above the mean load to save a cut link
+        self.imbalance = imbalance
+        self.max_passes = max_passes
+
+    def partition(self, nodes: Dict[str, Dict], links: List[Dict], num_parts: Optional[int] = None) -> PartitionPlan:
+        """Partition nodes into num_parts (default: as few as capacity allows)"""
+        names = list(nodes)
+        if not names:
+            return PartitionPlan(parts=[], loads=[])
+
+        weights = {name: self.weight_fn(name, nodes[name] or {}) for name in names}
+        graph = build_graph(nodes, links)
+        total = sum(weights.values())
+
+        k = num_parts or max(1, math.ceil(total / self.capacity - 1e-9))
+        k = min(k, len(names))
+        if k == 1:
+            return evaluate([names], nodes, links, self.weight_fn)
+
+        # If the caller fixed k below what capacity needs, spread the overflow evenly
+        capacity = max(self.capacity, total / k)
+        limit = min(capacity, total / k * (1 + self.imbalance))
+        limit = max(limit, max(weights.values()), total / k)
+
+        assignment = self._grow(names, graph, weights, k, capacity)
+        self._refine(names, graph, weights, assignment, k, limit)
+
+        parts: List[List[str]] = [[] for _ in range(k)]
+        for name in names:
+            parts[assignment[name]].append(name)
+        parts = [part for part in parts if part]
+
+        plan = evaluate(parts, nodes, links, self.weight_fn)
+        logger.debug(f"Partitioned {len(names)} nodes into {len(parts)} parts: {plan.summary()}")
+        return plan
+
+    def _grow(self, names: List[str], graph: Graph, weights: Dict[str, float],
+              k: int, capacity: float) -> Dict[str, int]:
+        """Initial partition by growing each part outward from a high-degree seed"""
+        rank = {name: index for index, name in enumerate(names)}
+        order = sorted(names, key=lambda n: (-sum(graph[n].values()), rank[n]))
+        assignment: Dict[str, int] = {}
+        loads = [0.0] * k
+
+        for part in range(k):
+            remaining = [n for n in order if n not in assignment]
+            if not remaining:
+                break
+            # Re-aim at the mean of what is left so earlier rounding does not starve the last part
+            target = sum(weights[n] for n in remaining) / (k - part)
+
+            def fits(name: str) -> bool:
+                return (loads[part] + weights[name] <= capacity
+                        and (loads[part] == 0 or loads[part] + weights[name] / 2 <= target))
+
+            connectivity: Dict[str, float] = {}
+            current = remaining[0]
+            while current is not None:
+                assignment[current] = part
+                loads[part] += weights[current]
+                connectivity.pop(current, None)
+                for neighbor, weight in graph[current].items():
+                    if neighbor not in assignment:
+                        connectivity[neighbor] = connectivity.get(neighbor, 0) + weight
+
+                candidates = [n for n in connectivity if fits(n)]
+                if candidates:
+                    # Most links into the part first, then fewest links left outside it
+                    current = max(candidates, key=lambda n: (
+                        connectivity[n], -(sum(graph[n].values()) - connectivity[n]), -rank[n]))
+                else:
+                    # Frontier exhausted (disconnected graph) or full: top up with the next unplaced node
+                    current = next((n for n in order if n not in assignment and fits(n)), None)
+
+        for name in order:
+            if name in assignment:
+                continue
+            # Leftovers from rounding: the best-connected part with room, else the lightest part
+            links_to = {}
+            for neighbor, weight in graph[name].items():
+                if neighbor in assignment:
+                    links_to[assignment[neighbor]] = links_to.get(assignment[neighbor], 0) + weight
+            roomy = [p for p in range(k) if loads[p] + weights[name] <= capacity]
+            part = (max(roomy, key=lambda p: (links_to.get(p, 0), -loads[p])) if roomy
+                    else min(range(k), key=lambda p: loads[p]))
+            assignment[name] = part
+            loads[part] += weights[name]
+
+        return assignment
+
+    def _refine(self, names: List[str], graph: Graph, weights: Dict[str, float],
+                assignment: Dict[str, int], k: int, limit: float):
+        """Kernighan-Lin style passes: apply improving moves, then improving swaps"""
+        loads = [0.0] * k
+        for name, part in assignment.items():
+            loads[part] += weights[name]
+
+        def links_to(name: str) -> Dict[int, float]:
+            result: Dict[int, float] = {}
+            for neighbor, weight in graph[name].items():
+                part = assignment[neighbor]
+                result[part] = result.get(part, 0) + weight
+            return result
+
+        for _ in range(self.max_passes):
+            improved = False
+
+            # Single-node moves with positive gain that keep the destination within the limit
+            for name in names:
+                src = assignment[name]
+                conn = links_to(name)
+                best_gain, best_dst = 0.0, None
+                for dst, weight in conn.items():
+                    gain = weight - conn.get(src, 0)
+                    if dst != src and gain > best_gain and loads[dst] + weights[name] <= limit:
+                        best_gain, best_dst = gain, dst
+                if best_dst is not None:
+                    assignment[name] = best_dst
+                    loads[src] -= weights[name]
+                    loads[best_dst] += weights[name]
+                    improved = True
+
+            # Pairwise swaps between boundary nodes, for gains that capacity blocks as single moves
+            boundary = [n for n in names if any(assignment[m] != assignment[n] for m in graph[n])]
+            while True:
+                best_gain, best_pair = 0.0, None
+                for i, u in enumerate(boundary):
+                    conn_u = links_to(u)
+                    a = assignment[u]
+                    for v in boundary[i + 1:]:
+                        b = assignment[v]
+                        if a == b or conn_u.get(b, 0) == 0:
+                            continue
+                        conn_v = links_to(v)
+                        gain = (conn_u.get(b, 0) - conn_u.get(a, 0)
+                                + conn_v.get(a, 0) - conn_v.get(b, 0)
+                                - 2 * graph[u].get(v, 0))
+                        if (gain > best_gain
+                                and loads[a] - weights[u] + weights[v] <= limit
+                                and loads[b] - weights[v] + weights[u] <= limit):
+                            best_gain, best_pair = gain, (u, v)
+                if best_pair is None:
+                    break
+                u, v = best_pair
+                a, b = assignment[u], assignment[v]
+                assignment[u], assignment[v] = b, a
+                loads[a] += weights[v] - weights[u]
+                loads[b] += weights[u] - weights[v]
+                improved = True
+
+            if not improved:
+                break
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tracing for NDT
+Nested timing spans through a deployment, carried by a contextvar across tasks and executor threads
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Span states
+RUNNING = 'running'
+OK = 'ok'
+FAILED = 'failed'
+
+@dataclass
+class Span:
+    """One timed step; children are the steps started while it was the current span"""
+    name: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    started: float = field(default_factory=time.time)
+    ended: Optional[float] = None
+    status: str = RUNNING
+    error: Optional[str] = None
+    children: List['Span'] = field(default_factory=list)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error: str):
+        """Mark the span failed without ending it (for steps that report failure instead of raising)"""
+        self.status = FAILED
+        self.error = error
+
+    def finish(self, error: Optional[str] = None):
+        """End the span; later calls keep the first end time"""
+        if error is not None:
+            self.fail(error)
+        if self.ended is None:
+            self.ended = time.time()
+            if self.status == RUNNING:
+                self.status = OK
+
+    @property
+    def duration(self) -> float:
+        return (self.ended or time.time()) - self.started
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict:
+        """Span tree with start offsets relative to origin (default: this span's start)"""
+        origin = self.started if origin is None else origin
+        return {
+            'name': self.name,
+            'start_ms': round((self.started - origin) * 1000, 1),
+            'duration_ms': round(self.duration * 1000, 1),
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+            # Children of concurrent steps are appended as they start, possibly from several threads
+            'children': [child.to_dict(origin) for child in sorted(self.children, key=lambda s: s.started)],
+        }
+
+    def tree(self) -> Dict:
+        """Root span as stored with a deployment"""
+        return {
+            'started_at': datetime.fromtimestamp(self.started).isoformat(),
+            'duration_seconds': round(self.duration, 2),
+            'status': self.status,
+            'root': self.to_dict(),
+        }
+
+_current: ContextVar[Optional[Span]] = ContextVar('ndt_trace_span', default=None)
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+def start_span(name: str, **attributes) -> Span:
+    """A child of the current span that is not made current; the caller finishes it"""
+    span = Span(name, attributes)
+    parent = _current.get()
+    if parent is not None:
+        parent.children.append(span)
+    return span
+
+@contextmanager
+def _activate(span: Span) -> Iterator[Span]:
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.finish(str(e) or type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        span.finish()
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Time a block as a child of the current span; an exception marks it failed and propagates
+
+    Outside a trace the span is recorded nowhere, so instrumented code costs next to nothing.
+    """
+    with _activate(start_span(name, **attributes)) as child:
+        yield child
+
+@contextmanager
+def trace(name: str, **attributes) -> Iterator[Span]:
+    """Start a new trace whose root span is current for the block"""
+    with _activate(Span(name, attributes)) as root:
+        yield root
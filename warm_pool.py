@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Warm Pool for NDT Manager
+Bootstrapped standby workers per instance size, claimed instantly by placement and refilled in the background
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
+
+from botocore.exceptions import ClientError
+
+from async_executor import DEPLOY_LANE, run_blocking
+from state_store import POOL_DEMAND, WARM_POOL, StateStore
+
+if TYPE_CHECKING:
+    from ndt_manager import NDTManager
+
+logger = logging.getLogger(__name__)
+
+# NDT-Managed tag value of standbys: fleet listings filter on 'true', so standbys never receive topologies
+STANDBY_TAG = 'standby'
+
+# Standby states (store record and NDT-Pool-State tag)
+WARMING = 'warming'
+READY = 'ready'
+CLAIMED = 'claimed'
+
+# How standbys wait: 'stopped' (EBS only), 'hibernated' (RAM kept, faster resume) or 'running'
+POOL_MODES = ('stopped', 'hibernated', 'running')
+
+# A standby still warming after this long lost its warming task (manager restart)
+WARMING_TIMEOUT = 1800
+
+class WarmPool:
+    """Keeps bootstrapped standby workers per size, sized to recent deploy demand
+
+    Records live in the state store so claims are atomic across manager processes;
+    only the process holding the refill lock launches or retires standbys.
+    """
+
+    def __init__(self,
+                 manager: 'NDTManager',
+                 store: StateStore,
+                 sizes: Optional[Dict[str, Dict]] = None,
+                 mode: str = 'stopped',
+                 interval: float = 60,
+                 demand_window: float = 1800,
+                 enabled: bool = True):
+        if mode not in POOL_MODES:
+            raise ValueError(f"Unknown warm pool mode {mode!r}, expected one of {', '.join(POOL_MODES)}")
+        self.manager = manager
+        self.store = store
+        # size -> {'min': n, 'max': m}
+        self.sizes = sizes or {}
+        self.mode = mode
+        self.interval = interval
+        self.demand_window = demand_window
+        self.enabled = enabled and bool(self.sizes)
+
+        self._wake = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._warming: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """Start the background refiller"""
+        if self.enabled and (self._loop_task is None or self._loop_task.done()):
+            self._loop_task = asyncio.create_task(self._run())
+            logger.info(f"Warm pool started ({self.mode} standbys for {', '.join(self.sizes)})")
+
+    async def stop(self):
+        """Stop the refiller; standbys still warming are finished by the next refill round"""
+        tasks = [t for t in [self._loop_task, *self._warming] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Warm pool refill failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    # Claiming
+
+    async def claim_many(self, sizes: List[str]) -> Dict[int, str]:
+        """Claim and start one standby per requested size where available
+
+        Returns {index in sizes: instance_id}; indexes without a standby are for the
+        caller to launch. Every request counts as demand for pool sizing.
+        """
+        if not self.enabled:
+            return {}
+        await self.record_demand(sizes)
+
+        claimed: Dict[int, str] = {}
+        records = await self.store.all(WARM_POOL)
+        candidates: Dict[str, List[str]] = {}
+        for record in sorted(records.values(), key=lambda r: r['created_at']):
+            if record['state'] == READY:
+                candidates.setdefault(record['size'], []).append(record['instance_id'])
+
+        for index, size in enumerate(sizes):
+            queue = candidates.get(size, [])
+            while queue:
+                instance_id = queue.pop(0)
+                if await self._take(instance_id):
+                    claimed[index] = instance_id
+                    break
+
+        if claimed:
+            activated = await self._activate(list(claimed.values()))
+            claimed = {index: iid for index, iid in claimed.items() if iid in activated}
+            logger.info(f"Claimed {len(claimed)} warm standbys: {', '.join(claimed.values())}")
+            self._wake.set()
+        return claimed
+
+    async def _take(self, instance_id: str) -> bool:
+        """Atomically move a ready standby to claimed; False if someone else got it first"""
+        won = False
+
+        def take(record: Optional[Dict]) -> Optional[Dict]:
+            nonlocal won
+            if record is None or record['state'] != READY:
+                return record
+            won = True
+            return {**record, 'state': CLAIMED, 'claimed_at': time.time()}
+
+        await self.store.update(WARM_POOL, instance_id, take)
+        return won
+
+    async def _activate(self, instance_ids: List[str]) -> List[str]:
+        """Start claimed standbys and turn them into managed workers; returns the ones that made it"""
+        activated = []
+        try:
+            if self.mode != 'running':
+                await run_blocking(self.manager.ec2_client.start_instances, InstanceIds=instance_ids)
+            await run_blocking(
+                self.manager.ec2_client.create_tags,
+                Resources=instance_ids,
+                Tags=[
+                    {'Key': 'NDT-Managed', 'Value': 'true'},
+                    {'Key': 'Name', 'Value': f"ndt-worker-{datetime.now().strftime('%Y%m%d-%H%M%S')}"},
+                ],
+            )
+            await run_blocking(
+                self.manager.ec2_client.delete_tags,
+                Resources=instance_ids,
+                Tags=[{'Key': 'NDT-Pool-State'}, {'Key': 'NDT-Pool-Size'}],
+            )
+            activated = instance_ids
+        except ClientError as e:
+            # e.g. InsufficientInstanceCapacity on start: drop these standbys, the caller launches fresh ones
+            logger.error(f"Could not start warm standbys {', '.join(instance_ids)}: {e}")
+            await self._terminate(instance_ids)
+        finally:
+            for instance_id in instance_ids:
+                await self.store.delete(WARM_POOL, instance_id)
+        return activated
+
+    # Sizing
+
+    async def record_demand(self, sizes: List[str]):
+        now = time.time()
+        for size in set(sizes):
+            count = sizes.count(size)
+
+            def add(record: Optional[Dict]) -> Dict:
+                events = [t for t in (record or {}).get('events', []) if t > now - self.demand_window]
+                return {'events': events + [now] * count}
+
+            await self.store.update(POOL_DEMAND, size, add)
+
+    async def target_size(self, size: str) -> int:
+        """Standbys to keep for a size: the workers requested in the last window, within min/max"""
+        bounds = self.sizes.get(size, {})
+        record = await self.store.get(POOL_DEMAND, size) or {}
+        recent = sum(1 for t in record.get('events', []) if t > time.time() - self.demand_window)
+        return max(int(bounds.get('min', 0)), min(int(bounds.get('max', 0)), recent))
+
+    # Refilling
+
+    async def refill(self):
+        """Bring each size's pool to its target; a no-op unless this process wins the refill lock"""
+        lock = self.store.lock('warm-pool-refill', ttl=max(self.interval * 5, 300))
+        if not await lock.acquire(blocking=False):
+            return
+        try:
+            await self._reconcile()
+            records = list((await self.store.all(WARM_POOL)).values())
+            for size in self.sizes:
+                target = await self.target_size(size)
+                pooled = [r for r in records if r['size'] == size and r['state'] in (WARMING, READY)]
+                if len(pooled) < target:
+                    await self._add(size, target - len(pooled))
+                elif len(pooled) > target:
+                    ready = sorted((r for r in pooled if r['state'] == READY), key=lambda r: r['created_at'])
+                    await self._retire([r['instance_id'] for r in ready[:len(pooled) - target]])
+        finally:
+            await lock.release()
+
+    async def _reconcile(self):
+        """Align store records with the standbys that exist in EC2"""
+        response = await run_blocking(
+            self.manager.ec2_client.describe_instances,
+            Filters=[
+                {'Name': 'tag:NDT-Managed', 'Values': [STANDBY_TAG]},
+                {'Name': 'instance-state-name', 'Values': ['pending', 'running', 'stopping', 'stopped']},
+            ],
+        )
+        standbys = {
+            instance['InstanceId']: {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+            for reservation in response.get('Reservations', [])
+            for instance in reservation.get('Instances', [])
+        }
+        records = await self.store.all(WARM_POOL)
+
+        for instance_id in set(records) - set(standbys):
+            await self.store.delete(WARM_POOL, instance_id)
+
+        orphans = []
+        for instance_id, tags in standbys.items():
+            record = records.get(instance_id)
+            if record is not None:
+                if record['state'] == WARMING and record['created_at'] < time.time() - WARMING_TIMEOUT:
+                    await self.store.delete(WARM_POOL, instance_id)
+                    orphans.append(instance_id)
+                continue
+            if tags.get('NDT-Pool-State') == READY and tags.get('NDT-Pool-Size') in self.sizes:
+                # Survived a manager restart (or the memory store was reset)
+                await self.store.put(WARM_POOL, instance_id, {
+                    'instance_id': instance_id, 'size': tags['NDT-Pool-Size'],
+                    'state': READY, 'created_at': time.time(),
+                })
+            else:
+                # Warming when its manager died, or a size no longer pooled
+                orphans.append(instance_id)
+        if orphans:
+            logger.warning(f"Terminating {len(orphans)} unusable standbys: {', '.join(orphans)}")
+            await self._terminate(orphans)
+
+    async def _add(self, size: str, count: int):
+        ami_id = await self.manager._get_ubuntu_ami()
+        security_group_id = await self.manager._get_worker_security_group()
+        instance_ids = await self.manager._run_instances(
+            size, count, ami_id, security_group_id, standby_mode=self.mode
+        )
+        for instance_id in instance_ids:
+            await self.store.put(WARM_POOL, instance_id, {
+                'instance_id': instance_id, 'size': size, 'state': WARMING, 'created_at': time.time(),
+            })
+        logger.info(f"Warming {count} {size} standbys: {', '.join(instance_ids)}")
+
+        task = asyncio.create_task(self._warm(instance_ids))
+        self._warming.add(task)
+        task.add_done_callback(self._warming.discard)
+
+    async def _warm(self, instance_ids: List[str]):
+        """Wait for bootstrap, park the standbys, then mark them ready"""
+        try:
+            ready = await self.manager._wait_for_instances_ready(instance_ids)
+            failed = [iid for iid in instance_ids if iid not in ready]
+            if failed:
+                logger.error(f"Standbys {', '.join(failed)} failed to bootstrap; terminating them")
+                await self._terminate(failed)
+                for instance_id in failed:
+                    await self.store.delete(WARM_POOL, instance_id)
+            if not ready:
+                return
+
+            if self.mode != 'running':
+                await self.manager.instance_retired(ready, stopped=True)
+                await run_blocking(
+                    self.manager.ec2_client.stop_instances,
+                    InstanceIds=ready,
+                    Hibernate=self.mode == 'hibernated',
+                )
+                waiter = self.manager.ec2_client.get_waiter('instance_stopped')
+                await run_blocking(waiter.wait, InstanceIds=ready, lane=DEPLOY_LANE)
+
+            await run_blocking(
+                self.manager.ec2_client.create_tags,
+                Resources=ready,
+                Tags=[{'Key': 'NDT-Pool-State', 'Value': READY}],
+            )
+
+            def mark_ready(record: Optional[Dict]) -> Optional[Dict]:
+                return {**record, 'state': READY} if record is not None else None
+
+            for instance_id in ready:
+                await self.store.update(WARM_POOL, instance_id, mark_ready)
+            logger.info(f"Standbys ready ({self.mode}): {', '.join(ready)}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error warming standbys {', '.join(instance_ids)}: {e}")
+
+    async def _retire(self, instance_ids: List[str]):
+        """Terminate surplus ready standbys that nobody claimed meanwhile"""
+        taken = [instance_id for instance_id in instance_ids if await self._take(instance_id)]
+        if taken:
+            logger.info(f"Retiring {len(taken)} surplus standbys: {', '.join(taken)}")
+            await self._terminate(taken)
+            for instance_id in taken:
+                await self.store.delete(WARM_POOL, instance_id)
+
+    async def _terminate(self, instance_ids: List[str]):
+        try:
+            await self.manager.instance_retired(instance_ids)
+            await run_blocking(self.manager.ec2_client.terminate_instances, InstanceIds=instance_ids)
+        except ClientError as e:
+            logger.error(f"Error terminating standbys {', '.join(instance_ids)}: {e}")
+
+    async def status(self) -> Dict:
+        """Pool contents and targets per size"""
+        records = list((await self.store.all(WARM_POOL)).values())
+        sizes = {}
+        for size, bounds in self.sizes.items():
+            pooled = [r for r in records if r['size'] == size]
+            sizes[size] = {
+                'min': int(bounds.get('min', 0)),
+                'max': int(bounds.get('max', 0)),
+                'target': await self.target_size(size),
+                'ready': sum(1 for r in pooled if r['state'] == READY),
+                'warming': sum(1 for r in pooled if r['state'] == WARMING),
+            }
+        return {'enabled': self.enabled, 'mode': self.mode, 'sizes': sizes}